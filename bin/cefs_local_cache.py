@@ -0,0 +1,20 @@
+#!/usr/bin/env python3
+"""Node-local CEFS image cache, run from the autofs program map with the system python.
+
+Usage:
+    ./bin/cefs_local_cache.py --cache-dir /cefs-cache map KEY
+    ./bin/cefs_local_cache.py --cache-dir /cefs-cache stats
+"""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+# Allow running without the ce environment (only the standard library is needed)
+sys.path.insert(0, str(Path(__file__).parent))
+
+from lib.cefs.local_cache import main
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,20 @@
+#!/usr/bin/env python3
+"""CEFS mount latency and read statistics, run on nodes with the system python.
+
+Usage:
+    ./bin/cefs_mount_metrics.py probe --cold-only abc123_gcc /cefs/de/def456_consolidated
+    ./bin/cefs_mount_metrics.py --prometheus-file /var/lib/node_exporter/cefs.prom collect
+"""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+# Allow running without the ce environment (only the standard library is needed)
+sys.path.insert(0, str(Path(__file__).parent))
+
+from lib.cefs.mount_metrics import main
+
+if __name__ == "__main__":
+    sys.exit(main())
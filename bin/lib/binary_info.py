@@ -7,11 +7,9 @@ from collections.abc import Iterable
 from pathlib import Path
 from typing import Any
 
+from lib.elf_reader import ElfFormatError, read_elf
 from lib.library_platform import LibraryPlatform
 
-SYMBOLLINE_RE = re.compile(
-    r"^\s*(\d*):\s[0-9a-f]*\s*(\d*)\s(\w*)\s*(\w*)\s*(\w*)\s*([\w|\d]*)\s?([\w\.]*)?$", re.MULTILINE
-)
 SYMBOLLINE_NM_RE = re.compile(r"^[0-9a-f ]*\s(\w)\s(.*)\r$", re.MULTILINE)
 SO_STRANGE_SYMLINK = re.compile(r"INPUT \((\S*)\)")
 
@@ -23,14 +21,6 @@ OBJ_FORMAT_RE = re.compile(r"^\s*Format:\s*(.*)$", re.MULTILINE)
 OBJ_ARCH_RE = re.compile(r"^\s*Arch:\s*(.*)$", re.MULTILINE)
 OBJ_ADDRSIZE_RE = re.compile(r"^\s*AddressSize:\s*(.*)$", re.MULTILINE)
 
-sym_grp_num = 0
-sym_grp_val = 1
-sym_grp_type = 2
-sym_grp_bind = 3
-sym_grp_vis = 4
-sym_grp_ndx = 5
-sym_grp_name = 6
-
 nm_sym_grp_ndx = 0
 nm_sym_grp_name = 1
 
@@ -47,9 +37,13 @@ class BinaryInfo:
         self.readelf_symbols_details = ""
         self.ldd_details = ""
         self.nm_used = False
+        self.needed_libraries: tuple[str, ...] = ()
+        self.required_symbols: set[str] = set()
+        self.implemented_symbols: set[str] = set()
 
         self._follow_and_readelf()
-        self._read_symbols_from_binary()
+        if self.nm_used:
+            self._read_symbols_from_binary()
 
     def _debug_check_output(self, arr):
         # self.logger.debug("Executing: %s %s", arr[0], arr[1])
@@ -64,17 +58,22 @@ class BinaryInfo:
             self.filepath = self.filepath.resolve()
             self.logger.debug("Was symlink -> readelf on %s", self.filepath)
 
+        if self.platform == LibraryPlatform.Linux:
+            try:
+                elf = read_elf(self.filepath)
+            except ElfFormatError:
+                self._follow_linker_script()
+                return
+            # Kept in readelf's words, which is what callers look for (e.g. "ELF32")
+            self.readelf_header_details = "".join(header.describe() for header in elf.headers)
+            self.needed_libraries = elf.needed
+            self.ldd_details = "".join(f" (NEEDED) Shared library: [{needed}]\n" for needed in elf.needed)
+            self.required_symbols = set(elf.undefined_symbols)
+            self.implemented_symbols = set(elf.defined_symbols)
+            return
+
         try:
-            if self.platform == LibraryPlatform.Linux:
-                self.readelf_header_details = self._debug_check_output(["readelf", "-h", str(self.filepath)])
-                self.readelf_symbols_details = self._debug_check_output(["readelf", "-W", "-s", str(self.filepath)])
-                if ".so" in self.filepath.name:
-                    try:
-                        self.ldd_details = self._debug_check_output(["ldd", str(self.filepath)])
-                    except:  # noqa: E722
-                        # some C++ SO's are stubborn and ldd can't read them for some reason, readelf -d sort of gives us the same info
-                        self.ldd_details = self._debug_check_output(["readelf", "-d", str(self.filepath)])
-            elif self.platform == LibraryPlatform.Windows:
+            if self.platform == LibraryPlatform.Windows:
                 self.readelf_header_details = self._debug_check_output(["llvm-readelf", "-h", str(self.filepath)])
                 if str(self.filepath).endswith(".a"):
                     self.readelf_symbols_details = self._debug_check_output(["nm", str(self.filepath)])
@@ -84,36 +83,27 @@ class BinaryInfo:
                     self.nm_used = True
 
         except subprocess.CalledProcessError:
-            try:
-                match = SO_STRANGE_SYMLINK.match(Path(self.filepath).read_text(encoding="utf-8"))
-                if match:
-                    self.filepath = self.buildfolder / match[1]
-                    self._follow_and_readelf()
-            except UnicodeDecodeError:
-                return
+            self._follow_linker_script()
 
-    def _read_symbols_from_binary(self) -> None:
-        self.required_symbols = set()
-        self.implemented_symbols = set()
+    def _follow_linker_script(self) -> None:
+        # Some "libfoo.so"s are linker scripts naming the real library
+        try:
+            match = SO_STRANGE_SYMLINK.match(Path(self.filepath).read_text(encoding="utf-8"))
+            if match:
+                self.filepath = self.buildfolder / match[1]
+                self._follow_and_readelf()
+        except UnicodeDecodeError:
+            return
 
-        if self.nm_used:
-            symbollinematches = SYMBOLLINE_NM_RE.findall(self.readelf_symbols_details)
-            if symbollinematches:
-                for line in symbollinematches:
-                    if line[nm_sym_grp_name]:
-                        if line[nm_sym_grp_ndx] == "U":
-                            self.required_symbols.add(line[nm_sym_grp_name])
-                        else:
-                            self.implemented_symbols.add(line[nm_sym_grp_name])
-        else:
-            symbollinematches = SYMBOLLINE_RE.findall(self.readelf_symbols_details)
-            if symbollinematches:
-                for line in symbollinematches:
-                    if len(line) == 7 and line[sym_grp_name]:
-                        if line[sym_grp_ndx] == "UND":
-                            self.required_symbols.add(line[sym_grp_name])
-                        else:
-                            self.implemented_symbols.add(line[sym_grp_name])
+    def _read_symbols_from_binary(self) -> None:
+        symbollinematches = SYMBOLLINE_NM_RE.findall(self.readelf_symbols_details)
+        if symbollinematches:
+            for line in symbollinematches:
+                if line[nm_sym_grp_name]:
+                    if line[nm_sym_grp_ndx] == "U":
+                        self.required_symbols.add(line[nm_sym_grp_name])
+                    else:
+                        self.implemented_symbols.add(line[nm_sym_grp_name])
 
     @staticmethod
     def symbol_maybe_cxx11abi(symbol: str) -> bool:
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""A CARGO_HOME shared by Rust library builds, so crates and the registry index are fetched once.
+
+Builds only share one when `ce_install build --cargo-home` is given. Build scripts then resolve
+dependencies offline first, from what earlier builds already fetched, and only go to the network
+for what's missing. Crates a library was built against before also serve as its source when
+building it again. The cache is kept under a size limit by pruning the least recently added
+entries, cheapest to recreate first: extracted sources, then git checkouts, then downloaded
+crates, then git databases. Compiled dependencies are not shared through it: they are only
+reusable with the same rustc, which is what sccache (`ce_install build --compiler-cache`) keys
+them by.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+from collections.abc import Iterator
+from pathlib import Path
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_CARGO_HOME_SIZE = 10 * 1024 * 1024 * 1024
+
+# What can go, in order: each is a glob of entries under CARGO_HOME
+_PRUNABLE = ("registry/src/*/*", "git/checkouts/*/*", "registry/cache/*/*.crate", "git/db/*")
+
+
+def _size(path: Path) -> int:
+    if path.is_symlink() or not path.is_dir():
+        return path.lstat().st_size
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except FileNotFoundError:
+                continue
+    return total
+
+
+class CargoHome:
+    def __init__(self, path: Path, max_size: int = DEFAULT_CARGO_HOME_SIZE):
+        self.path = path
+        self.max_size = max_size
+
+    def env(self) -> dict[str, str]:
+        """Environment for a build script using this cargo home."""
+        return {"CARGO_HOME": str(self.path)}
+
+    def cached_crate(self, name: str, version: str) -> Path | None:
+        """The .crate file of name at version, if any build fetched it already."""
+        for crate in sorted(self.path.glob(f"registry/cache/*/{name}-{version}.crate")):
+            return crate
+        return None
+
+    def size(self) -> int:
+        return _size(self.path) if self.path.exists() else 0
+
+    def _candidates(self) -> Iterator[Path]:
+        for pattern in _PRUNABLE:
+            entries = []
+            for entry in self.path.glob(pattern):
+                try:
+                    entries.append((entry.lstat().st_mtime, entry))
+                except FileNotFoundError:
+                    continue
+            for _, entry in sorted(entries):
+                yield entry
+
+    def prune(self) -> int:
+        """Remove cached entries until the cargo home fits in max_size; returns the bytes freed."""
+        total = self.size()
+        if total <= self.max_size:
+            return 0
+        freed = 0
+        for entry in self._candidates():
+            if total - freed <= self.max_size:
+                break
+            entry_size = _size(entry)
+            if entry.is_dir() and not entry.is_symlink():
+                shutil.rmtree(entry, ignore_errors=True)
+            else:
+                entry.unlink(missing_ok=True)
+            freed += entry_size
+        _LOGGER.info("Pruned %d bytes from cargo home %s, %d bytes left", freed, self.path, total - freed)
+        return freed
+
+
+_shared_cargo_home: CargoHome | None = None
+
+
+def shared_cargo_home() -> CargoHome | None:
+    """The cargo home Rust library builds in this process share, if one is set up."""
+    return _shared_cargo_home
+
+
+def load_shared_cargo_home(path: Path, max_size: int = DEFAULT_CARGO_HOME_SIZE) -> CargoHome:
+    global _shared_cargo_home
+    _shared_cargo_home = CargoHome(path, max_size)
+    return _shared_cargo_home
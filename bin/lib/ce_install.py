@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
+import contextlib
 import fnmatch
 import json
 import logging
@@ -8,6 +9,7 @@ import multiprocessing
 import os
 import signal
 import sys
+import time
 import traceback
 from dataclasses import dataclass, field
 from functools import partial
@@ -16,20 +18,46 @@ from pathlib import Path
 from typing import TextIO
 
 import click
+import humanfriendly
 import yaml
 from click.core import ParameterSource
 from packaging import specifiers, version
 
 from lib.amazon_properties import get_properties_compilers_and_libraries
+from lib.cargo_home import DEFAULT_CARGO_HOME_SIZE, load_shared_cargo_home
+from lib.cefs.trash import (
+    DEFAULT_MAX_DELETES_PER_SECOND,
+    DEFAULT_TRASH_WORKERS,
+    TRASH_DIR_NAME,
+    BackgroundTrashEmptier,
+    TrashQueue,
+)
+from lib.compiler_cache import (
+    CCACHE,
+    DEFAULT_COMPILER_CACHE_SIZE,
+    LAUNCHERS,
+    CompilerCache,
+    configure_compiler_cache,
+)
 from lib.compiler_id_lookup import get_compiler_id_lookup
+from lib.compiler_probe_cache import default_probe_cache_path, load_shared_probe_cache
 from lib.config import Config
 from lib.config_safe_loader import ConfigSafeLoader
+from lib.golang_stdlib import DEFAULT_ARCHITECTURES, build_missing_go_stdlibs, is_go_installation
+from lib.installable.go import GoInstallable
 from lib.installable.installable import Installable
 from lib.installation import installers_for
 from lib.installation_context import FetchFailure, InstallationContext
+from lib.library_builder import DEFAULT_MEMORY_PER_BUILD, build_worker_count, physical_memory_bytes
 from lib.library_platform import LibraryPlatform
 from lib.library_yaml import LibraryYaml
-from lib.squashfs import verify_squashfs_contents
+from lib.squashfs import (
+    SquashfsEntry,
+    SquashfsError,
+    list_squashfs_entries,
+    list_squashfs_entries_with_unsquashfs,
+    verify_squashfs_contents,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -721,7 +749,7 @@ def squash_check(
             # Verify contents if requested
             nfs_path = context.installation_context.destination / installable.install_path
             _LOGGER.info("Verifying %s...", installable.name)
-            total_errors += verify_squashfs_contents(destination, nfs_path)
+            total_errors += verify_squashfs_contents(destination, nfs_path, context.config.squashfs)
 
     # Check mount points (unless disabled)
     if not no_check_mount_targets:
@@ -736,6 +764,46 @@ def squash_check(
         sys.exit(0)
 
 
+@cli.command()
+@click.pass_obj
+@click.option("--repeat", default=1, show_default=True, type=int, help="Time each reader this many times")
+@click.argument("images", metavar="IMAGE", nargs=-1, required=True, type=click.Path(dir_okay=False, path_type=Path))
+def squash_benchmark(context: CliContext, images: tuple[Path, ...], repeat: int):
+    """Compare the native squashfs metadata reader with parsing unsquashfs -ll on each IMAGE.
+
+    Also checks both readers list the same entries.
+    """
+    mismatched = 0
+    for image in images:
+        timings: dict[str, float] = {}
+        listings: dict[str, list[SquashfsEntry]] = {}
+        readers = {
+            "native": lambda image=image: list_squashfs_entries(context.config.squashfs, image),
+            "unsquashfs": lambda image=image: list_squashfs_entries_with_unsquashfs(context.config.squashfs, image),
+        }
+        for name, reader in readers.items():
+            start = time.perf_counter()
+            try:
+                for _ in range(repeat):
+                    listings[name] = reader()
+            except SquashfsError as e:
+                raise click.ClickException(f"{name} reader failed on {image}: {e}") from e
+            timings[name] = (time.perf_counter() - start) / repeat
+
+        entries = len(listings["native"])
+        click.echo(f"{image} ({humanfriendly.format_size(image.stat().st_size, binary=True)}, {entries} entries)")
+        for name, seconds in timings.items():
+            click.echo(f"  {name:>10}: {seconds:.3f}s ({entries / seconds if seconds else 0:,.0f} entries/s)")
+        if timings["native"]:
+            click.echo(f"  speedup: {timings['unsquashfs'] / timings['native']:.1f}x")
+        if set(listings["native"]) != set(listings["unsquashfs"]):
+            mismatched += 1
+            click.echo("  MISMATCH: readers disagree on the image contents")
+
+    if mismatched:
+        raise click.ClickException(f"{mismatched} images listed differently by the two readers")
+
+
 def should_install_helper(force: bool, installable: Installable) -> tuple[Installable, bool]:
     try:
         return installable, force or installable.should_install()
@@ -750,37 +818,83 @@ def should_install_helper(force: bool, installable: Installable) -> tuple[Instal
 @cli.command()
 @click.pass_obj
 @click.option("--force", is_flag=True, help="Force even if would otherwise skip")
+@click.option(
+    "--bulk",
+    is_flag=True,
+    help="Move old CEFS backups to the trash and delete them in the background instead of after each install",
+)
+@click.option(
+    "--trash-workers",
+    default=DEFAULT_TRASH_WORKERS,
+    show_default=True,
+    type=int,
+    help="Number of trash items deleted in parallel with --bulk",
+)
+@click.option(
+    "--max-deletes-per-second",
+    default=DEFAULT_MAX_DELETES_PER_SECOND,
+    show_default=True,
+    type=float,
+    help="Limit on NFS delete operations per second with --bulk (0 for no limit)",
+)
+@click.option(
+    "--compression-profile",
+    metavar="PROFILE",
+    help="Squashfs compression profile for new CEFS images, e.g. hot or cold (see squashfs.profiles in the config)",
+)
 @click.argument("filter_", metavar="FILTER", nargs=-1)
-def install(context: CliContext, filter_: list[str], force: bool):
+def install(
+    context: CliContext,
+    filter_: list[str],
+    force: bool,
+    bulk: bool,
+    trash_workers: int,
+    max_deletes_per_second: float,
+    compression_profile: str | None,
+):
     """Install targets matching FILTER."""
     num_installed = 0
     num_skipped = 0
     failed = []
 
+    if compression_profile is not None:
+        try:
+            context.installation_context.config.squashfs.profile(compression_profile)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint="--compression-profile") from e
+        context.installation_context.compression_profile = compression_profile
+
     with context.pool() as pool:
         to_do = pool.map(partial(should_install_helper, force), context.get_installables(filter_))
 
-    for installable, should_install in to_do:
-        print(f"Installing {installable.name}")
-        if should_install:
-            try:
-                installable.install()
-                if context.installation_context.dry_run:
-                    _LOGGER.info("Assuming %s installed OK (dry run)", installable.name)
-                    num_installed += 1
-                else:
-                    if not installable.is_installed():
-                        _LOGGER.error("%s installed OK, but doesn't appear as installed after", installable.name)
-                        failed.append(installable.name)
-                    else:
-                        _LOGGER.info("%s installed OK", installable.name)
+    trash_emptier: contextlib.AbstractContextManager = contextlib.nullcontext()
+    if bulk and context.installation_context.cefs_enabled and not context.installation_context.dry_run:
+        trash = TrashQueue(context.installation_context.destination / TRASH_DIR_NAME)
+        context.installation_context.trash = trash
+        trash_emptier = BackgroundTrashEmptier(trash, trash_workers, max_deletes_per_second or None)
+
+    with trash_emptier:
+        for installable, should_install in to_do:
+            print(f"Installing {installable.name}")
+            if should_install:
+                try:
+                    installable.install()
+                    if context.installation_context.dry_run:
+                        _LOGGER.info("Assuming %s installed OK (dry run)", installable.name)
                         num_installed += 1
-            except Exception as e:  # noqa: BLE001
-                _LOGGER.info("%s failed to install: %s\n%s", installable.name, e, traceback.format_exc(5))
-                failed.append(installable.name)
-        else:
-            _LOGGER.info("%s is already installed, skipping", installable.name)
-            num_skipped += 1
+                    else:
+                        if not installable.is_installed():
+                            _LOGGER.error("%s installed OK, but doesn't appear as installed after", installable.name)
+                            failed.append(installable.name)
+                        else:
+                            _LOGGER.info("%s installed OK", installable.name)
+                            num_installed += 1
+                except Exception as e:  # noqa: BLE001
+                    _LOGGER.info("%s failed to install: %s\n%s", installable.name, e, traceback.format_exc(5))
+                    failed.append(installable.name)
+            else:
+                _LOGGER.info("%s is already installed, skipping", installable.name)
+                num_skipped += 1
     print(
         f"{num_installed} packages installed "
         f"{'(apparently; this was a dry-run) ' if context.installation_context.dry_run else ''}OK, "
@@ -804,6 +918,69 @@ def install(context: CliContext, filter_: list[str], force: bool):
 )
 @click.option("--popular-compilers-only", is_flag=True, help="Only build with popular (enough) compilers")
 @click.option("--temp-install", is_flag=True, help="Temporary install target if it's not installed yet")
+@click.option(
+    "--max-workers",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Build up to N compiler/configuration combinations of a C++ or Go library at once",
+    metavar="N",
+)
+@click.option(
+    "--memory-per-build",
+    default=humanfriendly.format_size(DEFAULT_MEMORY_PER_BUILD, binary=True),
+    show_default=True,
+    help="Memory to budget for each concurrent build; --max-workers is capped to fit in RAM",
+    metavar="SIZE",
+)
+@click.option(
+    "--probe-cache",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=default_probe_cache_path,
+    show_default="$XDG_CACHE_HOME/ce-install/compiler-probes.json",
+    help="File to keep the results of probing compilers' supported targets in, between runs",
+    metavar="FILE",
+)
+@click.option(
+    "--compiler-cache",
+    type=click.Path(file_okay=False, path_type=Path),
+    default=None,
+    help="Run C/C++ compilations (and cargo builds, with sccache) through a compiler cache kept in DIR",
+    metavar="DIR",
+)
+@click.option(
+    "--compiler-cache-size",
+    default=humanfriendly.format_size(DEFAULT_COMPILER_CACHE_SIZE, binary=True),
+    show_default=True,
+    help="Size the compiler cache is bounded to",
+    metavar="SIZE",
+)
+@click.option(
+    "--compiler-launcher",
+    type=click.Choice(LAUNCHERS),
+    default=CCACHE,
+    show_default=True,
+    help="Compiler cache to use for C/C++ compilations",
+)
+@click.option(
+    "--cargo-home",
+    type=click.Path(file_okay=False, path_type=Path),
+    default=None,
+    help="Share DIR as the CARGO_HOME of Rust library builds, so crates are only fetched once",
+    metavar="DIR",
+)
+@click.option(
+    "--cargo-home-size",
+    default=humanfriendly.format_size(DEFAULT_CARGO_HOME_SIZE, binary=True),
+    show_default=True,
+    help="Size the shared CARGO_HOME is pruned to after building",
+    metavar="SIZE",
+)
+@click.option(
+    "--plan",
+    is_flag=True,
+    help="Show which compiler/configuration combinations would be built or skipped, and why, without building",
+)
 @click.argument("filter_", metavar="FILTER", nargs=-1)
 def build(
     context: CliContext,
@@ -812,8 +989,110 @@ def build(
     buildfor: str,
     popular_compilers_only: bool,
     temp_install: bool,
+    max_workers: int,
+    memory_per_build: str,
+    probe_cache: Path,
+    compiler_cache: Path | None,
+    compiler_cache_size: str,
+    compiler_launcher: str,
+    cargo_home: Path | None,
+    cargo_home_size: str,
+    plan: bool,
 ):
     """Build library targets matching FILTER."""
+    try:
+        memory_per_build_bytes = humanfriendly.parse_size(memory_per_build, binary=True)
+    except humanfriendly.InvalidSize as e:
+        raise click.BadParameter(str(e), param_hint="--memory-per-build") from e
+    workers = build_worker_count(max_workers, memory_per_build_bytes, os.cpu_count(), physical_memory_bytes())
+    if workers < max_workers:
+        _LOGGER.info(
+            "Running %d builds at a time rather than %d to fit the CPU and memory budget", workers, max_workers
+        )
+
+    cargo = None
+    if cargo_home:
+        try:
+            cargo_home_bytes = humanfriendly.parse_size(cargo_home_size, binary=True)
+        except humanfriendly.InvalidSize as e:
+            raise click.BadParameter(str(e), param_hint="--cargo-home-size") from e
+        cargo = load_shared_cargo_home(cargo_home.resolve(), cargo_home_bytes)
+
+    probes = load_shared_probe_cache(probe_cache, context.parallel)
+    if plan:
+        try:
+            _print_build_plans(context, filter_, force, buildfor, popular_compilers_only)
+        finally:
+            probes.save()
+        return
+
+    cache = None
+    if compiler_cache:
+        try:
+            cache_size = humanfriendly.parse_size(compiler_cache_size, binary=True)
+        except humanfriendly.InvalidSize as e:
+            raise click.BadParameter(str(e), param_hint="--compiler-cache-size") from e
+        try:
+            cache = CompilerCache(compiler_cache.resolve(), cache_size, compiler_launcher)
+        except RuntimeError as e:
+            raise click.BadParameter(str(e), param_hint="--compiler-launcher") from e
+        _LOGGER.info("Using compiler cache: %s", cache.describe())
+    configure_compiler_cache(cache)
+
+    try:
+        num_installed, num_skipped, num_failed = _build_installables(
+            context, filter_, force, buildfor, popular_compilers_only, temp_install, workers
+        )
+    finally:
+        configure_compiler_cache(None)
+        if cargo:
+            cargo.prune()
+        probes.save()
+        _LOGGER.info("Compiler probes: %d cached, %d run", probes.hits, probes.misses)
+
+    print(f"{num_installed} packages built OK, {num_skipped} skipped, and {num_failed} failed build")
+    if cache:
+        print(f"Compiler cache: {cache.totals.describe()}")
+    if num_failed:
+        sys.exit(1)
+
+
+def _print_build_plans(
+    context: CliContext, filter_: list[str], force: bool, buildfor: str, popular_compilers_only: bool
+) -> None:
+    platform = LibraryPlatform.Windows if "windows" in context.enabled else LibraryPlatform.Linux
+    effective_buildfor = buildfor if buildfor else ("forceall" if force else "")
+    for installable in context.get_installables(filter_):
+        if not force and not installable.should_build(platform):
+            print(f"{installable.name} ({platform.value}): does not have to build")
+            continue
+        try:
+            planned_builds = installable.plan_build(effective_buildfor, popular_compilers_only, platform)
+        except RuntimeError as e:
+            print(f"{installable.name} ({platform.value}): {e}")
+            continue
+
+        print(f"{installable.name} ({platform.value}):")
+        for planned in planned_builds:
+            _, buildtype, arch, stdver, stdlib, flags = planned.job.combination
+            action = "build" if planned.status is None else planned.status.name.lower()
+            print(
+                f"  {planned.job.compiler:<24} {buildtype:<8} {arch or '-':<7} {stdver or '-':<8} "
+                f"{stdlib or '-':<8} {' '.join(flags) or '-':<12} {action:<8} {planned.reason}"
+            )
+        to_build = sum(planned.status is None for planned in planned_builds)
+        print(f"  {to_build} to build, {len(planned_builds) - to_build} not")
+
+
+def _build_installables(
+    context: CliContext,
+    filter_: list[str],
+    force: bool,
+    buildfor: str,
+    popular_compilers_only: bool,
+    temp_install: bool,
+    workers: int,
+) -> tuple[int, int, int]:
     num_installed = 0
     num_skipped = 0
     num_failed = 0
@@ -853,7 +1132,7 @@ def build(
                     # Pass "forceall" to force rebuild when --force is specified without --buildfor
                     effective_buildfor = buildfor if buildfor else ("forceall" if force else "")
                     [num_installed, num_skipped, num_failed] = installable.build(
-                        effective_buildfor, popular_compilers_only, platform
+                        effective_buildfor, popular_compilers_only, platform, workers
                     )
                     if num_installed > 0:
                         _LOGGER.info("%s built OK", installable.name)
@@ -874,7 +1153,55 @@ def build(
         else:
             _LOGGER.info("%s does not have to build, skipping", installable.name)
             num_skipped += 1
-    print(f"{num_installed} packages built OK, {num_skipped} skipped, and {num_failed} failed build")
+    return num_installed, num_skipped, num_failed
+
+
+@cli.command(name="build-go-stdlib")
+@click.pass_obj
+@click.option(
+    "--arch",
+    "architectures",
+    multiple=True,
+    metavar="OS/ARCH",
+    help="Architecture to build for (repeatable); defaults to each Go's build_stdlib_archs",
+)
+@click.option(
+    "--max-workers",
+    type=click.IntRange(min=1),
+    default=len(DEFAULT_ARCHITECTURES),
+    show_default=True,
+    help="Build up to N architectures of a Go version at once",
+    metavar="N",
+)
+@click.option(
+    "--cpus",
+    type=click.IntRange(min=1),
+    default=None,
+    help="CPUs the concurrent builds share  [default: all]",
+    metavar="N",
+)
+@click.argument("filter_", metavar="FILTER", nargs=-1)
+def build_go_stdlib(
+    context: CliContext, filter_: list[str], architectures: tuple[str, ...], max_workers: int, cpus: int | None
+):
+    """Prebuild the stdlib cache of each installed Go matching FILTER that doesn't have one yet."""
+    installations = []
+    for installable in context.get_installables(filter_):
+        if not isinstance(installable, GoInstallable) or not installable.build_stdlib:
+            continue
+        if not installable.is_installed():
+            _LOGGER.info("%s is not installed, skipping", installable.name)
+            continue
+        install_path = context.installation_context.destination / installable.install_path
+        if not is_go_installation(install_path):
+            _LOGGER.warning("%s has no go binary at %s, skipping", installable.name, install_path)
+            continue
+        installations.append((install_path, list(architectures) or installable.build_stdlib_archs))
+
+    num_built, num_skipped, num_failed = build_missing_go_stdlibs(
+        installations, context.installation_context.dry_run, max_workers, cpus
+    )
+    print(f"{num_built} Go stdlibs built, {num_skipped} already built, and {num_failed} failed")
     if num_failed:
         sys.exit(1)
 
@@ -37,12 +37,22 @@ from lib.cefs_manifest import (
     sanitize_path_for_filename,
     validate_manifest,
 )
-from lib.config import SquashfsConfig
+from lib.config import CompressionProfile, SquashfsConfig
 from lib.installation_context import fix_permissions, is_windows
-from lib.squashfs import create_squashfs_image, extract_squashfs_relocating_subdir
+from lib.squashfs import (
+    create_squashfs_image,
+    create_squashfs_image_from_tar,
+    extract_squashfs_relocating_subdir,
+    merge_squashfs_images_to_tar,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
+# Temp space needed, as a multiple of a group's compressed size. Extraction lands the whole
+# uncompressed tree on disk before re-squashing; streaming only ever writes the output image.
+EXTRACTION_SPACE_MULTIPLIER = 5
+STREAMING_SPACE_MULTIPLIER = 2
+
 
 @dataclass(frozen=True)
 class ExtractionResult:
@@ -154,6 +164,7 @@ def create_consolidated_image(
     temp_dir: Path,
     output_path: Path,
     max_parallel_extractions: int | None = None,
+    profile: CompressionProfile | None = None,
 ) -> None:
     """Create a consolidated squashfs image from multiple CEFS items.
 
@@ -163,6 +174,7 @@ def create_consolidated_image(
         temp_dir: Temporary directory for extraction
         output_path: Path for the consolidated squashfs image
         max_parallel_extractions: Maximum number of parallel extractions (default: CPU count - 1)
+        profile: Compression profile for the image (default: the configured compression)
 
     Raises:
         RuntimeError: If consolidation fails
@@ -264,7 +276,7 @@ def create_consolidated_image(
             fix_permissions(extraction_dir)
 
         _LOGGER.info("Creating consolidated squashfs image at %s", output_path)
-        create_squashfs_image(squashfs_config, extraction_dir, output_path)
+        create_squashfs_image(squashfs_config, extraction_dir, output_path, profile=profile)
 
         consolidated_size = output_path.stat().st_size
 
@@ -297,6 +309,61 @@ def create_consolidated_image(
             _LOGGER.debug("Cleaned up extraction directory: %s", extraction_dir)
 
 
+def create_consolidated_image_streaming(
+    squashfs_config: SquashfsConfig,
+    items: list[tuple[Path, Path, str, Path | None]],
+    output_path: Path,
+    profile: CompressionProfile | None = None,
+) -> None:
+    """Create a consolidated squashfs image by streaming the source images, without extracting them.
+
+    Each source image (or the relevant subdirectory of it) is read as a tar stream, relocated
+    under its subdirectory name with ownership and permissions normalised on the fly, and fed
+    straight into mksquashfs. The uncompressed tree never lands on disk, so only space for the
+    output image is needed.
+
+    Args:
+        squashfs_config: SquashFsConfig object with tool paths and settings
+        items: List of (nfs_path, squashfs_path, subdirectory_name, extraction_path) tuples
+        output_path: Path for the consolidated squashfs image
+        profile: Compression profile for the image (default: the configured compression)
+
+    Raises:
+        RuntimeError: If consolidation fails
+    """
+    _LOGGER.info("Streaming %d items into consolidated squashfs image at %s", len(items), output_path)
+    whole_images = [squashfs_path for _, squashfs_path, _, extraction_path in items if extraction_path is None]
+    streamed_bytes = 0
+
+    def write_tar(stream) -> None:
+        nonlocal streamed_bytes
+        streamed_bytes = merge_squashfs_images_to_tar(
+            squashfs_config,
+            [(squashfs_path, extraction_path, subdir_name) for _, squashfs_path, subdir_name, extraction_path in items],
+            stream,
+        )
+
+    create_squashfs_image_from_tar(squashfs_config, output_path, write_tar, profile=profile)
+
+    consolidated_size = output_path.stat().st_size
+    _LOGGER.info("Consolidation complete:")
+    _LOGGER.info("  Final image size: %s", humanfriendly.format_size(consolidated_size, binary=True))
+    _LOGGER.info(
+        "  Data compression: %s -> %s (%.1fx)",
+        humanfriendly.format_size(streamed_bytes, binary=True),
+        humanfriendly.format_size(consolidated_size, binary=True),
+        streamed_bytes / consolidated_size if consolidated_size > 0 else 0,
+    )
+    # Only the inputs are sized here: images used in part contribute an unknown share of the output,
+    # so there's no like-for-like saving to report
+    if whole_images:
+        _LOGGER.info(
+            "  Source images used whole: %d, %s",
+            len(whole_images),
+            humanfriendly.format_size(sum(path.stat().st_size for path in whole_images), binary=True),
+        )
+
+
 def update_symlinks_for_consolidation(
     unchanged_symlinks: list[Path],
     consolidated_filename: str,
@@ -532,8 +599,10 @@ def determine_extraction_path(targets: list[Path], image_path: Path, mount_point
     """
     for target in targets:
         if is_item_still_using_image(target, image_path, mount_point):
-            if len(target.parts) > 4:
-                return Path(*target.parts[4:])
+            # {mount_point}/XX/FILENAME_STEM[/subdir]
+            subdir_parts = target.parts[len(mount_point.parts) + 2 :]
+            if subdir_parts:
+                return Path(*subdir_parts)
             break
     return None
 
@@ -601,13 +670,27 @@ def pack_items_into_groups(
         List of groups, where each group is a list of ConsolidationCandidate
     """
     # Sort by name for deterministic packing
-    sorted_items = sorted(items, key=lambda x: x.name)
+    return pack_ordered_items_into_groups(sorted(items, key=lambda x: x.name), max_size_bytes, min_items)
+
+
+def pack_ordered_items_into_groups(
+    ordered_items: list[ConsolidationCandidate], max_size_bytes: int, min_items: int
+) -> list[list[ConsolidationCandidate]]:
+    """Greedily pack already-ordered candidates into groups, preserving their order.
 
+    Args:
+        ordered_items: Items to pack, in the order they should be placed into groups
+        max_size_bytes: Maximum size per group in bytes
+        min_items: Minimum number of items per group
+
+    Returns:
+        List of groups, where each group is a list of ConsolidationCandidate
+    """
     groups: list[list[ConsolidationCandidate]] = []
     current_group: list[ConsolidationCandidate] = []
     current_size = 0
 
-    for item in sorted_items:
+    for item in ordered_items:
         if current_size + item.size > max_size_bytes and len(current_group) >= min_items:
             # Start new group
             groups.append(current_group)
@@ -630,12 +713,20 @@ def pack_items_into_groups(
     return groups
 
 
-def validate_space_requirements(groups: list[list[ConsolidationCandidate]], temp_dir: Path) -> tuple[int, int]:
+def validate_space_requirements(
+    groups: list[list[ConsolidationCandidate]],
+    temp_dir: Path,
+    space_multiplier: int = EXTRACTION_SPACE_MULTIPLIER,
+    uncompressed_group_sizes: list[int] | None = None,
+) -> tuple[int, int]:
     """Validate that there's enough space for consolidation.
 
     Args:
         groups: List of consolidation groups
         temp_dir: Temporary directory to check space for
+        space_multiplier: Temp space needed as a multiple of the largest group's size
+        uncompressed_group_sizes: Known uncompressed size of each group (from image metadata). When
+            given, the requirement is the extracted tree plus the new image, rather than a multiple
 
     Returns:
         Tuple of (required_space, largest_group_size)
@@ -647,8 +738,15 @@ def validate_space_requirements(groups: list[list[ConsolidationCandidate]], temp
         return 0, 0
 
     # Calculate space requirements
-    largest_group_size = max(sum(item.size for item in group) for group in groups)
-    required_temp_space = largest_group_size * 5  # Conservative multiplier for extraction/compression
+    group_sizes = [sum(item.size for item in group) for group in groups]
+    largest_group_size = max(group_sizes)
+    if uncompressed_group_sizes is not None:
+        required_temp_space = max(
+            uncompressed + compressed
+            for uncompressed, compressed in zip(uncompressed_group_sizes, group_sizes, strict=True)
+        )
+    else:
+        required_temp_space = largest_group_size * space_multiplier
 
     # Check available space
     temp_dir.mkdir(parents=True, exist_ok=True)
@@ -732,20 +830,28 @@ def prepare_consolidation_items(
     return items_for_consolidation, subdir_mapping
 
 
-def create_group_manifest(group: list[ConsolidationCandidate]) -> dict:
+def create_group_manifest(
+    group: list[ConsolidationCandidate],
+    operation: str = "consolidate",
+    compression_profile: str | None = None,
+) -> dict:
     """Create a manifest for a consolidation group.
 
     Args:
         group: List of consolidation candidates
+        operation: "consolidate", or "recompress" when re-encoding an existing image
+        compression_profile: Compression profile the image is built with (None for the default)
 
     Returns:
         Manifest dictionary
     """
     contents = [create_installable_manifest_entry(item.name, item.nfs_path) for item in group]
+    verb = "recompression" if operation == "recompress" else "consolidation"
     return create_manifest(
-        operation="consolidate",
-        description=f"Created through consolidation of {len(group)} items: " + ", ".join(item.name for item in group),
+        operation=operation,
+        description=f"Created through {verb} of {len(group)} items: " + ", ".join(item.name for item in group),
         contents=contents,
+        compression_profile=compression_profile,
     )
 
 
@@ -923,6 +1029,9 @@ def process_consolidation_group(
     max_parallel_extractions: int | None,
     find_installable_func: Callable[[str], Any],
     dry_run: bool = False,
+    streaming: bool = False,
+    compression_profile: str | None = None,
+    operation: str = "consolidate",
 ) -> tuple[bool, int, int]:
     """Process a single consolidation group.
 
@@ -938,6 +1047,9 @@ def process_consolidation_group(
         max_parallel_extractions: Maximum parallel extractions
         find_installable_func: Function to find installables by exact name
         dry_run: Whether this is a dry run
+        streaming: Build the image by streaming the source images rather than extracting them
+        compression_profile: Named compression profile for the image (see SquashfsConfig.profile)
+        operation: Manifest operation: "consolidate", or "recompress" to re-encode existing images
 
     Returns:
         Tuple of (success, updated_symlinks, skipped_symlinks)
@@ -958,20 +1070,27 @@ def process_consolidation_group(
             return False, 0, 0
 
         # Create manifest
-        manifest = create_group_manifest(group)
+        manifest = create_group_manifest(group, operation, compression_profile)
+        profile = squashfs_config.profile(compression_profile)
 
         # Create temporary consolidated image
         temp_consolidated_path = group_temp_dir / "consolidated.sqfs"
-        create_consolidated_image(
-            squashfs_config,
-            items_for_consolidation,
-            group_temp_dir,
-            temp_consolidated_path,
-            max_parallel_extractions,
-        )
+        if streaming:
+            create_consolidated_image_streaming(
+                squashfs_config, items_for_consolidation, temp_consolidated_path, profile=profile
+            )
+        else:
+            create_consolidated_image(
+                squashfs_config,
+                items_for_consolidation,
+                group_temp_dir,
+                temp_consolidated_path,
+                max_parallel_extractions,
+                profile=profile,
+            )
 
         # Get CEFS paths for the image
-        filename = get_cefs_filename_for_image(temp_consolidated_path, "consolidate")
+        filename = get_cefs_filename_for_image(temp_consolidated_path, operation)
         cefs_paths = get_cefs_paths(image_dir, mount_point, filename)
 
         # Deploy image and update symlinks
@@ -8,3 +8,6 @@ NFS_MAX_RECURSION_DEPTH = 3  # Limit depth when recursing on NFS to avoid perfor
 
 # Default minimum age for CEFS cleanup operations
 DEFAULT_MIN_AGE = "1h"
+
+# Number of hex digits of an image's SHA256 used in CEFS filenames
+CEFS_HASH_LENGTH = 24
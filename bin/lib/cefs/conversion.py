@@ -3,110 +3,336 @@
 
 from __future__ import annotations
 
+import datetime
+import json
 import logging
+import threading
+from collections.abc import Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Any
 
-from lib.cefs.deployment import backup_and_symlink, deploy_to_cefs_transactional
+from lib.cefs.deployment import backup_and_symlink, copy_to_cefs_hashing, place_hashed_copy
 from lib.cefs.paths import (
+    CEFSPaths,
     detect_nfs_state,
     get_cefs_filename_for_image,
     get_cefs_paths,
 )
-from lib.cefs_manifest import create_installable_manifest_entry, create_manifest
+from lib.cefs_manifest import (
+    create_installable_manifest_entry,
+    create_manifest,
+    finalize_manifest,
+    generate_cefs_filename,
+    write_manifest_inprogress,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
+DEFAULT_CONVERT_WORKERS = 4
+DEFAULT_CONVERT_BYTES_IN_FLIGHT = 8 * 1024 * 1024 * 1024
+
+
+class ConversionError(RuntimeError):
+    """A single installable could not be converted."""
+
+
+@dataclass(frozen=True)
+class ConversionItem:
+    """An installable to convert, with its NFS directory and existing squashfs image."""
+
+    installable: Any
+    nfs_path: Path
+    squashfs_image_path: Path
+
+    @property
+    def name(self) -> str:
+        return self.installable.name
+
+
+@dataclass(frozen=True)
+class PreparedConversion:
+    """An item whose image is in CEFS storage, ready for its symlink swap.
+
+    cefs_paths is None if the item was already converted and there is nothing left to do.
+    """
+
+    item: ConversionItem
+    cefs_paths: CEFSPaths | None
+    manifest_pending: bool = False  # An .inprogress manifest must be finalised after the swap
+
+
+@dataclass
+class BulkConversionResult:
+    """Outcome of a bulk conversion."""
+
+    converted: list[str] = field(default_factory=list)
+    already_converted: list[str] = field(default_factory=list)
+    resumed: list[str] = field(default_factory=list)  # Skipped because the journal says they're done
+    failed: dict[str, str] = field(default_factory=dict)
+
+
+class IoBudget:
+    """Limits the total size of images being read and copied at once.
+
+    A single image larger than the budget is still allowed through, on its own.
+    """
+
+    def __init__(self, max_bytes: int):
+        self._max_bytes = max_bytes
+        self._in_flight = 0
+        self._condition = threading.Condition()
 
-def convert_to_cefs(
-    installable,
-    destination_path: Path,
-    squashfs_image_path: Path,
+    @contextmanager
+    def reserve(self, num_bytes: int) -> Iterator[None]:
+        with self._condition:
+            self._condition.wait_for(lambda: self._in_flight == 0 or self._in_flight + num_bytes <= self._max_bytes)
+            self._in_flight += num_bytes
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._in_flight -= num_bytes
+                self._condition.notify_all()
+
+
+class ConversionJournal:
+    """Append-only JSONL record of per-item conversion outcomes, so an interrupted run can resume.
+
+    Each line is {"name", "status", "time", ...}; the last line for a name wins. Items whose
+    last status is "converted" are skipped on the next run with the same journal, and failed
+    items are retried.
+    """
+
+    def __init__(self, path: Path | None):
+        self._path = path
+        self._status: dict[str, str] = {}
+        if path and path.exists():
+            for line_number, line in enumerate(path.read_text(encoding="utf-8").splitlines(), start=1):
+                try:
+                    entry = json.loads(line)
+                    self._status[entry["name"]] = entry["status"]
+                except (ValueError, KeyError, TypeError):
+                    _LOGGER.warning("Ignoring malformed line %d of conversion journal %s", line_number, path)
+
+    def is_converted(self, name: str) -> bool:
+        return self._status.get(name) == "converted"
+
+    def record(self, name: str, status: str, **details: str) -> None:
+        self._status[name] = status
+        if not self._path:
+            return
+        entry = {"name": name, "status": status, "time": datetime.datetime.now().isoformat(), **details}
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        with self._path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+
+
+def _inprogress_manifest_path(image_path: Path) -> Path:
+    return Path(str(image_path.with_suffix(".yaml")) + ".inprogress")
+
+
+def prepare_conversion(
+    item: ConversionItem,
     config_squashfs,
     config_cefs,
     force: bool,
-    defer_cleanup: bool,
     dry_run: bool,
-) -> bool:
-    """Convert a single installable from squashfs to CEFS.
-
-    Args:
-        installable: The installable object to convert
-        destination_path: NFS destination path
-        squashfs_image_path: Path to the squashfs image
-        config_squashfs: Squashfs configuration
-        config_cefs: CEFS configuration
-        force: Force conversion even if already converted
-        defer_cleanup: Defer cleanup of backup directories
-        dry_run: Whether this is a dry run
+    budget: IoBudget | None = None,
+) -> PreparedConversion:
+    """Get an item's image into CEFS storage, without touching its NFS directory.
 
-    Returns:
-        True if conversion was successful or already converted.
-    """
-    nfs_path = destination_path / installable.install_path
+    This is the slow, I/O heavy part of a conversion and is safe to run for many items at once.
+    The image is hashed while it's copied, and the manifest is written as .inprogress; if an
+    image with the same name is already in place (e.g. a previous run stopped before its
+    symlink swap) it is reused.
 
-    if not squashfs_image_path.exists():
-        _LOGGER.error("No squashfs image found for %s at %s", installable.name, squashfs_image_path)
-        return False
+    Raises:
+        ConversionError: If the item can't be converted
+    """
+    if not item.squashfs_image_path.exists():
+        raise ConversionError(f"No squashfs image found at {item.squashfs_image_path}")
 
-    match detect_nfs_state(nfs_path):
+    match detect_nfs_state(item.nfs_path):
         case "symlink":
             if not force:
-                _LOGGER.info("Already converted to CEFS: %s", installable.name)
-                return True
+                _LOGGER.info("Already converted to CEFS: %s", item.name)
+                return PreparedConversion(item=item, cefs_paths=None)
         case "missing":
-            _LOGGER.error("NFS directory missing for %s: %s", installable.name, nfs_path)
-            return False
+            raise ConversionError(f"NFS directory missing: {item.nfs_path}")
 
-    # Generate CEFS filename and paths
-    try:
-        _LOGGER.info("Calculating hash for %s...", squashfs_image_path)
-        relative_path = squashfs_image_path.relative_to(config_squashfs.image_dir)
-        filename = get_cefs_filename_for_image(squashfs_image_path, "convert", relative_path)
-        _LOGGER.info("Filename: %s", filename)
-    except OSError as e:
-        _LOGGER.error("Failed to calculate hash for %s: %s", installable.name, e)
-        return False
-
-    cefs_paths = get_cefs_paths(config_cefs.image_dir, config_cefs.mount_point, filename)
-
-    installable_info = create_installable_manifest_entry(installable.name, nfs_path)
+    relative_path = item.squashfs_image_path.relative_to(config_squashfs.image_dir)
+    installable_info = create_installable_manifest_entry(item.name, item.nfs_path)
     manifest = create_manifest(
         operation="convert",
-        description=f"Created through conversion of {installable.name}",
+        description=f"Created through conversion of {item.name}",
         contents=[installable_info],
     )
 
-    # Copy squashfs to CEFS images directory if not already there
-    # Never overwrite - hash ensures content is identical
-    if cefs_paths.image_path.exists():
-        _LOGGER.info("CEFS image already exists: %s", cefs_paths.image_path)
-        # Still need to create symlink even if image exists
+    if dry_run:
         try:
-            backup_and_symlink(nfs_path, cefs_paths.mount_path, dry_run, defer_cleanup)
-        except RuntimeError as e:
-            _LOGGER.error("Failed to create symlink for %s: %s", installable.name, e)
-            return False
+            filename = get_cefs_filename_for_image(item.squashfs_image_path, "convert", relative_path)
+        except OSError as e:
+            raise ConversionError(f"Failed to calculate hash: {e}") from e
+        cefs_paths = get_cefs_paths(config_cefs.image_dir, config_cefs.mount_point, filename)
+        _LOGGER.info("DRY RUN: Would deploy %s to %s", item.squashfs_image_path, cefs_paths.image_path)
+        return PreparedConversion(item=item, cefs_paths=cefs_paths)
+
+    image_size = item.squashfs_image_path.stat().st_size
+    with budget.reserve(image_size) if budget else nullcontext():
+        _LOGGER.info("Hashing and copying %s...", item.squashfs_image_path)
+        try:
+            temp_path, hash_value = copy_to_cefs_hashing(item.squashfs_image_path, config_cefs.image_dir)
+        except OSError as e:
+            raise ConversionError(f"Failed to copy {item.squashfs_image_path}: {e}") from e
+
+    filename = generate_cefs_filename(hash_value, "convert", relative_path)
+    cefs_paths = get_cefs_paths(config_cefs.image_dir, config_cefs.mount_point, filename)
+    try:
+        placed = place_hashed_copy(temp_path, cefs_paths.image_path)
+        if placed:
+            write_manifest_inprogress(manifest, cefs_paths.image_path)
+    except OSError as e:
+        raise ConversionError(f"Failed to deploy {cefs_paths.image_path}: {e}") from e
+
+    if placed:
+        _LOGGER.info("Deployed %s as %s", item.squashfs_image_path, cefs_paths.image_path)
     else:
-        # Deploy image and create symlink within transaction
+        _LOGGER.info("CEFS image already exists: %s", cefs_paths.image_path)
+    manifest_pending = placed or _inprogress_manifest_path(cefs_paths.image_path).exists()
+    return PreparedConversion(item=item, cefs_paths=cefs_paths, manifest_pending=manifest_pending)
+
+
+def finish_conversion(prepared: PreparedConversion, defer_cleanup: bool, dry_run: bool) -> None:
+    """Swap an item's NFS directory for a symlink to its CEFS image and finalise the manifest.
+
+    This is the short critical section of a conversion. On failure the manifest is left
+    .inprogress for fsck to report.
+
+    Raises:
+        ConversionError: If the swap fails (the NFS directory is restored)
+    """
+    assert prepared.cefs_paths is not None
+    try:
+        backup_and_symlink(prepared.item.nfs_path, prepared.cefs_paths.mount_path, dry_run, defer_cleanup)
+    except RuntimeError as e:
+        _LOGGER.warning("Leaving manifest as .inprogress for debugging: %s", prepared.cefs_paths.image_path)
+        raise ConversionError(str(e)) from e
+    if prepared.manifest_pending and not dry_run:
         try:
-            with deploy_to_cefs_transactional(squashfs_image_path, cefs_paths.image_path, manifest, dry_run):
-                # Create symlink while transaction is active
-                backup_and_symlink(nfs_path, cefs_paths.mount_path, dry_run, defer_cleanup)
-                # Manifest will be automatically finalized on successful exit
-        except RuntimeError as e:
-            _LOGGER.error("Failed to convert %s to CEFS: %s", installable.name, e)
-            return False
-
-    # Post-migration validation (skip in dry-run)
-    if not dry_run:
-        if not nfs_path.is_symlink():
-            _LOGGER.error("Post-migration check failed: %s is not a symlink", nfs_path)
-            return False
-
-        if not installable.is_installed():
-            _LOGGER.error("Post-migration check: %s reports not installed", installable.name)
-            return False
-        _LOGGER.info("Post-migration check: %s still installed", installable.name)
-
-    _LOGGER.info("Successfully converted %s to CEFS", installable.name)
-    return True
+            finalize_manifest(prepared.cefs_paths.image_path)
+        except OSError as e:
+            # The conversion itself succeeded; fsck will find the .inprogress manifest
+            _LOGGER.error("Failed to finalize manifest for %s: %s", prepared.cefs_paths.image_path, e)
+
+
+def check_conversion(prepared: PreparedConversion, dry_run: bool) -> None:
+    """Check that a converted item still looks installed.
+
+    Raises:
+        ConversionError: If the post-migration check fails
+    """
+    if dry_run:
+        return
+    item = prepared.item
+    if not item.nfs_path.is_symlink():
+        raise ConversionError(f"Post-migration check failed: {item.nfs_path} is not a symlink")
+    if not item.installable.is_installed():
+        raise ConversionError(f"Post-migration check: {item.name} reports not installed")
+    _LOGGER.info("Post-migration check: %s still installed", item.name)
+
+
+def bulk_convert(
+    items: list[ConversionItem],
+    config_squashfs,
+    config_cefs,
+    force: bool,
+    defer_cleanup: bool,
+    dry_run: bool,
+    max_workers: int = DEFAULT_CONVERT_WORKERS,
+    max_bytes_in_flight: int = DEFAULT_CONVERT_BYTES_IN_FLIGHT,
+    journal: ConversionJournal | None = None,
+) -> BulkConversionResult:
+    """Convert many installables, overlapping the slow parts.
+
+    Images are hashed and copied by max_workers threads, with at most max_bytes_in_flight
+    of images being read at once. Symlink swaps and manifest finalisation happen one at a
+    time on the calling thread, in the order of items, as each image becomes ready. Post-
+    migration checks run in parallel after each swap.
+
+    Each outcome is recorded in the journal (if given) as soon as it's known, and items the
+    journal already has as converted are skipped, so a stopped run can simply be restarted.
+    Dry runs don't write to the journal.
+
+    Returns:
+        BulkConversionResult
+    """
+    result = BulkConversionResult()
+    journal = journal or ConversionJournal(None)
+    budget = IoBudget(max_bytes_in_flight)
+
+    def record(name: str, status: str, **details: str) -> None:
+        if not dry_run:
+            journal.record(name, status, **details)
+
+    def fail(name: str, error: Exception) -> None:
+        _LOGGER.error("Failed to convert %s to CEFS: %s", name, error)
+        result.failed[name] = str(error)
+        record(name, "failed", error=str(error))
+
+    pending = []
+    for item in items:
+        if journal.is_converted(item.name):
+            _LOGGER.info("Skipping %s: already converted according to the journal", item.name)
+            result.resumed.append(item.name)
+        else:
+            pending.append(item)
+
+    with (
+        ThreadPoolExecutor(max_workers=max_workers) as prepare_pool,
+        ThreadPoolExecutor(max_workers=max_workers) as check_pool,
+    ):
+        preparing = [
+            (item, prepare_pool.submit(prepare_conversion, item, config_squashfs, config_cefs, force, dry_run, budget))
+            for item in pending
+        ]
+        checking: list[tuple[PreparedConversion, Future]] = []
+        try:
+            for done, (item, future) in enumerate(preparing, start=1):
+                try:
+                    prepared = future.result()
+                except (ConversionError, OSError) as e:
+                    fail(item.name, e)
+                    continue
+                if prepared.cefs_paths is None:
+                    result.already_converted.append(item.name)
+                    record(item.name, "converted", note="already converted")
+                    continue
+                _LOGGER.info(
+                    "[%d/%d] Swapping %s to %s", done, len(preparing), item.nfs_path, prepared.cefs_paths.mount_path
+                )
+                try:
+                    finish_conversion(prepared, defer_cleanup, dry_run)
+                except ConversionError as e:
+                    fail(item.name, e)
+                    continue
+                checking.append((prepared, check_pool.submit(check_conversion, prepared, dry_run)))
+        except BaseException:
+            prepare_pool.shutdown(cancel_futures=True)
+            raise
+
+        for prepared, future in checking:
+            name = prepared.item.name
+            try:
+                future.result()
+            except ConversionError as e:
+                fail(name, e)
+                continue
+            assert prepared.cefs_paths is not None
+            _LOGGER.info("Successfully converted %s to CEFS", name)
+            result.converted.append(name)
+            record(name, "converted", image=str(prepared.cefs_paths.image_path))
+
+    return result
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""Cross-image file-level duplicate content analysis for CEFS images."""
+
+from __future__ import annotations
+
+import itertools
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import yaml
+from lib.cefs.packing import item_family
+from lib.cefs.state import CEFSState
+from lib.cefs_manifest import read_manifest_from_alongside
+from lib.config import SquashfsConfig
+from lib.squashfs import FileDigest, SquashfsError, hash_squashfs_files
+
+_LOGGER = logging.getLogger(__name__)
+
+# Files shared by more images than this are counted in totals and families but not per image pair,
+# otherwise a header present in every image would produce O(images^2) pairs.
+DEFAULT_MAX_PAIR_FANOUT = 50
+
+
+@dataclass(frozen=True)
+class DedupeImage:
+    """A CEFS image and the installables it contains."""
+
+    path: Path
+    size: int
+    names: tuple[str, ...]
+
+    @property
+    def families(self) -> set[str]:
+        return {item_family(name) for name in self.names}
+
+
+@dataclass
+class DedupeReport:
+    """Duplicate content found across a set of images."""
+
+    images: int = 0
+    files: int = 0
+    total_bytes: int = 0
+    duplicate_bytes: int = 0
+    pair_bytes: dict[tuple[Path, Path], int] = field(default_factory=dict)
+    family_bytes: dict[str, int] = field(default_factory=dict)
+    errors: list[str] = field(default_factory=list)
+
+
+def collect_dedupe_images(state: CEFSState, filter_: list[str]) -> list[DedupeImage]:
+    """Get the images to analyse, with their contents, from a scanned CEFSState.
+
+    Args:
+        state: CEFSState after scan_cefs_images_with_manifests()
+        filter_: Only include images containing an installable matching one of these substrings
+
+    Returns:
+        List of DedupeImage, sorted by path
+    """
+    images = []
+    for image_path in sorted(state.all_cefs_images.values()):
+        try:
+            manifest = read_manifest_from_alongside(image_path)
+        except (OSError, yaml.YAMLError) as e:
+            _LOGGER.warning("Failed to read manifest for %s: %s", image_path, e)
+            continue
+        names = tuple(content["name"] for content in (manifest or {}).get("contents", []) if "name" in content)
+        if filter_ and not any(f in name for f in filter_ for name in names):
+            continue
+        images.append(DedupeImage(path=image_path, size=image_path.stat().st_size, names=names))
+    return images
+
+
+def index_image_files(
+    squashfs_config: SquashfsConfig,
+    images: list[DedupeImage],
+    min_file_size: int,
+    max_workers: int,
+    errors: list[str],
+) -> dict[Path, list[FileDigest]]:
+    """Hash the files of each image in parallel.
+
+    Images that can't be read are skipped and recorded in errors.
+
+    Returns:
+        Dictionary mapping image path to digests of its files
+    """
+    result: dict[Path, list[FileDigest]] = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(hash_squashfs_files, squashfs_config, image.path, min_file_size): image for image in images
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            image = futures[future]
+            try:
+                result[image.path] = future.result()
+            except SquashfsError as e:
+                _LOGGER.error("Failed to index %s: %s", image.path, e)
+                errors.append(f"{image.path}: {e}")
+                continue
+            _LOGGER.info("[%d/%d] Indexed %d files in %s", done, len(images), len(result[image.path]), image.path)
+    return result
+
+
+def build_dedupe_report(
+    images: list[DedupeImage],
+    digests: dict[Path, list[FileDigest]],
+    max_pair_fanout: int = DEFAULT_MAX_PAIR_FANOUT,
+) -> DedupeReport:
+    """Work out how much file content is duplicated across images.
+
+    Content is keyed by (digest, size) and counted once per image, since squashfs already
+    dedupes within an image. Duplicate bytes are what consolidating every copy into one
+    image could save.
+
+    Args:
+        images: Images that were indexed
+        digests: Image path to file digests (see index_image_files)
+        max_pair_fanout: Skip per-pair accounting for content in more images than this
+
+    Returns:
+        DedupeReport
+    """
+    report = DedupeReport(images=len(digests))
+    families = {image.path: image.families for image in images}
+    holders: dict[tuple[bytes, int], list[Path]] = defaultdict(list)
+    for image_path, files in digests.items():
+        report.files += len(files)
+        for key in {(file.digest, file.size) for file in files}:
+            holders[key].append(image_path)
+
+    pair_bytes: dict[tuple[Path, Path], int] = defaultdict(int)
+    family_bytes: dict[str, int] = defaultdict(int)
+    for (_, size), image_paths in holders.items():
+        report.total_bytes += size * len(image_paths)
+        if len(image_paths) < 2:
+            continue
+        report.duplicate_bytes += size * (len(image_paths) - 1)
+        if len(image_paths) <= max_pair_fanout:
+            for pair in itertools.combinations(sorted(image_paths), 2):
+                pair_bytes[pair] += size
+        family_counts: dict[str, int] = defaultdict(int)
+        for image_path in image_paths:
+            for family in families.get(image_path, ()):
+                family_counts[family] += 1
+        for family, count in family_counts.items():
+            if count > 1:
+                family_bytes[family] += size * (count - 1)
+
+    report.pair_bytes = dict(pair_bytes)
+    report.family_bytes = dict(family_bytes)
+    return report
+
+
+def suggest_dedupe_groups(
+    images: list[DedupeImage], report: DedupeReport, min_shared_bytes: int, max_group_bytes: int
+) -> list[list[str]]:
+    """Cluster images that share a lot of content into suggested consolidation groups.
+
+    Pairs are merged greedily, most shared bytes first, as long as the cluster's compressed
+    size stays within max_group_bytes.
+
+    Args:
+        images: Images that were indexed
+        report: Report from build_dedupe_report
+        min_shared_bytes: Ignore pairs sharing less than this
+        max_group_bytes: Maximum combined image size of a suggested group
+
+    Returns:
+        List of groups of installable names, largest shared content first
+    """
+    by_path = {image.path: image for image in images}
+    cluster_of: dict[Path, int] = {}
+    clusters: dict[int, list[Path]] = {}
+    cluster_shared: dict[int, int] = defaultdict(int)
+    next_cluster_id = itertools.count()
+
+    def cluster_size(cluster_id: int) -> int:
+        return sum(by_path[path].size for path in clusters[cluster_id])
+
+    for (first, second), shared in sorted(report.pair_bytes.items(), key=lambda kv: (-kv[1], kv[0])):
+        if shared < min_shared_bytes:
+            break
+        if first not in by_path or second not in by_path:
+            continue
+        for path in (first, second):
+            if path not in cluster_of:
+                cluster_of[path] = next(next_cluster_id)
+                clusters[cluster_of[path]] = [path]
+        first_id, second_id = cluster_of[first], cluster_of[second]
+        if first_id == second_id:
+            cluster_shared[first_id] += shared
+            continue
+        if cluster_size(first_id) + cluster_size(second_id) > max_group_bytes:
+            continue
+        for path in clusters.pop(second_id):
+            cluster_of[path] = first_id
+            clusters[first_id].append(path)
+        cluster_shared[first_id] += cluster_shared.pop(second_id, 0) + shared
+
+    suggested = sorted(
+        ((cluster_shared[cluster_id], paths) for cluster_id, paths in clusters.items() if len(paths) > 1),
+        key=lambda entry: -entry[0],
+    )
+    return [sorted(name for path in paths for name in by_path[path].names) for _, paths in suggested]
+
+
+def write_suggested_groups(path: Path, groups: list[list[str]]) -> None:
+    """Write suggested consolidation groups as YAML (readable by `cefs consolidate --groups-from`)."""
+    path.write_text(yaml.safe_dump({"groups": groups}, sort_keys=False), encoding="utf-8")
+
+
+def read_suggested_groups(path: Path) -> list[list[str]]:
+    """Read suggested consolidation groups written by write_suggested_groups.
+
+    Raises:
+        ValueError: If the file isn't in the expected format
+    """
+    data = yaml.safe_load(path.read_text(encoding="utf-8"))
+    groups = data.get("groups") if isinstance(data, dict) else None
+    if not isinstance(groups, list) or not all(
+        isinstance(group, list) and all(isinstance(name, str) for name in group) for group in groups
+    ):
+        raise ValueError(f"{path} does not contain a 'groups' list of lists of installable names")
+    return groups
@@ -4,6 +4,7 @@
 from __future__ import annotations
 
 import datetime
+import hashlib
 import logging
 import os
 import shutil
@@ -12,6 +13,8 @@ from collections.abc import Generator
 from contextlib import contextmanager
 from pathlib import Path
 
+from lib.cefs.constants import CEFS_HASH_LENGTH
+from lib.cefs.trash import TrashQueue
 from lib.cefs_manifest import finalize_manifest, write_manifest_inprogress
 
 _LOGGER = logging.getLogger(__name__)
@@ -52,6 +55,58 @@ def copy_to_cefs_atomically(source_path: Path, cefs_image_path: Path) -> None:
         raise
 
 
+def copy_to_cefs_hashing(source_path: Path, cefs_image_dir: Path) -> tuple[Path, str]:
+    """Copy an image to a temp file in the CEFS images directory, hashing it on the way.
+
+    The source is read once rather than once to hash and again to copy. The temp file never
+    has the .sqfs extension, so it can't be mistaken for an image; once the hash has given
+    the image its name, move it into place with place_hashed_copy.
+
+    Args:
+        source_path: Source squashfs image to copy
+        cefs_image_dir: CEFS images directory (the temp file goes at its top level)
+
+    Returns:
+        Tuple of (temp file path, truncated hash as calculate_squashfs_hash would give)
+
+    Raises:
+        OSError: If the copy fails (temp file is cleaned up)
+    """
+    cefs_image_dir.mkdir(parents=True, exist_ok=True)
+    sha256_hash = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(dir=cefs_image_dir, suffix=".tmp", prefix="cefs_", delete=False) as temp_file:
+        temp_path = Path(temp_file.name)
+        try:
+            with open(source_path, "rb") as source_file:
+                while chunk := source_file.read(16 * 1024 * 1024):
+                    sha256_hash.update(chunk)
+                    temp_file.write(chunk)
+        except OSError:
+            temp_path.unlink(missing_ok=True)
+            raise
+    return temp_path, sha256_hash.hexdigest()[:CEFS_HASH_LENGTH]
+
+
+def place_hashed_copy(temp_path: Path, cefs_image_path: Path) -> bool:
+    """Atomically move a copy made by copy_to_cefs_hashing to its final image path.
+
+    Never overwrites: if the image already exists (same hash, so same content) the copy is discarded.
+
+    Returns:
+        True if the copy was placed, False if the image already existed
+    """
+    cefs_image_path.parent.mkdir(parents=True, exist_ok=True)
+    if cefs_image_path.exists():
+        temp_path.unlink(missing_ok=True)
+        return False
+    try:
+        temp_path.replace(cefs_image_path)
+    except OSError:
+        temp_path.unlink(missing_ok=True)
+        raise
+    return True
+
+
 @contextmanager
 def deploy_to_cefs_transactional(
     source_path: Path, cefs_image_path: Path, manifest: dict, dry_run: bool = False
@@ -111,7 +166,9 @@ def deploy_to_cefs_transactional(
                 # Note: We don't re-raise here because the main operation succeeded
 
 
-def backup_and_symlink(nfs_path: Path, cefs_target: Path, dry_run: bool, defer_cleanup: bool) -> None:
+def backup_and_symlink(
+    nfs_path: Path, cefs_target: Path, dry_run: bool, defer_cleanup: bool, trash: TrashQueue | None = None
+) -> None:
     """Backup NFS directory and create CEFS symlink with rollback on failure.
 
     Args:
@@ -119,6 +176,7 @@ def backup_and_symlink(nfs_path: Path, cefs_target: Path, dry_run: bool, defer_c
         cefs_target: Target path for the CEFS symlink
         dry_run: If True, only log what would be done
         defer_cleanup: If True, rename old .bak to .DELETE_ME_<timestamp> instead of deleting
+        trash: If given, move old .bak into this trash queue instead of deleting (takes precedence over defer_cleanup)
     """
     backup_path = nfs_path.with_name(nfs_path.name + ".bak")
 
@@ -131,7 +189,9 @@ def backup_and_symlink(nfs_path: Path, cefs_target: Path, dry_run: bool, defer_c
         # We use symlinks=False here to account for broken symlinks.
         # Handle old backup if it exists
         if backup_path.exists(follow_symlinks=False):
-            if defer_cleanup:
+            if trash:
+                trash.put(backup_path)
+            elif defer_cleanup:
                 # Rename to .DELETE_ME_<timestamp> for later cleanup
                 timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
                 delete_me_path = nfs_path.with_name(f"{nfs_path.name}.DELETE_ME_{timestamp}")
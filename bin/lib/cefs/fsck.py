@@ -1,12 +1,20 @@
 #!/usr/bin/env python3
-"""CEFS filesystem checking and validation."""
+"""CEFS filesystem checking and validation.
+
+Manifests are checked in parallel, one hash-prefix directory ("shard") per task, and each check is
+reported through a callback as its shard completes, so progress and reports stream out while the
+rest of the image store is still being checked.
+"""
 
 from __future__ import annotations
 
 import logging
 import time
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Any
 
 import yaml
 from lib.cefs.constants import NFS_MAX_RECURSION_DEPTH
@@ -16,6 +24,41 @@ from lib.cefs_manifest import validate_manifest
 
 _LOGGER = logging.getLogger(__name__)
 
+# Checking is mostly waiting on NFS, so this can usefully exceed the number of CPUs
+DEFAULT_FSCK_WORKERS = 8
+
+# Records when fsck last found every manifest valid, for --since last (kept in the CEFS local temp dir)
+FSCK_LAST_RUN_FILENAME = "fsck-last-success"
+
+# ManifestCheck.status for manifests not modified since the --since cutoff
+UNCHANGED = "unchanged"
+
+
+@dataclass(frozen=True)
+class ManifestCheck:
+    """The result of checking one image's manifest."""
+
+    image_path: Path
+    status: str  # "valid", UNCHANGED, or an error type (see validate_single_manifest)
+    error: str | None = None
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.image_path.with_suffix(".yaml")
+
+    @property
+    def is_problem(self) -> bool:
+        return self.status not in ("valid", UNCHANGED)
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            "type": "manifest",
+            "image": str(self.image_path),
+            "manifest": str(self.manifest_path),
+            "status": self.status,
+            "error": self.error,
+        }
+
 
 @dataclass(frozen=True)
 class FSCKResults:
@@ -23,6 +66,7 @@ class FSCKResults:
 
     total_images: int = 0
     valid_manifests: int = 0
+    unchanged_manifests: int = 0  # Not read, as they hadn't changed since the --since cutoff
     missing_manifests: list[Path] = field(default_factory=list)
     old_format_manifests: list[Path] = field(default_factory=list)
     invalid_name_manifests: list[tuple[Path, str]] = field(default_factory=list)
@@ -100,6 +144,38 @@ def check_inprogress_files(cefs_image_dir: Path, current_time: float) -> list[Fi
     return sorted(files, key=lambda x: x.age_seconds, reverse=True)
 
 
+def _check_manifest(manifest_path: Path) -> tuple[str | None, str | None]:
+    """Check a manifest file.
+
+    Returns:
+        Tuple of (error_type, error message); error_type is None if the manifest is valid
+    """
+    if not manifest_path.exists():
+        return "missing", None
+
+    try:
+        with manifest_path.open(encoding="utf-8") as f:
+            manifest_dict = yaml.safe_load(f)
+    except (OSError, yaml.YAMLError):
+        return "unreadable", "Cannot read manifest file"
+
+    contents = manifest_dict.get("contents", []) if manifest_dict else []
+
+    if any("target" in content for content in contents):
+        return "old_format", None
+
+    try:
+        validate_manifest(manifest_dict)
+    except ValueError as e:
+        error_msg = str(e).lower()
+        error_type = (
+            "invalid_name" if "invalid name" in error_msg or "entries with invalid name" in error_msg else "other"
+        )
+        return error_type, str(e)
+
+    return None, None
+
+
 def validate_single_manifest(manifest_path: Path, mount_point: Path, filename_stem: str) -> tuple[bool, str | None]:
     """Validate a single manifest file.
 
@@ -117,79 +193,136 @@ def validate_single_manifest(manifest_path: Path, mount_point: Path, filename_st
         - "invalid_name": has invalid installable names
         - "other": other validation errors
     """
-    if not manifest_path.exists():
-        return False, "missing"
+    error_type, _ = _check_manifest(manifest_path)
+    return error_type is None, error_type
 
-    try:
-        with manifest_path.open(encoding="utf-8") as f:
-            manifest_dict = yaml.safe_load(f)
-    except (OSError, yaml.YAMLError):
-        return False, "unreadable"
 
-    contents = manifest_dict.get("contents", []) if manifest_dict else []
+def check_shard(shard_dir: Path, since: float | None = None) -> list[ManifestCheck]:
+    """Check the manifests of every image in one hash-prefix directory.
 
-    if any("target" in content for content in contents):
-        return False, "old_format"
+    Images with a .yaml.inprogress manifest are skipped: they're reported as in-progress files.
 
+    Args:
+        shard_dir: A directory of the CEFS image store (e.g. /efs/cefs-images/ab)
+        since: If given, manifests last modified before this time are reported as UNCHANGED
+            rather than read. Missing manifests are always reported.
+    """
+    checks = []
+    for image_path in sorted(shard_dir.glob("*.sqfs")):
+        manifest_path = image_path.with_suffix(".yaml")
+        if Path(f"{manifest_path}.inprogress").exists():
+            continue
+        if since is not None:
+            try:
+                if manifest_path.stat().st_mtime < since:
+                    checks.append(ManifestCheck(image_path, UNCHANGED))
+                    continue
+            except FileNotFoundError:
+                pass  # Reported as missing below
+        error_type, error = _check_manifest(manifest_path)
+        checks.append(ManifestCheck(image_path, error_type or "valid", error))
+    return checks
+
+
+def list_shards(cefs_image_dir: Path) -> list[Path]:
+    """The hash-prefix directories of the CEFS image store."""
+    if not cefs_image_dir.is_dir():
+        _LOGGER.warning("CEFS images directory does not exist: %s", cefs_image_dir)
+        return []
+    return sorted(path for path in cefs_image_dir.iterdir() if path.is_dir())
+
+
+def read_last_success(path: Path) -> float | None:
+    """When fsck last completed without finding invalid manifests, or None if never (or unknown)."""
     try:
-        validate_manifest(manifest_dict)
-    except ValueError as e:
-        error_msg = str(e).lower()
-        error_type = (
-            "invalid_name" if "invalid name" in error_msg or "entries with invalid name" in error_msg else "other"
-        )
-        return False, error_type
+        return float(path.read_text(encoding="utf-8").strip())
+    except (OSError, ValueError):
+        return None
+
+
+def record_success(path: Path, started_at: float) -> None:
+    """Record a clean fsck run that started at started_at, for the next --since last."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(f"{path.name}.tmp")
+    temp_path.write_text(f"{started_at}\n", encoding="utf-8")
+    temp_path.replace(path)
 
-    return True, None
+
+def is_clean_baseline(results: FSCKResults, since: str | None) -> bool:
+    """Whether a run vouches for every manifest, so a later --since last can start from it.
+
+    It must have found nothing invalid, and every manifest it didn't read must have been vouched for
+    by the previous such run (--since last). One skipped for its age (--since 1d) never was.
+    """
+    return results.total_invalid == 0 and since in (None, "last")
 
 
 def run_fsck_validation(
     state: CEFSState,
     mount_point: Path,
+    max_workers: int = DEFAULT_FSCK_WORKERS,
+    since: float | None = None,
+    on_check: Callable[[ManifestCheck], None] | None = None,
+    on_shard: Callable[[int, int], None] | None = None,
 ) -> FSCKResults:
     """Run CEFS filesystem validation checks.
 
+    The shards of state.cefs_image_dir are checked by max_workers processes; state doesn't need to
+    have been scanned.
+
     Args:
-        state: CEFSState with scanned images
+        state: CEFSState giving the image and NFS directories
         mount_point: CEFS mount point
+        max_workers: Number of shards to check in parallel (1 to check in this process)
+        since: Only read manifests modified since this time (see check_shard)
+        on_check: Called with each check as its shard completes
+        on_shard: Called with (shards done, total shards) as each shard completes
 
     Returns:
         FSCKResults containing all validation results
     """
+    shards = list_shards(state.cefs_image_dir)
     total_images = 0
     valid_manifests = 0
+    unchanged_manifests = 0
     missing_manifests = []
     old_format_manifests = []
     invalid_name_manifests = []
     other_invalid_manifests = []
     unreadable_manifests = []
 
-    for filename_stem, image_path in state.all_cefs_images.items():
-        total_images += 1
-        manifest_path = image_path.with_suffix(".yaml")
-        is_valid, error_type = validate_single_manifest(manifest_path, mount_point, filename_stem)
-
-        if is_valid:
-            valid_manifests += 1
-        else:
-            match error_type:
+    def collect(checks: list[ManifestCheck], shards_done: int) -> None:
+        nonlocal total_images, valid_manifests, unchanged_manifests
+        for check in checks:
+            total_images += 1
+            match check.status:
+                case "valid":
+                    valid_manifests += 1
+                case "unchanged":
+                    unchanged_manifests += 1
                 case "missing":
-                    missing_manifests.append(manifest_path)
+                    missing_manifests.append(check.manifest_path)
                 case "old_format":
-                    old_format_manifests.append(manifest_path)
-                case "invalid_name" | "other":
-                    # Re-validate to capture the specific error message since we only got the type earlier
-                    try:
-                        with manifest_path.open(encoding="utf-8") as f:
-                            manifest_dict = yaml.safe_load(f)
-                        validate_manifest(manifest_dict)
-                    except ValueError as e:
-                        if error_type == "invalid_name":
-                            invalid_name_manifests.append((manifest_path, str(e)))
-                        else:
-                            other_invalid_manifests.append((manifest_path, str(e)))
+                    old_format_manifests.append(check.manifest_path)
+                case "invalid_name":
+                    invalid_name_manifests.append((check.manifest_path, check.error or ""))
                 case "unreadable":
-                    unreadable_manifests.append((manifest_path, "Cannot read manifest file"))
+                    unreadable_manifests.append((check.manifest_path, check.error or ""))
+                case _:
+                    other_invalid_manifests.append((check.manifest_path, check.error or ""))
+            if on_check:
+                on_check(check)
+        if on_shard:
+            on_shard(shards_done, len(shards))
+
+    if max_workers <= 1 or len(shards) <= 1:
+        for index, shard in enumerate(shards):
+            collect(check_shard(shard, since), index + 1)
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(check_shard, shard, since) for shard in shards]
+            for index, future in enumerate(as_completed(futures)):
+                collect(future.result(), index + 1)
 
     current_time = time.time()
     inprogress_files = check_inprogress_files(state.cefs_image_dir, current_time)
@@ -201,6 +334,7 @@ def run_fsck_validation(
     return FSCKResults(
         total_images=total_images,
         valid_manifests=valid_manifests,
+        unchanged_manifests=unchanged_manifests,
         missing_manifests=missing_manifests,
         old_format_manifests=old_format_manifests,
         invalid_name_manifests=invalid_name_manifests,
@@ -210,3 +344,24 @@ def run_fsck_validation(
         pending_backups=pending_backups,
         pending_deletes=pending_deletes,
     )
+
+
+def fsck_report_records(results: FSCKResults) -> list[dict[str, Any]]:
+    """JSON-lines report records for everything but the manifest checks, ending with a summary."""
+    records: list[dict[str, Any]] = []
+    for kind, items in (
+        ("inprogress", results.inprogress_files),
+        ("pending_backup", results.pending_backups),
+        ("pending_delete", results.pending_deletes),
+    ):
+        records.extend({"type": kind, "path": str(item.path), "age_seconds": item.age_seconds} for item in items)
+    records.append({
+        "type": "summary",
+        "total_images": results.total_images,
+        "valid_manifests": results.valid_manifests,
+        "unchanged_manifests": results.unchanged_manifests,
+        "invalid_manifests": results.total_invalid,
+        "inprogress_files": len(results.inprogress_files),
+        "pending_cleanup": len(results.pending_backups) + len(results.pending_deletes),
+    })
+    return records
@@ -0,0 +1,453 @@
+#!/usr/bin/env python3
+"""Node-local cache of CEFS images, so hot images are mounted from local disk instead of EFS.
+
+This runs from the autofs program map on compile nodes, which only have the system python, so it
+must only use the standard library (and other stdlib-only modules under lib.cefs).
+
+CEFS images are named by the hash of their contents and never change, so a cached copy is valid
+for as long as it exists. On a mount:
+
+- hit: the cached copy is mounted, and its mtime bumped to record the access
+- miss: the image is mounted from EFS as usual. Once an image has missed a few times, or straight
+  away if it's on the warm list (the images `ce cefs warm` ranks hottest), a detached process
+  copies it into the cache, verifying its hash, for next time. Only a few copies run at once, and
+  they share a bandwidth cap, so filling the cache doesn't compete with the EFS reads it saves.
+  The oldest images are evicted to keep the cache, including copies in flight, under size
+
+Hit, miss, fill, eviction and verification failure counts are kept as the sizes of append-only
+files under .stats/ (one byte per event), so concurrent mounts never lose an update.
+"""
+
+from __future__ import annotations
+
+import argparse
+import fcntl
+import hashlib
+import itertools
+import logging
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from lib.cefs.constants import CEFS_HASH_LENGTH
+from lib.cefs.trash import RateLimiter
+
+_LOGGER = logging.getLogger(__name__)
+
+# Without an explicit size, the cache may use this much of its filesystem. Evicted images that are still
+# mounted keep their space until they're unmounted, so leave some room for them.
+DEFAULT_LOCAL_CACHE_DISK_SHARE = 0.8
+
+MOUNT_OPTIONS = "-fstype=squashfs,loop,nosuid,nodev,ro"
+
+# Entry point the autofs map runs with the system python
+LOCAL_CACHE_SCRIPT = Path(__file__).resolve().parents[2] / "cefs_local_cache.py"
+
+# A partial copy older than this belongs to a fill that died
+STALE_FILL_SECONDS = 60 * 60
+
+# How many fills may run at once, and the EFS bandwidth they share
+DEFAULT_MAX_FILLS = 2
+DEFAULT_FILL_BANDWIDTH = 50 * 1024 * 1024
+# An image that isn't on the warm list is cached on this many-th miss
+DEFAULT_FILL_AFTER_MISSES = 2
+
+COUNTERS = ("hits", "misses", "fills", "evictions", "verify_failures")
+
+_KEY_RE = re.compile(rf"^[0-9a-f]{{{CEFS_HASH_LENGTH}}}[\w.+-]*$")
+_PARTIAL_SUFFIX = ".partial"
+_COPY_CHUNK = 16 * 1024 * 1024
+
+
+@dataclass(frozen=True)
+class LocalCacheStats:
+    """Counters and current contents of a local image cache."""
+
+    hits: int
+    misses: int
+    fills: int
+    evictions: int
+    verify_failures: int
+    images: int
+    cached_bytes: int
+    max_bytes: int
+
+    @property
+    def hit_rate(self) -> float:
+        mounts = self.hits + self.misses
+        return self.hits / mounts if mounts else 0.0
+
+
+class LocalImageCache:
+    """A size-limited, least-recently-mounted cache of CEFS images on local disk.
+
+    Cached images use the same XX/KEY.sqfs layout as the image directory.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path,
+        image_dir: Path,
+        max_bytes: int,
+        max_fills: int = DEFAULT_MAX_FILLS,
+        fill_bandwidth: int | None = DEFAULT_FILL_BANDWIDTH,
+        fill_after_misses: int = DEFAULT_FILL_AFTER_MISSES,
+        hot_list: Path | None = None,
+    ):
+        self.cache_dir = cache_dir
+        self.image_dir = image_dir
+        self.max_bytes = max_bytes
+        self.max_fills = max_fills
+        self.fill_bandwidth = fill_bandwidth
+        self.fill_after_misses = fill_after_misses
+        self.hot_list = hot_list
+        self._stats_dir = cache_dir / ".stats"
+        self._misses_dir = cache_dir / ".misses"
+        self._fills_dir = cache_dir / ".fills"
+
+    @staticmethod
+    def is_valid_key(key: str) -> bool:
+        """Whether key looks like a CEFS image name (and so is safe to use as a path component)."""
+        return bool(_KEY_RE.match(key))
+
+    def source_path(self, key: str) -> Path:
+        return self.image_dir / key[:2] / f"{key}.sqfs"
+
+    def cached_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.sqfs"
+
+    @staticmethod
+    def _append(path: Path) -> int:
+        """Append a byte to path, returning its new size."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, b".")
+            return os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+
+    def _count(self, counter: str) -> None:
+        try:
+            self._append(self._stats_dir / counter)
+        except OSError as e:
+            _LOGGER.debug("Failed to count %s: %s", counter, e)
+
+    def hot_keys(self) -> set[str]:
+        """The images on the hot list, a list of files in mounted images as `ce cefs warm --write-list` writes."""
+        if self.hot_list is None:
+            return set()
+        try:
+            lines = self.hot_list.read_text(encoding="utf-8").splitlines()
+        except OSError:
+            return set()
+        keys: set[str] = set()
+        for line in lines:
+            parts = Path(line).parts
+            # Mounts are at {mount_point}/XX/KEY
+            keys.update(
+                key for prefix, key in itertools.pairwise(parts) if key[:2] == prefix and self.is_valid_key(key)
+            )
+        return keys
+
+    def should_fill(self, key: str) -> bool:
+        """Record a miss of key, and say whether it's now worth caching."""
+        try:
+            misses = self._append(self._misses_dir / key)
+        except OSError as e:
+            _LOGGER.debug("Failed to count a miss of %s: %s", key, e)
+            return False
+        return misses >= self.fill_after_misses or key in self.hot_keys()
+
+    def resolve(self, key: str) -> tuple[Path, bool]:
+        """Get the path to mount an image from, preferring the cache.
+
+        Returns:
+            Tuple of (image path, whether it's the cached copy)
+        """
+        cached = self.cached_path(key)
+        try:
+            os.utime(cached)
+        except OSError:
+            self._count("misses")
+            return self.source_path(key), False
+        self._count("hits")
+        return cached, True
+
+    def cached_images(self) -> list[tuple[Path, os.stat_result]]:
+        """All complete cached images, least recently mounted first."""
+        images = []
+        for path in self.cache_dir.glob("*/*.sqfs"):
+            try:
+                images.append((path, path.stat()))
+            except FileNotFoundError:
+                continue  # Evicted meanwhile
+        return sorted(images, key=lambda entry: entry[1].st_mtime)
+
+    def _in_flight_bytes(self) -> int:
+        """The size of the copies being filled, removing stale ones.
+
+        A fill sizes its partial copy to the whole image before it starts, so this is what they
+        will take up when they finish.
+        """
+        total = 0
+        now = time.time()
+        for partial in self.cache_dir.glob(f"*/*{_PARTIAL_SUFFIX}"):
+            try:
+                stat = partial.stat()
+                if now - stat.st_mtime > STALE_FILL_SECONDS:
+                    partial.unlink()
+                else:
+                    total += stat.st_size
+            except FileNotFoundError:
+                pass
+        return total
+
+    def evict(self, needed_bytes: int = 0) -> int:
+        """Remove the least recently mounted images until needed_bytes more would fit.
+
+        Copies still being filled count towards the size of the cache. Images that are still
+        mounted keep working: the loop device holds the file open, and its space is freed when
+        it's unmounted. Stale partial copies are removed too.
+
+        Returns:
+            Number of bytes freed
+        """
+        in_flight = self._in_flight_bytes()
+        images = self.cached_images()
+        total = in_flight + sum(stat.st_size for _, stat in images)
+        freed = 0
+        for path, stat in images:
+            if total - freed + needed_bytes <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            _LOGGER.info("Evicted %s (%d bytes)", path.name, stat.st_size)
+            self._count("evictions")
+            freed += stat.st_size
+        return freed
+
+    def _take_fill_slot(self) -> int | None:
+        """Lock a free fill slot, returning its fd (closing it frees the slot), or None if all are taken."""
+        self._fills_dir.mkdir(parents=True, exist_ok=True)
+        for slot in range(self.max_fills):
+            fd = os.open(self._fills_dir / str(slot), os.O_WRONLY | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue
+            return fd
+        return None
+
+    def fill(self, key: str) -> bool:
+        """Copy an image into the cache, verifying that its contents match its hash.
+
+        At most max_fills copies run at once, each reading at its share of fill_bandwidth.
+
+        Returns:
+            True if the image is now cached; False if it's already being filled, too many fills
+            are running, it is too big for the cache or it failed verification
+
+        Raises:
+            OSError: If the image can't be read or the copy can't be written
+        """
+        cached = self.cached_path(key)
+        if cached.exists():
+            return True
+        source = self.source_path(key)
+        size = source.stat().st_size
+        if size > self.max_bytes:
+            _LOGGER.info("Not caching %s: %d bytes is larger than the cache", key, size)
+            return False
+
+        slot = self._take_fill_slot()
+        if slot is None:
+            # It's counted as a miss again next time it's mounted, and filled then
+            _LOGGER.info("Not caching %s: %d fills already running", key, self.max_fills)
+            return False
+        try:
+            return self._fill(key, source, cached, size)
+        finally:
+            os.close(slot)
+
+    def _fill(self, key: str, source: Path, cached: Path, size: int) -> bool:
+        cached.parent.mkdir(parents=True, exist_ok=True)
+        partial = cached.with_name(cached.name + _PARTIAL_SUFFIX)
+        try:
+            fd = os.open(partial, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileExistsError:
+            _LOGGER.info("Not caching %s: already being cached", key)
+            return False
+
+        limiter = RateLimiter(self.fill_bandwidth / self.max_fills if self.fill_bandwidth else None)
+        try:
+            with os.fdopen(fd, "wb") as dst, source.open("rb") as src:
+                # Claim the whole image's size up front, so concurrent fills make room for each other
+                dst.truncate(size)
+                self.evict()
+                sha256_hash = hashlib.sha256()
+                while chunk := src.read(_COPY_CHUNK):
+                    limiter.wait(len(chunk))
+                    sha256_hash.update(chunk)
+                    dst.write(chunk)
+            if sha256_hash.hexdigest()[:CEFS_HASH_LENGTH] != key[:CEFS_HASH_LENGTH]:
+                _LOGGER.error("Not caching %s: its contents don't match its hash", key)
+                self._count("verify_failures")
+                return False
+            partial.rename(cached)
+        finally:
+            partial.unlink(missing_ok=True)
+        _LOGGER.info("Cached %s (%d bytes)", key, size)
+        self._count("fills")
+        (self._misses_dir / key).unlink(missing_ok=True)
+        return True
+
+    def stats(self) -> LocalCacheStats:
+        counts = {}
+        for counter in COUNTERS:
+            try:
+                counts[counter] = (self._stats_dir / counter).stat().st_size
+            except FileNotFoundError:
+                counts[counter] = 0
+        images = self.cached_images()
+        return LocalCacheStats(
+            **counts,
+            images=len(images),
+            cached_bytes=sum(stat.st_size for _, stat in images),
+            max_bytes=self.max_bytes,
+        )
+
+
+def format_prometheus(stats: LocalCacheStats) -> str:
+    """Format cache stats in the Prometheus text exposition format (e.g. for a node_exporter textfile)."""
+    lines = []
+    for counter in COUNTERS:
+        metric = f"cefs_local_cache_{counter}_total"
+        lines += [f"# TYPE {metric} counter", f"{metric} {getattr(stats, counter)}"]
+    for gauge, value in (("images", stats.images), ("bytes", stats.cached_bytes), ("max_bytes", stats.max_bytes)):
+        metric = f"cefs_local_cache_{gauge}"
+        lines += [f"# TYPE {metric} gauge", f"{metric} {value}"]
+    return "\n".join(lines) + "\n"
+
+
+def map_entry(cache: LocalImageCache, key: str, fill_command: list[str] | None) -> str:
+    """Get the autofs map entry to mount an image, starting a background fill on a miss worth caching.
+
+    Args:
+        cache: The local cache
+        key: Image name, as passed to the autofs program map
+        fill_command: Command to run, with the key appended, to fill the cache on a miss
+    """
+    if not cache.is_valid_key(key):
+        return f"{MOUNT_OPTIONS} :{cache.source_path(key)}"
+    path, hit = cache.resolve(key)
+    if not hit and fill_command and cache.should_fill(key):
+        # Detached and with no stdout, so autofs isn't kept waiting for it
+        subprocess.Popen(
+            [*fill_command, key],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+    return f"{MOUNT_OPTIONS} :{path}"
+
+
+def default_max_size(cache_dir: Path) -> int:
+    return int(shutil.disk_usage(cache_dir).total * DEFAULT_LOCAL_CACHE_DISK_SHARE)
+
+
+def _parse_size(size: str) -> int:
+    units = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+    match = re.fullmatch(r"(\d+)([KMGT]?)i?B?", size.strip().upper())
+    if not match:
+        raise argparse.ArgumentTypeError(f"Invalid size: {size}")
+    return int(match.group(1)) * units[match.group(2)]
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cache-dir", type=Path, required=True)
+    parser.add_argument("--image-dir", type=Path, default=Path("/efs/cefs-images"))
+    parser.add_argument(
+        "--max-size",
+        type=_parse_size,
+        help=f"Maximum size of cached images (default: {DEFAULT_LOCAL_CACHE_DISK_SHARE * 100:.0f}%% of the cache filesystem)",
+    )
+    parser.add_argument(
+        "--max-fills", type=int, default=DEFAULT_MAX_FILLS, help="How many images may be copied in at once"
+    )
+    parser.add_argument(
+        "--fill-bandwidth",
+        type=_parse_size,
+        default=DEFAULT_FILL_BANDWIDTH,
+        help="Bytes per second all fills share (default: 50M)",
+    )
+    parser.add_argument(
+        "--fill-after-misses",
+        type=int,
+        default=DEFAULT_FILL_AFTER_MISSES,
+        help="Cache an image on this many-th miss, unless it's on the hot list",
+    )
+    parser.add_argument(
+        "--hot-list", type=Path, help="Cache images with files in this list (`ce cefs warm --write-list`) on first miss"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    map_parser = commands.add_parser("map", help="Print the autofs map entry for an image")
+    map_parser.add_argument("key")
+    fill_parser = commands.add_parser("fill", help="Copy an image into the cache")
+    fill_parser.add_argument("key")
+    commands.add_parser("evict", help="Evict images until the cache is within its size limit")
+    stats_parser = commands.add_parser("stats", help="Show hit/miss counts and cache usage")
+    stats_parser.add_argument("--prometheus-file", type=Path, help="Write the stats here in Prometheus text format")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    max_size = args.max_size or default_max_size(args.cache_dir)
+    cache = LocalImageCache(
+        args.cache_dir,
+        args.image_dir,
+        max_size,
+        max_fills=args.max_fills,
+        fill_bandwidth=args.fill_bandwidth,
+        fill_after_misses=args.fill_after_misses,
+        hot_list=args.hot_list,
+    )
+    match args.command:
+        case "map":
+            fill_command = [
+                sys.executable,
+                os.path.abspath(sys.argv[0]),
+                f"--cache-dir={args.cache_dir}",
+                f"--image-dir={args.image_dir}",
+                f"--max-size={max_size}",
+                f"--max-fills={args.max_fills}",
+                f"--fill-bandwidth={args.fill_bandwidth}",
+                "fill",
+            ]
+            print(map_entry(cache, args.key, fill_command))
+        case "fill":
+            if not cache.is_valid_key(args.key):
+                parser.error(f"Invalid image name: {args.key}")
+            return 0 if cache.fill(args.key) else 1
+        case "evict":
+            cache.evict()
+        case "stats":
+            stats = cache.stats()
+            if args.prometheus_file:
+                temp_path = args.prometheus_file.with_name(f"{args.prometheus_file.name}.tmp")
+                temp_path.write_text(format_prometheus(stats), encoding="utf-8")
+                temp_path.replace(args.prometheus_file)
+            else:
+                print(f"Hits: {stats.hits}, misses: {stats.misses} (hit rate {stats.hit_rate:.1%})")
+                print(f"Fills: {stats.fills}, evictions: {stats.evictions}, verify failures: {stats.verify_failures}")
+                print(f"Cached: {stats.images} images, {stats.cached_bytes} of {stats.max_bytes} bytes")
+    return 0
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""Mount latency and read statistics for CEFS images, for finding images worth re-tiering,
+consolidating or prefetching.
+
+Like the local cache, this runs on compile nodes with the system python, so it must only use the
+standard library (and other stdlib-only modules under lib.cefs).
+
+- probe: triggers the autofs mount of each given image and times it, and then a first access
+  (listing and stat()ing the image root). Images that were already mounted are reported as such,
+  as their times say nothing about mounting.
+- collect: for every mounted image, reads its loop device's block stats (reads, bytes read from
+  the image file, time spent reading) from sysfs, and the bytes the node has read from EFS from
+  /proc/self/mountstats. Bytes read over an image's size is its read amplification: above 1, the
+  page cache isn't holding on to what compiles read.
+
+Both can print JSON, and write Prometheus text format (e.g. for a node_exporter textfile collector).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+_LOGGER = logging.getLogger(__name__)
+
+SECTOR_BYTES = 512  # sysfs block stats count 512-byte sectors whatever the device's block size
+
+_MOUNTINFO_ESCAPE_RE = re.compile(r"\\([0-7]{3})")
+
+
+@dataclass(frozen=True)
+class CefsMount:
+    """A mounted CEFS image."""
+
+    stem: str
+    mount_path: str
+    device: str  # major:minor of the (loop) block device it's mounted from
+
+
+@dataclass(frozen=True)
+class ProbeResult:
+    """How long an image took to mount and first access."""
+
+    stem: str
+    was_mounted: bool
+    mount_seconds: float | None
+    first_access_seconds: float | None
+    error: str | None = None
+
+
+@dataclass(frozen=True)
+class ImageReadStats:
+    """Reads of a mounted image's file through its loop device, since it was mounted."""
+
+    stem: str
+    mount_path: str
+    backing_file: str
+    cached: bool  # Mounted from the node-local cache rather than EFS
+    read_ios: int
+    read_bytes: int
+    read_seconds: float
+    image_bytes: int | None
+
+    @property
+    def read_amplification(self) -> float | None:
+        if not self.image_bytes:
+            return None
+        return self.read_bytes / self.image_bytes
+
+
+def _unescape_mountinfo(field: str) -> str:
+    return _MOUNTINFO_ESCAPE_RE.sub(lambda match: chr(int(match.group(1), 8)), field)
+
+
+def image_stem_from_mount_path(mount_path: str, mount_point: Path) -> str | None:
+    """The image stem if mount_path is an image mounted at {mount_point}/XX/STEM, otherwise None."""
+    parts = Path(mount_path).parts
+    mount_parts = mount_point.parts
+    if len(parts) != len(mount_parts) + 2 or parts[: len(mount_parts)] != mount_parts:
+        return None
+    prefix, stem = parts[-2:]
+    return stem if stem.startswith(prefix) else None
+
+
+def parse_mountinfo(text: str, mount_point: Path) -> list[CefsMount]:
+    """Find the squashfs images mounted under mount_point in the contents of /proc/self/mountinfo."""
+    mounts = []
+    for line in text.splitlines():
+        fields = line.split()
+        try:
+            separator = fields.index("-")
+        except ValueError:
+            continue
+        if len(fields) < separator + 2 or fields[separator + 1] != "squashfs":
+            continue
+        mount_path = _unescape_mountinfo(fields[4])
+        stem = image_stem_from_mount_path(mount_path, mount_point)
+        if stem:
+            mounts.append(CefsMount(stem, mount_path, fields[2]))
+    return mounts
+
+
+def parse_nfs_read_bytes(text: str) -> dict[str, int]:
+    """Bytes read from the server by each NFS mount, from the contents of /proc/self/mountstats.
+
+    Returns:
+        Mount path to bytes read over the wire (the "server read bytes" counter)
+    """
+    read_bytes = {}
+    mount_path = None
+    for line in text.splitlines():
+        fields = line.split()
+        if line.startswith("device "):
+            # device SERVER:/PATH mounted on MOUNT with fstype nfs4 statvers=1.1
+            mount_path = None
+            if len(fields) >= 8 and fields[3] == "on" and fields[7].startswith("nfs"):
+                mount_path = _unescape_mountinfo(fields[4])
+        elif mount_path and fields and fields[0] == "bytes:" and len(fields) >= 7:
+            # bytes: normalread normalwrite directread directwrite serverread serverwrite ...
+            read_bytes[mount_path] = int(fields[5])
+    return read_bytes
+
+
+def efs_read_bytes(nfs_read_bytes: dict[str, int], image_dir: Path) -> int | None:
+    """Bytes read from the NFS mount holding image_dir, if it's on one."""
+    containing = [path for path in nfs_read_bytes if image_dir.is_relative_to(path)]
+    if not containing:
+        return None
+    return nfs_read_bytes[max(containing, key=len)]
+
+
+def read_image_stats(mount: CefsMount, image_dir: Path, sys_root: Path = Path("/sys")) -> ImageReadStats | None:
+    """Read the block stats of the loop device an image is mounted from.
+
+    Returns:
+        The stats, or None if the image isn't mounted from a loop device (or has been unmounted meanwhile)
+    """
+    device_dir = sys_root / "dev" / "block" / mount.device
+    try:
+        backing_file = (device_dir / "loop" / "backing_file").read_text(encoding="utf-8").strip()
+        stat = (device_dir / "stat").read_text(encoding="utf-8").split()
+    except OSError:
+        return None
+    try:
+        image_bytes: int | None = os.stat(backing_file).st_size
+    except OSError:
+        image_bytes = None
+    return ImageReadStats(
+        stem=mount.stem,
+        mount_path=mount.mount_path,
+        backing_file=backing_file,
+        cached=not Path(backing_file).is_relative_to(image_dir),
+        read_ios=int(stat[0]),
+        read_bytes=int(stat[2]) * SECTOR_BYTES,
+        read_seconds=int(stat[3]) / 1000,
+        image_bytes=image_bytes,
+    )
+
+
+def collect_image_stats(
+    mount_point: Path, image_dir: Path, proc_root: Path = Path("/proc"), sys_root: Path = Path("/sys")
+) -> list[ImageReadStats]:
+    """Read stats of every mounted CEFS image, most bytes read first."""
+    mounts = parse_mountinfo((proc_root / "self" / "mountinfo").read_text(encoding="utf-8"), mount_point)
+    stats = [read_image_stats(mount, image_dir, sys_root) for mount in mounts]
+    return sorted(filter(None, stats), key=lambda s: (-s.read_bytes, s.stem))
+
+
+def mount_path_for(image: str, mount_point: Path) -> Path:
+    """The mount path of an image given by stem, or by mount path."""
+    if image.startswith("/"):
+        return Path(image)
+    return mount_point / image[:2] / image
+
+
+def probe_image(mount_path: Path, mounted_paths: set[str]) -> ProbeResult:
+    """Trigger the mount of an image and time it, then time a first access.
+
+    Args:
+        mount_path: {mount_point}/XX/STEM
+        mounted_paths: Paths already mounted before probing
+    """
+    was_mounted = str(mount_path) in mounted_paths
+    try:
+        start = time.perf_counter()
+        # A plain stat of an autofs key doesn't trigger the mount (the kernel treats it as
+        # AT_NO_AUTOMOUNT); with the trailing slash, the path must resolve into the mounted image
+        os.stat(f"{mount_path}/")
+        mounted = time.perf_counter()
+        with os.scandir(mount_path) as entries:
+            for entry in entries:
+                entry.stat(follow_symlinks=False)
+        accessed = time.perf_counter()
+    except OSError as e:
+        return ProbeResult(mount_path.name, was_mounted, None, None, str(e))
+    return ProbeResult(mount_path.name, was_mounted, mounted - start, accessed - mounted)
+
+
+def probe_images(
+    images: list[str], mount_point: Path, cold_only: bool, proc_root: Path = Path("/proc")
+) -> list[ProbeResult]:
+    """Probe images one at a time, so mounts don't compete with each other.
+
+    Args:
+        images: Image stems or mount paths
+        mount_point: CEFS mount point
+        cold_only: Skip images that are already mounted
+    """
+    mounted_paths = {
+        mount.mount_path
+        for mount in parse_mountinfo((proc_root / "self" / "mountinfo").read_text(encoding="utf-8"), mount_point)
+    }
+    results = []
+    for image in images:
+        mount_path = mount_path_for(image, mount_point)
+        if cold_only and str(mount_path) in mounted_paths:
+            _LOGGER.info("Skipping %s: already mounted", mount_path.name)
+            continue
+        results.append(probe_image(mount_path, mounted_paths))
+    return results
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_prometheus(
+    probes: list[ProbeResult] | None = None,
+    image_stats: list[ImageReadStats] | None = None,
+    efs_bytes: int | None = None,
+) -> str:
+    """Format probe results and read stats in the Prometheus text exposition format."""
+    lines = []
+
+    def metric(name: str, kind: str, help_text: str, samples: list[tuple[dict[str, str], float | int]]) -> None:
+        if not samples:
+            return
+        lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"])
+        for labels, value in samples:
+            label_text = ",".join(f'{key}="{_escape_label(label)}"' for key, label in labels.items())
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+    if probes is not None:
+        ok = [probe for probe in probes if probe.error is None]
+
+        def probe_labels(probe: ProbeResult) -> dict[str, str]:
+            return {"image": probe.stem, "was_mounted": str(probe.was_mounted).lower()}
+
+        metric(
+            "cefs_probe_mount_seconds",
+            "gauge",
+            "Time to trigger the autofs mount of an image",
+            [(probe_labels(probe), probe.mount_seconds) for probe in ok if probe.mount_seconds is not None],
+        )
+        metric(
+            "cefs_probe_first_access_seconds",
+            "gauge",
+            "Time to list and stat the root of an image once mounted",
+            [
+                (probe_labels(probe), probe.first_access_seconds)
+                for probe in ok
+                if probe.first_access_seconds is not None
+            ],
+        )
+        metric(
+            "cefs_probe_success",
+            "gauge",
+            "Whether an image could be mounted and accessed",
+            [({"image": probe.stem}, int(probe.error is None)) for probe in probes],
+        )
+
+    if image_stats is not None:
+
+        def stats_labels(stats: ImageReadStats) -> dict[str, str]:
+            return {"image": stats.stem, "cached": str(stats.cached).lower()}
+
+        metric("cefs_mounted_images", "gauge", "CEFS images mounted on this node", [({}, len(image_stats))])
+        metric(
+            "cefs_image_read_bytes_total",
+            "counter",
+            "Bytes read from an image file since it was mounted",
+            [(stats_labels(stats), stats.read_bytes) for stats in image_stats],
+        )
+        metric(
+            "cefs_image_read_ios_total",
+            "counter",
+            "Reads from an image file since it was mounted",
+            [(stats_labels(stats), stats.read_ios) for stats in image_stats],
+        )
+        metric(
+            "cefs_image_read_seconds_total",
+            "counter",
+            "Time spent reading an image file since it was mounted",
+            [(stats_labels(stats), stats.read_seconds) for stats in image_stats],
+        )
+        metric(
+            "cefs_image_bytes",
+            "gauge",
+            "Size of a mounted image file",
+            [(stats_labels(stats), stats.image_bytes) for stats in image_stats if stats.image_bytes is not None],
+        )
+
+    if efs_bytes is not None:
+        metric("cefs_efs_read_bytes_total", "counter", "Bytes this node has read from EFS", [({}, efs_bytes)])
+    return "\n".join(lines) + "\n"
+
+
+def to_json(
+    probes: list[ProbeResult] | None = None,
+    image_stats: list[ImageReadStats] | None = None,
+    efs_bytes: int | None = None,
+) -> dict:
+    result: dict = {"time": time.time()}
+    if probes is not None:
+        result["probes"] = [asdict(probe) for probe in probes]
+    if image_stats is not None:
+        result["images"] = [{**asdict(stats), "read_amplification": stats.read_amplification} for stats in image_stats]
+    if efs_bytes is not None:
+        result["efs_read_bytes"] = efs_bytes
+    return result
+
+
+def _write_atomically(path: Path, text: str) -> None:
+    temp_path = path.with_name(f"{path.name}.tmp")
+    temp_path.write_text(text, encoding="utf-8")
+    temp_path.replace(path)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mount-point", type=Path, default=Path("/cefs"))
+    parser.add_argument("--image-dir", type=Path, default=Path("/efs/cefs-images"))
+    parser.add_argument("--json-file", type=Path, help="Write JSON here instead of to stdout")
+    parser.add_argument(
+        "--prometheus-file", type=Path, help="Write Prometheus text format here (no JSON unless --json-file)"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    probe_parser = commands.add_parser("probe", help="Time mounting and first access of images")
+    probe_parser.add_argument("--cold-only", action="store_true", help="Skip images that are already mounted")
+    probe_parser.add_argument("images", nargs="+", metavar="IMAGE", help="Image stem or mount path")
+    commands.add_parser("collect", help="Read stats of every mounted image, and bytes read from EFS")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    probes = image_stats = efs_bytes = None
+    match args.command:
+        case "probe":
+            probes = probe_images(args.images, args.mount_point, args.cold_only)
+            for probe in probes:
+                if probe.error:
+                    _LOGGER.warning("Failed to probe %s: %s", probe.stem, probe.error)
+        case "collect":
+            image_stats = collect_image_stats(args.mount_point, args.image_dir)
+            try:
+                nfs_read_bytes = parse_nfs_read_bytes(Path("/proc/self/mountstats").read_text(encoding="utf-8"))
+            except OSError as e:
+                _LOGGER.warning("Could not read NFS stats: %s", e)
+            else:
+                efs_bytes = efs_read_bytes(nfs_read_bytes, args.image_dir)
+
+    if args.prometheus_file:
+        _write_atomically(args.prometheus_file, format_prometheus(probes, image_stats, efs_bytes))
+    if args.json_file:
+        _write_atomically(args.json_file, json.dumps(to_json(probes, image_stats, efs_bytes)) + "\n")
+    elif not args.prometheus_file:
+        json.dump(to_json(probes, image_stats, efs_bytes), sys.stdout, indent=2)
+        print()
+    return 1 if probes and any(probe.error for probe in probes) else 0
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""Usage-aware packing strategies for CEFS consolidation, and a simulator to score them."""
+
+from __future__ import annotations
+
+import csv
+import io
+import logging
+import math
+import re
+from collections import defaultdict
+from collections.abc import Iterable
+from dataclasses import dataclass
+from pathlib import Path
+
+import humanfriendly
+import requests
+from lib.cefs.consolidation import pack_ordered_items_into_groups
+from lib.cefs.models import ConsolidationCandidate
+
+_LOGGER = logging.getLogger(__name__)
+
+COMPILER_USAGE_URL = "https://compiler-explorer.s3.amazonaws.com/public/compiler_usage.csv"
+
+# Items covering this share of all recorded usage are treated as "hot" and packed together.
+HOT_USAGE_SHARE = 0.9
+
+# Number of compilations a node is assumed to serve between image unmounts when simulating.
+DEFAULT_REQUESTS_PER_NODE = 5000
+
+# Rough fraction of a same-family sibling's size that squashfs block dedupe saves when the siblings
+# share an image. Only used for estimating; real savings vary a lot between families.
+FAMILY_DEDUPE_ESTIMATE = 0.3
+
+_TRAILING_VERSION_RE = re.compile(r"[-_ ]v?\d[\w.+-]*$")
+
+
+@dataclass(frozen=True)
+class PackingScore:
+    """Simulated cost of a set of consolidation groups."""
+
+    groups: int
+    total_bytes: int
+    expected_mounted_images: float
+    expected_mounted_bytes: float
+    estimated_compressed_bytes: int
+
+
+def load_compiler_usage(source: str = COMPILER_USAGE_URL) -> dict[str, int]:
+    """Load compiler usage counts from a compiler_usage.csv URL or local file.
+
+    Args:
+        source: URL or local path of a CSV with "compiler" and "times_used" columns
+
+    Returns:
+        Dictionary mapping compiler id to number of times used
+
+    Raises:
+        RuntimeError: If the CSV can't be fetched
+    """
+    if source.startswith(("http://", "https://")):
+        try:
+            response = requests.get(source, timeout=60)
+        except requests.RequestException as e:
+            raise RuntimeError(f"Failed to fetch compiler usage from {source}: {e}") from e
+        if not response.ok:
+            raise RuntimeError(f"Failed to fetch compiler usage from {source}: HTTP {response.status_code}")
+        text = response.text
+    else:
+        text = Path(source).read_text(encoding="utf-8")
+
+    usage: dict[str, int] = {}
+    for row in csv.DictReader(io.StringIO(text)):
+        try:
+            usage[row["compiler"]] = int(row["times_used"])
+        except (KeyError, TypeError, ValueError):
+            _LOGGER.debug("Skipping malformed usage row: %s", row)
+    _LOGGER.info("Loaded usage for %d compilers from %s", len(usage), source)
+    return usage
+
+
+def compute_item_heat(
+    items: Iterable[ConsolidationCandidate],
+    usage: dict[str, int],
+    exe_to_compiler_ids: dict[str, set[str]],
+) -> dict[str, int]:
+    """Attribute compiler usage to consolidation candidates.
+
+    A compiler's usage counts towards the candidate whose install directory contains its executable.
+
+    Args:
+        items: Consolidation candidates
+        usage: Compiler id to times used (see load_compiler_usage)
+        exe_to_compiler_ids: Executable path to compiler ids (see CompilerIdLookup.get_all_mappings)
+
+    Returns:
+        Dictionary mapping candidate name to its usage count; every candidate is present
+    """
+    name_by_path = {str(item.nfs_path): item.name for item in items}
+    heat = dict.fromkeys(name_by_path.values(), 0)
+    for exe_path, compiler_ids in exe_to_compiler_ids.items():
+        owner = next((name_by_path[str(p)] for p in Path(exe_path).parents if str(p) in name_by_path), None)
+        if owner is not None:
+            heat[owner] += sum(usage.get(compiler_id, 0) for compiler_id in compiler_ids)
+    return heat
+
+
+def item_family(name: str) -> str:
+    """Get the family of an installable, i.e. its name without the version.
+
+    "compilers/c++/x86/gcc 14.2.0" -> "compilers/c++/x86/gcc"
+    """
+    if " " in name:
+        return name.rsplit(" ", 1)[0]
+    return _TRAILING_VERSION_RE.sub("", name) or name
+
+
+def _heat_tiers(items: list[ConsolidationCandidate], heat: dict[str, int]) -> dict[str, int]:
+    """Assign each item a tier: 0 for hot, 1 for used, 2 for never used."""
+    total = sum(heat.get(item.name, 0) for item in items)
+    tiers: dict[str, int] = {}
+    cumulative = 0
+    for item in sorted(items, key=lambda x: (-heat.get(x.name, 0), x.name)):
+        item_heat = heat.get(item.name, 0)
+        if item_heat == 0:
+            tiers[item.name] = 2
+        elif cumulative < total * HOT_USAGE_SHARE:
+            tiers[item.name] = 0
+        else:
+            tiers[item.name] = 1
+        cumulative += item_heat
+    return tiers
+
+
+def pack_items_by_affinity(
+    items: list[ConsolidationCandidate], max_size_bytes: int, min_items: int, heat: dict[str, int]
+) -> list[list[ConsolidationCandidate]]:
+    """Pack consolidation candidates so that items used together end up in the same image.
+
+    Items are split into hot, used and unused tiers. Within a tier, families are ordered by their
+    combined usage and each family's versions are kept adjacent. Hot items therefore share a few
+    images (fewer mounts and less cached data per node), and sibling versions share images where
+    squashfs can dedupe their common blocks.
+
+    Args:
+        items: List of items to pack into groups
+        max_size_bytes: Maximum size per group in bytes
+        min_items: Minimum number of items per group
+        heat: Candidate name to usage count (see compute_item_heat)
+
+    Returns:
+        List of groups, where each group is a list of ConsolidationCandidate
+    """
+    tiers = _heat_tiers(items, heat)
+    family_heat: dict[tuple[int, str], int] = defaultdict(int)
+    for item in items:
+        family_heat[(tiers[item.name], item_family(item.name))] += heat.get(item.name, 0)
+
+    def sort_key(item: ConsolidationCandidate) -> tuple[int, int, str, str]:
+        tier = tiers[item.name]
+        family = item_family(item.name)
+        return tier, -family_heat[(tier, family)], family, item.name
+
+    return pack_ordered_items_into_groups(sorted(items, key=sort_key), max_size_bytes, min_items)
+
+
+def pack_items_with_suggestions(
+    items: list[ConsolidationCandidate], suggestions: list[list[str]], max_size_bytes: int, min_items: int
+) -> tuple[list[list[ConsolidationCandidate]], list[ConsolidationCandidate]]:
+    """Pack candidates following suggested groups of installable names (e.g. from `cefs dedupe-report`).
+
+    Each suggestion is packed on its own, so its items never share an image with unrelated ones.
+    Names that aren't candidates are ignored, and suggestions too small to form a group give
+    their items back.
+
+    Args:
+        items: List of items to pack into groups
+        suggestions: Groups of installable names, in priority order
+        max_size_bytes: Maximum size per group in bytes
+        min_items: Minimum number of items per group
+
+    Returns:
+        Tuple of (groups, items not placed in any group) for the caller to pack some other way
+    """
+    by_name = {item.name: item for item in items}
+    groups: list[list[ConsolidationCandidate]] = []
+    placed: set[str] = set()
+    for suggestion in suggestions:
+        members = [by_name[name] for name in suggestion if name in by_name and name not in placed]
+        for group in pack_ordered_items_into_groups(members, max_size_bytes, min_items):
+            groups.append(group)
+            placed.update(item.name for item in group)
+    return groups, [item for item in items if item.name not in placed]
+
+
+def score_packing(
+    groups: list[list[ConsolidationCandidate]],
+    heat: dict[str, int],
+    requests_per_node: int = DEFAULT_REQUESTS_PER_NODE,
+) -> PackingScore:
+    """Simulate how a set of groups behaves on a compilation node.
+
+    A node serving requests_per_node compilations drawn from the usage distribution touches item i
+    with probability p_i = 1 - (1 - f_i)^N, where f_i is the item's share of usage. A group is
+    mounted if any of its items is touched: P(group) = 1 - prod(1 - p_i). Lower expected mounted
+    bytes mean less data to fetch and cache per node.
+
+    The compressed size estimate assumes squashfs dedupes part of each same-family sibling that
+    shares an image (FAMILY_DEDUPE_ESTIMATE); it is only meaningful for comparing packings.
+
+    Args:
+        groups: Consolidation groups to score
+        heat: Candidate name to usage count
+        requests_per_node: Compilations per node between unmounts
+
+    Returns:
+        PackingScore for the groups
+    """
+    total_heat = sum(heat.get(item.name, 0) for group in groups for item in group)
+    expected_images = 0.0
+    expected_bytes = 0.0
+    estimated_compressed = 0
+    total_bytes = 0
+
+    for group in groups:
+        group_size = sum(item.size for item in group)
+        total_bytes += group_size
+
+        log_not_mounted = 0.0
+        for item in group:
+            share = heat.get(item.name, 0) / total_heat if total_heat else 0.0
+            if share >= 1.0:
+                log_not_mounted = -math.inf
+                break
+            # log((1 - p_i)) == N * log(1 - f_i); stays accurate for tiny shares
+            log_not_mounted += requests_per_node * math.log1p(-share)
+        p_mounted = 1.0 - math.exp(log_not_mounted)
+        expected_images += p_mounted
+        expected_bytes += p_mounted * group_size
+
+        family_sizes: dict[str, list[int]] = defaultdict(list)
+        for item in group:
+            family_sizes[item_family(item.name)].append(item.size)
+        for sizes in family_sizes.values():
+            largest = max(sizes)
+            estimated_compressed += largest + int((sum(sizes) - largest) * (1.0 - FAMILY_DEDUPE_ESTIMATE))
+
+    return PackingScore(
+        groups=len(groups),
+        total_bytes=total_bytes,
+        expected_mounted_images=expected_images,
+        expected_mounted_bytes=expected_bytes,
+        estimated_compressed_bytes=estimated_compressed,
+    )
+
+
+def format_packing_score(label: str, score: PackingScore) -> str:
+    """Format a PackingScore as a single log line."""
+    return (
+        f"{label}: {score.groups} groups, {humanfriendly.format_size(score.total_bytes, binary=True)} total, "
+        f"~{score.expected_mounted_images:.1f} images / "
+        f"{humanfriendly.format_size(int(score.expected_mounted_bytes), binary=True)} mounted per node, "
+        f"~{humanfriendly.format_size(score.estimated_compressed_bytes, binary=True)} after family dedupe"
+    )
@@ -11,7 +11,7 @@ from fnmatch import fnmatch
 from pathlib import Path
 from typing import NamedTuple
 
-from lib.cefs.constants import NFS_MAX_RECURSION_DEPTH  # noqa: F401 (used in docstring)
+from lib.cefs.constants import CEFS_HASH_LENGTH, NFS_MAX_RECURSION_DEPTH  # noqa: F401 (used in docstring)
 from lib.cefs_manifest import generate_cefs_filename
 
 _LOGGER = logging.getLogger(__name__)
@@ -84,7 +84,7 @@ def calculate_squashfs_hash(squashfs_path: Path) -> str:
         for chunk in iter(lambda: f.read(16 * 1024 * 1024), b""):
             sha256_hash.update(chunk)
     full_hash = sha256_hash.hexdigest()
-    truncated_hash = full_hash[:24]
+    truncated_hash = full_hash[:CEFS_HASH_LENGTH]
     _LOGGER.debug("Hash for %s: full=%s, truncated=%s", squashfs_path, full_hash, truncated_hash)
     return truncated_hash
 
@@ -153,6 +153,9 @@ def validate_cefs_mount_point(mount_point: Path) -> bool:
 def get_directory_size(directory: Path) -> int:
     """Calculate total size of a directory tree in bytes.
 
+    Counts regular files only (not symlinks). Uses os.scandir, whose directory entries already
+    carry the file type, so only regular files need a stat call.
+
     Args:
         directory: Directory to measure
 
@@ -160,12 +163,18 @@ def get_directory_size(directory: Path) -> int:
         Total size in bytes
     """
     total_size = 0
-    try:
-        for item in directory.rglob("*"):
-            if item.is_file() and not item.is_symlink():
-                total_size += item.stat().st_size
-    except OSError as e:
-        _LOGGER.warning("Error calculating directory size for %s: %s", directory, e)
+    pending = [directory]
+    while pending:
+        current = pending.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(Path(entry.path))
+                    elif entry.is_file(follow_symlinks=False):
+                        total_size += entry.stat(follow_symlinks=False).st_size
+        except OSError as e:
+            _LOGGER.warning("Error calculating directory size for %s: %s", current, e)
     return total_size
 
 
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""Re-encoding of CEFS images with a compression profile suited to how much they're used.
+
+Frequently mounted images are read on nearly every compile, so they get the "hot" profile (cheap to
+decompress, small blocks); images nobody uses get the "cold" one (smallest on EFS). Recompressed
+images are built and deployed through the consolidation pipeline, so symlinks are swapped the same
+transactional way, and the old images are left for gc.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+import stat
+import statistics
+import subprocess
+import time
+from collections.abc import Iterable
+from dataclasses import dataclass
+from pathlib import Path
+
+from lib.cefs.consolidation import extract_candidates_from_manifest
+from lib.cefs.models import ConsolidationCandidate
+from lib.cefs.packing import HOT_USAGE_SHARE
+from lib.cefs.state import CEFSState
+from lib.cefs.warm import HOT_PATTERNS, find_warm_targets
+from lib.cefs_manifest import read_manifest_from_alongside
+from lib.config import CompressionProfile, SquashfsConfig
+from lib.squashfs import create_squashfs_image, extract_squashfs_image
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_PROFILE = "default"
+HOT_PROFILE = "hot"
+COLD_PROFILE = "cold"
+
+DEFAULT_BENCHMARK_SAMPLES = 20
+
+
+@dataclass(frozen=True)
+class RecompressPlan:
+    """An image to re-encode, and the items in it that are still in use."""
+
+    image_path: Path
+    current_profile: str
+    target_profile: str
+    usage: int
+    items: tuple[ConsolidationCandidate, ...]
+
+
+@dataclass(frozen=True)
+class ProfileBenchmark:
+    """How an image built with one compression profile performs."""
+
+    profile: str
+    image_bytes: int
+    build_seconds: float
+    extract_seconds: float  # Decompressing the whole image
+    read_seconds: tuple[float, ...]  # Reading each sampled file out of the image, cold
+
+    @property
+    def read_p50(self) -> float:
+        return statistics.median(self.read_seconds) if self.read_seconds else 0.0
+
+    @property
+    def read_p95(self) -> float:
+        if len(self.read_seconds) < 2:
+            return self.read_p50
+        return statistics.quantiles(self.read_seconds, n=20, method="inclusive")[-1]
+
+
+def image_compression_profile(manifest: dict) -> str:
+    """The compression profile an image was built with, as recorded in its manifest."""
+    return manifest.get("compression_profile") or DEFAULT_PROFILE
+
+
+def compute_image_usage(
+    usage: dict[str, int],
+    exe_to_compiler_ids: dict[str, set[str]],
+    nfs_dir: Path,
+    mount_point: Path,
+) -> dict[str, int]:
+    """Attribute compiler usage to the CEFS images the compilers are installed in.
+
+    Returns:
+        Image filename stem to times used, for every image containing a known compiler (including
+        unused ones, as 0). Images without compilers (libraries, tools) are absent: their usage is unknown.
+    """
+    every_compiler = {compiler_id: 1 for compiler_ids in exe_to_compiler_ids.values() for compiler_id in compiler_ids}
+    compiler_images = find_warm_targets(every_compiler, exe_to_compiler_ids, nfs_dir, mount_point)
+    used = {
+        target.mount_path.name: target.usage
+        for target in find_warm_targets(usage, exe_to_compiler_ids, nfs_dir, mount_point)
+    }
+    return {target.mount_path.name: used.get(target.mount_path.name, 0) for target in compiler_images}
+
+
+def assign_profiles(image_usage: dict[str, int], hot_share: float = HOT_USAGE_SHARE) -> dict[str, str]:
+    """Choose a compression profile for each image from its usage.
+
+    The most used images that together account for hot_share of all usage are hot, unused images are
+    cold, and the rest keep the default profile.
+
+    Returns:
+        Image filename stem to profile name
+    """
+    total = sum(image_usage.values())
+    profiles = {}
+    covered = 0
+    for stem, times_used in sorted(image_usage.items(), key=lambda kv: (-kv[1], kv[0])):
+        if not times_used:
+            profiles[stem] = COLD_PROFILE
+        elif covered < total * hot_share:
+            profiles[stem] = HOT_PROFILE
+            covered += times_used
+        else:
+            profiles[stem] = DEFAULT_PROFILE
+    return profiles
+
+
+def plan_recompression(
+    state: CEFSState,
+    target_profiles: dict[str, str],
+    image_usage: dict[str, int],
+    filter_: list[str],
+) -> list[RecompressPlan]:
+    """Find the images whose compression profile differs from their target.
+
+    Args:
+        state: CEFSState after scan_cefs_images_with_manifests()
+        target_profiles: Image filename stem to the profile it should have; other images are left alone
+        image_usage: Image filename stem to times used, to order the plan
+        filter_: Only include items matching one of these substrings
+
+    Returns:
+        Plans, most used images first. Images with no items still in use are skipped (gc removes them).
+    """
+    plans = []
+    for stem, target_profile in target_profiles.items():
+        image_path = state.all_cefs_images.get(stem)
+        if image_path is None:
+            continue
+        manifest = read_manifest_from_alongside(image_path)
+        if not manifest or "contents" not in manifest:
+            _LOGGER.warning("Cannot recompress %s: no manifest", image_path.name)
+            continue
+        current_profile = image_compression_profile(manifest)
+        if current_profile == target_profile:
+            continue
+        items = extract_candidates_from_manifest(
+            manifest, image_path, filter_, image_path.stat().st_size, state.mount_point
+        )
+        if not items:
+            _LOGGER.debug("Not recompressing %s: nothing matching uses it", image_path.name)
+            continue
+        plans.append(
+            RecompressPlan(image_path, current_profile, target_profile, image_usage.get(stem, 0), tuple(items))
+        )
+    return sorted(plans, key=lambda plan: (-plan.usage, plan.image_path.name))
+
+
+def select_sample_files(source_dir: Path, count: int) -> list[Path]:
+    """Pick files to time reads of: the hot files of an installation (see HOT_PATTERNS), largest first.
+
+    Falls back to the largest files if none match, e.g. for non-compiler installations.
+
+    Returns:
+        Up to count paths relative to source_dir
+    """
+
+    def regular_files(paths: Iterable[Path]) -> dict[Path, int]:
+        sizes = {}
+        for path in paths:
+            file_stat = path.lstat()
+            if stat.S_ISREG(file_stat.st_mode):
+                sizes[path.relative_to(source_dir)] = file_stat.st_size
+        return sizes
+
+    sizes = regular_files(path for pattern in HOT_PATTERNS for path in source_dir.glob(pattern))
+    if not sizes:
+        sizes = regular_files(Path(root) / name for root, _, names in os.walk(source_dir) for name in names)
+    return sorted(sizes, key=lambda path: (-sizes[path], path))[:count]
+
+
+def _time_read(squashfs_config: SquashfsConfig, image_path: Path, file_path: Path) -> float:
+    start = time.perf_counter()
+    subprocess.run(
+        [squashfs_config.unsquashfs_path, "-cat", str(image_path), str(file_path)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        check=True,
+    )
+    return time.perf_counter() - start
+
+
+def benchmark_profiles(
+    squashfs_config: SquashfsConfig,
+    source_dir: Path,
+    profiles: dict[str, CompressionProfile],
+    work_dir: Path,
+    sample_files: list[Path],
+) -> list[ProfileBenchmark]:
+    """Build an image of source_dir with each profile and time decompressing it.
+
+    Read times include starting unsquashfs, which is the same for every profile, so compare them
+    between profiles rather than treating them as page fault latencies.
+
+    Raises:
+        SquashfsError: If an image can't be built or extracted
+        subprocess.CalledProcessError: If a sampled file can't be read
+    """
+    results = []
+    for name, profile in profiles.items():
+        image_path = work_dir / f"benchmark-{name}.sqfs"
+        extract_dir = work_dir / f"benchmark-{name}"
+        try:
+            start = time.perf_counter()
+            create_squashfs_image(squashfs_config, source_dir, image_path, profile=profile)
+            build_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            extract_squashfs_image(squashfs_config, image_path, extract_dir, None)
+            extract_seconds = time.perf_counter() - start
+            shutil.rmtree(extract_dir)
+
+            read_seconds = tuple(_time_read(squashfs_config, image_path, path) for path in sample_files)
+            results.append(
+                ProfileBenchmark(name, image_path.stat().st_size, build_seconds, extract_seconds, read_seconds)
+            )
+            _LOGGER.info("Benchmarked profile %s", name)
+        finally:
+            image_path.unlink(missing_ok=True)
+            shutil.rmtree(extract_dir, ignore_errors=True)
+    return results
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""Offline what-if simulation of CEFS gc, consolidation and reconsolidation.
+
+A snapshot records every image's size, age and manifest items, and whether each item's symlink
+(or its .bak) points into it. Scenarios are then played against the snapshot in memory, using
+the same packing and reconsolidation rules as the real commands, so sweeping parameters costs
+no I/O once the snapshot is taken.
+
+The model assumes:
+- a consolidated image is as big as the items packed into it (no extra dedupe from squashfs)
+- items are moved out of an image by consolidation and their .bak backups are cleaned up
+  before gc runs, so images left with nothing referencing them are gc candidates
+- gc keeps images younger than --min-age (by image mtime, as gc does) and broken images
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+from dataclasses import asdict, dataclass, replace
+from pathlib import Path
+
+from lib.cefs.consolidation import pack_items_into_groups, should_reconsolidate_image
+from lib.cefs.gc import check_if_symlink_references_image
+from lib.cefs.models import ConsolidationCandidate
+from lib.cefs.state import CEFSState
+from lib.cefs_manifest import read_manifest_from_alongside
+
+_LOGGER = logging.getLogger(__name__)
+
+_SNAPSHOT_VERSION = 1
+
+
+@dataclass(frozen=True)
+class SnapshotItem:
+    """One manifest entry of an image, and whether its symlinks point into the image."""
+
+    name: str
+    destination: str
+    linked: bool  # The main symlink points into this image
+    backed_up: bool = False  # Only the .bak symlink does (protects the image for rollback)
+
+
+@dataclass(frozen=True)
+class SnapshotImage:
+    """An image, as gc and consolidation see it."""
+
+    stem: str
+    size: int
+    mtime: float
+    items: tuple[SnapshotItem, ...]
+    broken: bool = False  # Missing or invalid manifest: never deleted, never repacked
+
+    @property
+    def is_consolidated(self) -> bool:
+        return len(self.items) > 1
+
+    @property
+    def is_referenced(self) -> bool:
+        return self.broken or any(item.linked or item.backed_up for item in self.items)
+
+    @property
+    def usage(self) -> float:
+        """Percentage of items still referenced, as calculate_image_usage() reports it."""
+        if not self.items:
+            return 0.0
+        return 100.0 * sum(item.linked or item.backed_up for item in self.items) / len(self.items)
+
+
+@dataclass(frozen=True)
+class CEFSSnapshot:
+    """Every complete image in the image directory at one moment."""
+
+    taken_at: float
+    images: tuple[SnapshotImage, ...]
+
+    def to_json(self) -> dict:
+        return {"version": _SNAPSHOT_VERSION, **asdict(self)}
+
+    @staticmethod
+    def from_json(data: dict) -> CEFSSnapshot:
+        if data.get("version") != _SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version: {data.get('version')}")
+        images = tuple(
+            SnapshotImage(
+                stem=image["stem"],
+                size=image["size"],
+                mtime=image["mtime"],
+                items=tuple(SnapshotItem(**item) for item in image["items"]),
+                broken=image.get("broken", False),
+            )
+            for image in data["images"]
+        )
+        return CEFSSnapshot(taken_at=data["taken_at"], images=images)
+
+
+@dataclass(frozen=True)
+class SimulationParams:
+    """One scenario: gc with min_age, after consolidating (and reconsolidating) if max_size is set."""
+
+    min_age_seconds: float
+    max_size_bytes: int | None = None  # None: don't consolidate
+    min_items: int = 3
+    efficiency_threshold: float | None = None  # None: don't reconsolidate
+    undersized_ratio: float = 0.25
+
+
+@dataclass(frozen=True)
+class Projection:
+    """What the image directory would look like after a scenario."""
+
+    images: int
+    bytes: int
+    mounts: int  # Distinct images the linked items are spread over, i.e. autofs mounts to serve them all
+    linked_items: int
+    consolidated_images: int = 0  # New images built
+    consolidated_bytes: int = 0
+    moved_items: int = 0
+    gc_images: int = 0  # Images gc would delete
+    gc_bytes: int = 0
+
+
+def _snapshot_items(manifest: dict, stem: str, nfs_dir: Path, mount_point: Path) -> tuple[SnapshotItem, ...]:
+    items = []
+    for content in manifest.get("contents", []):
+        if "name" not in content or "destination" not in content:
+            continue
+        destination = Path(content["destination"])
+        full_path = destination if destination.is_absolute() else nfs_dir / destination
+        linked = check_if_symlink_references_image(full_path, stem, mount_point)
+        bak_path = full_path.with_name(full_path.name + ".bak")
+        backed_up = not linked and check_if_symlink_references_image(bak_path, stem, mount_point)
+        items.append(SnapshotItem(content["name"], content["destination"], linked, backed_up))
+    return tuple(items)
+
+
+def take_snapshot(state: CEFSState, now: float) -> CEFSSnapshot:
+    """Record the images in state, and where their items' symlinks point.
+
+    In-progress images are left out: gc never touches them and they can't be consolidated.
+
+    Args:
+        state: CEFSState after scan_cefs_images_with_manifests()
+        now: Time the snapshot is taken at (scenario ages are measured from it)
+    """
+    images = []
+    for stem, image_path in sorted(state.all_cefs_images.items()):
+        try:
+            image_stat = image_path.stat()
+        except OSError as e:
+            _LOGGER.warning("Skipping %s: %s", image_path, e)
+            continue
+        manifest = read_manifest_from_alongside(image_path)
+        items = _snapshot_items(manifest, stem, state.nfs_dir, state.mount_point) if manifest else ()
+        # As gc: an image whose manifest is missing, invalid or names no destinations is broken, and kept
+        images.append(SnapshotImage(stem, image_stat.st_size, image_stat.st_mtime, items, broken=not items))
+    recorded = {image.stem for image in images}
+    for image_path in sorted(state.broken_images):
+        if image_path.stem in recorded:
+            continue
+        try:
+            image_stat = image_path.stat()
+        except OSError as e:
+            _LOGGER.warning("Skipping %s: %s", image_path, e)
+            continue
+        images.append(SnapshotImage(image_path.stem, image_stat.st_size, image_stat.st_mtime, (), broken=True))
+    return CEFSSnapshot(taken_at=now, images=tuple(sorted(images, key=lambda image: image.stem)))
+
+
+def write_snapshot(snapshot: CEFSSnapshot, path: Path) -> None:
+    path.write_text(json.dumps(snapshot.to_json()), encoding="utf-8")
+
+
+def read_snapshot(path: Path) -> CEFSSnapshot:
+    """Read a snapshot written by write_snapshot().
+
+    Raises:
+        OSError: If the file can't be read
+        ValueError: If it isn't a snapshot this version understands
+    """
+    try:
+        return CEFSSnapshot.from_json(json.loads(path.read_text(encoding="utf-8")))
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"Malformed snapshot {path}: {e}") from e
+
+
+def project(images: list[SnapshotImage] | tuple[SnapshotImage, ...]) -> Projection:
+    """Count images, bytes and mount fan-out of a set of images."""
+    return Projection(
+        images=len(images),
+        bytes=sum(image.size for image in images),
+        mounts=sum(any(item.linked for item in image.items) for image in images),
+        linked_items=sum(item.linked for image in images for item in image.items),
+    )
+
+
+def _consolidation_candidates(snapshot: CEFSSnapshot, params: SimulationParams) -> list[ConsolidationCandidate]:
+    """The items consolidate would pack: linked items of individual images, plus those of consolidated
+    images marked for reconsolidation. squashfs_path carries the source image's stem."""
+    assert params.max_size_bytes is not None
+    fresh = [
+        ConsolidationCandidate(item.name, Path(item.destination), Path(image.stem), image.size)
+        for image in snapshot.images
+        if not image.broken and not image.is_consolidated
+        for item in image.items
+        if item.linked
+    ]
+    if params.efficiency_threshold is None:
+        return fresh
+
+    fresh_names = {candidate.name for candidate in fresh}
+    seen_names: set[str] = set()
+    recon = []
+    # Newest image wins when the same item is in several, as in consolidate
+    for image in sorted(snapshot.images, key=lambda image: -image.mtime):
+        if image.broken or not image.is_consolidated:
+            continue
+        should_reconsolidate, _ = should_reconsolidate_image(
+            image.usage, image.size, params.efficiency_threshold, params.max_size_bytes, params.undersized_ratio
+        )
+        if not should_reconsolidate:
+            continue
+        item_size = image.size // len(image.items)
+        for item in image.items:
+            if item.linked and item.name not in fresh_names and item.name not in seen_names:
+                seen_names.add(item.name)
+                recon.append(
+                    ConsolidationCandidate(
+                        item.name, Path(item.destination), Path(image.stem), item_size, from_reconsolidation=True
+                    )
+                )
+    return fresh + recon
+
+
+def run_simulation(snapshot: CEFSSnapshot, params: SimulationParams) -> Projection:
+    """Play a scenario against a snapshot: consolidate (if max_size_bytes is set), then gc.
+
+    Returns:
+        Projection of the image directory afterwards
+    """
+    images = list(snapshot.images)
+    consolidated_images = consolidated_bytes = moved_items = 0
+
+    if params.max_size_bytes is not None:
+        groups = pack_items_into_groups(
+            _consolidation_candidates(snapshot, params), params.max_size_bytes, params.min_items
+        )
+        moved: dict[str, set[str]] = {}  # Source image stem -> names of the items moved out of it
+        for index, group in enumerate(groups):
+            size = sum(candidate.size for candidate in group)
+            items = tuple(SnapshotItem(candidate.name, str(candidate.nfs_path), linked=True) for candidate in group)
+            images.append(SnapshotImage(f"simulated-{index}_consolidated", size, snapshot.taken_at, items))
+            consolidated_images += 1
+            consolidated_bytes += size
+            moved_items += len(group)
+            for candidate in group:
+                moved.setdefault(candidate.squashfs_path.name, set()).add(candidate.name)
+        # Moved items now link to their new image, and their .bak backups have been cleaned up
+        images = [
+            replace(
+                image,
+                items=tuple(
+                    replace(item, linked=False, backed_up=False) if item.name in moved[image.stem] else item
+                    for item in image.items
+                ),
+            )
+            if image.stem in moved
+            else image
+            for image in images
+        ]
+
+    min_mtime = snapshot.taken_at - params.min_age_seconds
+    deleted = [image for image in images if not image.is_referenced and image.mtime <= min_mtime]
+    deleted_stems = {image.stem for image in deleted}
+    remaining = [image for image in images if image.stem not in deleted_stems]
+
+    after = project(remaining)
+    return Projection(
+        images=after.images,
+        bytes=after.bytes,
+        mounts=after.mounts,
+        linked_items=after.linked_items,
+        consolidated_images=consolidated_images,
+        consolidated_bytes=consolidated_bytes,
+        moved_items=moved_items,
+        gc_images=len(deleted),
+        gc_bytes=sum(image.size for image in deleted),
+    )
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""Uncompressed size accounting for CEFS images, read from squashfs metadata and cached per image."""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from lib.cefs.models import ConsolidationCandidate
+from lib.config import SquashfsConfig
+from lib.squashfs import SquashfsEntry, list_squashfs_entries
+
+_LOGGER = logging.getLogger(__name__)
+
+# Directory totals are kept this many levels deep; enough for consolidated images' subdirectories.
+DIRECTORY_DEPTH = 2
+
+# Name of the cache file, kept in the CEFS local temp dir
+SIZE_CACHE_FILENAME = "image-sizes.json"
+
+_CACHE_VERSION = 1
+
+
+@dataclass(frozen=True)
+class ImageSizes:
+    """Uncompressed sizes of an image's contents."""
+
+    total_bytes: int
+    file_count: int
+    directory_bytes: dict[str, int] = field(default_factory=dict)  # "a" or "a/b" -> bytes beneath it
+
+    def bytes_under(self, subdir: Path | None) -> int:
+        """Uncompressed bytes beneath subdir (the whole image if None).
+
+        Directories deeper than DIRECTORY_DEPTH are estimated by their nearest recorded ancestor,
+        which can only over-estimate.
+        """
+        if subdir is None or subdir == Path("."):
+            return self.total_bytes
+        parts = subdir.parts
+        for depth in range(min(len(parts), DIRECTORY_DEPTH), 0, -1):
+            key = "/".join(parts[:depth])
+            if key in self.directory_bytes:
+                return self.directory_bytes[key]
+        return self.total_bytes if len(parts) > DIRECTORY_DEPTH else 0
+
+
+def image_sizes_from_entries(entries: list[SquashfsEntry]) -> ImageSizes:
+    """Summarise parsed unsquashfs -ll entries into an ImageSizes."""
+    total = 0
+    files = 0
+    directory_bytes: dict[str, int] = defaultdict(int)
+    for entry in entries:
+        if entry.file_type == "d" and entry.path.count("/") < DIRECTORY_DEPTH:
+            directory_bytes.setdefault(entry.path, 0)
+        if entry.file_type != "-":
+            continue
+        files += 1
+        total += entry.size
+        parts = entry.path.split("/")[:-1]
+        for depth in range(1, min(len(parts), DIRECTORY_DEPTH) + 1):
+            directory_bytes["/".join(parts[:depth])] += entry.size
+    return ImageSizes(total_bytes=total, file_count=files, directory_bytes=dict(directory_bytes))
+
+
+def _image_key(image_path: Path) -> str:
+    # Images are content-addressed: the hash prefix of the filename identifies the contents
+    return image_path.stem.split("_")[0]
+
+
+class ImageSizeCache:
+    """Per-image uncompressed sizes, read from squashfs metadata and cached in a JSON file.
+
+    Images are immutable once written, so entries are keyed by image hash and only re-read
+    if the image file's size has changed (e.g. the hash was reused for a rebuilt image).
+    """
+
+    def __init__(self, squashfs_config: SquashfsConfig, cache_path: Path | None):
+        self._squashfs_config = squashfs_config
+        self._cache_path = cache_path
+        self._entries: dict[str, dict] = {}
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+        if cache_path and cache_path.exists():
+            try:
+                data = json.loads(cache_path.read_text(encoding="utf-8"))
+                if data.get("version") == _CACHE_VERSION:
+                    self._entries = data.get("images", {})
+            except (OSError, ValueError, AttributeError) as e:
+                _LOGGER.warning("Ignoring unreadable size cache %s: %s", cache_path, e)
+
+    def get(self, image_path: Path) -> ImageSizes:
+        """Get the uncompressed sizes of an image, reading its metadata if not cached.
+
+        Raises:
+            SquashfsError: If the image metadata can't be read
+        """
+        key = _image_key(image_path)
+        image_size = image_path.stat().st_size
+        cached = self._entries.get(key)
+        if cached and cached.get("image_size") == image_size:
+            self.hits += 1
+            return ImageSizes(
+                total_bytes=cached["total_bytes"],
+                file_count=cached["file_count"],
+                directory_bytes=cached["directory_bytes"],
+            )
+
+        self.misses += 1
+        sizes = image_sizes_from_entries(list_squashfs_entries(self._squashfs_config, image_path))
+        self._entries[key] = {
+            "image_size": image_size,
+            "total_bytes": sizes.total_bytes,
+            "file_count": sizes.file_count,
+            "directory_bytes": sizes.directory_bytes,
+        }
+        self._dirty = True
+        return sizes
+
+    def candidate_bytes(self, candidate: ConsolidationCandidate) -> int:
+        """Uncompressed size of a consolidation candidate (the whole image, or its extraction path)."""
+        return self.get(candidate.squashfs_path).bytes_under(candidate.extraction_path)
+
+    def save(self) -> None:
+        """Write the cache back to disk if anything changed. Failures are logged, not raised."""
+        if not self._cache_path or not self._dirty:
+            return
+        try:
+            self._cache_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = self._cache_path.with_name(f"{self._cache_path.name}.{os.getpid()}.tmp")
+            temp_path.write_text(json.dumps({"version": _CACHE_VERSION, "images": self._entries}), encoding="utf-8")
+            temp_path.replace(self._cache_path)
+            self._dirty = False
+        except OSError as e:
+            _LOGGER.warning("Failed to save size cache %s: %s", self._cache_path, e)
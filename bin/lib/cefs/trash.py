@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""Deferred, batched deletion of old NFS trees through a durable trash queue."""
+
+from __future__ import annotations
+
+import errno
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+_LOGGER = logging.getLogger(__name__)
+
+# Trash directory name, created at the top of the NFS installation directory
+TRASH_DIR_NAME = ".cefs-trash"
+
+DEFAULT_TRASH_WORKERS = 4
+DEFAULT_MAX_DELETES_PER_SECOND = 200.0
+
+# A claimed item that hasn't been deleted after this long is assumed to belong to a worker that died
+DEFAULT_STALE_CLAIM_SECONDS = 60 * 60
+
+_QUEUED = "queued"
+_DELETING = "deleting"
+
+
+@dataclass
+class TrashResult:
+    """Outcome of emptying (some of) the trash."""
+
+    deleted_items: int = 0
+    deleted_entries: int = 0
+    errors: list[str] = field(default_factory=list)
+
+    def add(self, other: TrashResult) -> None:
+        self.deleted_items += other.deleted_items
+        self.deleted_entries += other.deleted_entries
+        self.errors.extend(other.errors)
+
+
+class RateLimiter:
+    """Spaces out filesystem operations to at most per_second, across all threads (None for no limit).
+
+    wait() takes a number of units, so the same limiter can cap bytes per second as well as operations.
+    """
+
+    def __init__(self, per_second: float | None):
+        self._interval = 1.0 / per_second if per_second else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self, units: float = 1.0) -> None:
+        if not self._interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self._interval * units
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class TrashQueue:
+    """A durable queue of directory trees waiting to be deleted.
+
+    The queue is just a directory on the same filesystem as the items. Every step is a rename,
+    which is atomic, so an item is always in exactly one place and nothing is lost or deleted
+    twice if a process dies part way:
+
+    - put() renames an item into queued/ (cheap, so it can happen on the install path)
+    - claim() renames it from queued/ into deleting/, so only one worker ever gets it, even
+      across machines sharing the filesystem
+    - the claimant deletes it from deleting/; claims older than stale_after are reclaimed
+      (by another rename) so a crashed worker's half-deleted item is finished later
+    """
+
+    def __init__(self, root: Path, stale_after: float = DEFAULT_STALE_CLAIM_SECONDS):
+        self.root = root
+        self.stale_after = stale_after
+        self._queued = root / _QUEUED
+        self._deleting = root / _DELETING
+
+    def put(self, path: Path) -> Path:
+        """Move path into the trash queue.
+
+        If the trash is on a different filesystem, the item is instead renamed in place to
+        .DELETE_ME_<timestamp> for gc to clean up, as with deferred cleanup.
+
+        Returns:
+            Where the item now is
+
+        Raises:
+            OSError: If the item can't be moved
+        """
+        self._queued.mkdir(parents=True, exist_ok=True)
+        queued_path = self._queued / f"{time.strftime('%Y%m%dT%H%M%S')}_{uuid.uuid4().hex[:8]}_{path.name}"
+        try:
+            path.rename(queued_path)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            queued_path = path.with_name(f"{path.name}.DELETE_ME_{time.strftime('%Y%m%d_%H%M%S')}")
+            _LOGGER.warning("%s is not on the same filesystem as %s, renaming to %s", path, self.root, queued_path)
+            path.rename(queued_path)
+            return queued_path
+        _LOGGER.info("Moved %s to trash as %s", path, queued_path.name)
+        return queued_path
+
+    def pending(self) -> list[Path]:
+        """Items waiting to be claimed, oldest first, plus any stale claims."""
+        return sorted(_list_dir(self._queued)) + self._stale_claims()
+
+    def _stale_claims(self) -> list[Path]:
+        now = time.time()
+        stale = []
+        for path in sorted(_list_dir(self._deleting)):
+            claimed_at = path.name.split("_", 1)[0]
+            if not claimed_at.isdigit() or now - int(claimed_at) >= self.stale_after:
+                stale.append(path)
+        return stale
+
+    def claim(self, path: Path) -> Path | None:
+        """Claim a pending item for deletion. Returns the claimed path, or None if someone else got it."""
+        self._deleting.mkdir(parents=True, exist_ok=True)
+        # Claims are named <claim time>_<host>-<pid>_<queued name>
+        queued_name = path.name.split("_", 2)[-1] if path.parent == self._deleting else path.name
+        claimant = f"{socket.gethostname().replace('_', '-')}-{os.getpid()}"
+        claimed = self._deleting / f"{int(time.time())}_{claimant}_{queued_name}"
+        try:
+            path.rename(claimed)
+        except FileNotFoundError:
+            return None
+        return claimed
+
+
+def _list_dir(directory: Path) -> list[Path]:
+    try:
+        return list(directory.iterdir())
+    except FileNotFoundError:
+        return []
+
+
+def _remove(path: str, remover, limiter: RateLimiter) -> int:
+    limiter.wait()
+    try:
+        remover(path)
+    except FileNotFoundError:
+        return 0  # Already gone, e.g. removed by a worker that then died
+    except PermissionError:
+        # Read-only directories (common in unpacked tarballs) stop us removing their contents
+        os.chmod(os.path.dirname(path), 0o700)
+        remover(path)
+    return 1
+
+
+def delete_tree(path: Path, limiter: RateLimiter) -> int:
+    """Delete a file, symlink or directory tree, one rate-limited operation at a time.
+
+    Returns:
+        Number of filesystem entries removed
+
+    Raises:
+        OSError: If something can't be removed
+    """
+    if path.is_symlink() or not path.is_dir():
+        return _remove(str(path), os.unlink, limiter)
+    removed = 0
+    for root, dirs, files in os.walk(path, topdown=False):
+        for name in files:
+            removed += _remove(os.path.join(root, name), os.unlink, limiter)
+        for name in dirs:
+            entry = os.path.join(root, name)
+            removed += _remove(entry, os.unlink if os.path.islink(entry) else os.rmdir, limiter)
+    return removed + _remove(str(path), os.rmdir, limiter)
+
+
+def _delete_claimed(claimed: Path, limiter: RateLimiter) -> TrashResult:
+    try:
+        entries = delete_tree(claimed, limiter)
+    except OSError as e:
+        _LOGGER.error("Failed to delete %s: %s", claimed, e)
+        return TrashResult(errors=[f"Failed to delete {claimed}: {e}"])
+    _LOGGER.info("Deleted %s from trash (%d entries)", claimed.name, entries)
+    return TrashResult(deleted_items=1, deleted_entries=entries)
+
+
+def empty_trash_once(queue: TrashQueue, executor: ThreadPoolExecutor, limiter: RateLimiter) -> TrashResult:
+    """Claim everything currently pending and delete it in parallel.
+
+    Items put in the trash while this runs are left for the next call.
+    """
+    result = TrashResult()
+    claimed = [path for path in map(queue.claim, queue.pending()) if path]
+    for item_result in executor.map(lambda path: _delete_claimed(path, limiter), claimed):
+        result.add(item_result)
+    return result
+
+
+def empty_trash(
+    queue: TrashQueue,
+    max_workers: int = DEFAULT_TRASH_WORKERS,
+    max_deletes_per_second: float | None = DEFAULT_MAX_DELETES_PER_SECOND,
+) -> TrashResult:
+    """Delete everything in the trash, including items whose earlier deletion was interrupted."""
+    limiter = RateLimiter(max_deletes_per_second)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return empty_trash_once(queue, executor, limiter)
+
+
+class BackgroundTrashEmptier:
+    """Empties a trash queue on background threads while other work carries on.
+
+    Use as a context manager around a batch of work that puts items in the trash. On exit
+    the trash is emptied of everything queued so far; anything left over (e.g. if the
+    process is killed) stays queued for next time or for `ce cefs empty-trash`.
+    """
+
+    def __init__(
+        self,
+        queue: TrashQueue,
+        max_workers: int = DEFAULT_TRASH_WORKERS,
+        max_deletes_per_second: float | None = DEFAULT_MAX_DELETES_PER_SECOND,
+        poll_seconds: float = 5.0,
+    ):
+        self.queue = queue
+        self.result = TrashResult()
+        self._limiter = RateLimiter(max_deletes_per_second)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="trash")
+        self._poll_seconds = poll_seconds
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="trash-emptier", daemon=True)
+
+    def _run(self) -> None:
+        while True:
+            stopping = self._stop.is_set()
+            try:
+                self.result.add(empty_trash_once(self.queue, self._executor, self._limiter))
+            except OSError as e:
+                _LOGGER.error("Failed to empty trash %s: %s", self.queue.root, e)
+                self.result.errors.append(str(e))
+            if stopping:
+                return
+            self._stop.wait(self._poll_seconds)
+
+    def __enter__(self) -> BackgroundTrashEmptier:
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        _LOGGER.info("Waiting for trash to be emptied...")
+        self._stop.set()
+        self._thread.join()
+        self._executor.shutdown()
+        _LOGGER.info(
+            "Emptied trash: %d items (%d entries) deleted, %d errors",
+            self.result.deleted_items,
+            self.result.deleted_entries,
+            len(self.result.errors),
+        )
@@ -7,45 +7,52 @@ import datetime
 import logging
 import shutil
 import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
 from pathlib import Path
 
 from lib.cefs.deployment import backup_and_symlink, deploy_to_cefs_transactional
-from lib.cefs.paths import get_cefs_filename_for_image, get_cefs_paths, parse_cefs_target
+from lib.cefs.paths import get_cefs_filename_for_image, get_cefs_paths, get_directory_size, parse_cefs_target
+from lib.cefs.sizes import ImageSizeCache
 from lib.cefs_manifest import create_installable_manifest_entry, create_manifest
 from lib.config import SquashfsConfig
-from lib.squashfs import create_squashfs_image, extract_squashfs_relocating_subdir
+from lib.squashfs import (
+    SquashfsError,
+    create_squashfs_image,
+    extract_squashfs_paths,
+    extract_squashfs_relocating_subdir,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
+# mksquashfs is multithreaded itself, and unpacks mostly wait on NFS, so a few at once is plenty
+DEFAULT_UNPACK_WORKERS = 4
 
-def unpack_cefs_item(
-    installable_name: str,
-    nfs_path: Path,
-    cefs_image_dir: Path,
-    mount_point: Path,
-    squashfs_config: SquashfsConfig,
-    defer_cleanup: bool,
-    dry_run: bool,
-) -> bool:
-    """Unpack a CEFS image to a real directory for in-place modifications.
 
-    Extracts the CEFS image and replaces the symlink with the actual directory.
-    The original symlink is saved as .bak for rollback.
+@dataclass(frozen=True)
+class UnpackItem:
+    """An installable to unpack, and where its contents are in which image."""
 
-    Args:
-        installable_name: Full installable name (for logging)
-        nfs_path: Path to the NFS installation (currently a symlink to CEFS)
-        cefs_image_dir: Base directory for CEFS images
-        mount_point: CEFS mount point
-        squashfs_config: Squashfs configuration for extraction
-        defer_cleanup: If True, rename old .bak to .DELETE_ME instead of deleting
-        dry_run: If True, only log what would be done
+    name: str
+    nfs_path: Path
+    symlink_target: Path  # Where nfs_path pointed when planned; it must still point there to be swapped
+    image_path: Path
+    extraction_path: Path | None  # Subdirectory within a consolidated image, or None for the whole image
 
-    Returns:
-        True if successful, False otherwise
+
+@dataclass
+class BatchResult:
+    """Outcome of unpacking or repacking several installables."""
+
+    successful: list[str] = field(default_factory=list)
+    failed: dict[str, str] = field(default_factory=dict)
+
+
+def plan_unpack(installable_name: str, nfs_path: Path, cefs_image_dir: Path, mount_point: Path) -> UnpackItem:
+    """Work out which image (and which part of it) an installable's CEFS symlink points to.
 
     Raises:
-        RuntimeError: If unpacking fails
+        RuntimeError: If nfs_path isn't a CEFS symlink or its image is missing
     """
     # Verify it's a CEFS symlink
     if not nfs_path.is_symlink():
@@ -65,10 +72,6 @@ def unpack_cefs_item(
     if not cefs_image_path.exists():
         raise RuntimeError(f"CEFS image not found: {cefs_image_path}")
 
-    _LOGGER.info("Unpacking %s from %s", installable_name, cefs_image_path)
-    if is_consolidated:
-        _LOGGER.info("This is from a consolidated image, will extract only the needed subdirectory")
-
     # Determine what to extract
     extraction_path = None
     if is_consolidated:
@@ -78,55 +81,225 @@ def unpack_cefs_item(
         mount_parts = mount_point.parts
         if len(parts) > len(mount_parts) + 2:
             extraction_path = Path(*parts[len(mount_parts) + 2 :])
-            _LOGGER.debug("Will extract subdirectory: %s", extraction_path)
 
-    if dry_run:
-        _LOGGER.info("DRY RUN: Would unpack %s to %s", cefs_image_path, nfs_path)
-        if extraction_path:
-            _LOGGER.info("DRY RUN: Would extract only: %s", extraction_path)
-        return True
+    return UnpackItem(installable_name, nfs_path, symlink_target, cefs_image_path, extraction_path)
 
-    # Create temp directory for extraction with unique name
-    temp_name = f"{nfs_path.name}.UNPACK_{uuid.uuid4().hex[:8]}"
-    temp_path = nfs_path.parent / temp_name
 
-    try:
-        # Extract to temp directory
-        _LOGGER.info("Extracting to temporary location: %s", temp_path)
-        extract_squashfs_relocating_subdir(squashfs_config, cefs_image_path, temp_path, extraction_path)
+def _unpack_temp_path(nfs_path: Path) -> Path:
+    return nfs_path.parent / f"{nfs_path.name}.UNPACK_{uuid.uuid4().hex[:8]}"
 
-        backup_path = nfs_path.with_name(nfs_path.name + ".bak")
 
-        # Handle old .bak if it exists
-        if backup_path.exists(follow_symlinks=False):
-            if defer_cleanup:
-                timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-                delete_me_path = nfs_path.with_name(f"{nfs_path.name}.DELETE_ME_{timestamp}")
-                backup_path.rename(delete_me_path)
-                _LOGGER.info("Renamed old backup %s to %s for deferred cleanup", backup_path, delete_me_path)
+def _replace_symlink_with_directory(item: UnpackItem, temp_path: Path, defer_cleanup: bool) -> None:
+    """Swap an extracted directory in for an item's CEFS symlink, keeping the symlink as .bak.
+
+    Raises:
+        RuntimeError: If the symlink changed since the item was planned (e.g. a concurrent install)
+        OSError: If a rename fails
+    """
+    nfs_path = item.nfs_path
+    try:
+        current_target = nfs_path.readlink()
+    except OSError as e:
+        raise RuntimeError(f"{nfs_path} is no longer a symlink: {e}") from e
+    if current_target != item.symlink_target:
+        raise RuntimeError(f"{nfs_path} changed during unpack (now points to {current_target})")
+
+    backup_path = nfs_path.with_name(nfs_path.name + ".bak")
+
+    # Handle old .bak if it exists
+    if backup_path.exists(follow_symlinks=False):
+        if defer_cleanup:
+            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            delete_me_path = nfs_path.with_name(f"{nfs_path.name}.DELETE_ME_{timestamp}")
+            backup_path.rename(delete_me_path)
+            _LOGGER.info("Renamed old backup %s to %s for deferred cleanup", backup_path, delete_me_path)
+        else:
+            if backup_path.is_symlink():
+                backup_path.unlink()
             else:
-                if backup_path.is_symlink():
-                    backup_path.unlink()
-                else:
-                    shutil.rmtree(backup_path)
-                _LOGGER.debug("Removed old backup: %s", backup_path)
+                shutil.rmtree(backup_path)
+            _LOGGER.debug("Removed old backup: %s", backup_path)
 
-        # Atomic rename sequence: symlink → .bak, temp → main
-        _LOGGER.info("Replacing symlink with unpacked directory")
-        nfs_path.rename(backup_path)
-        _LOGGER.debug("Renamed symlink %s to %s", nfs_path, backup_path)
+    # Atomic rename sequence: symlink → .bak, temp → main
+    _LOGGER.info("Replacing symlink with unpacked directory")
+    nfs_path.rename(backup_path)
+    _LOGGER.debug("Renamed symlink %s to %s", nfs_path, backup_path)
 
-        temp_path.rename(nfs_path)
-        _LOGGER.info("Unpacked %s successfully", installable_name)
+    temp_path.rename(nfs_path)
+    _LOGGER.info("Unpacked %s successfully", item.name)
 
-        return True
+
+def _unpack_planned_item(squashfs_config: SquashfsConfig, item: UnpackItem, defer_cleanup: bool) -> None:
+    # Create temp directory for extraction with unique name
+    temp_path = _unpack_temp_path(item.nfs_path)
+
+    try:
+        # Extract to temp directory
+        _LOGGER.info("Extracting to temporary location: %s", temp_path)
+        extract_squashfs_relocating_subdir(squashfs_config, item.image_path, temp_path, item.extraction_path)
+        _replace_symlink_with_directory(item, temp_path, defer_cleanup)
 
     except Exception as e:
         # Clean up temp directory on failure
         if temp_path.exists():
             shutil.rmtree(temp_path)
             _LOGGER.debug("Cleaned up temp directory: %s", temp_path)
-        raise RuntimeError(f"Failed to unpack {installable_name}: {e}") from e
+        raise RuntimeError(f"Failed to unpack {item.name}: {e}") from e
+
+
+def unpack_cefs_item(
+    installable_name: str,
+    nfs_path: Path,
+    cefs_image_dir: Path,
+    mount_point: Path,
+    squashfs_config: SquashfsConfig,
+    defer_cleanup: bool,
+    dry_run: bool,
+) -> bool:
+    """Unpack a CEFS image to a real directory for in-place modifications.
+
+    Extracts the CEFS image and replaces the symlink with the actual directory.
+    The original symlink is saved as .bak for rollback.
+
+    Args:
+        installable_name: Full installable name (for logging)
+        nfs_path: Path to the NFS installation (currently a symlink to CEFS)
+        cefs_image_dir: Base directory for CEFS images
+        mount_point: CEFS mount point
+        squashfs_config: Squashfs configuration for extraction
+        defer_cleanup: If True, rename old .bak to .DELETE_ME instead of deleting
+        dry_run: If True, only log what would be done
+
+    Returns:
+        True if successful, False otherwise
+
+    Raises:
+        RuntimeError: If unpacking fails
+    """
+    item = plan_unpack(installable_name, nfs_path, cefs_image_dir, mount_point)
+
+    _LOGGER.info("Unpacking %s from %s", installable_name, item.image_path)
+    if item.extraction_path:
+        _LOGGER.info("This is from a consolidated image, will extract only the needed subdirectory")
+        _LOGGER.debug("Will extract subdirectory: %s", item.extraction_path)
+
+    if dry_run:
+        _LOGGER.info("DRY RUN: Would unpack %s to %s", item.image_path, nfs_path)
+        if item.extraction_path:
+            _LOGGER.info("DRY RUN: Would extract only: %s", item.extraction_path)
+        return True
+
+    _unpack_planned_item(squashfs_config, item, defer_cleanup)
+    return True
+
+
+def group_unpack_items(items: list[UnpackItem]) -> list[list[UnpackItem]]:
+    """Group items that can share one extraction.
+
+    Subdirectories of the same consolidated image that are unpacked into the same directory are
+    extracted together (and can then be moved into place by rename); every other item is on its own.
+    """
+    shared: dict[tuple[Path, Path], list[UnpackItem]] = {}
+    groups = []
+    for item in items:
+        if item.extraction_path is None:
+            groups.append([item])
+        else:
+            shared.setdefault((item.image_path, item.nfs_path.parent), []).append(item)
+    return list(shared.values()) + groups
+
+
+def _unpack_shared_group(
+    squashfs_config: SquashfsConfig, group: list[UnpackItem], defer_cleanup: bool
+) -> dict[str, str | None]:
+    """Extract every item of a group with one unsquashfs run, then swap each one in.
+
+    Returns:
+        Item name to error message, or None if it was unpacked
+    """
+    image_path = group[0].image_path
+    shared_dir = group[0].nfs_path.parent / f".UNPACK_{image_path.stem}_{uuid.uuid4().hex[:8]}"
+    outcomes: dict[str, str | None] = {}
+    try:
+        _LOGGER.info("Extracting %d items from %s to %s", len(group), image_path.name, shared_dir)
+        extract_squashfs_paths(
+            squashfs_config, image_path, shared_dir, [item.extraction_path for item in group if item.extraction_path]
+        )
+        for item in group:
+            assert item.extraction_path is not None
+            temp_path = _unpack_temp_path(item.nfs_path)
+            try:
+                extracted = shared_dir / item.extraction_path
+                if not extracted.is_dir():
+                    raise RuntimeError(f"Expected extracted subdirectory not found: {extracted}")
+                extracted.rename(temp_path)
+                _replace_symlink_with_directory(item, temp_path, defer_cleanup)
+                outcomes[item.name] = None
+            except (OSError, RuntimeError) as e:
+                if temp_path.exists():
+                    shutil.rmtree(temp_path)
+                outcomes[item.name] = str(e)
+    except (OSError, SquashfsError) as e:
+        for item in group:
+            outcomes.setdefault(item.name, str(e))
+    finally:
+        if shared_dir.exists():
+            shutil.rmtree(shared_dir)
+    return outcomes
+
+
+def _unpack_group(
+    squashfs_config: SquashfsConfig, group: list[UnpackItem], defer_cleanup: bool
+) -> dict[str, str | None]:
+    if len(group) > 1:
+        return _unpack_shared_group(squashfs_config, group, defer_cleanup)
+    try:
+        _unpack_planned_item(squashfs_config, group[0], defer_cleanup)
+    except RuntimeError as e:
+        return {group[0].name: str(e)}
+    return {group[0].name: None}
+
+
+def required_unpack_bytes(items: list[UnpackItem], size_cache: ImageSizeCache) -> int:
+    """Space the unpacked items will take up, from their images' metadata.
+
+    Raises:
+        OSError, SquashfsError: If an image's metadata can't be read
+    """
+    return sum(size_cache.get(item.image_path).bytes_under(item.extraction_path) for item in items)
+
+
+def unpack_cefs_items(
+    items: list[UnpackItem],
+    squashfs_config: SquashfsConfig,
+    defer_cleanup: bool,
+    dry_run: bool,
+    max_workers: int = DEFAULT_UNPACK_WORKERS,
+) -> BatchResult:
+    """Unpack planned items concurrently, extracting shared consolidated images once.
+
+    Each item's symlink is swapped for its directory with the same rename sequence as
+    unpack_cefs_item(), and only if it still points where it did when planned.
+    """
+    result = BatchResult()
+    if dry_run:
+        for item in items:
+            _LOGGER.info("DRY RUN: Would unpack %s from %s", item.name, item.image_path)
+            result.successful.append(item.name)
+        return result
+
+    groups = group_unpack_items(items)
+    _LOGGER.info("Unpacking %d items from %d extractions with %d workers", len(items), len(groups), max_workers)
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="unpack") as executor:
+        futures = [executor.submit(_unpack_group, squashfs_config, group, defer_cleanup) for group in groups]
+        for future in as_completed(futures):
+            for name, error in future.result().items():
+                if error is None:
+                    result.successful.append(name)
+                else:
+                    _LOGGER.error("Failed to unpack %s: %s", name, error)
+                    result.failed[name] = error
+    return result
 
 
 def repack_cefs_item(
@@ -215,3 +388,52 @@ def repack_cefs_item(
         if repack_dir.exists():
             shutil.rmtree(repack_dir)
             _LOGGER.debug("Cleaned up repack directory: %s", repack_dir)
+
+
+def required_repack_bytes(directories: list[Path], max_workers: int) -> int:
+    """Local temp space needed to repack directories max_workers at a time.
+
+    An image is no bigger than the directory it's built from, and each is deleted once deployed,
+    so at most the max_workers largest directories' worth is needed at once.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        sizes = sorted(executor.map(get_directory_size, directories), reverse=True)
+    return sum(sizes[:max_workers])
+
+
+def repack_cefs_items(
+    items: list[tuple[str, Path]],
+    cefs_image_dir: Path,
+    mount_point: Path,
+    squashfs_config: SquashfsConfig,
+    local_temp_dir: Path,
+    defer_cleanup: bool,
+    dry_run: bool,
+    max_workers: int = DEFAULT_UNPACK_WORKERS,
+) -> BatchResult:
+    """Repack several (installable name, directory) items concurrently with repack_cefs_item()."""
+    result = BatchResult()
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="repack") as executor:
+        futures = {
+            executor.submit(
+                repack_cefs_item,
+                name,
+                nfs_path,
+                cefs_image_dir,
+                mount_point,
+                squashfs_config,
+                local_temp_dir,
+                defer_cleanup,
+                dry_run,
+            ): name
+            for name, nfs_path in items
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                future.result()
+                result.successful.append(name)
+            except RuntimeError as e:
+                _LOGGER.error("Failed to repack %s: %s", name, e)
+                result.failed[name] = str(e)
+    return result
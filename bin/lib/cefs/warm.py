@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""Prefetching of the most used CEFS images, so the first compile after a mount isn't slow."""
+
+from __future__ import annotations
+
+import logging
+import os
+import stat
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from lib.cefs.trash import RateLimiter
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_WARM_TOP = 20
+DEFAULT_WARM_WORKERS = 8
+DEFAULT_MAX_BANDWIDTH = 100 * 1024 * 1024
+DEFAULT_MAX_BYTES_PER_IMAGE = 2 * 1024 * 1024 * 1024
+
+# File list written by `ce cefs warm --write-list` for nodes to prefetch at startup (see start-support.sh)
+WARM_LIST_FILENAME = ".cefs-warm-list"
+
+# Parts of an installation read by nearly every compile, relative to its install directory
+HOT_PATTERNS = (
+    "bin/*",
+    "libexec/gcc/*/*/cc1*",
+    "libexec/gcc/*/*/collect2",
+    "lib/gcc/*/*/include/**/*",
+    "include/c++/**/*",
+    "lib/clang/*/include/**/*",
+)
+
+_READ_CHUNK = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class WarmTarget:
+    """A CEFS image worth warming, with the installations in it that are used."""
+
+    mount_path: Path  # {mount_point}/XX/HASH
+    install_dirs: tuple[Path, ...]  # Installation directories inside the mount
+    exes: tuple[Path, ...]  # Used compiler executables, as paths inside the mount
+    usage: int
+
+
+@dataclass
+class WarmResult:
+    """Outcome of warming images."""
+
+    images: int = 0
+    files: int = 0
+    bytes_read: int = 0
+    errors: list[str] = field(default_factory=list)
+
+
+def _find_cefs_link(exe: Path, nfs_dir: Path, mount_point: Path) -> tuple[Path, Path] | None:
+    """Find the installation symlink an executable is reached through.
+
+    Returns:
+        Tuple of (symlink target inside the mount, exe path inside the mount), or None if the
+        executable isn't installed in CEFS
+    """
+    try:
+        relative = exe.relative_to(nfs_dir)
+    except ValueError:
+        return None
+    link = nfs_dir
+    for index, part in enumerate(relative.parts[:-1]):
+        link = link / part
+        if not link.is_symlink():
+            continue
+        target = link.readlink()
+        if not target.is_absolute():
+            target = link.parent / target
+        if not target.is_relative_to(mount_point):
+            return None
+        return target, target.joinpath(*relative.parts[index + 1 :])
+    return None
+
+
+def find_warm_targets(
+    usage: dict[str, int],
+    exe_to_compiler_ids: dict[str, set[str]],
+    nfs_dir: Path,
+    mount_point: Path,
+) -> list[WarmTarget]:
+    """Rank the CEFS images by how much their compilers are used.
+
+    Only the NFS symlinks are read; no images are mounted.
+
+    Args:
+        usage: Compiler id to times used (see load_compiler_usage)
+        exe_to_compiler_ids: Executable path to compiler ids (see CompilerIdLookup.get_all_mappings)
+        nfs_dir: NFS installation directory (e.g. /opt/compiler-explorer)
+        mount_point: CEFS mount point (e.g. /cefs)
+
+    Returns:
+        Images with any usage, most used first
+    """
+    image_usage: dict[Path, int] = defaultdict(int)
+    install_dirs: dict[Path, set[Path]] = defaultdict(set)
+    exes: dict[Path, set[Path]] = defaultdict(set)
+    mount_depth = len(mount_point.parts) + 2
+    for exe_path, compiler_ids in exe_to_compiler_ids.items():
+        times_used = sum(usage.get(compiler_id, 0) for compiler_id in compiler_ids)
+        if not times_used:
+            continue
+        found = _find_cefs_link(Path(exe_path), nfs_dir, mount_point)
+        if found is None:
+            continue
+        install_dir, exe = found
+        if len(install_dir.parts) < mount_depth:
+            _LOGGER.debug("Ignoring malformed CEFS symlink target %s", install_dir)
+            continue
+        mount_path = Path(*install_dir.parts[:mount_depth])
+        image_usage[mount_path] += times_used
+        install_dirs[mount_path].add(install_dir)
+        exes[mount_path].add(exe)
+
+    return [
+        WarmTarget(
+            mount_path=mount_path,
+            install_dirs=tuple(sorted(install_dirs[mount_path])),
+            exes=tuple(sorted(exes[mount_path])),
+            usage=times_used,
+        )
+        for mount_path, times_used in sorted(image_usage.items(), key=lambda kv: (-kv[1], kv[0]))
+    ]
+
+
+def list_hot_files(target: WarmTarget, max_bytes: int | None) -> list[tuple[Path, int]]:
+    """List the files to read to warm an image, mounting it if needed.
+
+    The used executables come first, then HOT_PATTERNS in each installation, up to max_bytes.
+
+    Returns:
+        List of (path, size)
+
+    Raises:
+        OSError: If the image can't be mounted
+    """
+    os.listdir(target.mount_path)  # Triggers the autofs mount
+    candidates = [
+        *target.exes,
+        *(
+            path
+            for install_dir in target.install_dirs
+            for pattern in HOT_PATTERNS
+            for path in install_dir.glob(pattern)
+        ),
+    ]
+    files = []
+    seen = set()
+    total = 0
+    for path in candidates:
+        if path in seen:
+            continue
+        seen.add(path)
+        if path.is_symlink() and path not in target.exes:
+            continue  # Symlinked files are read through their targets
+        try:
+            file_stat = path.stat()
+        except OSError:
+            continue
+        if not stat.S_ISREG(file_stat.st_mode):
+            continue
+        if max_bytes is not None and total + file_stat.st_size > max_bytes:
+            _LOGGER.debug("Stopping at %s for %s: reached %d bytes", path, target.mount_path, total)
+            break
+        files.append((path, file_stat.st_size))
+        total += file_stat.st_size
+    return files
+
+
+def read_file(path: Path, limiter: RateLimiter) -> int:
+    """Read a file and discard the contents, so it's in the page cache.
+
+    Returns:
+        Number of bytes read
+
+    Raises:
+        OSError: If the file can't be read
+    """
+    bytes_read = 0
+    buffer = bytearray(_READ_CHUNK)
+    with path.open("rb", buffering=0) as f:
+        while count := f.readinto(buffer):
+            bytes_read += count
+            limiter.wait(count)
+    return bytes_read
+
+
+def warm_images(
+    targets: list[WarmTarget],
+    max_workers: int = DEFAULT_WARM_WORKERS,
+    max_bytes_per_second: int | None = DEFAULT_MAX_BANDWIDTH,
+    max_bytes_per_image: int | None = DEFAULT_MAX_BYTES_PER_IMAGE,
+) -> WarmResult:
+    """Mount images and read their hot files in parallel, most used images first.
+
+    All images are mounted (and their file lists made) first, then every file is read with
+    max_workers threads sharing a max_bytes_per_second budget.
+
+    Returns:
+        WarmResult; errors don't stop the other images from being warmed
+    """
+    result = WarmResult()
+    limiter = RateLimiter(max_bytes_per_second)
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="warm") as executor:
+
+        def plan(target: WarmTarget) -> list[tuple[Path, int]]:
+            try:
+                return list_hot_files(target, max_bytes_per_image)
+            except OSError as e:
+                _LOGGER.warning("Failed to mount %s: %s", target.mount_path, e)
+                result.errors.append(f"Failed to mount {target.mount_path}: {e}")
+                return []
+
+        file_lists = list(executor.map(plan, targets))
+        result.images = sum(1 for files in file_lists if files)
+
+        def read(path: Path) -> int:
+            try:
+                return read_file(path, limiter)
+            except OSError as e:
+                _LOGGER.warning("Failed to read %s: %s", path, e)
+                result.errors.append(f"Failed to read {path}: {e}")
+                return -1
+
+        paths = [path for files in file_lists for path, _ in files]
+        for bytes_read in executor.map(read, paths):
+            if bytes_read >= 0:
+                result.files += 1
+                result.bytes_read += bytes_read
+    return result
+
+
+def write_warm_list(path: Path, targets: list[WarmTarget], max_bytes_per_image: int | None) -> int:
+    """Write the hot files of the targets to path, one per line, for nodes without `ce` to read.
+
+    Returns:
+        Number of files written
+
+    Raises:
+        OSError: If the list can't be written
+    """
+    lines: list[str] = []
+    for target in targets:
+        try:
+            lines.extend(str(file) for file, _ in list_hot_files(target, max_bytes_per_image))
+        except OSError as e:
+            _LOGGER.warning("Skipping %s: %s", target.mount_path, e)
+    temp_path = path.with_name(f"{path.name}.tmp")
+    temp_path.write_text("".join(f"{line}\n" for line in lines), encoding="utf-8")
+    temp_path.replace(path)
+    return len(lines)
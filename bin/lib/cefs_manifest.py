@@ -53,8 +53,9 @@ class CEFSManifest(BaseModel):
     git_sha: str = Field(..., description="Git SHA of the code that created this")
     command: list[str] = Field(..., description="Command that created this image")
     description: str = Field(..., description="Human-readable description")
-    operation: str = Field(..., description="Operation type: install, convert, or consolidate")
+    operation: str = Field(..., description="Operation type: install, convert, consolidate or recompress")
     contents: list[ManifestContentEntry] = Field(..., description="List of contents in this image")
+    compression_profile: str | None = Field(None, description="Compression profile, if not the default")
 
     @field_validator("version")
     @classmethod
@@ -68,7 +69,7 @@ class CEFSManifest(BaseModel):
     @classmethod
     def validate_operation(cls, v: str) -> str:
         """Validate operation type."""
-        valid_operations = {"install", "convert", "consolidate"}
+        valid_operations = {"install", "convert", "consolidate", "recompress"}
         if v not in valid_operations:
             raise ValueError(f"Invalid operation '{v}': must be one of {valid_operations}")
         return v
@@ -191,7 +192,7 @@ def generate_cefs_filename(hash: str, operation: str, path: Path | None = None)
 
     Args:
         hash: 24-character hash
-        operation: Operation type ("install", "convert", "consolidate")
+        operation: Operation type ("install", "convert", "consolidate", "recompress")
         path: Path information for suffix (optional)
 
     Returns:
@@ -223,14 +224,16 @@ def create_manifest(
     description: str,
     contents: list[dict[str, str]],
     command: list[str] | None = None,
+    compression_profile: str | None = None,
 ) -> dict[str, Any]:
     """Create a manifest dictionary for a CEFS image.
 
     Args:
-        operation: Type of operation ("install", "convert", "consolidate")
+        operation: Type of operation ("install", "convert", "consolidate", "recompress")
         description: Human-readable description of what this image contains
         contents: List of installable contents, each with name, target, destination
         command: Command-line that created this image (defaults to sys.argv)
+        compression_profile: Compression profile the image was built with (omitted for the default)
 
     Returns:
         Manifest dictionary ready for YAML serialization
@@ -257,6 +260,8 @@ def create_manifest(
         "operation": operation,
         "contents": contents,
     }
+    if compression_profile is not None:
+        manifest["compression_profile"] = compression_profile
 
     return manifest
 
@@ -3,7 +3,10 @@
 
 from __future__ import annotations
 
+import contextlib
 import datetime
+import itertools
+import json
 import logging
 import shutil
 import subprocess
@@ -14,25 +17,58 @@ from pathlib import Path
 
 import click
 import humanfriendly
+import yaml
 
 from lib.ce_install import CliContext, cli
 from lib.cefs.consolidation import (
+    EXTRACTION_SPACE_MULTIPLIER,
+    STREAMING_SPACE_MULTIPLIER,
     ConsolidationCandidate,
     pack_items_into_groups,
     process_consolidation_group,
     validate_space_requirements,
 )
 from lib.cefs.constants import DEFAULT_MIN_AGE
-from lib.cefs.conversion import convert_to_cefs
-from lib.cefs.deployment import snapshot_symlink_targets
+from lib.cefs.conversion import DEFAULT_CONVERT_WORKERS, ConversionItem, ConversionJournal, bulk_convert
+from lib.cefs.dedupe import (
+    DEFAULT_MAX_PAIR_FANOUT,
+    build_dedupe_report,
+    collect_dedupe_images,
+    index_image_files,
+    read_suggested_groups,
+    suggest_dedupe_groups,
+    write_suggested_groups,
+)
+from lib.cefs.deployment import check_temp_space_available, snapshot_symlink_targets
 from lib.cefs.formatting import (
     format_image_contents_string,
     format_usage_statistics,
     get_image_description,
     get_installable_current_locations,
 )
-from lib.cefs.fsck import FSCKResults, run_fsck_validation
+from lib.cefs.fsck import (
+    DEFAULT_FSCK_WORKERS,
+    FSCK_LAST_RUN_FILENAME,
+    FSCKResults,
+    ManifestCheck,
+    fsck_report_records,
+    is_clean_baseline,
+    read_last_success,
+    record_success,
+    run_fsck_validation,
+)
 from lib.cefs.gc import cleanup_bak_items, delete_image_with_manifest, filter_images_by_age, find_bak_candidates
+from lib.cefs.local_cache import LOCAL_CACHE_SCRIPT, MOUNT_OPTIONS
+from lib.cefs.packing import (
+    COMPILER_USAGE_URL,
+    HOT_USAGE_SHARE,
+    compute_item_heat,
+    format_packing_score,
+    load_compiler_usage,
+    pack_items_by_affinity,
+    pack_items_with_suggestions,
+    score_packing,
+)
 from lib.cefs.paths import (
     FileWithAge,
     get_cefs_mount_path,
@@ -40,6 +76,15 @@ from lib.cefs.paths import (
     parse_cefs_target,
     validate_cefs_mount_point,
 )
+from lib.cefs.recompress import (
+    DEFAULT_BENCHMARK_SAMPLES,
+    DEFAULT_PROFILE,
+    assign_profiles,
+    benchmark_profiles,
+    compute_image_usage,
+    plan_recompression,
+    select_sample_files,
+)
 from lib.cefs.repair import (
     InProgressTransaction,
     RepairAction,
@@ -48,8 +93,43 @@ from lib.cefs.repair import (
     perform_delete,
     perform_finalize,
 )
+from lib.cefs.simulate import (
+    SimulationParams,
+    project,
+    read_snapshot,
+    run_simulation,
+    take_snapshot,
+    write_snapshot,
+)
+from lib.cefs.sizes import SIZE_CACHE_FILENAME, ImageSizeCache
 from lib.cefs.state import CEFSState
-from lib.cefs.unpack import repack_cefs_item, unpack_cefs_item
+from lib.cefs.trash import (
+    DEFAULT_MAX_DELETES_PER_SECOND,
+    DEFAULT_TRASH_WORKERS,
+    TRASH_DIR_NAME,
+    TrashQueue,
+    empty_trash,
+)
+from lib.cefs.unpack import (
+    DEFAULT_UNPACK_WORKERS,
+    UnpackItem,
+    plan_unpack,
+    repack_cefs_items,
+    required_repack_bytes,
+    required_unpack_bytes,
+    unpack_cefs_items,
+)
+from lib.cefs.warm import (
+    DEFAULT_WARM_TOP,
+    DEFAULT_WARM_WORKERS,
+    WARM_LIST_FILENAME,
+    find_warm_targets,
+    warm_images,
+    write_warm_list,
+)
+from lib.compiler_id_lookup import get_compiler_id_lookup
+from lib.config import CefsConfig
+from lib.squashfs import SquashfsError, extract_squashfs_image
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -179,49 +259,94 @@ def status(context, show_usage: bool, verbose: bool, show_broken: bool):
     is_flag=True,
     help="Rename old .bak directories to .DELETE_ME_<timestamp> instead of deleting them immediately",
 )
+@click.option(
+    "--max-workers",
+    default=DEFAULT_CONVERT_WORKERS,
+    show_default=True,
+    type=int,
+    help="Number of images to hash and copy in parallel",
+)
+@click.option(
+    "--max-in-flight",
+    default="8G",
+    show_default=True,
+    help="Maximum total size of images being hashed and copied at once",
+)
+@click.option(
+    "--journal",
+    type=click.Path(path_type=Path, dir_okay=False),
+    help="Record each item's outcome in this JSONL file, and skip items it already has as converted",
+)
 @click.argument("filter_", metavar="FILTER", nargs=-1)
-def convert(context: CliContext, filter_: list[str], force: bool, defer_backup_cleanup: bool):
-    """Convert squashfs images to CEFS format for targets matching FILTER."""
+def convert(
+    context: CliContext,
+    filter_: list[str],
+    force: bool,
+    defer_backup_cleanup: bool,
+    max_workers: int,
+    max_in_flight: str,
+    journal: Path | None,
+):
+    """Convert squashfs images to CEFS format for targets matching FILTER.
+
+    Images are hashed and copied to CEFS storage in parallel; each symlink swap then happens
+    on its own, in order. Use --journal to be able to restart an interrupted conversion.
+    """
     if not validate_cefs_mount_point(context.config.cefs.mount_point):
         _LOGGER.error("CEFS mount point validation failed. Run 'ce cefs setup' first.")
         raise click.ClickException("CEFS not properly configured")
 
+    try:
+        max_in_flight_bytes = humanfriendly.parse_size(max_in_flight, binary=True)
+    except humanfriendly.InvalidSize as e:
+        raise click.ClickException(str(e)) from e
+
     installables = context.get_installables(filter_)
 
     if not installables:
         _LOGGER.warning("No installables match filter: %s", " ".join(filter_))
         return
 
-    successful = 0
-    failed = 0
+    items = []
     skipped = 0
-
     for installable in installables:
         if not installable.is_squashable:
             _LOGGER.debug("Skipping non-squashable: %s", installable.name)
             skipped += 1
             continue
+        items.append(
+            ConversionItem(
+                installable=installable,
+                nfs_path=context.installation_context.destination / installable.install_path,
+                squashfs_image_path=context.config.squashfs.image_dir / f"{installable.install_path}.img",
+            )
+        )
 
-        _LOGGER.info("Converting %s...", installable.name)
-        squashfs_image_path = context.config.squashfs.image_dir / f"{installable.install_path}.img"
-        if convert_to_cefs(
-            installable,
-            context.installation_context.destination,
-            squashfs_image_path,
-            context.config.squashfs,
-            context.config.cefs,
-            force,
-            defer_backup_cleanup,
-            context.installation_context.dry_run,
-        ):
-            successful += 1
-        else:
-            failed += 1
+    result = bulk_convert(
+        items,
+        context.config.squashfs,
+        context.config.cefs,
+        force,
+        defer_backup_cleanup,
+        context.installation_context.dry_run,
+        max_workers=max_workers,
+        max_bytes_in_flight=max_in_flight_bytes,
+        journal=ConversionJournal(journal),
+    )
 
-    _LOGGER.info("Conversion complete: %d successful, %d failed, %d skipped", successful, failed, skipped)
+    _LOGGER.info(
+        "Conversion complete: %d successful, %d already converted, %d failed, %d skipped, %d done in a previous run",
+        len(result.converted),
+        len(result.already_converted),
+        len(result.failed),
+        skipped,
+        len(result.resumed),
+    )
 
-    if failed > 0:
-        raise click.ClickException(f"Failed to convert {failed} installables")
+    if result.failed:
+        for name, error in result.failed.items():
+            _LOGGER.error("  %s: %s", name, error)
+        raise click.ClickException(f"Failed to convert {len(result.failed)} installables")
 
 
 def _run_setup_command(cmd: list[str], description: str, dry_run: bool) -> None:
@@ -239,6 +364,28 @@ def _run_setup_command(cmd: list[str], description: str, dry_run: bool) -> None:
         subprocess.check_call(cmd)
 
 
+def _autofs_sub_script(cefs_config: CefsConfig) -> str:
+    """The autofs program map mapping an image name to its squashfs mount, via the local cache if configured."""
+    script = 'key="$1"\nsubdir="${key:0:2}"\n'
+    if cefs_config.local_cache_dir:
+        cache_command = [
+            "/usr/bin/python3",
+            str(LOCAL_CACHE_SCRIPT),
+            f"--cache-dir={cefs_config.local_cache_dir}",
+            f"--image-dir={cefs_config.image_dir}",
+        ]
+        if cefs_config.local_cache_max_size:
+            cache_command.append(f"--max-size={cefs_config.local_cache_max_size}")
+        script += (
+            f"if [[ -d {cefs_config.local_cache_dir} ]] && "
+            f'{" ".join(cache_command)} map "${{key}}" 2>/dev/null; then\n'
+            "    exit 0\n"
+            "fi\n"
+        )
+    script += f'echo "{MOUNT_OPTIONS} :{cefs_config.image_dir}/${{subdir}}/${{key}}.sqfs"\n'
+    return f"#!/bin/bash\n{script}"
+
+
 @cefs.command()
 @click.pass_obj
 @click.option("--dry-run", is_flag=True, help="Show what would be done without making changes")
@@ -266,6 +413,14 @@ def setup(context: CliContext, dry_run: bool):
             ["sudo", "mkdir", "-p", str(cefs_mount_point)], f"Creating CEFS mount point: {cefs_mount_point}", dry_run
         )
 
+        # Step 1b: Create the local image cache directory, if there is one
+        if context.config.cefs.local_cache_dir:
+            _run_setup_command(
+                ["sudo", "mkdir", "-p", str(context.config.cefs.local_cache_dir)],
+                f"Creating CEFS local image cache: {context.config.cefs.local_cache_dir}",
+                dry_run,
+            )
+
         # Step 2: Create first-level autofs map file (handles {mount_point}/XX -> nested autofs)
         # Use the mount point name for autofs config files (e.g., /cefs -> auto.cefs, /test/mount -> auto.mount)
         auto_config_base = f"/etc/auto.{cefs_mount_point.name}"
@@ -277,11 +432,7 @@ def setup(context: CliContext, dry_run: bool):
         )
 
         # Step 2b: Create second-level autofs executable script (handles HASH -> squashfs mount)
-        auto_cefs_sub_script = f"""#!/bin/bash
-key="$1"
-subdir="${{key:0:2}}"
-echo "-fstype=squashfs,loop,nosuid,nodev,ro :{cefs_image_dir}/${{subdir}}/${{key}}.sqfs"
-"""
+        auto_cefs_sub_script = _autofs_sub_script(context.config.cefs)
         _run_setup_command(
             ["sudo", "bash", "-c", f"cat > {auto_config_base}.sub << 'EOF'\n{auto_cefs_sub_script}EOF"],
             f"Creating {auto_config_base}.sub script",
@@ -494,6 +645,37 @@ def rollback(context: CliContext, filter_: list[str]):
     type=float,
     help="Consider consolidated images undersized if smaller than max-size * this ratio (default: 0.25)",
 )
+@click.option(
+    "--streaming/--no-streaming",
+    default=False,
+    help="Build consolidated images by streaming source images into mksquashfs instead of extracting "
+    "them to temp space first (needs squashfs-tools 4.6+ and sqfs2tar)",
+)
+@click.option(
+    "--packing",
+    type=click.Choice(["name", "affinity"]),
+    default="name",
+    show_default=True,
+    help="How to pack items into groups: alphabetically by name, or by usage so hot items and related "
+    "versions share images (also logs a simulated comparison of both)",
+)
+@click.option(
+    "--usage-csv",
+    default=COMPILER_USAGE_URL,
+    show_default=True,
+    help="URL or path of the compiler usage CSV used by --packing affinity",
+)
+@click.option(
+    "--groups-from",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    help="YAML of suggested groups (from 'cefs dedupe-report --suggest-groups') to pack first; "
+    "remaining items are packed with --packing",
+)
+@click.option(
+    "--compression-profile",
+    metavar="PROFILE",
+    help="Squashfs compression profile for the consolidated images (see squashfs.profiles in the config)",
+)
 @click.argument("filter_", metavar="[FILTER]", nargs=-1, required=False)
 def consolidate(
     context: CliContext,
@@ -504,6 +686,11 @@ def consolidate(
     reconsolidate: bool,
     efficiency_threshold: float,
     undersized_ratio: float,
+    streaming: bool,
+    packing: str,
+    usage_csv: str,
+    groups_from: Path | None,
+    compression_profile: str | None,
     filter_: list[str],
 ):
     """Consolidate multiple CEFS images into larger consolidated images to reduce mount overhead.
@@ -524,7 +711,8 @@ def consolidate(
 
     try:
         max_size_bytes = humanfriendly.parse_size(max_size, binary=True)
-    except humanfriendly.InvalidSize as e:
+        context.config.squashfs.profile(compression_profile)
+    except (humanfriendly.InvalidSize, ValueError) as e:
         raise click.ClickException(str(e)) from e
 
     all_installables = context.get_installables(filter_)
@@ -644,7 +832,29 @@ def consolidate(
     _LOGGER.info("Found %d total CEFS items for consolidation", len(cefs_items))
 
     # Pack items into groups
-    groups = pack_items_into_groups(cefs_items, max_size_bytes, min_items)
+    groups: list[list[ConsolidationCandidate]] = []
+    remaining_items = cefs_items
+    if groups_from:
+        try:
+            suggestions = read_suggested_groups(groups_from)
+        except (OSError, ValueError, yaml.YAMLError) as e:
+            raise click.ClickException(f"Failed to read suggested groups: {e}") from e
+        groups, remaining_items = pack_items_with_suggestions(cefs_items, suggestions, max_size_bytes, min_items)
+        _LOGGER.info("Packed %d groups from suggestions in %s", len(groups), groups_from)
+
+    if packing == "affinity":
+        try:
+            usage = load_compiler_usage(usage_csv)
+        except (OSError, RuntimeError) as e:
+            raise click.ClickException(str(e)) from e
+        heat = compute_item_heat(cefs_items, usage, get_compiler_id_lookup().get_all_mappings())
+        affinity_groups = groups + pack_items_by_affinity(remaining_items, max_size_bytes, min_items, heat)
+        name_groups = groups + pack_items_into_groups(remaining_items, max_size_bytes, min_items)
+        _LOGGER.info(format_packing_score("Name packing", score_packing(name_groups, heat)))
+        _LOGGER.info(format_packing_score("Affinity packing", score_packing(affinity_groups, heat)))
+        groups = affinity_groups
+    else:
+        groups += pack_items_into_groups(remaining_items, max_size_bytes, min_items)
 
     if not groups:
         _LOGGER.warning("No groups meet consolidation criteria (min %d items, max %s per group)", min_items, max_size)
@@ -653,8 +863,23 @@ def consolidate(
     _LOGGER.info("Created %d consolidation groups", len(groups))
 
     temp_dir = context.config.cefs.local_temp_dir
+    space_multiplier = STREAMING_SPACE_MULTIPLIER if streaming else EXTRACTION_SPACE_MULTIPLIER
+
+    # Uncompressed sizes come from image metadata only (cached per image), so no data is read
+    size_cache = ImageSizeCache(context.config.squashfs, temp_dir / SIZE_CACHE_FILENAME)
+    uncompressed_group_sizes: list[int] | None = None
     try:
-        required_temp_space, largest_group_size = validate_space_requirements(groups, temp_dir)
+        uncompressed_group_sizes = [sum(size_cache.candidate_bytes(item) for item in group) for group in groups]
+    except (OSError, SquashfsError) as e:
+        _LOGGER.warning("Could not read uncompressed sizes from image metadata, estimating instead: %s", e)
+    finally:
+        size_cache.save()
+    _LOGGER.debug("Size cache: %d hits, %d misses", size_cache.hits, size_cache.misses)
+
+    try:
+        required_temp_space, largest_group_size = validate_space_requirements(
+            groups, temp_dir, space_multiplier, None if streaming else uncompressed_group_sizes
+        )
     except RuntimeError as e:
         raise click.ClickException(str(e)) from e
 
@@ -662,19 +887,38 @@ def consolidate(
     total_compressed_size = sum(sum(item.size for item in group) for group in groups)
     for i, group in enumerate(groups):
         group_size = sum(item.size for item in group)
-        _LOGGER.info(
-            "Group %d: %d items, %s compressed", i + 1, len(group), humanfriendly.format_size(group_size, binary=True)
-        )
+        if uncompressed_group_sizes is not None:
+            _LOGGER.info(
+                "Group %d: %d items, %s compressed, %s uncompressed",
+                i + 1,
+                len(group),
+                humanfriendly.format_size(group_size, binary=True),
+                humanfriendly.format_size(uncompressed_group_sizes[i], binary=True),
+            )
+        else:
+            _LOGGER.info(
+                "Group %d: %d items, %s compressed",
+                i + 1,
+                len(group),
+                humanfriendly.format_size(group_size, binary=True),
+            )
         if _LOGGER.isEnabledFor(logging.DEBUG):
             for item in group:
                 _LOGGER.debug("  - %s (%s)", item.name, humanfriendly.format_size(item.size, binary=True))
 
     _LOGGER.info("Total compressed size: %s", humanfriendly.format_size(total_compressed_size, binary=True))
-    _LOGGER.info(
-        "Required temp space: %s (5x largest group: %s)",
-        humanfriendly.format_size(required_temp_space, binary=True),
-        humanfriendly.format_size(largest_group_size, binary=True),
-    )
+    if streaming or uncompressed_group_sizes is None:
+        _LOGGER.info(
+            "Required temp space: %s (%dx largest group: %s)",
+            humanfriendly.format_size(required_temp_space, binary=True),
+            space_multiplier,
+            humanfriendly.format_size(largest_group_size, binary=True),
+        )
+    else:
+        _LOGGER.info(
+            "Required temp space: %s (largest group extracted plus its new image)",
+            humanfriendly.format_size(required_temp_space, binary=True),
+        )
 
     if context.installation_context.dry_run:
         _LOGGER.info("DRY RUN: Would consolidate %d groups", len(groups))
@@ -708,6 +952,8 @@ def consolidate(
             max_parallel_extractions,
             lambda name: context.find_installable_by_exact_name(name),
             context.installation_context.dry_run,
+            streaming,
+            compression_profile,
         )
 
         if success:
@@ -731,7 +977,430 @@ def consolidate(
         raise click.ClickException(f"Failed to consolidate {failed_groups} groups")
 
 
+@cefs.command(name="dedupe-report")
+@click.pass_obj
+@click.option(
+    "--min-file-size",
+    default="16K",
+    show_default=True,
+    help="Ignore files smaller than this (keeps the index small; large duplicates dominate anyway)",
+)
+@click.option("--max-workers", default=4, show_default=True, type=int, help="Number of images to read in parallel")
+@click.option("--top", default=20, show_default=True, type=int, help="Number of image pairs and families to show")
+@click.option(
+    "--suggest-groups",
+    type=click.Path(dir_okay=False, path_type=Path),
+    help="Write suggested consolidation groups to this YAML file (for 'cefs consolidate --groups-from')",
+)
+@click.option(
+    "--min-shared",
+    default="64M",
+    show_default=True,
+    help="Minimum content two images must share to be suggested together",
+)
+@click.option("--max-size", default="20G", show_default=True, help="Maximum combined image size of a suggested group")
+@click.argument("filter_", metavar="[FILTER]", nargs=-1, required=False)
+def dedupe_report(
+    context: CliContext,
+    min_file_size: str,
+    max_workers: int,
+    top: int,
+    suggest_groups: Path | None,
+    min_shared: str,
+    max_size: str,
+    filter_: list[str],
+):
+    """Report file content duplicated across CEFS images.
+
+    Every regular file in each image is hashed by streaming the image (no mount or extraction
+    needed). Reports how many bytes each pair of images and each family of installables
+    (e.g. all gcc versions) have in common, and optionally suggests consolidation groups that
+    would let squashfs dedupe that content.
+
+    FILTER selects images containing a matching installable.
+    """
+    try:
+        min_file_size_bytes = humanfriendly.parse_size(min_file_size, binary=True)
+        min_shared_bytes = humanfriendly.parse_size(min_shared, binary=True)
+        max_size_bytes = humanfriendly.parse_size(max_size, binary=True)
+    except humanfriendly.InvalidSize as e:
+        raise click.ClickException(str(e)) from e
+
+    state = CEFSState(
+        nfs_dir=context.installation_context.destination,
+        cefs_image_dir=context.config.cefs.image_dir,
+        mount_point=context.config.cefs.mount_point,
+    )
+    state.scan_cefs_images_with_manifests()
+    images = collect_dedupe_images(state, filter_)
+    if not images:
+        _LOGGER.warning("No CEFS images found matching filter: %s", " ".join(filter_) if filter_ else "all")
+        return
+
+    click.echo(f"Indexing {len(images)} images...")
+    errors: list[str] = []
+    digests = index_image_files(context.config.squashfs, images, min_file_size_bytes, max_workers, errors)
+    report = build_dedupe_report(images, digests, DEFAULT_MAX_PAIR_FANOUT)
+    report.errors = errors
+
+    image_by_path = {image.path: image for image in images}
+
+    def fmt(size: int) -> str:
+        return humanfriendly.format_size(size, binary=True)
+
+    def describe(path: Path) -> str:
+        names = image_by_path[path].names
+        return f"{path.name} ({', '.join(names)})" if names else path.name
+
+    click.echo(f"\nIndexed {report.files} files in {report.images} images ({fmt(report.total_bytes)} of content)")
+    click.echo(f"Duplicate content across images: {fmt(report.duplicate_bytes)}")
+
+    if report.pair_bytes:
+        click.echo(f"\nTop {top} image pairs by shared content:")
+        for (first, second), shared in sorted(report.pair_bytes.items(), key=lambda kv: -kv[1])[:top]:
+            click.echo(f"  {fmt(shared):>10}  {describe(first)}")
+            click.echo(f"  {'':>10}  {describe(second)}")
+
+    if report.family_bytes:
+        click.echo(f"\nTop {top} families by duplicate content:")
+        for family, duplicated in sorted(report.family_bytes.items(), key=lambda kv: -kv[1])[:top]:
+            click.echo(f"  {fmt(duplicated):>10}  {family}")
+
+    if suggest_groups:
+        groups = suggest_dedupe_groups(images, report, min_shared_bytes, max_size_bytes)
+        write_suggested_groups(suggest_groups, groups)
+        click.echo(f"\nWrote {len(groups)} suggested groups to {suggest_groups}")
+        click.echo(f"Use: ce cefs consolidate --groups-from {suggest_groups}")
+
+    if report.errors:
+        click.echo(f"\n{len(report.errors)} images could not be read:")
+        for error in report.errors:
+            click.echo(f"  {error}")
+
+
+@cefs.command(name="empty-trash")
+@click.pass_obj
+@click.option(
+    "--max-workers", default=DEFAULT_TRASH_WORKERS, show_default=True, type=int, help="Items to delete in parallel"
+)
+@click.option(
+    "--max-deletes-per-second",
+    default=DEFAULT_MAX_DELETES_PER_SECOND,
+    show_default=True,
+    type=float,
+    help="Limit on NFS delete operations per second (0 for no limit)",
+)
+@click.option(
+    "--stale-after",
+    default="1h",
+    show_default=True,
+    help="Take over deletions claimed by another process this long ago (it's assumed to have died)",
+)
+def empty_trash_command(context: CliContext, max_workers: int, max_deletes_per_second: float, stale_after: str):
+    """Delete old installation backups queued in the trash by `ce install --bulk`.
+
+    Also finishes deletions that were interrupted, e.g. by a crash during a bulk install.
+    """
+    try:
+        stale_after_seconds = humanfriendly.parse_timespan(stale_after)
+    except humanfriendly.InvalidTimespan as e:
+        raise click.ClickException(f"Invalid stale-after: {e}") from e
+
+    queue = TrashQueue(context.installation_context.destination / TRASH_DIR_NAME, stale_after_seconds)
+    pending = queue.pending()
+    if not pending:
+        click.echo(f"Trash {queue.root} is empty")
+        return
+    if context.installation_context.dry_run:
+        click.echo(f"Would delete {len(pending)} items from {queue.root}:")
+        for path in pending:
+            click.echo(f"  {path.name}")
+        return
+
+    click.echo(f"Deleting {len(pending)} items from {queue.root}...")
+    result = empty_trash(queue, max_workers, max_deletes_per_second or None)
+    click.echo(f"Deleted {result.deleted_items} items ({result.deleted_entries} files and directories)")
+    if result.errors:
+        for error in result.errors:
+            click.echo(f"  {error}")
+        raise click.ClickException(f"{len(result.errors)} items could not be deleted; they'll be retried next time")
+
+
+@cefs.command()
+@click.pass_obj
+@click.option("--top", default=DEFAULT_WARM_TOP, show_default=True, type=int, help="Number of most used images to warm")
+@click.option(
+    "--usage-csv",
+    default=COMPILER_USAGE_URL,
+    show_default=True,
+    help="URL or path of the compiler usage CSV used to rank images",
+)
+@click.option(
+    "--max-workers", default=DEFAULT_WARM_WORKERS, show_default=True, type=int, help="Files to read in parallel"
+)
+@click.option(
+    "--max-bandwidth", default="100M", show_default=True, help="Limit on bytes read per second (0 for no limit)"
+)
+@click.option(
+    "--max-bytes-per-image",
+    default="2G",
+    show_default=True,
+    help="Limit on bytes read from each image (0 for no limit)",
+)
+@click.option(
+    "--write-list",
+    is_flag=True,
+    help=f"Instead of reading the files, write their paths to {WARM_LIST_FILENAME} in the installation "
+    "directory for nodes to prefetch at startup",
+)
+def warm(
+    context: CliContext,
+    top: int,
+    usage_csv: str,
+    max_workers: int,
+    max_bandwidth: str,
+    max_bytes_per_image: str,
+    write_list: bool,
+):
+    """Mount the most used CEFS images and prefetch their compilers and headers.
+
+    Images are ranked by compiler usage, and the used compiler executables, cc1/cc1plus and
+    the standard headers of each of the top images are read (and discarded) to get them
+    into the page cache. Use after boot or after deploying new images so the first compiles
+    with popular compilers don't pay for cold image reads.
+    """
+    try:
+        max_bandwidth_bytes = humanfriendly.parse_size(max_bandwidth, binary=True)
+        max_image_bytes = humanfriendly.parse_size(max_bytes_per_image, binary=True)
+    except humanfriendly.InvalidSize as e:
+        raise click.ClickException(str(e)) from e
+    try:
+        usage = load_compiler_usage(usage_csv)
+    except (RuntimeError, OSError) as e:
+        raise click.ClickException(str(e)) from e
+
+    targets = find_warm_targets(
+        usage,
+        get_compiler_id_lookup().get_all_mappings(),
+        context.installation_context.destination,
+        context.config.cefs.mount_point,
+    )[:top]
+    if not targets:
+        click.echo("No used CEFS images found")
+        return
+
+    if context.installation_context.dry_run:
+        click.echo(f"Would warm {len(targets)} images:")
+        for target in targets:
+            dirs = ", ".join(str(path.relative_to(target.mount_path)) for path in target.install_dirs)
+            click.echo(f"  {target.usage:>10}  {target.mount_path} ({dirs})")
+        return
+
+    if write_list:
+        list_path = context.installation_context.destination / WARM_LIST_FILENAME
+        count = write_warm_list(list_path, targets, max_image_bytes or None)
+        click.echo(f"Wrote {count} files from {len(targets)} images to {list_path}")
+        return
+
+    click.echo(f"Warming {len(targets)} images...")
+    result = warm_images(targets, max_workers, max_bandwidth_bytes or None, max_image_bytes or None)
+    click.echo(
+        f"Warmed {result.images} images: read {result.files} files "
+        f"({humanfriendly.format_size(result.bytes_read, binary=True)})"
+    )
+    for error in result.errors:
+        click.echo(f"  {error}")
+
+
+@cefs.command()
+@click.pass_obj
+@click.option(
+    "--profile",
+    "forced_profile",
+    metavar="PROFILE",
+    help="Recompress every matching image with this profile, instead of choosing hot/default/cold by usage",
+)
+@click.option(
+    "--usage-csv",
+    default=COMPILER_USAGE_URL,
+    show_default=True,
+    help="URL or path of the compiler usage CSV used to choose profiles",
+)
+@click.option(
+    "--hot-share",
+    default=HOT_USAGE_SHARE,
+    show_default=True,
+    type=float,
+    help="The most used images covering this share of all compiles get the hot profile",
+)
+@click.option("--max-images", type=int, default=None, help="Recompress at most this many images, most used first")
+@click.option(
+    "--defer-backup-cleanup",
+    is_flag=True,
+    help="Rename old .bak directories to .DELETE_ME_<timestamp> instead of deleting them immediately",
+)
+@click.option(
+    "--streaming/--no-streaming",
+    default=False,
+    help="Build images by streaming the old ones into mksquashfs instead of extracting them first",
+)
+@click.argument("filter_", metavar="[FILTER]", nargs=-1, required=False)
+def recompress(
+    context: CliContext,
+    forced_profile: str | None,
+    usage_csv: str,
+    hot_share: float,
+    max_images: int | None,
+    defer_backup_cleanup: bool,
+    streaming: bool,
+    filter_: list[str],
+):
+    """Re-encode CEFS images with the compression profile that suits how much they're used.
+
+    Images of the most used compilers get the "hot" profile, which is quicker to decompress;
+    images of unused compilers get the "cold" one, which is smaller. Images without compilers
+    are only recompressed with --profile. Each image is rebuilt and its symlinks swapped
+    transactionally, as in consolidation; the old images are left for gc.
+
+    FILTER can be used to select which items to recompress.
+    """
+    if not validate_cefs_mount_point(context.config.cefs.mount_point):
+        _LOGGER.error("CEFS mount point validation failed. Run 'ce cefs setup' first.")
+        raise click.ClickException("CEFS not properly configured")
+
+    mount_point = context.config.cefs.mount_point
+    nfs_dir = context.installation_context.destination
+    state = CEFSState(nfs_dir=nfs_dir, cefs_image_dir=context.config.cefs.image_dir, mount_point=mount_point)
+    state.scan_cefs_images_with_manifests()
+
+    try:
+        usage = load_compiler_usage(usage_csv)
+    except (RuntimeError, OSError) as e:
+        raise click.ClickException(str(e)) from e
+    image_usage = compute_image_usage(usage, get_compiler_id_lookup().get_all_mappings(), nfs_dir, mount_point)
+    if forced_profile:
+        target_profiles = dict.fromkeys(state.all_cefs_images, forced_profile)
+    else:
+        target_profiles = assign_profiles(image_usage, hot_share)
+    for profile_name in set(target_profiles.values()):
+        try:
+            context.config.squashfs.profile(profile_name)
+        except ValueError as e:
+            raise click.ClickException(str(e)) from e
+
+    plans = plan_recompression(state, target_profiles, image_usage, filter_)[:max_images]
+    if not plans:
+        click.echo("All matching images already have their target compression profile")
+        return
+
+    click.echo(f"{len(plans)} images to recompress:")
+    for plan in plans:
+        click.echo(
+            f"  {plan.usage:>10}  {plan.image_path.name}: {plan.current_profile} -> {plan.target_profile} "
+            f"({len(plan.items)} items, {humanfriendly.format_size(plan.image_path.stat().st_size, binary=True)})"
+        )
+    if context.installation_context.dry_run:
+        return
+
+    temp_dir = context.config.cefs.local_temp_dir
+    try:
+        validate_space_requirements(
+            [list(plan.items) for plan in plans],
+            temp_dir,
+            STREAMING_SPACE_MULTIPLIER if streaming else EXTRACTION_SPACE_MULTIPLIER,
+        )
+    except RuntimeError as e:
+        raise click.ClickException(str(e)) from e
+
+    symlink_snapshot = snapshot_symlink_targets([item.nfs_path for plan in plans for item in plan.items])
+    work_dir = temp_dir / str(uuid.uuid4())
+    work_dir.mkdir(parents=True, exist_ok=True)
+    failed = 0
+    try:
+        for index, plan in enumerate(plans):
+            success, updated, skipped = process_consolidation_group(
+                list(plan.items),
+                index,
+                context.config.squashfs,
+                mount_point,
+                context.config.cefs.image_dir,
+                symlink_snapshot,
+                work_dir,
+                defer_backup_cleanup,
+                None,
+                lambda name: context.find_installable_by_exact_name(name),
+                streaming=streaming,
+                compression_profile=None if plan.target_profile == DEFAULT_PROFILE else plan.target_profile,
+                operation="recompress",
+            )
+            if success:
+                _LOGGER.info("Recompressed %s: updated %d symlinks, skipped %d", plan.image_path.name, updated, skipped)
+            else:
+                failed += 1
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    click.echo(f"Recompressed {len(plans) - failed} images; run 'ce cefs gc' to remove the old ones")
+    if failed:
+        raise click.ClickException(f"Failed to recompress {failed} images")
+
+
+@cefs.command(name="compression-benchmark")
+@click.pass_obj
+@click.option(
+    "--profile",
+    "profile_names",
+    metavar="PROFILE",
+    multiple=True,
+    help="Profile to benchmark; may be repeated (default: default and every configured profile)",
+)
+@click.option(
+    "--samples",
+    default=DEFAULT_BENCHMARK_SAMPLES,
+    show_default=True,
+    type=int,
+    help="Number of files (the compiler's hot files, largest first) to time reading",
+)
+@click.argument("source", type=click.Path(exists=True, path_type=Path))
+def compression_benchmark(context: CliContext, profile_names: tuple[str, ...], samples: int, source: Path):
+    """Compare compression profiles on SOURCE, an installation directory or squashfs image.
+
+    An image is built from SOURCE with each profile, and its size, build time, full
+    decompression time and the time to read each sampled file out of it are reported.
+    """
+    squashfs_config = context.config.squashfs
+    names = list(profile_names) or [DEFAULT_PROFILE, *squashfs_config.profiles]
+    try:
+        profiles = {name: squashfs_config.profile(name) for name in names}
+    except ValueError as e:
+        raise click.ClickException(str(e)) from e
+
+    work_dir = context.config.cefs.local_temp_dir / f"benchmark_{uuid.uuid4()}"
+    work_dir.mkdir(parents=True)
+    try:
+        source_dir = source
+        if source.is_file():
+            source_dir = work_dir / "source"
+            extract_squashfs_image(squashfs_config, source, source_dir, None)
+        sample_files = select_sample_files(source_dir, samples)
+        results = benchmark_profiles(squashfs_config, source_dir, profiles, work_dir, sample_files)
+    except (OSError, SquashfsError, subprocess.CalledProcessError) as e:
+        raise click.ClickException(f"Benchmark failed: {e}") from e
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    click.echo(f"{'Profile':<12} {'Size':>10} {'Build':>8} {'Extract':>8} {'Read p50':>9} {'Read p95':>9}")
+    for result in results:
+        click.echo(
+            f"{result.profile:<12} {humanfriendly.format_size(result.image_bytes, binary=True):>10} "
+            f"{result.build_seconds:>7.1f}s {result.extract_seconds:>7.1f}s "
+            f"{result.read_p50 * 1000:>7.1f}ms {result.read_p95 * 1000:>7.1f}ms"
+        )
+    click.echo(f"Read times are for {len(sample_files)} files, including unsquashfs start-up")
+
+
 GC_DEFAULT_MIN_AGE = "2d"
+FSCK_PROGRESS_SECONDS = 5.0
 
 
 def _run_bak_cleanup(context: CliContext, state: CEFSState, min_age_seconds: float, force: bool) -> None:
@@ -934,46 +1603,152 @@ def gc(context: CliContext, force: bool, min_age: str, include_broken: bool, cle
         raise click.ClickException(f"GC completed with {error_count} errors")
 
 
-def display_verbose_fsck_logs(
-    state: CEFSState,
-    results: FSCKResults,
-) -> None:
-    """Display verbose logging for fsck validation.
+@cefs.command()
+@click.pass_obj
+@click.option(
+    "--min-age",
+    "min_ages",
+    multiple=True,
+    default=[GC_DEFAULT_MIN_AGE],
+    show_default=True,
+    help="gc minimum age to simulate (repeat to sweep)",
+)
+@click.option(
+    "--max-size",
+    "max_sizes",
+    multiple=True,
+    help="Consolidate into images of at most this size before gc (repeat to sweep; omit to simulate gc alone)",
+)
+@click.option(
+    "--min-items",
+    "min_items_values",
+    multiple=True,
+    type=int,
+    default=[3],
+    show_default=True,
+    help="Minimum items per consolidated image (repeat to sweep)",
+)
+@click.option(
+    "--efficiency-threshold",
+    "efficiency_thresholds",
+    multiple=True,
+    type=float,
+    help="Also reconsolidate images below this efficiency (0.0-1.0, repeat to sweep; needs --max-size)",
+)
+@click.option(
+    "--undersized-ratio",
+    default=0.25,
+    show_default=True,
+    type=float,
+    help="Reconsolidate consolidated images smaller than max-size * this ratio",
+)
+@click.option(
+    "--snapshot",
+    "snapshot_file",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    help="Simulate against a snapshot saved with --save-snapshot instead of scanning CEFS",
+)
+@click.option(
+    "--save-snapshot",
+    type=click.Path(dir_okay=False, path_type=Path),
+    help="Save the scanned snapshot here, to simulate against later (e.g. on another machine)",
+)
+def simulate(
+    context: CliContext,
+    min_ages: tuple[str, ...],
+    max_sizes: tuple[str, ...],
+    min_items_values: tuple[int, ...],
+    efficiency_thresholds: tuple[float, ...],
+    undersized_ratio: float,
+    snapshot_file: Path | None,
+    save_snapshot: Path | None,
+):
+    """Project what gc, consolidation and reconsolidation would do, without changing anything.
+
+    Takes a snapshot of the CEFS images (sizes, ages, manifests and where symlinks point), then
+    plays every combination of the given parameters against it in memory, reporting the EFS bytes,
+    image count and mount fan-out (images needed to serve every installed item) each would leave.
+    Consolidated images are assumed to be as big as the items in them, and .bak backups of moved
+    items to have been cleaned up before gc runs.
+    """
+    try:
+        min_age_seconds = [humanfriendly.parse_timespan(min_age) for min_age in min_ages]
+        max_size_bytes: list[int | None] = [humanfriendly.parse_size(size, binary=True) for size in max_sizes]
+    except (humanfriendly.InvalidTimespan, humanfriendly.InvalidSize) as e:
+        raise click.ClickException(str(e)) from e
+    if efficiency_thresholds and not max_sizes:
+        raise click.ClickException("--efficiency-threshold needs --max-size")
+
+    if snapshot_file:
+        try:
+            snapshot = read_snapshot(snapshot_file)
+        except (OSError, ValueError) as e:
+            raise click.ClickException(f"Failed to read snapshot: {e}") from e
+    else:
+        state = CEFSState(
+            nfs_dir=context.installation_context.destination,
+            cefs_image_dir=context.config.cefs.image_dir,
+            mount_point=context.config.cefs.mount_point,
+        )
+        _LOGGER.info("Scanning CEFS images directory and reading manifests...")
+        state.scan_cefs_images_with_manifests()
+        snapshot = take_snapshot(state, time.time())
+    if save_snapshot:
+        write_snapshot(snapshot, save_snapshot)
+        click.echo(f"Saved snapshot to {save_snapshot}")
+
+    def fmt(size: int) -> str:
+        return humanfriendly.format_size(size, binary=True)
+
+    def fmt_change(change: int) -> str:
+        return f"{'+' if change > 0 else '-' if change < 0 else ''}{fmt(abs(change))}"
+
+    now = project(snapshot.images)
+    taken_at = datetime.datetime.fromtimestamp(snapshot.taken_at).strftime("%Y-%m-%d %H:%M")
+    click.echo(f"Snapshot taken {taken_at}: {now.images} images, {fmt(now.bytes)}, {now.mounts} mounts")
+    click.echo(
+        f"\n{'min-age':>8} {'max-size':>10} {'min-items':>9} {'efficiency':>10}"
+        f" {'images':>7} {'EFS bytes':>11} {'change':>12} {'mounts':>7} {'gc':>6} {'new':>5}"
+    )
+    for age_seconds, size_bytes, min_items, efficiency in itertools.product(
+        min_age_seconds, max_size_bytes or [None], min_items_values, efficiency_thresholds or [None]
+    ):
+        params = SimulationParams(age_seconds, size_bytes, min_items, efficiency, undersized_ratio)
+        after = run_simulation(snapshot, params)
+        click.echo(
+            f"{humanfriendly.format_timespan(age_seconds):>8}"
+            f" {fmt(size_bytes) if size_bytes is not None else '-':>10}"
+            f" {min_items if size_bytes is not None else '-':>9}"
+            f" {efficiency if efficiency is not None else '-':>10}"
+            f" {after.images:>7} {fmt(after.bytes):>11} {fmt_change(after.bytes - now.bytes):>12}"
+            f" {after.mounts:>7} {after.gc_images:>6} {after.consolidated_images:>5}"
+        )
+
+
+def display_manifest_check(check: ManifestCheck) -> None:
+    """Display the result of checking one manifest, for verbose fsck output."""
+    match check.status:
+        case "valid":
+            click.echo(f"✅ Valid manifest: {check.manifest_path}")
+        case "unchanged":
+            click.echo(f"⏭️  Unchanged manifest: {check.manifest_path}")
+        case "missing":
+            click.echo(f"❌ Missing manifest for {check.image_path}")
+        case "old_format":
+            click.echo(f"❌ Old manifest format (has 'target' field): {check.manifest_path}")
+        case "unreadable":
+            click.echo(f"❌ Cannot read manifest: {check.manifest_path}: {check.error}")
+        case _:
+            click.echo(f"❌ Invalid manifest: {check.manifest_path}")
+            click.echo(f"   Reason: {check.error}")
+
+
+def display_verbose_fsck_logs(results: FSCKResults) -> None:
+    """Display verbose logging for the non-manifest fsck checks.
 
     Args:
-        state: CEFS state with image information
         results: Validation results
     """
-    for _stem, image_path in state.all_cefs_images.items():
-        manifest_path = image_path.with_suffix(".yaml")
-        if (
-            manifest_path not in results.missing_manifests
-            and manifest_path not in results.old_format_manifests
-            and not any(m[0] == manifest_path for m in results.invalid_name_manifests)
-            and not any(m[0] == manifest_path for m in results.other_invalid_manifests)
-            and not any(m[0] == manifest_path for m in results.unreadable_manifests)
-        ):
-            click.echo(f"✅ Valid manifest: {manifest_path}")
-        elif manifest_path in results.missing_manifests:
-            click.echo(f"❌ Missing manifest for {image_path}")
-        elif manifest_path in results.old_format_manifests:
-            click.echo(f"❌ Old manifest format (has 'target' field): {manifest_path}")
-        else:
-            for m_path, error in results.invalid_name_manifests:
-                if m_path == manifest_path:
-                    click.echo(f"❌ Invalid manifest: {manifest_path}")
-                    click.echo(f"   Reason: {error}")
-                    break
-            for m_path, error in results.other_invalid_manifests:
-                if m_path == manifest_path:
-                    click.echo(f"❌ Invalid manifest: {manifest_path}")
-                    click.echo(f"   Reason: {error}")
-                    break
-            for m_path, error in results.unreadable_manifests:
-                if m_path == manifest_path:
-                    click.echo(f"❌ Cannot read manifest: {manifest_path}: {error}")
-                    break
-
     for file_with_age in results.inprogress_files:
         age_str = humanfriendly.format_timespan(file_with_age.age_seconds)
         click.echo(f"  Found .inprogress file: {file_with_age.path} (age: {age_str})")
@@ -1068,6 +1843,8 @@ def display_fsck_results(results: FSCKResults, verbose: bool, state: CEFSState)
     click.echo("\n📊 Summary:")
     click.echo(f"  Total images scanned: {results.total_images}")
     click.echo(f"  ✅ Valid manifests: {results.valid_manifests}")
+    if results.unchanged_manifests:
+        click.echo(f"  ⏭️  Unchanged since last check: {results.unchanged_manifests}")
     click.echo(f"  ❌ Invalid/problematic: {results.total_invalid}")
     click.echo(f"  🔄 In-progress files: {len(results.inprogress_files)}")
     click.echo(f"  🗑️  Pending cleanup: {len(results.pending_backups) + len(results.pending_deletes)}")
@@ -1248,6 +2025,24 @@ def display_fsck_results(results: FSCKResults, verbose: bool, state: CEFSState)
     help="Minimum age for repairing incomplete transactions (e.g., 1h, 30m, 1d)",
 )
 @click.option("--force", is_flag=True, help="Skip confirmation prompt for repairs")
+@click.option(
+    "--max-workers",
+    default=DEFAULT_FSCK_WORKERS,
+    show_default=True,
+    type=int,
+    help="Number of image directories to check in parallel",
+)
+@click.option(
+    "--since",
+    metavar="WHEN",
+    help="Only read manifests changed since WHEN: 'last' for the last run that found no invalid manifests, "
+    "or an age such as 1d",
+)
+@click.option(
+    "--report",
+    type=click.Path(dir_okay=False, path_type=Path),
+    help="Write a JSON-lines report of every check to this file as it runs",
+)
 @click.pass_obj
 def fsck(
     context: CliContext,
@@ -1255,6 +2050,9 @@ def fsck(
     repair: bool,
     min_age: str,
     force: bool,
+    max_workers: int,
+    since: str | None,
+    report: Path | None,
 ) -> None:
     """Check CEFS filesystem integrity and optionally repair issues.
 
@@ -1270,28 +2068,77 @@ def fsck(
     - Finalizing transactions where symlinks exist (marking as complete)
     - Deleting failed transactions where no symlinks were created
     - Skipping recent or conflicted transactions for safety
+
+    Image directories are checked in parallel and progress is shown as they complete.
     """
     state = CEFSState(
         nfs_dir=context.installation_context.destination,
         cefs_image_dir=context.config.cefs.image_dir,
         mount_point=context.config.cefs.mount_point,
     )
-    state.scan_cefs_images_with_manifests()
-    state.check_symlink_references()
+    last_success_path = context.config.cefs.local_temp_dir / FSCK_LAST_RUN_FILENAME
+    started_at = time.time()
+
+    since_time: float | None = None
+    if since == "last":
+        since_time = read_last_success(last_success_path)
+        if since_time is None:
+            click.echo("No previous successful fsck recorded; checking every manifest")
+    elif since:
+        try:
+            since_time = started_at - humanfriendly.parse_timespan(since)
+        except humanfriendly.InvalidTimespan as e:
+            raise click.ClickException(f"Invalid --since: {e}") from e
 
     if verbose:
         click.echo("\n🔍 Scanning CEFS images and validating manifests...")
 
-    results = run_fsck_validation(
-        state,
-        context.config.cefs.mount_point,
-    )
+    with contextlib.ExitStack() as stack:
+        report_file = None
+        if report:
+            report_file = stack.enter_context(report.open("w", encoding="utf-8"))
+        problems = 0
+        last_progress = 0.0
 
-    if verbose:
-        display_verbose_fsck_logs(
+        def on_check(check: ManifestCheck) -> None:
+            nonlocal problems
+            problems += check.is_problem
+            if verbose:
+                display_manifest_check(check)
+            if report_file:
+                report_file.write(json.dumps(check.to_json()) + "\n")
+
+        def on_shard(done: int, total: int) -> None:
+            nonlocal last_progress
+            now = time.monotonic()
+            if done == total or now - last_progress >= FSCK_PROGRESS_SECONDS:
+                last_progress = now
+                click.echo(f"  [{done}/{total} directories] {problems} problem(s) so far", err=True)
+
+        results = run_fsck_validation(
             state,
-            results,
+            context.config.cefs.mount_point,
+            max_workers=max_workers,
+            since=since_time,
+            on_check=on_check,
+            on_shard=on_shard,
         )
+        if report_file:
+            for record in fsck_report_records(results):
+                report_file.write(json.dumps(record) + "\n")
+
+    if is_clean_baseline(results, since):
+        try:
+            record_success(last_success_path, started_at)
+        except OSError as e:
+            _LOGGER.warning("Failed to record successful fsck in %s: %s", last_success_path, e)
+
+    if verbose:
+        display_verbose_fsck_logs(results)
+
+    if results.invalid_name_manifests or results.old_format_manifests:
+        # Only needed to tell whether images with broken manifests are still in use
+        state.scan_cefs_images_with_manifests()
 
     display_fsck_results(results, verbose, state)
 
@@ -1387,8 +2234,15 @@ def fsck(
     is_flag=True,
     help="Rename old .bak directories to .DELETE_ME_<timestamp> instead of deleting them immediately",
 )
+@click.option(
+    "--max-workers",
+    default=DEFAULT_UNPACK_WORKERS,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of images to extract at once",
+)
 @click.argument("filter_", metavar="FILTER", nargs=-1, required=True)
-def unpack(context: CliContext, defer_backup_cleanup: bool, filter_: list[str]):
+def unpack(context: CliContext, defer_backup_cleanup: bool, max_workers: int, filter_: list[str]):
     """Unpack CEFS images to real directories for in-place modifications.
 
     Extracts the CEFS image and replaces the symlink with the actual directory.
@@ -1399,6 +2253,9 @@ def unpack(context: CliContext, defer_backup_cleanup: bool, filter_: list[str]):
     modify the directory contents, then use 'ce cefs repack' to create a new
     CEFS image with your changes.
 
+    Items are unpacked concurrently. Items from the same consolidated image are
+    extracted from it in a single pass.
+
     Example:
         ce cefs unpack qt-6.10
         chmod -R a+rX /opt/compiler-explorer/qt-6.10.0
@@ -1418,9 +2275,9 @@ def unpack(context: CliContext, defer_backup_cleanup: bool, filter_: list[str]):
         _LOGGER.warning("No installables match filter: %s", " ".join(filter_))
         return
 
-    successful = 0
     failed = 0
     skipped = 0
+    items: list[UnpackItem] = []
 
     for installable in installables:
         nfs_path = context.installation_context.destination / installable.install_path
@@ -1435,24 +2292,40 @@ def unpack(context: CliContext, defer_backup_cleanup: bool, filter_: list[str]):
             skipped += 1
             continue
 
-        _LOGGER.info("Unpacking %s...", installable.name)
-
         try:
-            if unpack_cefs_item(
-                installable.name,
-                nfs_path,
-                context.config.cefs.image_dir,
-                context.config.cefs.mount_point,
-                context.config.squashfs,
-                defer_backup_cleanup,
-                context.installation_context.dry_run,
-            ):
-                successful += 1
+            items.append(
+                plan_unpack(installable.name, nfs_path, context.config.cefs.image_dir, context.config.cefs.mount_point)
+            )
         except RuntimeError as e:
             _LOGGER.error("Failed to unpack %s: %s", installable.name, e)
             failed += 1
 
-    _LOGGER.info("Unpack complete: %d successful, %d failed, %d skipped", successful, failed, skipped)
+    if items:
+        size_cache = ImageSizeCache(context.config.squashfs, context.config.cefs.local_temp_dir / SIZE_CACHE_FILENAME)
+        try:
+            required = required_unpack_bytes(items, size_cache)
+        except (OSError, SquashfsError) as e:
+            _LOGGER.warning("Could not read uncompressed sizes from image metadata, not checking space: %s", e)
+        else:
+            _LOGGER.info("Unpacking %d items needs %s", len(items), humanfriendly.format_size(required, binary=True))
+            if not check_temp_space_available(context.installation_context.destination, required):
+                message = f"Not enough space in {context.installation_context.destination} to unpack {len(items)} items"
+                if not context.installation_context.dry_run:
+                    raise click.ClickException(message)
+                _LOGGER.warning("%s", message)
+        finally:
+            size_cache.save()
+
+    result = unpack_cefs_items(
+        items,
+        context.config.squashfs,
+        defer_backup_cleanup,
+        context.installation_context.dry_run,
+        max_workers,
+    )
+    failed += len(result.failed)
+
+    _LOGGER.info("Unpack complete: %d successful, %d failed, %d skipped", len(result.successful), failed, skipped)
 
     if failed > 0:
         raise click.ClickException(f"Failed to unpack {failed} installables")
@@ -1465,8 +2338,15 @@ def unpack(context: CliContext, defer_backup_cleanup: bool, filter_: list[str]):
     is_flag=True,
     help="Rename old .bak directories to .DELETE_ME_<timestamp> instead of deleting them immediately",
 )
+@click.option(
+    "--max-workers",
+    default=DEFAULT_UNPACK_WORKERS,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of images to build at once",
+)
 @click.argument("filter_", metavar="FILTER", nargs=-1, required=True)
-def repack(context: CliContext, defer_backup_cleanup: bool, filter_: list[str]):
+def repack(context: CliContext, defer_backup_cleanup: bool, max_workers: int, filter_: list[str]):
     """Repack modified directories back into CEFS images.
 
     Creates a new squashfs image from an unpacked directory and deploys it
@@ -1497,9 +2377,8 @@ def repack(context: CliContext, defer_backup_cleanup: bool, filter_: list[str]):
         _LOGGER.warning("No installables match filter: %s", " ".join(filter_))
         return
 
-    successful = 0
-    failed = 0
     skipped = 0
+    items: list[tuple[str, Path]] = []
 
     for installable in installables:
         nfs_path = context.installation_context.destination / installable.install_path
@@ -1519,23 +2398,34 @@ def repack(context: CliContext, defer_backup_cleanup: bool, filter_: list[str]):
             skipped += 1
             continue
 
-        _LOGGER.info("Repacking %s...", installable.name)
+        items.append((installable.name, nfs_path))
 
-        try:
-            if repack_cefs_item(
-                installable.name,
-                nfs_path,
-                context.config.cefs.image_dir,
-                context.config.cefs.mount_point,
-                context.config.squashfs,
-                context.config.cefs.local_temp_dir,
-                defer_backup_cleanup,
-                context.installation_context.dry_run,
-            ):
-                successful += 1
-        except RuntimeError as e:
-            _LOGGER.error("Failed to repack %s: %s", installable.name, e)
-            failed += 1
+    local_temp_dir = context.config.cefs.local_temp_dir
+    if items:
+        required = required_repack_bytes([nfs_path for _, nfs_path in items], max_workers)
+        _LOGGER.info(
+            "Repacking %d items needs up to %s in %s",
+            len(items),
+            humanfriendly.format_size(required, binary=True),
+            local_temp_dir,
+        )
+        if not context.installation_context.dry_run:
+            local_temp_dir.mkdir(parents=True, exist_ok=True)
+            if not check_temp_space_available(local_temp_dir, required):
+                raise click.ClickException(f"Not enough space in {local_temp_dir} to repack {len(items)} items")
+
+    result = repack_cefs_items(
+        items,
+        context.config.cefs.image_dir,
+        context.config.cefs.mount_point,
+        context.config.squashfs,
+        local_temp_dir,
+        defer_backup_cleanup,
+        context.installation_context.dry_run,
+        max_workers,
+    )
+    successful = len(result.successful)
+    failed = len(result.failed)
 
     _LOGGER.info("Repack complete: %d successful, %d failed, %d skipped", successful, failed, skipped)
 
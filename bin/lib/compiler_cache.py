@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""Shared compiler cache (ccache or sccache) for library builds.
+
+With `ce_install build --compiler-cache DIR`, the generated build scripts run every C/C++
+compilation through a launcher that caches object files in DIR, and cargo builds use sccache as
+RUSTC_WRAPPER. Rebuilding a library for a new compiler version, or after a transient failure, then
+only recompiles what actually changed. Results are keyed by the compiler's content (not its path
+or mtime), so a reinstalled compiler never serves stale objects. The cache is bounded in size by
+the launcher itself.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import shutil
+import subprocess
+import threading
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TypeVar
+
+import humanfriendly
+
+_LOGGER = logging.getLogger(__name__)
+
+CCACHE = "ccache"
+SCCACHE = "sccache"
+LAUNCHERS = (CCACHE, SCCACHE)
+DEFAULT_COMPILER_CACHE_SIZE = 20 * 1024 * 1024 * 1024
+CCACHE_STATS_LOG = "ceccachestats.log"
+
+_CCACHE_HITS = {"direct_cache_hit", "preprocessed_cache_hit"}
+_CCACHE_MISSES = {"cache_miss"}
+
+T = TypeVar("T")
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+
+    def __add__(self, other: CacheStats) -> CacheStats:
+        return CacheStats(self.hits + other.hits, self.misses + other.misses)
+
+    def __sub__(self, other: CacheStats) -> CacheStats:
+        return CacheStats(self.hits - other.hits, self.misses - other.misses)
+
+    def describe(self) -> str:
+        lookups = self.hits + self.misses
+        if not lookups:
+            return "no cacheable compilations"
+        return f"{self.hits} hits, {self.misses} misses ({self.hits / lookups:.0%} hit rate)"
+
+
+def parse_ccache_stats_log(path: str | Path) -> CacheStats | None:
+    """Count the hits and misses in a ccache stats_log: a "# <source>" line per compilation, then its counters."""
+    try:
+        lines = Path(path).read_text(encoding="utf-8", errors="replace").splitlines()
+    except FileNotFoundError:
+        return None
+    stats = CacheStats()
+    for line in lines:
+        counter = line.strip()
+        if counter in _CCACHE_HITS:
+            stats.hits += 1
+        elif counter in _CCACHE_MISSES:
+            stats.misses += 1
+    return stats
+
+
+def _sum_counts(stats: dict, name: str) -> int:
+    return sum(stats.get(name, {}).get("counts", {}).values())
+
+
+class CompilerCache:
+    """Where the cache lives, how big it may get, and what uses it.
+
+    The C/C++ launcher is ccache or sccache. cargo builds need sccache, and go without a cache
+    if it isn't installed.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        max_size: int = DEFAULT_COMPILER_CACHE_SIZE,
+        launcher: str = CCACHE,
+        launcher_exe: str | None = None,
+        sccache_exe: str | None = None,
+    ):
+        if launcher not in LAUNCHERS:
+            raise ValueError(f"Unknown compiler launcher {launcher}, expected one of {', '.join(LAUNCHERS)}")
+        self.directory = directory
+        self.max_size = max_size
+        self.launcher = launcher
+        self.launcher_exe = launcher_exe or shutil.which(launcher)
+        if self.launcher_exe is None:
+            raise RuntimeError(f"Compiler launcher {launcher} not found on PATH")
+        self.sccache_exe = sccache_exe or (self.launcher_exe if launcher == SCCACHE else shutil.which(SCCACHE))
+        self.totals = CacheStats()
+        self._lock = threading.Lock()
+
+    def _sccache_env(self) -> dict[str, str]:
+        # sccache sizes are decimal; round down so the bound is never exceeded
+        return {
+            "SCCACHE_DIR": str(self.directory / SCCACHE),
+            "SCCACHE_CACHE_SIZE": f"{max(1, self.max_size // 1000**2)}M",
+        }
+
+    def build_env(self, build_folder: str, source_folder: str) -> dict[str, str]:
+        """Environment for a C/C++ build script running in build_folder on source_folder."""
+        if self.launcher == SCCACHE:
+            return self._sccache_env()
+        env = {
+            "CCACHE_DIR": str(self.directory / CCACHE),
+            "CCACHE_MAXSIZE": f"{max(1, self.max_size // 1000**2)}M",
+            "CCACHE_COMPILERCHECK": "content",
+            "CCACHE_NOHASHDIR": "1",
+            "CCACHE_STATSLOG": os.path.join(build_folder, CCACHE_STATS_LOG),
+        }
+        # Build folders live in fresh staging directories, so absolute paths within those must not
+        # reach the hash, or nothing would ever hit. Sources outside staging (in /opt, or anywhere
+        # with CEFS staging on local disk) are at the same path on every build, so can stay absolute.
+        env["CCACHE_BASEDIR"] = os.path.dirname(os.path.abspath(build_folder))
+        return env
+
+    def rust_env(self) -> dict[str, str]:
+        """Environment for a cargo build script; empty without sccache."""
+        if self.sccache_exe is None:
+            return {}
+        return {"RUSTC_WRAPPER": self.sccache_exe, **self._sccache_env()}
+
+    def _sccache_stats(self) -> CacheStats | None:
+        if self.sccache_exe is None:
+            return None
+        try:
+            output = subprocess.check_output(
+                [self.sccache_exe, "--show-stats", "--stats-format=json"],
+                env={**os.environ, **self._sccache_env()},
+                stderr=subprocess.DEVNULL,
+                text=True,
+            )
+            stats = json.loads(output)["stats"]
+        except (OSError, subprocess.CalledProcessError, ValueError, KeyError) as e:
+            _LOGGER.debug("Unable to read sccache stats: %s", e)
+            return None
+        return CacheStats(_sum_counts(stats, "cache_hits"), _sum_counts(stats, "cache_misses"))
+
+    def run_build(self, build_folder: str, run: Callable[[], T], uses_sccache: bool) -> tuple[T, CacheStats | None]:
+        """Run a build script that uses the cache, and work out its hits and misses.
+
+        ccache logs each build's compilations to its build folder. sccache only keeps
+        server-wide totals, so its figures also count any other build running at the same time.
+        """
+        before = self._sccache_stats() if uses_sccache else None
+        result = run()
+        if uses_sccache:
+            after = self._sccache_stats()
+            stats = after - before if before is not None and after is not None else None
+        else:
+            stats = parse_ccache_stats_log(os.path.join(build_folder, CCACHE_STATS_LOG))
+        if stats is not None:
+            with self._lock:
+                self.totals += stats
+        return result, stats
+
+    def describe(self) -> str:
+        return f"{self.launcher} in {self.directory} (up to {humanfriendly.format_size(self.max_size, binary=True)})"
+
+
+_compiler_cache: CompilerCache | None = None
+
+
+def compiler_cache() -> CompilerCache | None:
+    """The cache library builds in this process use, if any."""
+    return _compiler_cache
+
+
+def configure_compiler_cache(cache: CompilerCache | None) -> None:
+    global _compiler_cache
+    _compiler_cache = cache
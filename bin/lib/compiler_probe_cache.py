@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""Persistent cache of what compilers report when library builders probe them.
+
+Builders run each compiler (--target-help, --help, llc --version, -dumpmachine, go version) to find
+out which targets it supports. The answer only changes when the compiler does, so it is kept on disk
+keyed by the executable's path, inode, size and mtime, plus the options and ldPath it was probed
+with. Every builder in the process shares one cache, and later `ce_install build` runs reuse it.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, TypeVar
+
+_LOGGER = logging.getLogger(__name__)
+
+_CACHE_VERSION = 1
+DEFAULT_PROBE_WORKERS = 8
+
+T = TypeVar("T")
+
+
+def default_probe_cache_path() -> Path:
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "ce-install" / "compiler-probes.json"
+
+
+def exe_fingerprint(exe: str | Path) -> list[int] | None:
+    """Identify this build of a compiler: changes whenever it is reinstalled. None if it isn't there."""
+    try:
+        exe_stat = os.stat(exe)
+    except OSError:
+        return None
+    return [exe_stat.st_ino, exe_stat.st_size, exe_stat.st_mtime_ns]
+
+
+class CompilerProbeCache:
+    """Probe results, in memory and (if path is set) on disk.
+
+    Results must survive a JSON round trip. Probes of executables that can't be stat'ed aren't
+    cached at all, so a compiler that appears later is probed afresh.
+    """
+
+    def __init__(self, path: Path | None, max_workers: int = DEFAULT_PROBE_WORKERS):
+        self.path = path
+        self.max_workers = max_workers
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict[str, Any]] = {}
+        self._dirty: set[str] = set()
+        if path is not None:
+            self._entries = self._read(path)
+
+    @staticmethod
+    def _read(path: Path) -> dict[str, dict[str, Any]]:
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            _LOGGER.warning("Ignoring unreadable compiler probe cache %s: %s", path, e)
+            return {}
+        if not isinstance(data, dict) or data.get("version") != _CACHE_VERSION:
+            _LOGGER.info("Ignoring compiler probe cache %s from another version", path)
+            return {}
+        return data.get("probes", {})
+
+    @staticmethod
+    def key(kind: str, exe: str | Path, options: str = "", ld_path: str = "", detail: str = "") -> str:
+        return json.dumps([kind, str(exe), options, ld_path, detail])
+
+    def probe(
+        self,
+        kind: str,
+        exe: str | Path,
+        run_probe: Callable[[], T],
+        options: str = "",
+        ld_path: str = "",
+        detail: str = "",
+    ) -> T:
+        """Return the cached result of run_probe, running it if this exe hasn't been probed this way.
+
+        Args:
+            kind: What is being asked, e.g. "cpp-arch"; part of the key
+            exe: The executable the probe runs, whose fingerprint the result is tied to
+            run_probe: Runs the probe
+            options, ld_path: The compiler's options and ldPath, if they affect the result
+            detail: Anything else that does, e.g. the architecture asked about
+        """
+        fingerprint = exe_fingerprint(exe)
+        if fingerprint is None:
+            return run_probe()
+
+        key = self.key(kind, exe, options, ld_path, detail)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.get("fingerprint") == fingerprint:
+                self.hits += 1
+                return entry["result"]
+            self.misses += 1
+
+        result = run_probe()
+        with self._lock:
+            self._entries[key] = {"fingerprint": fingerprint, "result": result}
+            self._dirty.add(key)
+        return result
+
+    def warm(self, probes: Iterable[Callable[[], Any]]) -> None:
+        """Run probes (each typically probing one compiler through this cache) in parallel, then save."""
+        probes = list(probes)
+        if probes:
+            _LOGGER.info("Probing %d compilers, %d at a time", len(probes), self.max_workers)
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for future in [executor.submit(run_probe) for run_probe in probes]:
+                    try:
+                        future.result()
+                    except Exception as e:  # noqa: BLE001
+                        # The build will probe (and report) the same compiler again; don't stop the others here
+                        _LOGGER.warning("Compiler probe failed: %s", e)
+        self.save()
+
+    def save(self) -> None:
+        """Write new results to disk, merged with whatever other processes have saved meanwhile."""
+        if self.path is None:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            entries = self._read(self.path)
+            entries.update({key: self._entries[key] for key in self._dirty})
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with tempfile.NamedTemporaryFile(
+                    "w", dir=self.path.parent, prefix=f".{self.path.name}.", delete=False, encoding="utf-8"
+                ) as f:
+                    json.dump({"version": _CACHE_VERSION, "probes": entries}, f)
+                os.replace(f.name, self.path)
+            except OSError as e:
+                _LOGGER.warning("Unable to save compiler probe cache %s: %s", self.path, e)
+                return
+            self._entries.update(entries)
+            self._dirty.clear()
+            _LOGGER.debug("Saved %d compiler probes to %s", len(entries), self.path)
+
+
+_shared_cache = CompilerProbeCache(None)
+
+
+def shared_probe_cache() -> CompilerProbeCache:
+    """The cache every builder in this process uses (in memory only, until load_shared_probe_cache)."""
+    return _shared_cache
+
+
+def load_shared_probe_cache(path: Path, max_workers: int = DEFAULT_PROBE_WORKERS) -> CompilerProbeCache:
+    """Back the shared cache with the file at path."""
+    global _shared_cache
+    _shared_cache = CompilerProbeCache(path, max_workers)
+    return _shared_cache
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""Batched, background uploads of the packages library builds export to the local conan cache.
+
+Uploading (`conan upload <lib>/<ver> --all`) and clearing the cache after every compiler means
+the same reference is uploaded, and its cache rebuilt, many times per library. Instead, exported
+packages are collected, and every batch of them goes up in one parallel upload on a background
+thread while the next builds run. Each package is annotated once its upload is done, since the
+conan server only knows its package id from then on. The local cache is cleared when the builds
+are finished, or earlier if the disk it is on runs low.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+import threading
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+DEFAULT_UPLOAD_BATCH_SIZE = 8
+DEFAULT_CONAN_MIN_FREE_BYTES = 10 * 1024 * 1024 * 1024
+
+
+def conan_storage_path() -> Path:
+    """Where conan keeps its local package cache."""
+    return Path(os.environ.get("CONAN_USER_HOME") or Path.home()) / ".conan" / "data"
+
+
+def free_bytes(path: Path) -> int | None:
+    """Free space on the filesystem holding path (or its nearest existing parent)."""
+    for candidate in (path, *path.parents):
+        try:
+            return shutil.disk_usage(candidate).free
+        except FileNotFoundError:
+            continue
+        except OSError:
+            return None
+    return None
+
+
+@dataclass
+class PendingUpload:
+    """A package exported to the local conan cache, and what to annotate it with once uploaded."""
+
+    description: str
+    target: dict[str, str]
+    annotations: dict[str, Any]
+
+
+class ConanUploadPipeline:
+    """Uploads exported packages in batches, in the background, and clears the cache sparingly.
+
+    add() is called, with exports serialised, once per exported package. finish() waits for
+    everything to be uploaded and annotated, clears the cache, and returns the packages whose
+    upload or annotation failed.
+    """
+
+    def __init__(
+        self,
+        upload: Callable[[], None],
+        annotate: Callable[[PendingUpload], None],
+        clear_cache: Callable[[], None],
+        logger: logging.Logger,
+        batch_size: int = DEFAULT_UPLOAD_BATCH_SIZE,
+        min_free_bytes: int = DEFAULT_CONAN_MIN_FREE_BYTES,
+        cache_path: Path | None = None,
+    ):
+        self.upload = upload
+        self.annotate = annotate
+        self.clear_cache = clear_cache
+        self.logger = logger
+        self.batch_size = batch_size
+        self.min_free_bytes = min_free_bytes
+        self.cache_path = cache_path or conan_storage_path()
+        self.batches_uploaded = 0
+        self._pending: list[PendingUpload] = []
+        self._failed: list[PendingUpload] = []
+        self._in_flight: Future | None = None
+        self._executor: ThreadPoolExecutor | None = None
+        self._needs_clearing = False
+        self._lock = threading.Lock()
+
+    def add(self, pending: PendingUpload) -> None:
+        self._pending.append(pending)
+        if len(self._pending) >= self.batch_size:
+            self._start_batch()
+        free = free_bytes(self.cache_path)
+        if free is not None and free < self.min_free_bytes:
+            self.logger.info(f"Only {free} bytes free for the conan cache, uploading and clearing it now")
+            self._drain()
+            self._clear()
+
+    def finish(self) -> list[PendingUpload]:
+        self._drain()
+        self._clear()
+        if self._executor:
+            self._executor.shutdown()
+            self._executor = None
+        with self._lock:
+            failed, self._failed = self._failed, []
+        return failed
+
+    def _start_batch(self) -> None:
+        # One batch in flight at a time: a second `conan upload --all` would only redo the first
+        self._wait()
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="conan-upload")
+        self._needs_clearing = True
+        self._in_flight = self._executor.submit(self._upload_batch, batch)
+
+    def _wait(self) -> None:
+        if self._in_flight is not None:
+            self._in_flight.result()
+            self._in_flight = None
+
+    def _drain(self) -> None:
+        self._start_batch()
+        self._wait()
+
+    def _clear(self) -> None:
+        if self._needs_clearing:
+            self.logger.debug("Clearing conan cache")
+            self.clear_cache()
+            self._needs_clearing = False
+
+    def _upload_batch(self, batch: list[PendingUpload]) -> None:
+        self.logger.info(f"Uploading {len(batch)} exported builds")
+        try:
+            self.upload()
+        except Exception as e:  # noqa: BLE001
+            # Reported to makebuild by finish(); the builds still running shouldn't stop
+            self.logger.error(f"Uploading {len(batch)} builds failed: {e}")
+            with self._lock:
+                self._failed.extend(batch)
+            return
+        self.batches_uploaded += 1
+        for pending in batch:
+            try:
+                self.annotate(pending)
+            except Exception as e:  # noqa: BLE001
+                self.logger.error(f"Annotating {pending.description} failed: {e}")
+                with self._lock:
+                    self._failed.append(pending)
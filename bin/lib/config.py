@@ -18,6 +18,25 @@ from lib.config_safe_loader import ConfigSafeLoader
 _LOGGER = logging.getLogger(__name__)
 
 
+class CompressionProfile(BaseModel):
+    """mksquashfs settings for a class of images."""
+
+    compression: str = "zstd"
+    compression_level: int = 7
+    block_size: str | None = None  # mksquashfs -b, e.g. "64K"; None for mksquashfs's default of 128K
+
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
+
+# Starting points, to be tuned with `ce cefs compression-benchmark`. Frequently used compilers get smaller blocks,
+# so each page fault decompresses less; zstd decompresses at much the same speed whatever the level, so a low level
+# just makes them quicker to build. Rarely used ones get a high level and big blocks to save EFS space.
+DEFAULT_COMPRESSION_PROFILES = {
+    "hot": CompressionProfile(compression="zstd", compression_level=3, block_size="64K"),
+    "cold": CompressionProfile(compression="zstd", compression_level=19, block_size="1M"),
+}
+
+
 class SquashfsConfig(BaseModel):
     """Configuration for squashfs creation and management."""
 
@@ -39,9 +58,27 @@ class SquashfsConfig(BaseModel):
     compression_level: int = 7
     mksquashfs_path: str = "/usr/bin/mksquashfs"
     unsquashfs_path: str = "/usr/bin/unsquashfs"
+    # sqfs2tar (from squashfs-tools-ng) is only needed for streaming consolidation
+    sqfs2tar_path: str = "/usr/bin/sqfs2tar"
+    # Named alternatives to compression/compression_level (which are the "default" profile)
+    profiles: dict[str, CompressionProfile] = DEFAULT_COMPRESSION_PROFILES
 
     model_config = ConfigDict(frozen=True, extra="forbid")
 
+    def profile(self, name: str | None = None) -> CompressionProfile:
+        """Get a compression profile by name; None or "default" for the default compression settings.
+
+        Raises:
+            ValueError: If there's no such profile
+        """
+        if name is None or name == "default":
+            return CompressionProfile(compression=self.compression, compression_level=self.compression_level)
+        if name not in self.profiles:
+            raise ValueError(
+                f"Unknown compression profile '{name}' (known: default, {', '.join(sorted(self.profiles))})"
+            )
+        return self.profiles[name]
+
 
 class CefsConfig(BaseModel):
     """Configuration for CEFS (Compiler Explorer FileSystem) v2."""
@@ -50,6 +87,9 @@ class CefsConfig(BaseModel):
     mount_point: Path = Path("/cefs")
     image_dir: Path = Path("/efs/cefs-images")
     local_temp_dir: Path = Path("/tmp/ce-cefs-temp")
+    # Optional node-local cache of images (see lib/cefs/local_cache.py), used by the autofs map `cefs setup` writes
+    local_cache_dir: Path | None = None
+    local_cache_max_size: str | None = None  # e.g. "200G"; defaults to most of the cache filesystem
 
     model_config = ConfigDict(frozen=True, extra="forbid")
 
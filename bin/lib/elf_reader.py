@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""Pure-Python reader for what library builders need from ELF files and `ar` archives of them.
+
+Gives each file's (or archive member's) class, OS/ABI and machine, named as `readelf -h` names
+them, the NEEDED entries of its dynamic section, and the names of the symbols it defines and
+requires, from both .symtab and .dynsym. Files are mapped rather than read, and symbol tables are
+walked in place, so only string tables and the names themselves end up in memory. Results are
+cached by file content, so the same library inspected twice in a build is only parsed once.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import mmap
+import struct
+import threading
+from collections import OrderedDict
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path
+
+ELF_MAGIC = b"\x7fELF"
+AR_MAGIC = b"!<arch>\n"
+
+_AR_HEADER_SIZE = 60
+_RESULT_CACHE_SIZE = 64
+
+_ELFCLASS32, _ELFCLASS64 = 1, 2
+_ELFDATA2LSB, _ELFDATA2MSB = 1, 2
+
+_SHT_SYMTAB = 2
+_SHT_DYNAMIC = 6
+_SHT_DYNSYM = 11
+_SHN_UNDEF = 0
+_DT_NULL = 0
+_DT_NEEDED = 1
+
+# (header after e_ident, section header, symbol, dynamic entry) layouts per class; the index of
+# st_name and st_shndx within a symbol differs between them
+_LAYOUTS = {
+    _ELFCLASS32: ("HHIIIIIHHHHHH", "IIIIIIIIII", "IIIBBH", "iI"),
+    _ELFCLASS64: ("HHIQQQIHHHHHH", "IIQQQQIIQQ", "IBBHQQ", "qQ"),
+}
+_SYMBOL_FIELDS = {_ELFCLASS32: (0, 5), _ELFCLASS64: (0, 3)}
+
+# As readelf names them
+_OSABI_NAMES = {
+    0: "UNIX - System V",
+    1: "UNIX - HP-UX",
+    2: "UNIX - NetBSD",
+    3: "UNIX - GNU",
+    6: "UNIX - Solaris",
+    7: "UNIX - AIX",
+    8: "UNIX - IRIX",
+    9: "UNIX - FreeBSD",
+    12: "UNIX - OpenBSD",
+    97: "ARM",
+    255: "Standalone App",
+}
+_MACHINE_NAMES = {
+    2: "Sparc",
+    3: "Intel 80386",
+    4: "MC68000",
+    8: "MIPS R3000",
+    20: "PowerPC",
+    21: "PowerPC64",
+    22: "IBM S/390",
+    40: "ARM",
+    42: "Renesas / SuperH SH",
+    43: "Sparc v9",
+    62: "Advanced Micro Devices X86-64",
+    83: "Atmel AVR 8-bit microcontroller",
+    94: "Tensilica Xtensa Processor",
+    105: "Texas Instruments msp430 microcontroller",
+    183: "AArch64",
+    190: "NVIDIA CUDA architecture",
+    224: "AMD GPU",
+    243: "RISC-V",
+    247: "Linux BPF",
+    258: "LoongArch",
+}
+
+
+class ElfFormatError(ValueError):
+    """The file is neither an ELF file nor an archive of them, or is corrupt."""
+
+
+@dataclass(frozen=True)
+class ElfHeader:
+    elf_class: str
+    osabi: str
+    machine: str
+
+    def describe(self) -> str:
+        """The lines of `readelf -h` output this corresponds to."""
+        return (
+            f"  Class:                             {self.elf_class}\n"
+            f"  OS/ABI:                            {self.osabi}\n"
+            f"  Machine:                           {self.machine}\n"
+        )
+
+
+@dataclass(frozen=True)
+class ElfSummary:
+    """An ELF file, or everything in an archive of them."""
+
+    headers: tuple[ElfHeader, ...]
+    needed: tuple[str, ...]
+    defined_symbols: frozenset[str]
+    undefined_symbols: frozenset[str]
+
+
+class _ElfParser:
+    def __init__(self, data: memoryview):
+        if len(data) < 16 or data[:4] != ELF_MAGIC:
+            raise ElfFormatError("Not an ELF file")
+        self.data = data
+        elf_class, byte_order, osabi = data[4], data[5], data[7]
+        if elf_class not in _LAYOUTS or byte_order not in (_ELFDATA2LSB, _ELFDATA2MSB):
+            raise ElfFormatError(f"Unknown ELF class {elf_class} or data encoding {byte_order}")
+        endian = "<" if byte_order == _ELFDATA2LSB else ">"
+        header, section, symbol, dynamic = (struct.Struct(endian + layout) for layout in _LAYOUTS[elf_class])
+        self.section_struct = section
+        self.symbol_struct = symbol
+        self.dynamic_struct = dynamic
+        self.symbol_name_field, self.symbol_shndx_field = _SYMBOL_FIELDS[elf_class]
+
+        fields = self._unpack(header, 16)
+        machine = fields[1]
+        shoff, shentsize, shnum = fields[5], fields[10], fields[11]
+        self.header = ElfHeader(
+            f"ELF{32 if elf_class == _ELFCLASS32 else 64}",
+            _OSABI_NAMES.get(osabi, f"<unknown: {osabi:x}>"),
+            _MACHINE_NAMES.get(machine, f"<unknown>: 0x{machine:x}"),
+        )
+        self.sections: list[tuple] = []
+        if shoff:
+            if shentsize != section.size:
+                raise ElfFormatError(f"Unexpected section header size {shentsize}")
+            if shnum == 0:
+                # More sections than e_shnum can hold: the count is in the first section's sh_size
+                shnum = self._unpack(section, shoff)[5]
+            self.sections = [self._unpack(section, shoff + index * shentsize) for index in range(shnum)]
+
+    def _unpack(self, layout: struct.Struct, offset: int) -> tuple:
+        if offset < 0 or offset + layout.size > len(self.data):
+            raise ElfFormatError("Truncated ELF file")
+        return layout.unpack_from(self.data, offset)
+
+    def _section_data(self, section: tuple, entry_size: int = 1) -> memoryview:
+        """The section's whole entries, as a view the caller must release."""
+        offset, size = section[4], section[5]
+        if offset + size > len(self.data):
+            raise ElfFormatError("Section extends past the end of the file")
+        return self.data[offset : offset + size - size % entry_size]
+
+    def _strings(self, link: int) -> bytes:
+        if link >= len(self.sections):
+            raise ElfFormatError(f"String table {link} does not exist")
+        with self._section_data(self.sections[link]) as strings:
+            return bytes(strings)
+
+    @staticmethod
+    def _string(strings: bytes, offset: int) -> str:
+        end = strings.find(b"\0", offset)
+        return strings[offset : end if end >= 0 else len(strings)].decode("utf-8", "replace")
+
+    def symbols(self) -> Iterator[tuple[str, bool]]:
+        """(name, defined) of every named symbol in .symtab and .dynsym."""
+        for section in self.sections:
+            if section[1] not in (_SHT_SYMTAB, _SHT_DYNSYM):
+                continue
+            strings = self._strings(section[6])
+            with self._section_data(section, self.symbol_struct.size) as table:
+                for symbol in self.symbol_struct.iter_unpack(table):
+                    name_offset = symbol[self.symbol_name_field]
+                    if name_offset:
+                        name = self._string(strings, name_offset)
+                        if name:
+                            yield name, symbol[self.symbol_shndx_field] != _SHN_UNDEF
+
+    def needed(self) -> Iterator[str]:
+        for section in self.sections:
+            if section[1] != _SHT_DYNAMIC:
+                continue
+            strings = self._strings(section[6])
+            with self._section_data(section, self.dynamic_struct.size) as table:
+                for tag, value in self.dynamic_struct.iter_unpack(table):
+                    if tag == _DT_NULL:
+                        break
+                    if tag == _DT_NEEDED:
+                        yield self._string(strings, value)
+
+
+def _archive_members(data: memoryview) -> Iterator[memoryview]:
+    offset = len(AR_MAGIC)
+    while offset + _AR_HEADER_SIZE <= len(data):
+        header = bytes(data[offset : offset + _AR_HEADER_SIZE])
+        if header[58:60] != b"`\n":
+            raise ElfFormatError(f"Bad archive member header at {offset}")
+        name = header[:16].rstrip(b" ")
+        try:
+            size = int(header[48:58])
+        except ValueError as e:
+            raise ElfFormatError(f"Bad archive member size at {offset}") from e
+        start = offset + _AR_HEADER_SIZE
+        offset = start + size + (size & 1)
+        if name in (b"/", b"//", b"/SYM64/") or name.startswith(b"__.SYMDEF"):
+            continue  # symbol index and long name table
+        if name.startswith(b"#1/"):
+            # BSD: the name follows the header, inside the member
+            try:
+                name_length = int(name[3:])
+            except ValueError as e:
+                raise ElfFormatError(f"Bad archive member name at {start - _AR_HEADER_SIZE}") from e
+            start, size = start + name_length, size - name_length
+        yield data[start : start + size]
+
+
+def _summarise(data: memoryview) -> ElfSummary:
+    if data[: len(AR_MAGIC)] == AR_MAGIC:
+        members = [member for member in _archive_members(data) if member[:4] == ELF_MAGIC]
+    elif data[:4] == ELF_MAGIC:
+        members = [data]
+    else:
+        raise ElfFormatError("Neither an ELF file nor an ar archive")
+
+    headers = []
+    needed: list[str] = []
+    defined: set[str] = set()
+    undefined: set[str] = set()
+    try:
+        for member in members:
+            parser = _ElfParser(member)
+            headers.append(parser.header)
+            needed.extend(parser.needed())
+            for name, is_defined in parser.symbols():
+                (defined if is_defined else undefined).add(name)
+    finally:
+        # An error's traceback keeps the parser alive; the file can't be unmapped while it has views
+        for member in members:
+            member.release()
+    return ElfSummary(tuple(headers), tuple(needed), frozenset(defined), frozenset(undefined))
+
+
+_cache: OrderedDict[bytes, ElfSummary] = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def read_elf(path: str | Path) -> ElfSummary:
+    """Summarise the ELF file or ar archive at path.
+
+    Raises:
+        ElfFormatError: It isn't one (it may be a linker script, say)
+    """
+    with open(path, "rb") as f:
+        digest = hashlib.file_digest(f, "blake2b").digest()
+        with _cache_lock:
+            if digest in _cache:
+                _cache.move_to_end(digest)
+                return _cache[digest]
+        if f.seek(0, 2) == 0:
+            raise ElfFormatError("Empty file")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                summary = _summarise(view)
+            finally:
+                view.release()
+    with _cache_lock:
+        _cache[digest] = summary
+        while len(_cache) > _RESULT_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return summary
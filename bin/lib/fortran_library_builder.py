@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import contextlib
 import csv
+import functools
 import glob
 import hashlib
 import itertools
@@ -21,6 +22,7 @@ import requests
 
 from lib.amazon import get_ssm_param
 from lib.amazon_properties import get_properties_compilers_and_libraries, get_specific_library_version_details
+from lib.compiler_probe_cache import shared_probe_cache
 from lib.installation_context import FetchFailure, PostFailure
 from lib.library_build_config import LibraryBuildConfig
 from lib.library_builder import (
@@ -37,6 +39,7 @@ from lib.library_builder import (
     resil_post,
 )
 from lib.library_platform import LibraryPlatform
+from lib.source_tree import materialise_source_tree
 from lib.staging import StagingDir
 
 _TIMEOUT = 600
@@ -54,7 +57,6 @@ build_supported_flagscollection = [[""]]
 disable_clang_libcpp = [""]
 
 _propsandlibs: dict[str, Any] = defaultdict(lambda: [])
-_supports_x86: dict[str, Any] = defaultdict(lambda: [])
 
 GITCOMMITHASH_RE = re.compile(r"^(\w*)\s.*")
 
@@ -211,8 +213,17 @@ class FortranLibraryBuilder:
         if fixedTarget:
             return fixedTarget == arch
 
-        fullenv = os.environ
-        fullenv["LD_LIBRARY_PATH"] = ldPath
+        return shared_probe_cache().probe(
+            "fortran-arch",
+            exe,
+            lambda: self._probe_compiler_support(exe, compilerType, arch, ldPath),
+            options=options,
+            ld_path=ldPath,
+            detail=f"{compilerType}|{arch}",
+        )
+
+    def _probe_compiler_support(self, exe, compilerType, arch, ldPath):
+        fullenv = {**os.environ, "LD_LIBRARY_PATH": ldPath}
 
         if not compilerType:
             try:
@@ -230,10 +241,18 @@ class FortranLibraryBuilder:
             return False
 
     def does_compiler_support_x86(self, exe, compilerType, options, ldPath):
-        cachekey = f"{exe}|{options}"
-        if cachekey not in _supports_x86:
-            _supports_x86[cachekey] = self.does_compiler_support(exe, compilerType, "x86", options, ldPath)
-        return _supports_x86[cachekey]
+        return self.does_compiler_support(exe, compilerType, "x86", options, ldPath)
+
+    def warm_compiler_probes(self, compilers: list[str]) -> None:
+        """Probe the architectures of every compiler makebuild will consider, in parallel, ahead of it."""
+
+        def probe(compiler):
+            props = self.compilerprops[compiler]
+            compiler_type = self.get_compiler_type(compiler)
+            for arch in filter(None, [self.buildconfig.build_fixed_arch, "x86"]):
+                self.does_compiler_support(props["exe"], compiler_type, arch, props["options"], props["ldPath"])
+
+        shared_probe_cache().warm(functools.partial(probe, compiler) for compiler in compilers)
 
     def replace_optional_arg(self, arg, name, value):
         optional = "%" + name + "?%"
@@ -598,6 +617,15 @@ class FortranLibraryBuilder:
         # Just wrote a new annotation server-side; bulk cache is stale.
         self._annotations_bulk = None
 
+    def materialise_source(self, build_folder: str) -> None:
+        stats = materialise_source_tree(
+            self.sourcefolder,
+            build_folder,
+            self.buildconfig.source_tree,
+            self.buildconfig.source_tree_writable,
+        )
+        self.logger.info(f"Source tree materialised: {stats.describe()}")
+
     def makebuildfor(
         self,
         compiler,
@@ -657,7 +685,7 @@ class FortranLibraryBuilder:
                 return BuildStatus.Skipped
 
         if requires_tree_copy:
-            shutil.copytree(self.sourcefolder, build_folder, dirs_exist_ok=True)
+            self.materialise_source(build_folder)
 
         if not self.install_context.dry_run and not self.conanserverproxy_token:
             self.conanproxy_login()
@@ -796,11 +824,16 @@ class FortranLibraryBuilder:
             if checkcompiler not in self.compilerprops:
                 self.logger.error(f"Unknown compiler {checkcompiler}")
 
+        compilers = []
         for compiler in self.compilerprops:
             if not self.should_build_with_compiler(compiler, checkcompiler, buildfor):
                 self.logger.debug(f"Skipping {compiler}")
-                continue
+            else:
+                compilers.append(compiler)
+
+        self.warm_compiler_probes(compilers)
 
+        for compiler in compilers:
             compilerType = self.get_compiler_type(compiler)
 
             exe = self.compilerprops[compiler]["exe"]
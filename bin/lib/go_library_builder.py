@@ -14,7 +14,9 @@ import os
 import shutil
 import subprocess
 from collections import defaultdict
-from collections.abc import Generator
+from collections.abc import Generator, Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
 from enum import Enum, unique
 from pathlib import Path
 from typing import Any, TextIO
@@ -24,7 +26,7 @@ import requests
 from lib.amazon import get_ssm_param
 from lib.amazon_properties import get_properties_compilers_and_libraries
 from lib.cache_delta import CacheDeltaCapture
-from lib.golang_stdlib import go_supports_trimpath
+from lib.golang_stdlib import get_arch_marker_file, get_go_version, go_module_flags, go_supports_trimpath
 from lib.installation_context import InstallationContext, PostFailure
 from lib.library_build_config import LibraryBuildConfig
 from lib.library_builder import (
@@ -41,6 +43,7 @@ from lib.library_builder import (
     resil_post,
 )
 from lib.library_platform import LibraryPlatform
+from lib.source_tree import materialise_source_tree
 from lib.staging import StagingDir
 
 _LOGGER = logging.getLogger(__name__)
@@ -102,6 +105,18 @@ class BuildStatus(Enum):
     TimedOut = 3
 
 
+@dataclass
+class GoBuildJob:
+    """A compiler configuration to build the module for, and the folder it's built in."""
+
+    compiler: str
+    buildos: str
+    buildtype: str
+    arch: str
+    build_folder: Path
+    build_method: str
+
+
 @contextlib.contextmanager
 def open_script(script: Path) -> Generator[TextIO, None, None]:
     """Context manager to create an executable script file."""
@@ -114,8 +129,8 @@ class GoLibraryBuilder:
     """Builds Go modules for specific compiler versions.
 
     This builder:
-    1. Downloads module sources to a GOPATH
-    2. Builds with the compiler's stdlib cache as baseline
+    1. Downloads the module and its dependency graph once, to a GOPATH every build shares
+    2. Builds for each compiler, in parallel if asked, with its stdlib cache as baseline
     3. Captures only the GOCACHE delta (new compiled artifacts)
     4. Packages both cache_delta and module_sources for Conan
     """
@@ -208,15 +223,30 @@ class GoLibraryBuilder:
             return cache_path
         return None
 
-    def _download_module(self, go_binary: Path, gopath: Path, goroot: Path) -> bool:
-        """Download module sources to GOPATH."""
-        module_spec = f"{self.module_path}@{self.target_name}"
-        self.logger.info("Downloading module %s", module_spec)
+    def _get_target(self, compiler: str) -> tuple[str, str]:
+        """GOOS and GOARCH a compiler builds for, as CE runs it."""
+        goos = self.compilerprops[compiler].get("goos") or "linux"
+        goarch = self.compilerprops[compiler].get("goarch") or "amd64"
+        return goos, goarch
 
+    def _module_env(self, go_binary: Path, goroot: Path, gopath: Path) -> dict[str, str]:
+        """Environment for go commands using the module cache in gopath, which builds share."""
         env = os.environ.copy()
         env["GOROOT"] = str(goroot)
         env["GOPATH"] = str(gopath)
+        env["GOMODCACHE"] = str(gopath / "pkg" / "mod")
         env["GOPROXY"] = "https://proxy.golang.org,direct"
+        flags = go_module_flags(go_binary)
+        if flags:
+            env["GOFLAGS"] = flags
+        return env
+
+    def _download_module(self, go_binary: Path, gopath: Path, goroot: Path) -> bool:
+        """Download module sources to GOPATH."""
+        module_spec = f"{self.module_path}@{self.target_name}"
+        self.logger.info("Downloading module %s", module_spec)
+
+        env = self._module_env(go_binary, goroot, gopath)
 
         try:
             result = subprocess.run(
@@ -235,19 +265,8 @@ class GoLibraryBuilder:
             self.logger.error("Timeout downloading module %s", module_spec)
             return False
 
-    def _build_module(
-        self,
-        go_binary: Path,
-        goroot: Path,
-        gopath: Path,
-        gocache: Path,
-        build_dir: Path,
-        compiler: str,
-    ) -> bool:
-        """Build the module to populate GOCACHE."""
-        self.logger.info("Building module to populate cache")
-
-        # Create a minimal test program that imports the module
+    def _write_test_module(self, build_dir: Path) -> None:
+        """Write a minimal program that imports the module, and the go.mod requiring it."""
         # Use import_path for modules where root package isn't importable (e.g., protobuf)
         test_program = build_dir / "main.go"
         test_program.write_text(f'''package main
@@ -265,15 +284,62 @@ go 1.21
 require {self.module_path} {self.target_name}
 """)
 
-        env = os.environ.copy()
-        env["GOROOT"] = str(goroot)
-        env["GOPATH"] = str(gopath)
+    def prefetch_modules(self, jobs: list[GoBuildJob], gopath: Path, prefetch_dir: Path) -> bool:
+        """Download the module and what it imports once, into the module cache the jobs share.
+
+        Uses the newest Go among the jobs. The builds then resolve everything from the cache, and
+        only go to the network for anything a particular Go version needs beyond it.
+        """
+        compiler = max(
+            (job.compiler for job in jobs),
+            key=lambda compiler: get_go_version(self._get_go_binary(compiler)) or (0, 0),
+        )
+        go_binary = self._get_go_binary(compiler)
+        goroot = self._get_goroot(compiler)
+        gopath.mkdir(parents=True, exist_ok=True)
+        if not self._download_module(go_binary, gopath, goroot):
+            return False
+
+        # Resolve what the builds import, as they will, rather than downloading the whole module graph
+        self.logger.info("Prefetching the dependencies of %s with %s", self.module_path, compiler)
+        prefetch_dir.mkdir(parents=True, exist_ok=True)
+        self._write_test_module(prefetch_dir)
+        try:
+            result = subprocess.run(
+                [str(go_binary), "mod", "tidy"],
+                env=self._module_env(go_binary, goroot, gopath),
+                cwd=prefetch_dir,
+                capture_output=True,
+                text=True,
+                timeout=_TIMEOUT,
+                check=False,
+            )
+        except subprocess.TimeoutExpired:
+            self.logger.warning("Timeout running go mod tidy, builds will download what they need")
+            return True
+        # Not fatal: each build still resolves (and downloads) whatever it needs itself
+        if result.returncode != 0:
+            self.logger.warning("go mod tidy failed: %s", result.stderr[:500])
+        return True
+
+    def _build_module(
+        self,
+        go_binary: Path,
+        goroot: Path,
+        gopath: Path,
+        gocache: Path,
+        build_dir: Path,
+        compiler: str,
+    ) -> bool:
+        """Build the module to populate GOCACHE."""
+        self.logger.info("Building module to populate cache")
+
+        self._write_test_module(build_dir)
+
+        env = self._module_env(go_binary, goroot, gopath)
         env["GOCACHE"] = str(gocache)
-        env["GOPROXY"] = "https://proxy.golang.org,direct"
         # Match CE runtime environment for cache compatibility
-        # Get goos/goarch from compiler properties with defaults
-        goos = self.compilerprops[compiler].get("goos") or "linux"
-        goarch = self.compilerprops[compiler].get("goarch") or "amd64"
+        goos, goarch = self._get_target(compiler)
         env["CGO_ENABLED"] = "1"
         env["GOOS"] = goos
         env["GOARCH"] = goarch
@@ -613,15 +679,15 @@ require {self.module_path} {self.target_name}
             shutil.rmtree(buildfolder, ignore_errors=True)
             self.logger.info("Removing %s", buildfolder)
 
-    def makebuildfor(
+    def prepare_build(
         self,
         compiler: str,
         buildos: str,
         buildtype: str,
         arch: str,
         staging: StagingDir,
-    ) -> BuildStatus:
-        """Build library for a specific compiler configuration."""
+    ) -> GoBuildJob | BuildStatus:
+        """Set up the build folder for a compiler configuration, or say why it isn't built."""
         build_method = get_build_method(compiler)
 
         combined_hash = self.makebuildhash(compiler, buildos, buildtype, arch)
@@ -649,65 +715,65 @@ require {self.module_path} {self.target_name}
         if not self.install_context.dry_run and not self.conanserverproxy_token:
             self.conanproxy_login()
 
-        # Get compiler paths
-        go_binary = self._get_go_binary(compiler)
-        goroot = self._get_goroot(compiler)
-        stdlib_cache = self._get_stdlib_cache(compiler)
+        if self._get_stdlib_cache(compiler) is None:
+            self.logger.info("No stdlib cache found for %s, skipping library build", compiler)
+            return BuildStatus.Skipped
+
+        return GoBuildJob(compiler, buildos, buildtype, arch, build_folder, build_method)
+
+    def compile_build(self, job: GoBuildJob, gopath: Path) -> BuildStatus:
+        """Build the module for a job and lay out its package, against the shared module cache in gopath.
 
+        Only reads the builder's state, so jobs can run at the same time.
+        """
+        go_binary = self._get_go_binary(job.compiler)
+        goroot = self._get_goroot(job.compiler)
+        stdlib_cache = self._get_stdlib_cache(job.compiler)
         if stdlib_cache is None:
-            self.logger.info("No stdlib cache found for %s, skipping library build", compiler)
             return BuildStatus.Skipped
 
-        # Set up directories
-        gopath = build_folder / "gopath"
-        gocache = build_folder / "gocache"
-        source_dir = build_folder / "source"
-        gopath.mkdir(exist_ok=True)
-        gocache.mkdir(exist_ok=True)
-        source_dir.mkdir(exist_ok=True)
+        goos, goarch = self._get_target(job.compiler)
+        if not get_arch_marker_file(stdlib_cache, f"{goos}/{goarch}").exists():
+            self.logger.warning(
+                "Stdlib cache of %s was not built for %s/%s, its packages will be in the cache delta",
+                job.compiler,
+                goos,
+                goarch,
+            )
 
-        # Download module
-        if not self._download_module(go_binary, gopath, goroot):
-            self.save_build_logging(BuildStatus.Failed, log_folder, build_method)
-            return BuildStatus.Failed
+        gocache = job.build_folder / "gocache"
+        source_dir = job.build_folder / "source"
+        source_dir.mkdir(exist_ok=True)
 
-        # Set up delta capture
+        # Start from the prebuilt stdlib cache, cloned rather than copied where the filesystem
+        # allows, and capture it as the baseline
+        stats = materialise_source_tree(stdlib_cache, gocache, "reflink")
+        self.logger.debug("Stdlib cache materialised: %s", stats.describe())
         delta_capture = CacheDeltaCapture(gocache)
-
-        # Copy stdlib cache to gocache and capture baseline
-        if stdlib_cache and stdlib_cache.exists():
-            shutil.copytree(stdlib_cache, gocache, dirs_exist_ok=True)
         delta_capture.capture_baseline()
 
         # Build module
-        if not self._build_module(go_binary, goroot, gopath, gocache, source_dir, compiler):
-            self.save_build_logging(BuildStatus.Failed, log_folder, build_method)
+        if not self._build_module(go_binary, goroot, gopath, gocache, source_dir, job.compiler):
             return BuildStatus.Failed
 
         # Capture delta
         delta_count = delta_capture.get_delta_count()
-        self.logger.info("Cache delta: %d files", delta_count)
+        self.logger.info("Cache delta for %s: %d files", job.compiler, delta_count)
 
         # Create package structure
-        pkg_dir = build_folder / "package"
+        pkg_dir = job.build_folder / "package"
         pkg_dir.mkdir(exist_ok=True)
 
         # Copy delta to package
         cache_delta_dir = pkg_dir / "cache_delta"
         delta_capture.copy_delta_to(cache_delta_dir)
 
-        # Copy module sources
-        module_sources_dir = pkg_dir / "module_sources"
-        mod_cache = gopath / "pkg" / "mod"
-        if mod_cache.exists():
-            shutil.copytree(mod_cache, module_sources_dir, dirs_exist_ok=True)
-
         # Create metadata
         go_sum = self._get_go_sum(source_dir)
         metadata = {
             "module": self.module_path,
             "version": self.target_name,
-            "go_version": compiler,
+            "go_version": job.compiler,
             "cache_files_count": delta_count,
             "cache_size_bytes": delta_capture.get_delta_size_bytes(),
             "go_mod_require": f"{self.module_path} {self.target_name}",
@@ -716,30 +782,105 @@ require {self.module_path} {self.target_name}
         (pkg_dir / "metadata.json").write_text(json.dumps(metadata, indent=2))
 
         # Copy package contents to build folder for Conan
-        shutil.copytree(pkg_dir, build_folder, dirs_exist_ok=True)
+        shutil.copytree(pkg_dir, job.build_folder, dirs_exist_ok=True)
+        return BuildStatus.Ok
+
+    def copy_module_sources(self, job: GoBuildJob, gopath: Path) -> BuildStatus:
+        """Package the shared module cache with a compiled job, once no build can still be writing to it."""
+        mod_cache = gopath / "pkg" / "mod"
+        if not mod_cache.exists():
+            return BuildStatus.Ok
+        try:
+            stats = materialise_source_tree(mod_cache, job.build_folder / "module_sources", "reflink")
+        except OSError:
+            self.logger.exception("Unable to copy module sources for %s", job.compiler)
+            return BuildStatus.Failed
+        self.logger.debug("Module sources materialised: %s", stats.describe())
+        return BuildStatus.Ok
+
+    def export_build(self, job: GoBuildJob, status: BuildStatus) -> BuildStatus:
+        """Export a compiled job to Conan and report how it went."""
+        self.set_current_conan_build_parameters(job.buildos, job.buildtype, job.compiler, job.arch)
+        log_folder = job.build_folder / "log"
+        if status != BuildStatus.Ok:
+            self.save_build_logging(status, log_folder, job.build_method)
+            return status
 
         # Export to Conan
-        self.writeconanscript(build_folder)
+        self.writeconanscript(job.build_folder)
         if not self.install_context.dry_run:
-            export_status = self.executeconanscript(build_folder)
+            export_status = self.executeconanscript(job.build_folder)
             if export_status == BuildStatus.Ok:
                 self.needs_uploading += 1
-                self.set_as_uploaded(build_folder, build_method)
-            self.save_build_logging(export_status, log_folder, build_method)
+                self.set_as_uploaded(job.build_folder, job.build_method)
+            self.save_build_logging(export_status, log_folder, job.build_method)
 
             if export_status != BuildStatus.Ok:
                 return export_status
         else:
             self.logger.info("Dry run: would export package")
 
-        self.build_cleanup(build_folder)
+        self.build_cleanup(job.build_folder)
         return BuildStatus.Ok
 
-    def makebuild(self, buildfor: str) -> list[int]:
+    def run_build_job(self, job: GoBuildJob, gopath: Path) -> BuildStatus:
+        try:
+            return self.compile_build(job, gopath)
+        except Exception:
+            # Broad catch is intentional: one compiler's build must not abort the others
+            self.logger.exception("Build of %s failed with an unexpected exception", job.compiler)
+            return BuildStatus.Failed
+
+    def run_build_jobs(
+        self, jobs: list[GoBuildJob], gopath: Path, max_workers: int
+    ) -> Iterator[tuple[GoBuildJob, BuildStatus]]:
+        """Compile jobs, up to max_workers at once, yielding each with its status as it finishes."""
+        if max_workers <= 1 or len(jobs) <= 1:
+            for job in jobs:
+                yield job, self.run_build_job(job, gopath)
+            return
+
+        workers = min(max_workers, len(jobs))
+        self.logger.info("Running %d builds, %d at a time", len(jobs), workers)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(self.run_build_job, job, gopath): job for job in jobs}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
+    def build_all(self, jobs: list[GoBuildJob], staging: StagingDir, max_workers: int = 1) -> list[BuildStatus]:
+        """Prefetch the module once, compile the jobs against it, then package and export each."""
+        gopath = staging.path / "gopath"
+        if not self.prefetch_modules(jobs, gopath, staging.path / "prefetch"):
+            return [self.export_build(job, BuildStatus.Failed) for job in jobs]
+        # Builds may download into the shared module cache until the last one finishes, so it's only
+        # packaged after that. Conan export and the proxy calls around it stay on this thread, one at a time
+        compiled = list(self.run_build_jobs(jobs, gopath, max_workers))
+        return [
+            self.export_build(job, self.copy_module_sources(job, gopath) if status == BuildStatus.Ok else status)
+            for job, status in compiled
+        ]
+
+    def makebuildfor(
+        self,
+        compiler: str,
+        buildos: str,
+        buildtype: str,
+        arch: str,
+        staging: StagingDir,
+    ) -> BuildStatus:
+        """Build library for a specific compiler configuration."""
+        job = self.prepare_build(compiler, buildos, buildtype, arch, staging)
+        if isinstance(job, BuildStatus):
+            return job
+        [status] = self.build_all([job], staging)
+        return status
+
+    def makebuild(self, buildfor: str, max_workers: int = 1) -> list[int]:
         """Build library for all or specific compiler.
 
         Args:
             buildfor: Specific compiler ID, "forceall" for all compilers, or empty for all.
+            max_workers: How many compilers to build for at once.
 
         Returns:
             List of [succeeded, skipped, failed] counts.
@@ -761,6 +902,8 @@ require {self.module_path} {self.target_name}
                 return [0, 0, 1]
 
         with self.install_context.new_staging_dir() as staging:
+            statuses = []
+            jobs = []
             for compiler in self.compilerprops:
                 if checkcompiler and compiler != checkcompiler:
                     continue
@@ -781,15 +924,24 @@ require {self.module_path} {self.target_name}
                 for buildos in BUILD_SUPPORTED_OS:
                     for buildtype in BUILD_SUPPORTED_BUILDTYPE:
                         for arch in BUILD_SUPPORTED_ARCH:
-                            buildstatus = self.makebuildfor(compiler, buildos, buildtype, arch, staging)
-                            if buildstatus == BuildStatus.Ok:
-                                builds_succeeded += 1
-                            elif buildstatus == BuildStatus.Skipped:
-                                builds_skipped += 1
+                            job = self.prepare_build(compiler, buildos, buildtype, arch, staging)
+                            if isinstance(job, BuildStatus):
+                                statuses.append(job)
                             else:
-                                builds_failed += 1
+                                jobs.append(job)
+
+            if jobs:
+                statuses.extend(self.build_all(jobs, staging, max_workers))
+
+            for buildstatus in statuses:
+                if buildstatus == BuildStatus.Ok:
+                    builds_succeeded += 1
+                elif buildstatus == BuildStatus.Skipped:
+                    builds_skipped += 1
+                else:
+                    builds_failed += 1
 
-                if builds_succeeded > 0:
-                    self.upload_builds()
+            if builds_succeeded > 0:
+                self.upload_builds()
 
         return [builds_succeeded, builds_skipped, builds_failed]
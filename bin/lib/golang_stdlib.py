@@ -10,8 +10,12 @@ import logging
 import os
 import re
 import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+from lib.compiler_probe_cache import shared_probe_cache
+
 _LOGGER = logging.getLogger(__name__)
 
 DEFAULT_ARCHITECTURES = ["linux/amd64", "linux/arm", "linux/arm64"]
@@ -19,15 +23,22 @@ STDLIB_CACHE_DIR = "cache"
 
 # -trimpath was introduced in Go 1.13
 _TRIMPATH_MIN_VERSION = (1, 13)
+# -mod=mod and -modcacherw were introduced in Go 1.14
+_MODULE_FLAGS_MIN_VERSION = (1, 14)
 
 _GO_VERSION_RE = re.compile(r"go(\d+)\.(\d+)")
 
 
 def get_go_version(go_binary: Path) -> tuple[int, int] | None:
-    """Get the major.minor version of a Go binary by running 'go version'.
+    """Get the major.minor version of a Go binary by running 'go version' (once per build of go).
 
     Returns (major, minor) tuple, e.g. (1, 21) for Go 1.21, or None on failure.
     """
+    version = shared_probe_cache().probe("go-version", go_binary, lambda: _run_go_version(go_binary))
+    return (version[0], version[1]) if version else None
+
+
+def _run_go_version(go_binary: Path) -> tuple[int, int] | None:
     try:
         result = subprocess.run(
             [str(go_binary), "version"],
@@ -56,6 +67,14 @@ def go_supports_trimpath(go_binary: Path) -> bool:
     return ver >= _TRIMPATH_MIN_VERSION
 
 
+def go_module_flags(go_binary: Path) -> str:
+    """GOFLAGS for builds sharing a module cache: go.mod may be updated, and the cache stays removable."""
+    ver = get_go_version(go_binary)
+    if ver is not None and ver < _MODULE_FLAGS_MIN_VERSION:
+        return ""
+    return "-mod=mod -modcacherw"
+
+
 def is_go_installation(install_path: Path) -> bool:
     """Check if a path contains a Go installation."""
     go_binary = install_path / "go" / "bin" / "go"
@@ -107,11 +126,124 @@ def is_stdlib_already_built(install_path: Path, architectures: list[str] | None
     return True
 
 
+def _build_arch(go_binary: Path, env: dict[str, str], arch: str, use_trimpath: bool, jobs: int | None) -> bool:
+    """Run `go build std` for one "OS/ARCH" into the GOCACHE env names."""
+    try:
+        goos, goarch = arch.split("/")
+    except ValueError:
+        _LOGGER.error("Invalid architecture format '%s', expected 'OS/ARCH' (e.g., 'linux/amd64')", arch)
+        return False
+
+    _LOGGER.info("  Building for %s/%s...", goos, goarch)
+
+    build_env = env.copy()
+    build_env["GOOS"] = goos
+    build_env["GOARCH"] = goarch
+    # Disable CGO for cross-platform stdlib builds (avoids C toolchain dependencies)
+    build_env["CGO_ENABLED"] = "0"
+
+    try:
+        # Use -trimpath to match CE runtime behavior (CE uses -trimpath when compiling)
+        # This ensures stdlib cache entries have portable action IDs
+        # -trimpath requires Go >= 1.13
+        build_cmd = [str(go_binary), "build"]
+        if use_trimpath:
+            build_cmd.append("-trimpath")
+        if jobs is not None:
+            build_cmd.append(f"-p={jobs}")
+        build_cmd.extend(["-v", "std"])
+        result = subprocess.run(
+            build_cmd,
+            env=build_env,
+            capture_output=True,
+            text=True,
+            check=False,
+            timeout=600,  # 10 minute timeout per architecture
+        )
+
+        if result.returncode != 0:
+            _LOGGER.error("Failed to build stdlib for %s/%s:", goos, goarch)
+            _LOGGER.error("  stdout: %s", result.stdout)
+            _LOGGER.error("  stderr: %s", result.stderr)
+            return False
+        _LOGGER.info("  ✓ Built for %s/%s", goos, goarch)
+        return True
+
+    except subprocess.TimeoutExpired:
+        _LOGGER.error("Timeout building stdlib for %s/%s", goos, goarch)
+        return False
+    except OSError as e:
+        _LOGGER.error("Error building stdlib for %s/%s: %s", goos, goarch, e)
+        return False
+
+
+def _mark_built(gocache: Path, arch: str) -> None:
+    marker_file = get_arch_marker_file(gocache, arch)
+    marker_file.write_text(f"Built at: {os.environ.get('USER', 'unknown')}\n")
+
+
+def merge_cache_shard(shard: Path, gocache: Path) -> int:
+    """Move the entries of a GOCACHE shard into gocache, keeping any gocache already has.
+
+    Entries are named by their content or action hash, so one already present is the same entry.
+    Returns the number of entries moved.
+    """
+    moved = 0
+    for root, _, files in os.walk(shard):
+        target_dir = gocache / Path(root).relative_to(shard)
+        target_dir.mkdir(parents=True, exist_ok=True)
+        for name in files:
+            target = target_dir / name
+            if not target.exists():
+                os.replace(Path(root) / name, target)
+                moved += 1
+    return moved
+
+
+def _build_archs_in_parallel(
+    go_binary: Path,
+    env: dict[str, str],
+    architectures: list[str],
+    gocache: Path,
+    use_trimpath: bool,
+    max_workers: int,
+    cpu_budget: int,
+) -> list[str]:
+    """Build each architecture into its own GOCACHE shard, merging each into gocache as it finishes.
+
+    Returns the architectures that were built.
+    """
+    workers = max(1, min(max_workers, len(architectures), cpu_budget))
+    jobs = max(1, cpu_budget // workers)
+    _LOGGER.info("  Building %d architectures, %d at a time with -p=%d", len(architectures), workers, jobs)
+
+    built = []
+    # Shards sit next to the cache so merging them is a rename, not a copy
+    with tempfile.TemporaryDirectory(prefix=".gocache-shards-", dir=gocache.parent) as shards_dir:
+        shards = {arch: Path(shards_dir) / arch.replace("/", "_") for arch in architectures}
+
+        def build(arch: str) -> bool:
+            return _build_arch(go_binary, {**env, "GOCACHE": str(shards[arch])}, arch, use_trimpath, jobs)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(build, arch): arch for arch in architectures}
+            for future in as_completed(futures):
+                arch = futures[future]
+                if future.result():
+                    moved = merge_cache_shard(shards[arch], gocache)
+                    _LOGGER.debug("Merged %d cache entries for %s", moved, arch)
+                    _mark_built(gocache, arch)
+                    built.append(arch)
+    return built
+
+
 def build_go_stdlib(
     go_installation_path: Path,
     architectures: list[str] | None = None,
     cache_dir: Path | None = None,
     dry_run: bool = False,
+    max_workers: int = 1,
+    cpu_budget: int | None = None,
 ) -> bool:
     """Build Go standard library for specified architectures.
 
@@ -121,6 +253,10 @@ def build_go_stdlib(
                       If None, uses DEFAULT_ARCHITECTURES
         cache_dir: Custom cache directory path. If None, uses <install-dir>/cache
         dry_run: If True, only show what would be done without executing
+        max_workers: How many architectures to build at once. Above 1, each builds into its own
+                     GOCACHE shard, which is merged into the cache when it is done
+        cpu_budget: CPUs the concurrent builds share, split between them with `go build -p`.
+                    If None, uses every CPU
 
     Returns:
         True if build succeeded, False otherwise
@@ -157,67 +293,56 @@ def build_go_stdlib(
     env["GOROOT"] = str(goroot)
     env["GOCACHE"] = str(gocache)
 
-    success_count = 0
-    failed_archs = []
-
-    for arch in architectures:
-        try:
-            goos, goarch = arch.split("/")
-        except ValueError:
-            _LOGGER.error("Invalid architecture format '%s', expected 'OS/ARCH' (e.g., 'linux/amd64')", arch)
-            failed_archs.append(arch)
-            continue
-
-        _LOGGER.info("  Building for %s/%s...", goos, goarch)
-
-        build_env = env.copy()
-        build_env["GOOS"] = goos
-        build_env["GOARCH"] = goarch
-        # Disable CGO for cross-platform stdlib builds (avoids C toolchain dependencies)
-        build_env["CGO_ENABLED"] = "0"
-
-        try:
-            # Use -trimpath to match CE runtime behavior (CE uses -trimpath when compiling)
-            # This ensures stdlib cache entries have portable action IDs
-            # -trimpath requires Go >= 1.13
-            build_cmd = [str(go_binary), "build"]
-            if use_trimpath:
-                build_cmd.append("-trimpath")
-            build_cmd.extend(["-v", "std"])
-            result = subprocess.run(
-                build_cmd,
-                env=build_env,
-                capture_output=True,
-                text=True,
-                check=False,
-                timeout=600,  # 10 minute timeout per architecture
-            )
-
-            if result.returncode != 0:
-                _LOGGER.error("Failed to build stdlib for %s/%s:", goos, goarch)
-                _LOGGER.error("  stdout: %s", result.stdout)
-                _LOGGER.error("  stderr: %s", result.stderr)
-                failed_archs.append(arch)
-            else:
-                _LOGGER.info("  ✓ Built for %s/%s", goos, goarch)
-                success_count += 1
-                # Create marker file for this architecture
-                marker_file = get_arch_marker_file(gocache, arch)
-                marker_file.write_text(f"Built at: {os.environ.get('USER', 'unknown')}\n")
-
-        except subprocess.TimeoutExpired:
-            _LOGGER.error("Timeout building stdlib for %s/%s", goos, goarch)
-            failed_archs.append(arch)
-        except OSError as e:
-            _LOGGER.error("Error building stdlib for %s/%s: %s", goos, goarch, e)
-            failed_archs.append(arch)
+    if max_workers > 1 and len(architectures) > 1:
+        built = _build_archs_in_parallel(
+            go_binary, env, architectures, gocache, use_trimpath, max_workers, cpu_budget or os.cpu_count() or 1
+        )
+    else:
+        built = []
+        for arch in architectures:
+            if _build_arch(go_binary, env, arch, use_trimpath, None):
+                _mark_built(gocache, arch)
+                built.append(arch)
 
+    failed_archs = [arch for arch in architectures if arch not in built]
     if failed_archs:
         _LOGGER.warning("Failed to build for architectures: %s", ", ".join(failed_archs))
 
-    if success_count > 0:
-        _LOGGER.info("✓ Successfully built stdlib for %d/%d architectures", success_count, len(architectures))
+    if built:
+        _LOGGER.info("✓ Successfully built stdlib for %d/%d architectures", len(built), len(architectures))
         return True
     else:
         _LOGGER.error("✗ Failed to build stdlib for all architectures")
         return False
+
+
+def build_missing_go_stdlibs(
+    installations: list[tuple[Path, list[str]]],
+    dry_run: bool = False,
+    max_workers: int = 1,
+    cpu_budget: int | None = None,
+) -> tuple[int, int, int]:
+    """Build the stdlib of each (Go installation, architectures) that isn't built for them yet.
+
+    Returns:
+        The numbers of installations built, skipped (already built) and failed
+    """
+    built = skipped = failed = 0
+    for install_path, architectures in installations:
+        if is_stdlib_already_built(install_path, architectures):
+            _LOGGER.info("Stdlib already built for %s", install_path.name)
+            skipped += 1
+            continue
+        if dry_run:
+            _LOGGER.info("DRY RUN: would build stdlib for %s (%s)", install_path.name, ", ".join(architectures))
+            continue
+        try:
+            ok = build_go_stdlib(install_path, architectures, max_workers=max_workers, cpu_budget=cpu_budget)
+        except (RuntimeError, OSError) as e:
+            _LOGGER.error("Error building stdlib for %s: %s", install_path.name, e)
+            ok = False
+        if ok:
+            built += 1
+        else:
+            failed += 1
+    return built, skipped, failed
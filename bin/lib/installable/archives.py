@@ -11,7 +11,7 @@ import tempfile
 from collections import defaultdict
 from datetime import datetime
 from pathlib import Path
-from typing import Any
+from typing import IO, Any
 
 from lib import amazon
 from lib.amazon import list_compilers
@@ -45,7 +45,7 @@ class S3TarballInstallable(Installable):
         s3_path_prefix = self.config_get("s3_path_prefix", default_s3_path_prefix)
         self.install_path = self.config_get("path_name", default_path_name)
         self.untar_dir = self.config_get("untar_dir", default_untar_dir)
-        compression = self.config_get("compression", "xz")
+        self.compression = compression = self.config_get("compression", "xz")
         if compression == "xz":
             self.s3_path = f"{s3_path_prefix}.tar.xz"
             decompress_flag = "J"
@@ -58,17 +58,37 @@ class S3TarballInstallable(Installable):
         else:
             raise RuntimeError(f"Unknown compression {compression}")
         self.tar_cmd = ["tar", f"{decompress_flag}xf", "-"]
-        if self.config_get("extract_xattrs", False):
+        self.extract_xattrs = self.config_get("extract_xattrs", False)
+        if self.extract_xattrs:
             self.tar_cmd += ["--xattrs"]
-        strip_components = self.config_get("strip_components", 0)
-        if strip_components:
-            self.tar_cmd += ["--strip-components", str(strip_components)]
+        self.strip_components = self.config_get("strip_components", 0)
+        if self.strip_components:
+            self.tar_cmd += ["--strip-components", str(self.strip_components)]
         self.strip = self.config_get("strip", False)
 
     def fetch_and_pipe_to(self, staging: StagingDir, s3_path: str, command: list[str]) -> None:
         # Extension point for subclasses
         self.install_context.fetch_s3_and_pipe_to(staging, s3_path, command)
 
+    def fetch_archive_to(self, fd: IO[bytes]) -> None:
+        # Extension point for subclasses; must fetch the same archive as fetch_and_pipe_to
+        self.install_context.fetch_to(f"{self.install_context.s3_url}/{self.s3_path}", fd)
+
+    @property
+    def archive_root(self) -> str:
+        """The directory within the archive that gets installed."""
+        return self.untar_dir
+
+    @property
+    def can_stream_to_cefs(self) -> bool:
+        """Whether install can skip staging; anything that modifies the unpacked tree needs it."""
+        return (
+            self.install_context.can_stream_archives_to_cefs
+            and not self.strip
+            and not self.after_stage_script
+            and not self.extract_xattrs
+        )
+
     def stage(self, staging: StagingDir) -> None:
         self.fetch_and_pipe_to(staging, self.s3_path, self.tar_cmd)
         if self.strip:
@@ -85,6 +105,16 @@ class S3TarballInstallable(Installable):
 
     def install(self) -> None:
         super().install()
+        if self.can_stream_to_cefs:
+            self.install_context.install_archive_to_cefs(
+                self.name,
+                self.fetch_archive_to,
+                self.compression,
+                self.archive_root,
+                self.install_path,
+                strip_components=self.strip_components,
+            )
+            return
         with self.install_context.new_staging_dir() as staging:
             self.stage(staging)
             self.install_context.move_from_staging(staging, self.name, self.untar_dir, self.install_path)
@@ -201,6 +231,7 @@ class TarballInstallable(Installable):
         else:
             self.untar_to = "."
         self.url = self.config_get("url")
+        self.compression = self.config_get("compression")
         if self.config_get("compression") == "xz":
             decompress_flag = "J"
         elif self.config_get("compression") == "gz":
@@ -214,6 +245,8 @@ class TarballInstallable(Installable):
         else:
             raise RuntimeError(f"Unknown compression {self.config_get('compression')}")
         self.configure_command = command_config(self.config_get("configure_command", []))
+        # The zstd tar command below never gets --strip-components, so streaming installs mustn't strip either
+        self.strip_components = self.config_get("strip_components", 0) if decompress_flag != "--zstd" else 0
         if is_windows() and decompress_flag == "J":
             self.tar_cmd = ["7z", "x"]
         elif is_windows() and decompress_flag == "j":
@@ -224,18 +257,17 @@ class TarballInstallable(Installable):
             self.tar_cmd = ["tar", "--zstd", "-xf", "-"]
         else:
             self.tar_cmd = ["tar", f"{decompress_flag}xf", "-"]
-            strip_components = self.config_get("strip_components", 0)
-            if strip_components:
-                self.tar_cmd += ["--strip-components", str(strip_components)]
-        extract_only = self.config_get("extract_only", "")
-        if extract_only:
+            if self.strip_components:
+                self.tar_cmd += ["--strip-components", str(self.strip_components)]
+        self.extract_only = self.config_get("extract_only", "")
+        if self.extract_only:
             if is_windows():
-                self.subdir = extract_only.split("/")[0]
+                self.subdir = self.extract_only.split("/")[0]
                 self.untar_to = "."
             else:
-                self.tar_cmd += [extract_only]
-        extract_xattrs = self.config_get("extract_xattrs", False)
-        if extract_xattrs:
+                self.tar_cmd += [self.extract_only]
+        self.extract_xattrs = self.config_get("extract_xattrs", False)
+        if self.extract_xattrs:
             self.tar_cmd += ["--xattrs"]
         self.strip = self.config_get("strip", False)
         self.remove_older_pattern = self.config_get("remove_older_pattern", "")
@@ -251,6 +283,26 @@ class TarballInstallable(Installable):
             raise RuntimeError(f"After unpacking, {self.untar_path} was not a directory")
         self.install_context.run_script(staging, staging.path / self.untar_to, self.after_stage_script)
 
+    def fetch_archive_to(self, fd: IO[bytes]) -> None:
+        self.install_context.fetch_to(self.url, fd)
+
+    @property
+    def archive_root(self) -> str:
+        """The directory within the archive that gets installed."""
+        return "" if self.untar_to == self.untar_path else self.untar_path
+
+    @property
+    def can_stream_to_cefs(self) -> bool:
+        """Whether install can skip staging; anything that modifies the unpacked tree needs it."""
+        return (
+            self.install_context.can_stream_archives_to_cefs
+            and not self.configure_command
+            and not self.strip
+            and not self.after_stage_script
+            and not self.extract_only
+            and not self.extract_xattrs
+        )
+
     def verify(self) -> bool:
         if not super().verify():
             return False
@@ -260,19 +312,31 @@ class TarballInstallable(Installable):
 
     def install(self) -> None:
         super().install()
-        with self.install_context.new_staging_dir() as staging:
-            self.stage(staging)
-
-            if self.remove_older_pattern:
-                # Do this first, and add one for the file we haven't yet installed... (then dry run works)
-                num_to_keep = self.num_to_keep + 1
-                all_versions = list(sorted(self.install_context.glob(self.remove_older_pattern)))
-                for to_remove in all_versions[:-num_to_keep]:
-                    self.install_context.remove_dir(to_remove)
+        if self.can_stream_to_cefs:
+            self._remove_older()
+            self.install_context.install_archive_to_cefs(
+                self.name,
+                self.fetch_archive_to,
+                self.compression,
+                self.archive_root,
+                self.install_path,
+                strip_components=self.strip_components,
+            )
+        else:
+            with self.install_context.new_staging_dir() as staging:
+                self.stage(staging)
+                self._remove_older()
+                self.install_context.move_from_staging(staging, self.name, self.untar_path, self.install_path)
+        if self.install_path_symlink:
+            self.install_context.set_link(Path(self.install_path), self.install_path_symlink)
 
-            self.install_context.move_from_staging(staging, self.name, self.untar_path, self.install_path)
-            if self.install_path_symlink:
-                self.install_context.set_link(Path(self.install_path), self.install_path_symlink)
+    def _remove_older(self) -> None:
+        if self.remove_older_pattern:
+            # Do this first, and add one for the file we haven't yet installed... (then dry run works)
+            num_to_keep = self.num_to_keep + 1
+            all_versions = list(sorted(self.install_context.glob(self.remove_older_pattern)))
+            for to_remove in all_versions[:-num_to_keep]:
+                self.install_context.remove_dir(to_remove)
 
     def __repr__(self) -> str:
         return f"TarballInstallable({self.name}, {self.install_path})"
@@ -411,6 +475,11 @@ class RestQueryTarballInstallable(TarballInstallable):
             raise RuntimeError(f"No installation candidate found for {self.name} from query '{self._rest_query}'")
         super().stage(staging)
 
+    def fetch_archive_to(self, fd: IO[bytes]) -> None:
+        if not self.url:
+            raise RuntimeError(f"No installation candidate found for {self.name} from query '{self._rest_query}'")
+        super().fetch_archive_to(fd)
+
     def __repr__(self) -> str:
         return f"RestQueryTarballInstallable({self.name}, {self.install_path})"
 
@@ -430,5 +499,15 @@ class NonFreeS3TarballInstallable(S3TarballInstallable):
             _LOGGER.info("Piping to %s", shlex.join(command))
             subprocess.check_call(command, stdin=fd, cwd=untar_dir)
 
+    def fetch_archive_to(self, fd: IO[bytes]) -> None:
+        full_path = f"opt-nonfree/{self.s3_path}"
+        _LOGGER.info("Downloading %s", full_path)
+        amazon.s3_client.download_fileobj("compiler-explorer", full_path, fd)
+
+    @property
+    def archive_root(self) -> str:
+        # Unlike the public tarballs, these are unpacked inside untar_dir
+        return ""
+
     def __repr__(self) -> str:
         return f"NonFreeS3TarballInstallable({self.name}, {self.install_path})"
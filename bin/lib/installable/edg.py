@@ -238,11 +238,10 @@ class EdgCompilerInstallable(NonFreeS3TarballInstallable):
             self.stage(staging)
             return self.install_context.compare_against_staging(staging, self.untar_dir, self.install_path)
 
-    def install(self) -> None:
-        super().install()
-        with self.install_context.new_staging_dir() as staging:
-            self.stage(staging)
-            self.install_context.move_from_staging(staging, self.name, self.untar_dir, self.install_path)
+    @property
+    def can_stream_to_cefs(self) -> bool:
+        """Never: the shim script is written into the staged tree."""
+        return False
 
     def __repr__(self) -> str:
         return f"EdgCompilerInstallable({self.name}, {self.install_path})"
@@ -29,6 +29,11 @@ class GoInstallable(TarballInstallable):
         # Allow disabling stdlib build with config option
         self.build_stdlib = self.config_get("build_stdlib", True)
 
+    @property
+    def can_stream_to_cefs(self) -> bool:
+        """The stdlib cache is built in the staged tree, so only installs without one can skip staging."""
+        return super().can_stream_to_cefs and not self.build_stdlib
+
     def stage(self, staging: StagingDir) -> None:
         """Stage the Go installation and build stdlib cache.
 
@@ -64,6 +69,7 @@ class GoInstallable(TarballInstallable):
                 architectures=self.build_stdlib_archs,
                 cache_dir=cache_dir,
                 dry_run=self.install_context.dry_run,
+                max_workers=len(self.build_stdlib_archs),
             )
 
             if success:
@@ -17,7 +17,7 @@ from lib.fortran_library_builder import FortranLibraryBuilder
 from lib.go_library_builder import GoLibraryBuilder
 from lib.installation_context import InstallationContext, is_windows
 from lib.library_build_config import LibraryBuildConfig
-from lib.library_builder import LibraryBuilder
+from lib.library_builder import LibraryBuilder, PlannedBuild
 from lib.library_platform import LibraryPlatform
 from lib.nightly_versions import NightlyVersions
 from lib.rust_library_builder import RustLibraryBuilder
@@ -275,7 +275,7 @@ class Installable:
         """
         return None
 
-    def build(self, buildfor: str, popular_compilers_only: bool, platform: LibraryPlatform):
+    def build(self, buildfor: str, popular_compilers_only: bool, platform: LibraryPlatform, max_workers: int = 1):
         if not self.is_library:
             raise RuntimeError("Nothing to build")
 
@@ -295,7 +295,7 @@ class Installable:
                 popular_compilers_only,
                 platform,
             )
-            return cppbuilder.makebuild(buildfor)
+            return cppbuilder.makebuild(buildfor, max_workers)
         elif (
             self.build_config.build_type == "none"
             and self.build_config.lib_type == "headeronly"
@@ -313,7 +313,7 @@ class Installable:
                 popular_compilers_only,
                 platform,
             )
-            return cppbuilder.makebuild(buildfor)
+            return cppbuilder.makebuild(buildfor, max_workers)
         elif self.build_config.build_type == "fpm":
             sourcefolder = os.path.join(self.install_context.destination, self.install_path)
             fbuilder = FortranLibraryBuilder(
@@ -336,9 +336,31 @@ class Installable:
             gbuilder = GoLibraryBuilder(
                 _LOGGER, self.language, self.context[-1], self.target_name, self.install_context, self.build_config
             )
-            return gbuilder.makebuild(buildfor)
+            return gbuilder.makebuild(buildfor, max_workers)
         raise RuntimeError(f"Unsupported build_type ${self.build_config.build_type}")
 
+    def plan_build(self, buildfor: str, popular_compilers_only: bool, platform: LibraryPlatform) -> list[PlannedBuild]:
+        """What build() would build, skip or fail, and why, without building anything."""
+        if not self.is_library:
+            raise RuntimeError("Nothing to build")
+
+        if self.build_config.build_type not in ["cmake", "make", "none"]:
+            raise RuntimeError(f"Build planning is not supported for build_type {self.build_config.build_type}")
+
+        sourcefolder = os.path.join(self.install_context.destination, self.install_path)
+        cppbuilder = LibraryBuilder(
+            _LOGGER,
+            self.language,
+            self.context[-1],
+            self.target_name,
+            sourcefolder,
+            self.install_context,
+            self.build_config,
+            popular_compilers_only,
+            platform,
+        )
+        return cppbuilder.plan_builds(cppbuilder.build_jobs(buildfor) or [])
+
     @property
     def is_squashable(self) -> bool:
         return True
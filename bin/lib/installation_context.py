@@ -8,6 +8,7 @@ import shlex
 import shutil
 import stat
 import subprocess
+import tarfile
 import tempfile
 import time
 import uuid
@@ -19,9 +20,11 @@ import requests
 import requests.adapters
 import requests_cache
 import yaml
+import zstandard
 
 from lib.cefs.deployment import backup_and_symlink, deploy_to_cefs_transactional
 from lib.cefs.paths import get_cefs_filename_for_image, get_cefs_paths
+from lib.cefs.trash import TrashQueue
 from lib.cefs_manifest import (
     create_installable_manifest_entry,
     create_manifest,
@@ -29,7 +32,12 @@ from lib.cefs_manifest import (
 from lib.config import Config
 from lib.config_safe_loader import ConfigSafeLoader
 from lib.library_platform import LibraryPlatform
-from lib.squashfs import create_squashfs_image
+from lib.squashfs import (
+    copy_tar_stream_relocated,
+    create_squashfs_image,
+    create_squashfs_image_from_tar,
+    normalised_permissions,
+)
 from lib.staging import StagingDir
 
 _LOGGER = logging.getLogger(__name__)
@@ -62,18 +70,7 @@ def fix_single_permission(file_path: Path) -> None:
 
     current_mode = file_path.stat().st_mode
     current_perms = stat.S_IMODE(current_mode)
-
-    # Build expected permissions:
-    # - User always gets write, keeps read/exec
-    # - Group/other mirror user's read/exec but never get write
-    new_perms = (current_perms & stat.S_IRWXU) | stat.S_IWUSR  # Always give user write
-
-    if bool(current_perms & stat.S_IRUSR):
-        new_perms |= stat.S_IRGRP
-        new_perms |= stat.S_IROTH
-    if bool(current_perms & stat.S_IXUSR):
-        new_perms |= stat.S_IXGRP
-        new_perms |= stat.S_IXOTH
+    new_perms = normalised_permissions(current_perms)
 
     if current_perms != new_perms:
         _LOGGER.debug("Fixing permissions on %s: %s -> %s", file_path, oct(current_perms), oct(new_perms))
@@ -157,6 +154,10 @@ class InstallationContext:
         self.yaml_dir = yaml_dir
         self.resource_dir = resource_dir
         self.run_checks_as_user = check_user
+        # When set (bulk installs), old CEFS backups go here for background deletion instead of being deleted inline
+        self.trash: TrashQueue | None = None
+        # Named squashfs compression profile for new CEFS images (see SquashfsConfig.profiles); None for the default
+        self.compression_profile: str | None = None
 
     @property
     def destination(self) -> Path:
@@ -184,7 +185,9 @@ class InstallationContext:
         finally:
             if not self._keep_staging:
                 if staging_dir.path.is_dir() and not is_windows():
-                    subprocess.check_call(["chmod", "-R", "u+w", staging_dir.path])
+                    # Only the directories need to be writable to remove everything. The files may be
+                    # hardlinks to installed sources (source_tree: hardlink), whose modes we mustn't touch.
+                    subprocess.check_call(["find", staging_dir.path, "-type", "d", "-exec", "chmod", "u+w", "{}", "+"])
                 shutil.rmtree(staging_dir.path, ignore_errors=True)
 
     def fetch_rest_query(self, url: str) -> dict:
@@ -511,32 +514,101 @@ class InstallationContext:
         if not is_windows():
             fix_permissions(source_path)
 
-        installable_info = create_installable_manifest_entry(installable_name, nfs_path)
-        manifest = create_manifest(
-            operation="install",
-            description=f"Created through installation of {installable_name}",
-            contents=[installable_info],
-        )
-
         # Create temporary squashfs image
         temp_squash_file = self.config.cefs.local_temp_dir / f"temp_{uuid.uuid4()}.img"
 
         # Create squashfs image from processed content
         _LOGGER.info("Creating squashfs image from %s", source_path)
         try:
-            create_squashfs_image(self.config.squashfs, source_path, temp_squash_file)
+            create_squashfs_image(
+                self.config.squashfs,
+                source_path,
+                temp_squash_file,
+                profile=self.config.squashfs.profile(self.compression_profile),
+            )
+            self._deploy_image_to_cefs(temp_squash_file, installable_name, dest)
+        finally:
+            if temp_squash_file.exists():
+                temp_squash_file.unlink()
 
-            filename = get_cefs_filename_for_image(temp_squash_file, "install", Path(dest))
-            cefs_paths = get_cefs_paths(self.config.cefs.image_dir, self.config.cefs.mount_point, filename)
+    @property
+    def can_stream_archives_to_cefs(self) -> bool:
+        """Whether archives can be installed straight into a CEFS image (see install_archive_to_cefs)."""
+        return self.cefs_enabled and not self.dry_run and not is_windows()
 
-            if cefs_paths.image_path.exists():
-                _LOGGER.info("CEFS image already exists: %s", cefs_paths.image_path)
-                backup_and_symlink(nfs_path, cefs_paths.mount_path, self.dry_run, defer_cleanup=False)
-            else:
-                _LOGGER.info("Copying squashfs to CEFS storage: %s", cefs_paths.image_path)
-                with deploy_to_cefs_transactional(temp_squash_file, cefs_paths.image_path, manifest, self.dry_run):
-                    # TODO: Add defer_cleanup parameter to install command to speed up bulk installations
-                    backup_and_symlink(nfs_path, cefs_paths.mount_path, self.dry_run, defer_cleanup=False)
+    def install_archive_to_cefs(
+        self,
+        installable_name: str,
+        fetch: Callable[[IO[bytes]], None],
+        compression: str,
+        archive_root: str,
+        dest: PathOrString,
+        strip_components: int = 0,
+    ) -> None:
+        """Install a tarball directly into a CEFS image, without extracting it to a staging directory.
+
+        The archive is downloaded to local disk, then decompressed and streamed into mksquashfs
+        with ownership and permissions normalised on the way, so the only other local disk
+        write is the image itself. The archive's own root directory entry is dropped, so a
+        restrictive mode on it can't make the image unreadable.
+
+        Args:
+            installable_name: Full installable name, for the manifest
+            fetch: Writes the compressed archive to the file it's given
+            compression: "gz", "bz2", "xz", "tar" (none) or "zstd"
+            archive_root: Directory within the archive (after strip_components) to install; "" for all of it
+            dest: Destination relative to the installation root
+            strip_components: Leading path components to remove, like tar --strip-components
+        """
+        local_temp_dir = self.config.cefs.local_temp_dir
+        local_temp_dir.mkdir(parents=True, exist_ok=True)
+        temp_squash_file = local_temp_dir / f"temp_{uuid.uuid4()}.img"
+        try:
+            with tempfile.TemporaryFile(dir=local_temp_dir) as archive:
+                fetch(archive)
+                archive.flush()
+                archive.seek(0)
+
+                def write_tar(output: IO[bytes]) -> None:
+                    source = zstandard.ZstdDecompressor().stream_reader(archive) if compression == "zstd" else archive
+                    with tarfile.open(fileobj=output, mode="w|", format=tarfile.PAX_FORMAT) as tar_out:
+                        members, data_bytes = copy_tar_stream_relocated(
+                            source, "", tar_out, subdir=archive_root, strip_components=strip_components
+                        )
+                    if not members:
+                        raise RuntimeError(f"Missing source '{archive_root}' in archive for {installable_name}")
+                    _LOGGER.info("Streamed %d entries (%d bytes) into squashfs image", members, data_bytes)
+
+                _LOGGER.info("Creating squashfs image directly from archive for %s", installable_name)
+                create_squashfs_image_from_tar(
+                    self.config.squashfs,
+                    temp_squash_file,
+                    write_tar,
+                    profile=self.config.squashfs.profile(self.compression_profile),
+                )
+            self._deploy_image_to_cefs(temp_squash_file, installable_name, dest)
         finally:
             if temp_squash_file.exists():
                 temp_squash_file.unlink()
+
+    def _deploy_image_to_cefs(self, squashfs_image: Path, installable_name: str, dest: PathOrString) -> None:
+        """Move a freshly built squashfs image into CEFS storage and symlink dest to it."""
+        nfs_path = self.destination / dest
+        installable_info = create_installable_manifest_entry(installable_name, nfs_path)
+        manifest = create_manifest(
+            operation="install",
+            description=f"Created through installation of {installable_name}",
+            contents=[installable_info],
+            compression_profile=self.compression_profile,
+        )
+
+        filename = get_cefs_filename_for_image(squashfs_image, "install", Path(dest))
+        cefs_paths = get_cefs_paths(self.config.cefs.image_dir, self.config.cefs.mount_point, filename)
+
+        if cefs_paths.image_path.exists():
+            _LOGGER.info("CEFS image already exists: %s", cefs_paths.image_path)
+            backup_and_symlink(nfs_path, cefs_paths.mount_path, self.dry_run, defer_cleanup=False, trash=self.trash)
+        else:
+            _LOGGER.info("Copying squashfs to CEFS storage: %s", cefs_paths.image_path)
+            with deploy_to_cefs_transactional(squashfs_image, cefs_paths.image_path, manifest, self.dry_run):
+                backup_and_symlink(nfs_path, cefs_paths.mount_path, self.dry_run, defer_cleanup=False, trash=self.trash)
@@ -3,8 +3,10 @@ from __future__ import annotations
 from typing import Any
 
 from lib.installation_context import is_windows
+from lib.source_tree import STRATEGIES
 
 valid_lib_types = ["static", "shared", "cshared", "headeronly", "cmake_built_headeronly"]
+valid_source_trees = ["auto", *STRATEGIES]
 
 
 class LibraryBuildConfig:
@@ -51,6 +53,11 @@ class LibraryBuildConfig:
         self.make_utility = self.config_get("make_utility", "make")
         self.skip_compilers = self.config_get("skip_compilers", [])
         self.copy_files = self.config_get("copy_files", [])
+        self.source_tree = self.config_get("source_tree", "auto")
+        if self.source_tree not in valid_source_trees:
+            raise RuntimeError(f"{self.source_tree} not a valid source_tree, expected one of {valid_source_trees}")
+        self.source_tree_writable = self.config_get("source_tree_writable", [])
+        self.compiler_cache = self.config_get("compiler_cache", True)
         self.package_install = self.config_get("package_install", False)
         self.use_compiler = self.config_get("use_compiler", "")
         self.cxx_compiler_wrapper = self.config_get("cxx_compiler_wrapper", "")
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import contextlib
 import csv
+import functools
 import glob
 import itertools
 import json
@@ -10,10 +11,13 @@ import re
 import shutil
 import subprocess
 import tempfile
+import threading
 import time
 import urllib.parse
 from collections import defaultdict
-from collections.abc import Callable, Generator
+from collections.abc import Callable, Generator, Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
 from enum import Enum, unique
 from logging import Logger
 from pathlib import Path
@@ -26,13 +30,19 @@ from urllib3.exceptions import ProtocolError
 from lib.amazon import get_ssm_param
 from lib.amazon_properties import get_properties_compilers_and_libraries, get_specific_library_version_details
 from lib.binary_info import BinaryInfo
+from lib.compiler_cache import SCCACHE, CompilerCache, compiler_cache
+from lib.compiler_probe_cache import shared_probe_cache
+from lib.conan_upload_pipeline import ConanUploadPipeline, PendingUpload
 from lib.installation_context import FetchFailure, PostFailure
 from lib.library_build_config import LibraryBuildConfig
 from lib.library_build_history import LibraryBuildHistory
 from lib.library_platform import LibraryPlatform
+from lib.source_tree import materialise_source_tree
 from lib.staging import StagingDir
 
 _TIMEOUT = 600
+# Compilers ccache and sccache can't cache for, or whose command lines they misread
+uncacheable_compiler_types = {"edg", "win32-vc"}
 compiler_popularity_treshhold = 1000
 popular_compilers: dict[str, Any] = defaultdict(lambda: [])
 
@@ -79,7 +89,6 @@ disable_compiler_ids = [
 ]
 
 _propsandlibs: dict[str, Any] = defaultdict(lambda: [])
-_supports_x86: dict[str, Any] = defaultdict(lambda: [])
 _compiler_support_output: dict[str, Any] = defaultdict(lambda: [])
 
 GITCOMMITHASH_RE = re.compile(r"^(\w*)\s.*")
@@ -403,6 +412,48 @@ build_timeout = 1200
 
 conanserver_url = "https://conan.compiler-explorer.com"
 
+DEFAULT_MEMORY_PER_BUILD = 2 * 1024 * 1024 * 1024
+
+
+@dataclass(frozen=True)
+class BuildJob:
+    """One (compiler, combination) cell of the build matrix, as makebuildfor takes it."""
+
+    compiler: str
+    options: str
+    exe: str
+    compiler_type: str
+    toolchain: str
+    combination: tuple[Any, ...]  # buildos, buildtype, arch, stdver, stdlib, flagscombination
+    iteration: int
+
+
+@dataclass(frozen=True)
+class PlannedBuild:
+    """What makebuild will do with a job: build it (status None), or count it as status, and why."""
+
+    job: BuildJob
+    status: BuildStatus | None
+    reason: str
+
+
+def physical_memory_bytes() -> int | None:
+    """Total RAM of this machine, or None where sysconf can't tell (e.g. Windows)."""
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def build_worker_count(max_workers: int, memory_per_build: int, cpu_count: int | None, memory_bytes: int | None) -> int:
+    """How many builds to run at once: at most max_workers, one per CPU, and memory_per_build each."""
+    workers = max(1, max_workers)
+    if cpu_count:
+        workers = min(workers, cpu_count)
+    if memory_bytes and memory_per_build > 0:
+        workers = min(workers, max(1, memory_bytes // memory_per_build))
+    return workers
+
 
 def is_nvhpc_compiler(exe: str) -> bool:
     """The nvhpc compilers have no compilerType of their own, so identify them by executable name."""
@@ -442,11 +493,17 @@ class LibraryBuilder:
         self.sourcefolder = sourcefolder
         self.target_name = target_name
         self.forcebuild = False
-        self.current_buildparameters_obj: dict[str, Any] = defaultdict(lambda: [])
-        self.current_buildparameters: list[str] = []
-        self.needs_uploading = 0
+        # The parameters of the build in progress are per thread, so makebuild can run several at once.
+        self._build_state = threading.local()
+        # Conan exports and cache clearing work on the one local conan cache; only one at a time.
+        # Uploads read it alongside them, in the background.
+        self._conan_lock = threading.RLock()
+        self.make_jobs: int | None = None  # None: each build uses every CPU
+        self.upload_pipeline = ConanUploadPipeline(
+            self.upload_builds, self.annotate_upload, self.clear_conan_cache, self.logger
+        )
         self.libid = self.libname  # TODO: CE libid might be different from yaml libname
-        self.conanserverproxy_token = None
+        self.conanserverproxy_token: str | None = None
         self.current_commit_hash = ""
         self.platform = platform
         self._possible_builds: PossibleBuilds | None = None
@@ -476,6 +533,26 @@ class LibraryBuilder:
 
         self.completeBuildConfig()
 
+    @property
+    def current_buildparameters_obj(self) -> dict[str, Any]:
+        if not hasattr(self._build_state, "buildparameters_obj"):
+            self._build_state.buildparameters_obj = defaultdict(lambda: [])
+        return self._build_state.buildparameters_obj
+
+    @current_buildparameters_obj.setter
+    def current_buildparameters_obj(self, value: dict[str, Any]) -> None:
+        self._build_state.buildparameters_obj = value
+
+    @property
+    def current_buildparameters(self) -> list[str]:
+        if not hasattr(self._build_state, "buildparameters"):
+            self._build_state.buildparameters = []
+        return self._build_state.buildparameters
+
+    @current_buildparameters.setter
+    def current_buildparameters(self, value: list[str]) -> None:
+        self._build_state.buildparameters = value
+
     def completeBuildConfig(self):
         if "description" in self.libraryprops[self.libid]:
             self.buildconfig.description = self.libraryprops[self.libid]["description"]
@@ -593,6 +670,9 @@ class LibraryBuilder:
         return False
 
     def getDefaultTargetFromCompiler(self, exe):
+        return shared_probe_cache().probe("dumpmachine", exe, lambda: self._run_dumpmachine(exe))
+
+    def _run_dumpmachine(self, exe):
         try:
             # Compilers that don't know -dumpmachine (e.g. nvc) complain on stderr; we only care
             # whether we got a triple back.
@@ -605,8 +685,7 @@ class LibraryBuilder:
         if exe in _compiler_support_output:
             return _compiler_support_output[exe]
 
-        fullenv = os.environ
-        fullenv["LD_LIBRARY_PATH"] = ldPath
+        fullenv = {**os.environ, "LD_LIBRARY_PATH": ldPath}
         output = ""
 
         if not compilerType or compilerType == "win32-mingw-gcc":
@@ -657,6 +736,16 @@ class LibraryBuilder:
         if fixedTarget:
             return fixedTarget == arch
 
+        return shared_probe_cache().probe(
+            "cpp-arch",
+            exe,
+            lambda: self._probe_compiler_support(exe, compilerType, arch, ldPath),
+            options=options,
+            ld_path=ldPath,
+            detail=f"{compilerType}|{arch}",
+        )
+
+    def _probe_compiler_support(self, exe, compilerType, arch, ldPath):
         output = self.get_compiler_support_output(exe, compilerType, ldPath)
         if not compilerType:
             if "icpx" in exe:
@@ -673,10 +762,7 @@ class LibraryBuilder:
             return False
 
     def does_compiler_support_x86(self, exe, compilerType, options, ldPath):
-        cachekey = f"{exe}|{options}"
-        if cachekey not in _supports_x86:
-            _supports_x86[cachekey] = self.does_compiler_support(exe, compilerType, "x86", options, ldPath)
-        return _supports_x86[cachekey]
+        return self.does_compiler_support(exe, compilerType, "x86", options, ldPath)
 
     def does_compiler_support_amd64(self, exe, compilerType, options, ldPath):
         return self.does_compiler_support(exe, compilerType, "x86_64", options, ldPath)
@@ -835,6 +921,12 @@ class LibraryBuilder:
 
             is_msvc = compilerType == "win32-vc"
 
+            cache = self.compiler_cache_for(compilerType)
+            self._build_state.compiler_cache = cache
+            if cache:
+                for var_name, var_value in cache.build_env(buildfolder, sourcefolder).items():
+                    f.write(self.script_env(var_name, var_value))
+
             libparampaths = []
             archflag = ""
             if is_msvc:
@@ -916,7 +1008,7 @@ class LibraryBuilder:
             f.write(self.script_env("LD_LIBRARY_PATH", ldlibpathsstr))
             f.write(self.script_env("LDFLAGS", f"{ldflags} {rpathflags}"))
             if self.platform == LibraryPlatform.Linux:
-                f.write(self.script_env("NUMCPUS", "$(nproc)"))
+                f.write(self.script_env("NUMCPUS", str(self.make_jobs) if self.make_jobs else "$(nproc)"))
 
             stdverflag = ""
             if stdver:
@@ -1036,10 +1128,19 @@ class LibraryBuilder:
                 cuda_path = self.getCudaPathFromOptions(compileroptions)
                 cudatoolkitparam = f'"-DCUDAToolkit_ROOT={cuda_path}"' if cuda_path else ""
 
+                launcherparams = ""
+                if cache:
+                    launcherparams = (
+                        f'"-DCMAKE_C_COMPILER_LAUNCHER={cache.launcher_exe}" '
+                        f'"-DCMAKE_CXX_COMPILER_LAUNCHER={cache.launcher_exe}"'
+                    )
+                    if compilerType == "nvcc":
+                        launcherparams += f' "-DCMAKE_CUDA_COMPILER_LAUNCHER={cache.launcher_exe}"'
+
                 cmakecmd = (
                     f'cmake --install-prefix "{installfolder}" {generator} "-DCMAKE_VERBOSE_MAKEFILE=ON" '
                     f'{targetparams} "-DCMAKE_BUILD_TYPE={buildtype}" {toolchainparam} {sysrootparam} '
-                    f"{cudatoolkitparam} "
+                    f"{cudatoolkitparam} {launcherparams} "
                     f'"-DCMAKE_CXX_FLAGS{cmake_flags_suffix}={cxx_flags}" "-DCMAKE_C_FLAGS{cmake_flags_suffix}={c_flags}" '
                     f'"-DCMAKE_ASM_FLAGS{cmake_flags_suffix}={asm_flags}" {cudaflagsparam} {extracmakeargs} {sourcefolder}'
                 )
@@ -1106,6 +1207,10 @@ class LibraryBuilder:
                 f.write("rm -f *.a\n")
                 f.write(self.script_env("CXXFLAGS", cxx_flags))
                 f.write(self.script_env("CFLAGS", c_flags))
+                if cache and compilerType != "nvcc":
+                    if compilerexecc:
+                        f.write(self.script_env("CC", f"{cache.launcher_exe} {compilerexecc}"))
+                    f.write(self.script_env("CXX", f"{cache.launcher_exe} {compilerexe}"))
                 logdir = ""
                 if self.buildconfig.source_folder:
                     f.write("LOGDIR=$(pwd)/\n")
@@ -1181,18 +1286,23 @@ class LibraryBuilder:
                 )
                 f.write(f"{expanded_line}\n")
 
-        if self.buildconfig.lib_type == "cshared":
-            self.setCurrentConanBuildParameters(
-                buildos, buildtype, "cshared", "cshared", libcxx, arch, stdver, extraflags
+        self.setCurrentConanBuildParameters(
+            *self.conan_build_parameters(
+                compiler, compilerType, buildos, buildtype, arch, stdver, stdlib, flagscombination
             )
+        )
+
+    def conan_build_parameters(
+        self, compiler, compilerType, buildos, buildtype, arch, stdver, stdlib, flagscombination
+    ) -> tuple[str, ...]:
+        """The setCurrentConanBuildParameters arguments for a combination, as writebuildscript sets them."""
+        libcxx = stdlib if stdlib and is_clang_variant(compilerType) else "libstdc++"
+        extraflags = " ".join(x for x in flagscombination)
+        if self.buildconfig.lib_type == "cshared":
+            return (buildos, buildtype, "cshared", "cshared", libcxx, arch, stdver, extraflags)
         elif self.buildconfig.lib_type == "headeronly":
-            self.setCurrentConanBuildParameters(
-                buildos, buildtype, "headeronly", "headeronly", libcxx, arch, stdver, extraflags
-            )
-        else:
-            self.setCurrentConanBuildParameters(
-                buildos, buildtype, compilerTypeOrGcc, compiler, libcxx, arch, stdver, extraflags
-            )
+            return (buildos, buildtype, "headeronly", "headeronly", libcxx, arch, stdver, extraflags)
+        return (buildos, buildtype, compilerType or "gcc", compiler, libcxx, arch, stdver, extraflags)
 
     def setCurrentConanBuildParameters(
         self, buildos, buildtype, compilerTypeOrGcc, compiler, libcxx, arch, stdver, extraflags
@@ -1396,7 +1506,30 @@ class LibraryBuilder:
             else:
                 return BuildStatus.Failed
 
+    def compiler_cache_for(self, compilerType: str) -> CompilerCache | None:
+        """The compiler cache this library's builds with this kind of compiler go through, if any."""
+        cache = compiler_cache()
+        if (
+            cache is None
+            or not self.buildconfig.compiler_cache
+            or self.platform != LibraryPlatform.Linux
+            or compilerType in uncacheable_compiler_types
+        ):
+            return None
+        return cache
+
     def executebuildscript(self, buildfolder):
+        cache = getattr(self._build_state, "compiler_cache", None)
+        if cache is None:
+            return self._run_build_script(buildfolder)
+        build_status, stats = cache.run_build(
+            buildfolder, lambda: self._run_build_script(buildfolder), cache.launcher == SCCACHE
+        )
+        if stats is not None:
+            self.logger.info(f"Compiler cache: {stats.describe()}")
+        return build_status
+
+    def _run_build_script(self, buildfolder):
         try:
             if self.platform == LibraryPlatform.Linux:
                 if subprocess.call(["./" + self.script_filename], cwd=buildfolder, timeout=build_timeout) == 0:
@@ -1430,16 +1563,18 @@ class LibraryBuilder:
 
     def _get_possible_builds(self) -> PossibleBuilds:
         """Return the conan-server /search response for this (libname, target_name), cached."""
-        if self._possible_builds is None:
-            self._possible_builds = fetch_possible_builds(
-                self.libname,
-                self.target_name,
-                lambda url: resil_get(self.http_session, url, stream=False, timeout=_TIMEOUT),
-                self.logger,
-            )
-        return self._possible_builds
+        # Build threads read this via get_conan_hash while the upload thread resets it.
+        with self._conan_lock:
+            if self._possible_builds is None:
+                self._possible_builds = fetch_possible_builds(
+                    self.libname,
+                    self.target_name,
+                    lambda url: resil_get(self.http_session, url, stream=False, timeout=_TIMEOUT),
+                    self.logger,
+                )
+            return self._possible_builds
 
-    def get_conan_hash(self, buildfolder: str) -> str | None:
+    def get_conan_hash(self, buildfolder: str = "") -> str | None:
         if self.install_context.dry_run:
             return None
         target = build_target_settings(self.current_buildparameters_obj)
@@ -1467,6 +1602,16 @@ class LibraryBuilder:
             response = json.loads(request.content)
             self.conanserverproxy_token = response["token"]
 
+    def conan_token(self) -> str:
+        """Return the conan proxy token, logging in first if no thread has yet."""
+        if not self.conanserverproxy_token:
+            with self._conan_lock:
+                if not self.conanserverproxy_token:
+                    self.conanproxy_login()
+        token = self.conanserverproxy_token
+        assert token is not None
+        return token
+
     def save_build_logging(self, builtok, buildfolder, extralogtext):
         if builtok == BuildStatus.Failed:
             url = f"{conanserver_url}/buildfailed"
@@ -1525,18 +1670,20 @@ class LibraryBuilder:
             self.logger.debug(f"Using cached annotations for {buildfolder}")
             return self._annotations_cache[buildfolder]
 
-        conanhash = self.get_conan_hash(buildfolder)
+        result = self.lookup_build_annotations()
+        self._annotations_cache[buildfolder] = result
+        return result
+
+    def lookup_build_annotations(self):
+        """Annotations of the current build parameters' package, from the bulk-fetched annotations."""
+        conanhash = self.get_conan_hash()
         if conanhash is None:
-            result = defaultdict(lambda: [])
-            self._annotations_cache[buildfolder] = result
-            return result
+            return defaultdict(lambda: [])
 
         # Look up in the bulk-cached annotations dict; defensive copy because callers
         # (set_as_uploaded) mutate the result before POSTing it back to the server.
         bulk_entry = self._get_annotations_bulk().get(conanhash, {})
-        result = dict(bulk_entry) if bulk_entry else defaultdict(lambda: [])
-        self._annotations_cache[buildfolder] = result
-        return result
+        return dict(bulk_entry) if bulk_entry else defaultdict(lambda: [])
 
     def get_commit_hash(self) -> str:
         if self.current_commit_hash:
@@ -1588,19 +1735,11 @@ class LibraryBuilder:
             return False
 
     def set_as_uploaded(self, buildfolder):
-        # We need the conan package_id (a deterministic SHA from compiler+version+libcxx+arch+...)
-        # to PUT annotations against /annotations/{lib}/{ver}/{package_id}. get_conan_hash
-        # derives the id by querying the server's /search index, which only lists packages
-        # already on the server -- so for a freshly built package, we must upload first.
-        annotations = self.get_build_annotations(buildfolder)
-        if "commithash" not in annotations:
-            self.upload_builds()
-
-        conanhash = self.get_conan_hash(buildfolder)
-        if conanhash is None:
-            raise RuntimeError(f"Error determining conan hash in {buildfolder}")
+        """Queue the package just exported from buildfolder for upload, and for annotation after it.
 
-        self.logger.info(f"conanhash: {conanhash}")
+        The binary details are read now, while buildfolder is still there.
+        """
+        annotations = dict(self.get_build_annotations(buildfolder))
         annotations["commithash"] = self.get_commit_hash()
 
         for lib in itertools.chain(self.buildconfig.staticliblink, self.buildconfig.sharedliblink):
@@ -1623,16 +1762,43 @@ class LibraryBuilder:
                 else:
                     annotations["osabi"] = archinfo["elf_osabi"]
 
-        headers = {"Content-Type": "application/json", "Authorization": "Bearer " + self.conanserverproxy_token}
+        if not self.install_context.dry_run:
+            # Log in here rather than on the upload thread, which annotate_upload runs on.
+            self.conan_token()
+        self.upload_pipeline.add(
+            PendingUpload(buildfolder, build_target_settings(self.current_buildparameters_obj), annotations)
+        )
+
+    def annotate_upload(self, pending: PendingUpload) -> None:
+        # We need the conan package_id (a deterministic SHA from compiler+version+libcxx+arch+...)
+        # to PUT annotations against /annotations/{lib}/{ver}/{package_id}. It's derived by
+        # querying the server's /search index, which only lists packages already on the server
+        # -- so this runs once the package's batch has been uploaded.
+        conanhash = find_matching_package_id(self._get_possible_builds(), pending.target)
+        if conanhash is None:
+            raise RuntimeError(f"Error determining conan hash of {pending.description}")
+
+        self.logger.info(f"conanhash: {conanhash}")
+        annotations = pending.annotations
+        headers = {"Content-Type": "application/json", "Authorization": "Bearer " + self.conan_token()}
 
         url = f"{conanserver_url}/annotations/{self.libname}/{self.target_name}/{conanhash}"
         request = resil_post(self.http_session, url, json_data=json.dumps(annotations), headers=headers)
-        if not request.ok:
+        if not isinstance(request, requests.Response) or not request.ok:
             raise PostFailure(f"Post failure for {url}: {request}")
 
         # We just wrote a new annotation server-side; the bulk cache is now stale.
         self._annotations_bulk = None
 
+    def materialise_source(self, build_folder: str) -> None:
+        stats = materialise_source_tree(
+            self.sourcefolder,
+            build_folder,
+            self.buildconfig.source_tree,
+            self.buildconfig.source_tree_writable,
+        )
+        self.logger.info(f"Source tree materialised: {stats.describe()}")
+
     def makebuildfor(
         self,
         compiler,
@@ -1650,7 +1816,9 @@ class LibraryBuilder:
         staging: StagingDir,
         compiler_props,
         iteration,
+        planned: bool = False,
     ):
+        """Build one combination in staging. If planned, plan_builds has already decided it needs building."""
         combined_hash = self.makebuildhash(
             compiler, options, toolchain, buildos, buildtype, arch, stdver, stdlib, flagscombination, iteration
         )
@@ -1687,21 +1855,22 @@ class LibraryBuilder:
         self.writeconanfile(build_folder)
         extralogtext = ""
 
-        if not self.forcebuild and self.has_failed_before():
-            self.logger.info("Build has failed before, not re-attempting")
-            return BuildStatus.Skipped
-
-        if self.is_already_uploaded(build_folder):
-            self.logger.info("Build already uploaded")
-            if not self.forcebuild:
+        if not planned:
+            if not self.forcebuild and self.has_failed_before():
+                self.logger.info("Build has failed before, not re-attempting")
                 return BuildStatus.Skipped
 
+            if self.is_already_uploaded(build_folder):
+                self.logger.info("Build already uploaded")
+                if not self.forcebuild:
+                    return BuildStatus.Skipped
+
         if requires_tree_copy:
-            shutil.copytree(self.sourcefolder, build_folder, dirs_exist_ok=True)
+            self.materialise_source(build_folder)
             self.writeconanfile(build_folder)
 
-        if not self.install_context.dry_run and not self.conanserverproxy_token:
-            self.conanproxy_login()
+        if not self.install_context.dry_run:
+            self.conan_token()
 
         build_status = self.executebuildscript(build_folder)
         if build_status == BuildStatus.Ok:
@@ -1724,10 +1893,10 @@ class LibraryBuilder:
             if filesfound != 0:
                 self.writeconanscript(build_folder)
                 if not self.install_context.dry_run:
-                    build_status = self.executeconanscript(build_folder)
-                    if build_status == BuildStatus.Ok:
-                        self.needs_uploading += 1
-                        self.set_as_uploaded(build_folder)
+                    with self._conan_lock:
+                        build_status = self.executeconanscript(build_folder)
+                        if build_status == BuildStatus.Ok:
+                            self.set_as_uploaded(build_folder)
             else:
                 extralogtext = "No binaries found to export"
                 self.logger.info(extralogtext)
@@ -1752,22 +1921,26 @@ class LibraryBuilder:
             self.logger.info(f"Removing {buildfolder}")
 
     def upload_builds(self):
-        if self.needs_uploading > 0:
+        """Upload every package of this library in the local conan cache, several at a time."""
+        if not self.install_context.dry_run:
+            self.logger.info("Uploading cached builds")
+            subprocess.check_call([
+                "conan",
+                "upload",
+                f"{self.libname}/{self.target_name}",
+                "--all",
+                "-r=ceserver",
+                "-c",
+                "--parallel",
+            ])
+        # Force re-fetch on next get_conan_hash so annotate_upload sees the new packages.
+        with self._conan_lock:
+            self._possible_builds = None
+
+    def clear_conan_cache(self):
+        with self._conan_lock:
             if not self.install_context.dry_run:
-                self.logger.info("Uploading cached builds")
-                subprocess.check_call([
-                    "conan",
-                    "upload",
-                    f"{self.libname}/{self.target_name}",
-                    "--all",
-                    "-r=ceserver",
-                    "-c",
-                ])
-                self.logger.debug("Clearing cache to speed up next upload")
                 subprocess.check_call(["conan", "remove", "-f", f"{self.libname}/{self.target_name}"])
-            self.needs_uploading = 0
-            # Force re-fetch on next get_conan_hash so post-upload set_as_uploaded sees the new package.
-            self._possible_builds = None
 
     def get_compiler_type(self, compiler):
         compilerType = ""
@@ -1835,11 +2008,76 @@ class LibraryBuilder:
 
         return True
 
-    def makebuild(self, buildfor):
-        builds_failed = 0
-        builds_succeeded = 0
-        builds_skipped = 0
+    def warm_compiler_probes(self, compilers: list[str]) -> None:
+        """Probe the architectures of every compiler makebuild will consider, in parallel, ahead of it."""
+
+        def probe(compiler):
+            props = self.compilerprops[compiler]
+            compiler_type = self.get_compiler_type(compiler)
+            archs = [self.buildconfig.build_fixed_arch] if self.buildconfig.build_fixed_arch else ["x86", "x86_64"]
+            for arch in archs:
+                self.does_compiler_support(props["exe"], compiler_type, arch, props["options"], props["ldPath"])
+
+        shared_probe_cache().warm(
+            functools.partial(probe, compiler) for compiler in compilers if compiler not in disable_clang_32bit
+        )
+
+    def run_build_job(self, job: BuildJob) -> BuildStatus:
+        """Build one matrix cell in a staging dir of its own."""
+        buildos, buildtype, arch, stdver, stdlib, flagscombination = job.combination
+        try:
+            with self.install_context.new_staging_dir() as staging:
+                return self.makebuildfor(
+                    job.compiler,
+                    job.options,
+                    job.exe,
+                    job.compiler_type,
+                    job.toolchain,
+                    buildos,
+                    buildtype,
+                    arch,
+                    stdver,
+                    stdlib,
+                    flagscombination,
+                    self.compilerprops[job.compiler]["ldPath"],
+                    staging,
+                    self.compilerprops[job.compiler],
+                    job.iteration,
+                    planned=True,
+                )
+        except Exception:
+            # Broad catch is intentional: one bad combination (e.g. conan rejecting a setting)
+            # must not abort the rest of the batch.
+            self.logger.exception(f"Build of {job.compiler} {job.combination} failed with an unexpected exception")
+            return BuildStatus.Failed
+
+    def run_build_jobs(self, jobs: list[BuildJob], max_workers: int) -> Iterator[tuple[BuildJob, BuildStatus]]:
+        """Run jobs, up to max_workers at once, yielding each with its status as it finishes.
+
+        With one worker, jobs run in order on the calling thread, exactly as they always have. With
+        more, each build's make gets an equal share of the CPUs, and the conan steps that touch the
+        shared local cache (export, upload, remove) take turns under _conan_lock.
+        """
+        if max_workers <= 1 or len(jobs) <= 1:
+            for job in jobs:
+                yield job, self.run_build_job(job)
+            return
+
+        workers = min(max_workers, len(jobs))
+        self.make_jobs = max(1, (os.cpu_count() or 1) // workers)
+        self.logger.info(f"Running {len(jobs)} builds, {workers} at a time with {self.make_jobs} jobs each")
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(self.run_build_job, job): job for job in jobs}
+                for future in as_completed(futures):
+                    yield futures[future], future.result()
+        finally:
+            self.make_jobs = None
+
+    def build_jobs(self, buildfor) -> list[BuildJob] | None:
+        """Every (compiler, combination) makebuild would consider for buildfor; None if nothing needs building."""
         checkcompiler = ""
+        jobs: list[BuildJob] = []
 
         build_supported_os = [self.platform.value]
         build_supported_buildtype = ["Debug"]
@@ -1868,7 +2106,7 @@ class LibraryBuilder:
                 build_supported_arch = [""]
             else:
                 self.logger.info("Header-only library, no need to build")
-                return [builds_succeeded, 1, builds_failed]
+                return None
         elif self.buildconfig.lib_type == "cmake_built_headeronly":
             # Header-only on disk, but the build script must run per-compiler so
             # configure_file substitutions and generated CMake package config files
@@ -1890,15 +2128,18 @@ class LibraryBuilder:
             if checkcompiler not in self.compilerprops:
                 self.logger.error(f"Unknown compiler {checkcompiler}")
 
+        compilers = []
         for compiler in self.compilerprops:
-            if compiler in disable_compiler_ids:
+            if compiler in disable_compiler_ids or not self.should_build_with_compiler(
+                compiler, checkcompiler, buildfor
+            ):
                 self.logger.debug(f"Skipping {compiler}")
-                continue
+            else:
+                compilers.append(compiler)
 
-            if not self.should_build_with_compiler(compiler, checkcompiler, buildfor):
-                self.logger.debug(f"Skipping {compiler}")
-                continue
+        self.warm_compiler_probes(compilers)
 
+        for compiler in compilers:
             compilerType = self.get_compiler_type(compiler)
             is_msvc = compilerType == "win32-vc"
 
@@ -2020,33 +2261,73 @@ class LibraryBuilder:
                 build_supported_os, buildtypes, archs, stdvers, stdlibs, build_supported_flagscollection
             ):
                 iteration += 1
-                try:
-                    with self.install_context.new_staging_dir() as staging:
-                        buildstatus = self.makebuildfor(
-                            compiler,
-                            options,
-                            exe,
-                            compilerType,
-                            toolchain,
-                            *args,
-                            self.compilerprops[compiler]["ldPath"],
-                            staging,
-                            self.compilerprops[compiler],
-                            iteration,
-                        )
-                        if buildstatus == BuildStatus.Ok:
-                            builds_succeeded = builds_succeeded + 1
-                        elif buildstatus == BuildStatus.Skipped:
-                            builds_skipped = builds_skipped + 1
-                        else:
-                            builds_failed = builds_failed + 1
-                except Exception:
-                    # Broad catch is intentional: one bad combination (e.g. conan rejecting a setting)
-                    # must not abort the rest of the batch.
-                    self.logger.exception(f"Build of {compiler} {args} failed with an unexpected exception")
+                jobs.append(BuildJob(compiler, options, exe, compilerType, toolchain, args, iteration))
+
+        return jobs
+
+    def plan_builds(self, jobs: list[BuildJob]) -> list[PlannedBuild]:
+        """Decide which jobs need building, from the conan server's state fetched once for all of them.
+
+        This is the has_failed_before/is_already_uploaded check makebuildfor used to make for each job
+        after setting up its staging dir; now only the builds that need to run get one.
+        """
+        plan = []
+        for job in jobs:
+            try:
+                self.setCurrentConanBuildParameters(
+                    *self.conan_build_parameters(job.compiler, job.compiler_type, *job.combination)
+                )
+                if not self.forcebuild and self.has_failed_before():
+                    plan.append(PlannedBuild(job, BuildStatus.Skipped, "failed before at this commit"))
+                    continue
+                uploaded = self.lookup_build_annotations().get("commithash") == self.get_commit_hash()
+                if uploaded and not self.forcebuild:
+                    plan.append(PlannedBuild(job, BuildStatus.Skipped, "already uploaded at this commit"))
+                elif uploaded:
+                    plan.append(PlannedBuild(job, None, "forced rebuild of an uploaded build"))
+                else:
+                    plan.append(PlannedBuild(job, None, "forced" if self.forcebuild else "not built at this commit"))
+            except Exception as e:
+                # Broad catch is intentional, as in run_build_job: count it as failed and plan the rest
+                self.logger.exception(f"Planning the build of {job.compiler} {job.combination} failed")
+                plan.append(PlannedBuild(job, BuildStatus.Failed, f"planning failed: {e}"))
+        return plan
+
+    def makebuild(self, buildfor, max_workers: int = 1):
+        builds_failed = 0
+        builds_succeeded = 0
+        builds_skipped = 0
+
+        jobs = self.build_jobs(buildfor)
+        if jobs is None:
+            return [builds_succeeded, 1, builds_failed]
+
+        to_build = []
+        for planned in self.plan_builds(jobs):
+            if planned.status is None:
+                to_build.append(planned.job)
+            elif planned.status == BuildStatus.Skipped:
+                self.logger.info(
+                    f"Skipping build of {planned.job.compiler} {planned.job.combination}: {planned.reason}"
+                )
+                builds_skipped = builds_skipped + 1
+            else:
+                builds_failed = builds_failed + 1
+
+        try:
+            for _, buildstatus in self.run_build_jobs(to_build, max_workers):
+                if buildstatus == BuildStatus.Ok:
+                    builds_succeeded = builds_succeeded + 1
+                elif buildstatus == BuildStatus.Skipped:
+                    builds_skipped = builds_skipped + 1
+                else:
                     builds_failed = builds_failed + 1
+        finally:
+            failed_uploads = self.upload_pipeline.finish()
 
-            if builds_succeeded > 0:
-                self.upload_builds()
+        for pending in failed_uploads:
+            self.logger.error(f"Build in {pending.description} was not uploaded")
+        builds_succeeded = builds_succeeded - len(failed_uploads)
+        builds_failed = builds_failed + len(failed_uploads)
 
         return [builds_succeeded, builds_skipped, builds_failed]
@@ -19,6 +19,8 @@ import requests
 
 from lib.amazon import get_ssm_param
 from lib.amazon_properties import get_properties_compilers_and_libraries
+from lib.cargo_home import shared_cargo_home
+from lib.compiler_cache import compiler_cache
 from lib.installation_context import InstallationContext, PostFailure
 from lib.library_build_config import LibraryBuildConfig
 from lib.library_builder import (
@@ -159,13 +161,30 @@ class RustLibraryBuilder:
             f.write(f"export CXX={linkerpath}/g++\n")
             f.write(f"export PATH={rustbinpath}:{linkerpath}\n")
             f.write(f'export RUSTFLAGS="-C linker={linkerpath}/gcc"\n')
+            for var_name, var_value in self.rust_cache_env().items():
+                f.write(f'export {var_name}="{var_value}"\n')
+            cargo_home = shared_cargo_home()
+            if cargo_home:
+                for var_name, var_value in cargo_home.env().items():
+                    f.write(f'export {var_name}="{var_value}"\n')
 
             for line in self.buildconfig.prebuild_script:
                 f.write(f"{line}\n")
 
             if self.buildconfig.build_type == "cargo":
-                cargoline = f"$CARGO build {methodflags} --target-dir {buildfolder} > {logfolder}/buildlog.txt 2>&1\n"
-                f.write(cargoline)
+                buildlog = f"{logfolder}/buildlog.txt"
+                cargoline = f"$CARGO build {methodflags} --target-dir {buildfolder} > {buildlog} 2>&1\n"
+                if cargo_home:
+                    # Resolve against what's already in the shared cargo home, only going online if that fails.
+                    # Cargo before 1.36 has no --offline, so those builds just go online as they always did.
+                    f.write("if $CARGO build --help 2>/dev/null | grep -q -- --offline; then\n")
+                    f.write(f"    $CARGO fetch --offline > {buildlog} 2>&1 || $CARGO fetch >> {buildlog} 2>&1\n")
+                    f.write(f"    $CARGO build --offline {methodflags} --target-dir {buildfolder} >> {buildlog} 2>&1\n")
+                    f.write("else\n")
+                    f.write(f"    {cargoline}")
+                    f.write("fi\n")
+                else:
+                    f.write(cargoline)
             else:
                 raise RuntimeError("Unknown build_type {self.buildconfig.build_type}")
 
@@ -245,7 +264,22 @@ class RustLibraryBuilder:
             self.logger.info("No binaries found to export")
             return BuildStatus.Failed
 
+    def rust_cache_env(self) -> dict[str, str]:
+        cache = compiler_cache()
+        if cache is None or not self.buildconfig.compiler_cache:
+            return {}
+        return cache.rust_env()
+
     def executebuildscript(self, buildfolder):
+        cache = compiler_cache()
+        if not self.rust_cache_env():
+            return self._run_build_script(buildfolder)
+        build_status, stats = cache.run_build(buildfolder, lambda: self._run_build_script(buildfolder), True)
+        if stats is not None:
+            self.logger.info(f"Compiler cache: {stats.describe()}")
+        return build_status
+
+    def _run_build_script(self, buildfolder):
         try:
             if subprocess.call(["./build.sh"], cwd=buildfolder, timeout=build_timeout) == 0:
                 self.logger.info(f"Build succeeded in {buildfolder}")
@@ -437,8 +471,14 @@ class RustLibraryBuilder:
         if not os.path.exists(os.path.join(source_folder, "Cargo.toml")):
             self.logger.info(f"Downloading sources for {self.libname}/{self.target_name}")
 
+            cargo_home = shared_cargo_home()
+            cached_crate = cargo_home.cached_crate(self.libname, self.target_name) if cargo_home else None
             if self.buildconfig.repo:
                 self.clone_branch(source_folder, staging)
+            elif cached_crate:
+                self.logger.info(f"Using {cached_crate} from the shared cargo home")
+                os.makedirs(source_folder, exist_ok=True)
+                subprocess.check_call(["tar", "zxf", str(cached_crate), "--strip-components", "1"], cwd=source_folder)
             else:
                 crate = RustCrate(self.libname, self.target_name, get_builder_user_agent_id())
                 url = crate.GetDownloadUrl()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""Materialise a library's source tree into a build folder without copying every byte.
+
+Make and fpm builds run in a full copy of the source tree, once per compiler/configuration. When the
+source and the build folder share a filesystem that supports it, each file is a reflink (a
+copy-on-write clone sharing the source's blocks), which is as safe as a copy and nearly free.
+Otherwise files are copied: clones can't cross filesystems, and with CEFS the build folders are
+staged on local disk, away from the installed sources in /opt.
+
+Builds that never rewrite existing source files in place can opt into a hardlink farm instead,
+which also only helps within the source's filesystem. Files such a build does modify are named by
+globs and are cloned or copied rather than linked, so the build can't write through a link into the
+installed source.
+"""
+
+from __future__ import annotations
+
+import errno
+import fnmatch
+import logging
+import os
+import shutil
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None  # type: ignore[assignment]
+
+_LOGGER = logging.getLogger(__name__)
+
+STRATEGIES = ("reflink", "hardlink", "copy")
+
+_FICLONE = 0x40049409  # _IOW(0x94, 9, int) from linux/fs.h
+_CLONE_UNSUPPORTED = {errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EPERM}
+
+
+@dataclass
+class MaterialiseStats:
+    """How a source tree was materialised."""
+
+    strategy: str
+    files: int = 0
+    cloned_bytes: int = 0
+    linked_bytes: int = 0
+    copied_bytes: int = 0
+    seconds: float = 0.0
+
+    @property
+    def total_bytes(self) -> int:
+        return self.cloned_bytes + self.linked_bytes + self.copied_bytes
+
+    @property
+    def saved_bytes(self) -> int:
+        """Bytes that didn't have to be written, compared with copying everything."""
+        return self.cloned_bytes + self.linked_bytes
+
+    def describe(self) -> str:
+        return (
+            f"{self.files} files ({self.total_bytes} bytes) with {self.strategy} in {self.seconds:.2f}s, "
+            f"{self.saved_bytes} bytes not copied ({self.cloned_bytes} cloned, {self.linked_bytes} linked)"
+        )
+
+
+class _Materialiser:
+    def __init__(self, stats: MaterialiseStats, source: Path, writable: list[str]):
+        self.stats = stats
+        self.source = source
+        self.writable = writable
+        self.can_clone = fcntl is not None and stats.strategy != "copy"
+        self.can_link = stats.strategy == "hardlink"
+
+    def _is_writable(self, src: str) -> bool:
+        relative = os.path.relpath(src, self.source)
+        return any(
+            fnmatch.fnmatch(relative, pattern) or fnmatch.fnmatch(os.path.basename(src), pattern)
+            for pattern in self.writable
+        )
+
+    def _clone(self, src: str, dst: str) -> bool:
+        try:
+            with open(src, "rb") as src_file, open(dst, "wb") as dst_file:
+                fcntl.ioctl(dst_file.fileno(), _FICLONE, src_file.fileno())  # type: ignore[union-attr]
+        except OSError as e:
+            if e.errno not in _CLONE_UNSUPPORTED:
+                raise
+            _LOGGER.debug("No reflinks from %s to %s (%s), copying instead", src, dst, e)
+            self.can_clone = False
+            return False
+        shutil.copystat(src, dst)
+        return True
+
+    def _link(self, src: str, dst: str) -> bool:
+        try:
+            if os.path.lexists(dst):
+                os.unlink(dst)
+            os.link(src, dst)
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                raise
+            _LOGGER.debug("Unable to hardlink %s to %s (%s), copying instead", src, dst, e)
+            self.can_link = False
+            return False
+        return True
+
+    def __call__(self, src: str, dst: str) -> str:
+        """A shutil.copytree copy_function."""
+        size = os.path.getsize(src)
+        self.stats.files += 1
+        if self.can_link and not self._is_writable(src) and self._link(src, dst):
+            self.stats.linked_bytes += size
+        elif self.can_clone and self._clone(src, dst):
+            self.stats.cloned_bytes += size
+        else:
+            shutil.copy2(src, dst)
+            self.stats.copied_bytes += size
+        return dst
+
+
+def _device(path: Path) -> int:
+    """The device holding path, or the nearest of its parents that exists."""
+    while not path.exists() and path.parent != path:
+        path = path.parent
+    return path.stat().st_dev
+
+
+def default_strategy(source: str | Path, dest: str | Path) -> str:
+    """The strategy "auto" resolves to: "reflink" within a filesystem, else "copy"."""
+    return "reflink" if _device(Path(source)) == _device(Path(dest)) else "copy"
+
+
+def materialise_source_tree(
+    source: str | Path, dest: str | Path, strategy: str = "auto", writable: list[str] | None = None
+) -> MaterialiseStats:
+    """Fill dest (which may already exist) with the contents of source, as shutil.copytree would.
+
+    Args:
+        source: The source tree
+        dest: Where it's wanted
+        strategy: "reflink" (clone, else copy), "hardlink" (link, else clone, else copy), "copy",
+            or "auto" to pick one with default_strategy
+        writable: For "hardlink", globs (of paths relative to source, or file names) of files the
+            build modifies in place, which are cloned or copied rather than linked
+    """
+    if strategy == "auto":
+        strategy = default_strategy(source, dest)
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown source tree strategy {strategy}, expected one of {', '.join(STRATEGIES)}")
+    stats = MaterialiseStats(strategy)
+    start = time.perf_counter()
+    shutil.copytree(source, dest, copy_function=_Materialiser(stats, Path(source), writable or []), dirs_exist_ok=True)
+    stats.seconds = time.perf_counter() - start
+    return stats
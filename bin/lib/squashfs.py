@@ -3,15 +3,22 @@
 
 from __future__ import annotations
 
+import hashlib
 import logging
 import re
 import shutil
+import stat
 import subprocess
+import tarfile
+import tempfile
 import uuid
+from collections.abc import Callable, Iterable
 from dataclasses import dataclass
 from pathlib import Path
+from typing import IO
 
-from lib.config import SquashfsConfig
+from lib.config import CompressionProfile, SquashfsConfig
+from lib.squashfs_reader import SquashfsFormatError, SquashfsReader, UnsupportedCompressionError
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -82,27 +89,14 @@ def parse_unsquashfs_line(line: str) -> SquashfsEntry | None:
     )
 
 
-def verify_squashfs_contents(img_path: Path, nfs_path: Path) -> int:
-    """Verify squashfs image contents match NFS directory. Returns error count."""
-    error_count = 0
-
-    try:
-        # Extract squashfs metadata without mounting
-        # TODO make unsquashfs path configurable like all other uses of it.
-        result = subprocess.run(
-            ["unsquashfs", "-ll", "-d", "", str(img_path)], capture_output=True, text=True, check=True
-        )
-        sqfs_output = result.stdout
-    except subprocess.CalledProcessError as e:
-        _LOGGER.error("Failed to read squashfs image %s: %s", img_path, e)
-        return 1
-    except FileNotFoundError:
-        _LOGGER.error("unsquashfs command not found - install squashfs-tools")
-        return 1
+def parse_unsquashfs_listing(output: str) -> list[SquashfsEntry]:
+    """Parse the full output of unsquashfs -ll, skipping headers and the root directory.
 
-    # Parse squashfs output to get file list
-    sqfs_files: dict[str, tuple[str, str]] = {}
-    for line in sqfs_output.split("\n"):
+    Raises:
+        ValueError: For unparseable lines
+    """
+    entries = []
+    for line in output.split("\n"):
         if not line.strip():
             continue
 
@@ -110,15 +104,65 @@ def verify_squashfs_contents(img_path: Path, nfs_path: Path) -> int:
         if line.startswith("Parallel unsquashfs:") or line.startswith("Filesystem on"):
             continue
 
-        try:
-            parsed = parse_unsquashfs_line(line)
-            if parsed is None:
-                # None means intentionally skipped (e.g., root directory, empty lines)
-                continue
-            sqfs_files[parsed.path] = (parsed.file_type, str(parsed.size))
-        except ValueError as e:
-            _LOGGER.error("Failed to parse unsquashfs output: %s", e)
-            raise
+        parsed = parse_unsquashfs_line(line)
+        if parsed is not None:  # None means intentionally skipped (e.g., root directory)
+            entries.append(parsed)
+    return entries
+
+
+def list_squashfs_entries(config_squashfs: SquashfsConfig, img_path: Path) -> list[SquashfsEntry]:
+    """List every entry of a squashfs image from its metadata, without reading any file data.
+
+    The image's metadata is read natively (see lib.squashfs_reader); unsquashfs -ll is only
+    used for images compressed with something we can't decompress in Python.
+
+    Raises:
+        SquashfsError: If the image can't be read
+    """
+    try:
+        with SquashfsReader(img_path) as reader:
+            return [
+                SquashfsEntry(file_type=inode.file_type, size=inode.size, path=inode.path, target=inode.target)
+                for inode in reader.iter_entries()
+            ]
+    except UnsupportedCompressionError as e:
+        _LOGGER.debug("%s; falling back to unsquashfs for %s", e, img_path)
+    except (OSError, SquashfsFormatError) as e:
+        raise SquashfsError(f"Failed to read squashfs image {img_path}: {e}") from e
+    return list_squashfs_entries_with_unsquashfs(config_squashfs, img_path)
+
+
+def list_squashfs_entries_with_unsquashfs(config_squashfs: SquashfsConfig, img_path: Path) -> list[SquashfsEntry]:
+    """List every entry of a squashfs image by running and parsing unsquashfs -ll.
+
+    Raises:
+        SquashfsError: If unsquashfs fails or its output can't be parsed
+    """
+    result = subprocess.run(
+        [config_squashfs.unsquashfs_path, "-ll", "-d", "", str(img_path)],
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if result.returncode != 0:
+        raise SquashfsError(f"unsquashfs listing of {img_path} failed: {result.stderr.strip()}")
+    try:
+        return parse_unsquashfs_listing(result.stdout)
+    except ValueError as e:
+        raise SquashfsError(f"Failed to parse unsquashfs listing of {img_path}: {e}") from e
+
+
+def verify_squashfs_contents(img_path: Path, nfs_path: Path, config_squashfs: SquashfsConfig | None = None) -> int:
+    """Verify squashfs image contents match NFS directory. Returns error count."""
+    error_count = 0
+
+    # Read squashfs metadata without mounting
+    try:
+        entries = list_squashfs_entries(config_squashfs or SquashfsConfig(), img_path)
+    except (SquashfsError, FileNotFoundError) as e:
+        _LOGGER.error("Failed to read squashfs image %s: %s", img_path, e)
+        return 1
+    sqfs_files = {entry.path: (entry.file_type, str(entry.size)) for entry in entries}
 
     # Build equivalent from directory filesystem
     dir_files: dict[str, tuple[str, str]] = {}
@@ -197,6 +241,293 @@ class SquashfsError(RuntimeError):
     pass
 
 
+def normalised_permissions(current_perms: int) -> int:
+    """Compute the permissions we want installed files to have.
+
+    Mirrors user permissions to group and other, but never grants write to group/other.
+    Always ensures user has write permission for future editing.
+    """
+    new_perms = (current_perms & stat.S_IRWXU) | stat.S_IWUSR  # Always give user write
+    if bool(current_perms & stat.S_IRUSR):
+        new_perms |= stat.S_IRGRP
+        new_perms |= stat.S_IROTH
+    if bool(current_perms & stat.S_IXUSR):
+        new_perms |= stat.S_IXGRP
+        new_perms |= stat.S_IXOTH
+    return new_perms
+
+
+def _relative_tar_name(name: str) -> str:
+    """Strip any leading "./" or "/" from a tar member name; the archive root becomes ""."""
+    relative = name.lstrip("/")
+    while relative.startswith("./"):
+        relative = relative[2:]
+    return "" if relative == "." else relative.rstrip("/")
+
+
+def _select_tar_name(name: str, subdir: str, strip_components: int) -> str | None:
+    """Path of a member relative to subdir after stripping leading components, or None if outside it."""
+    relative = _relative_tar_name(name)
+    if strip_components:
+        parts = relative.split("/")
+        if len(parts) <= strip_components:
+            return None
+        relative = "/".join(parts[strip_components:])
+    if not subdir:
+        return relative
+    if relative == subdir:
+        return ""
+    if not relative.startswith(f"{subdir}/"):
+        return None
+    return relative[len(subdir) + 1 :]
+
+
+def copy_tar_stream_relocated(
+    source: IO[bytes], prefix: str, output: tarfile.TarFile, subdir: str = "", strip_components: int = 0
+) -> tuple[int, int]:
+    """Copy every member of a tar stream into output, relocated under prefix.
+
+    The source is read strictly sequentially, so it can be a pipe; gzip, bzip2 and xz
+    compression are detected and handled transparently. Ownership is reset to root and
+    permissions are normalised (see normalised_permissions) as each member passes through,
+    so no post-processing of an extracted tree is needed.
+
+    Args:
+        source: Readable binary stream containing a tar archive
+        prefix: Directory to place every member under ("" to keep names as-is)
+        output: Tar file opened for writing (typically in "w|" streaming mode)
+        subdir: Only copy members beneath this directory of the archive, which becomes the root
+        strip_components: Remove this many leading path components first, like tar --strip-components
+
+    Returns:
+        Tuple of (number of members copied, total bytes of regular file data)
+
+    Raises:
+        SquashfsError: If a hard link refers to a file outside the copied part of the archive
+    """
+    subdir = _relative_tar_name(subdir)
+    members = 0
+    data_bytes = 0
+    with tarfile.open(fileobj=source, mode="r|*") as tar_in:
+        for member in tar_in:
+            relative = _select_tar_name(member.name, subdir, strip_components)
+            if not relative:
+                continue  # Outside subdir, or its root; the caller decides how prefix itself is represented
+            member.name = f"{prefix}/{relative}" if prefix else relative
+            if member.islnk():
+                link_relative = _select_tar_name(member.linkname, subdir, strip_components)
+                if not link_relative:
+                    raise SquashfsError(f"Hard link {member.name} refers to {member.linkname}, outside {subdir or '/'}")
+                member.linkname = f"{prefix}/{link_relative}" if prefix else link_relative
+            member.uid = member.gid = 0
+            member.uname = member.gname = "root"
+            if not member.issym():
+                member.mode = normalised_permissions(member.mode)
+            if member.isreg():
+                output.addfile(member, tar_in.extractfile(member))
+                data_bytes += member.size
+            else:
+                output.addfile(member)
+            members += 1
+    return members, data_bytes
+
+
+def open_squashfs_as_tar(
+    config_squashfs: SquashfsConfig, squashfs_path: Path, subdir: Path | None, log: IO[bytes]
+) -> subprocess.Popen:
+    """Start streaming a squashfs image (or one subdirectory of it) as an uncompressed tar on stdout.
+
+    Uses sqfs2tar from squashfs-tools-ng; when subdir is given it becomes the root of the archive.
+    Its stderr goes to log, a file: a pipe could fill up and deadlock us while we read its stdout.
+    The caller owns the returned process and must wait() on it.
+    """
+    cmd = [config_squashfs.sqfs2tar_path, "--no-xattr"]
+    if subdir and subdir != Path("."):
+        cmd += ["--subdir", str(subdir)]
+    cmd.append(str(squashfs_path))
+    _LOGGER.debug("Running sqfs2tar command: %s", " ".join(cmd))
+    return subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=log)
+
+
+def _read_log(log: IO[bytes]) -> str:
+    log.seek(0)
+    return log.read().decode(errors="replace").strip()
+
+
+@dataclass(frozen=True)
+class FileDigest:
+    """Content digest of a regular file inside an image."""
+
+    path: str  # Relative path without leading slash
+    size: int
+    digest: bytes
+
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_tar_stream_files(source: IO[bytes], min_size: int = 0) -> list[FileDigest]:
+    """Hash the contents of every regular file in an uncompressed tar stream.
+
+    Hard links are skipped (their data is counted once, under the first name). Files smaller
+    than min_size are not hashed.
+    """
+    digests: list[FileDigest] = []
+    with tarfile.open(fileobj=source, mode="r|") as tar_in:
+        for member in tar_in:
+            if not member.isreg() or member.size < min_size:
+                continue
+            hasher = hashlib.blake2b(digest_size=16)
+            data = tar_in.extractfile(member)
+            assert data is not None
+            while chunk := data.read(_HASH_CHUNK_SIZE):
+                hasher.update(chunk)
+            digests.append(FileDigest(path=_relative_tar_name(member.name), size=member.size, digest=hasher.digest()))
+    return digests
+
+
+def hash_squashfs_files(config_squashfs: SquashfsConfig, squashfs_path: Path, min_size: int = 0) -> list[FileDigest]:
+    """Hash the contents of every regular file in a squashfs image, without mounting or extracting it.
+
+    Raises:
+        SquashfsError: If the image cannot be read
+    """
+    with tempfile.TemporaryFile() as log:
+        process = open_squashfs_as_tar(config_squashfs, squashfs_path, None, log)
+        assert process.stdout is not None
+        try:
+            digests = hash_tar_stream_files(process.stdout, min_size)
+        except tarfile.TarError as e:
+            process.kill()
+            process.wait()
+            raise SquashfsError(f"Failed to read tar stream of {squashfs_path}: {e}") from e
+        finally:
+            process.stdout.close()
+        if process.wait() != 0:
+            raise SquashfsError(f"sqfs2tar of {squashfs_path} failed: {_read_log(log)}")
+    return digests
+
+
+# Compressors whose mksquashfs options include -Xcompression-level
+_LEVELLED_COMPRESSORS = ("gzip", "lzo", "zstd")
+
+
+def compression_args(profile: CompressionProfile) -> list[str]:
+    """mksquashfs arguments to compress with a profile."""
+    args = ["-comp", profile.compression]
+    if profile.compression in _LEVELLED_COMPRESSORS:
+        args += ["-Xcompression-level", str(profile.compression_level)]
+    if profile.block_size:
+        args += ["-b", profile.block_size]
+    return args
+
+
+def _resolve_profile(
+    config_squashfs: SquashfsConfig,
+    compression: str | None,
+    compression_level: int | None,
+    profile: CompressionProfile | None,
+) -> CompressionProfile:
+    if profile is not None:
+        return profile
+    return CompressionProfile(
+        compression=compression or config_squashfs.compression,
+        compression_level=config_squashfs.compression_level if compression_level is None else compression_level,
+    )
+
+
+def create_squashfs_image_from_tar(
+    config_squashfs: SquashfsConfig,
+    output_path: Path,
+    write_tar: Callable[[IO[bytes]], None],
+    compression: str | None = None,
+    compression_level: int | None = None,
+    profile: CompressionProfile | None = None,
+) -> None:
+    """Create a squashfs image from a tar stream without an intermediate directory tree.
+
+    Runs "mksquashfs - OUTPUT -tar" (squashfs-tools 4.6+) and hands its stdin to write_tar,
+    which must write a complete uncompressed tar archive to it. A profile, if given, takes
+    precedence over compression and compression_level.
+
+    Raises:
+        SquashfsError: If mksquashfs fails
+    """
+    cmd = [
+        config_squashfs.mksquashfs_path,
+        "-",
+        str(output_path),
+        "-tar",
+        "-all-root",
+        *compression_args(_resolve_profile(config_squashfs, compression, compression_level, profile)),
+        "-noappend",
+    ]
+    _LOGGER.debug("Running mksquashfs command: %s", " ".join(cmd))
+    # mksquashfs output goes to a file: a pipe could fill up and deadlock us while we write its stdin
+    with tempfile.TemporaryFile() as log:
+        process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=log, stderr=subprocess.STDOUT)
+        assert process.stdin is not None
+        try:
+            write_tar(process.stdin)
+        except BrokenPipeError:
+            pass  # mksquashfs died early; its exit code and output explain why
+        except BaseException:
+            process.kill()
+            process.wait()
+            raise
+        finally:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+        returncode = process.wait()
+        if returncode != 0:
+            log.seek(0)
+            raise SquashfsError(f"mksquashfs from tar stream failed: {log.read().decode(errors='replace').strip()}")
+
+
+def merge_squashfs_images_to_tar(
+    config_squashfs: SquashfsConfig, sources: Iterable[tuple[Path, Path | None, str]], output: IO[bytes]
+) -> int:
+    """Write a single tar stream combining several squashfs images, each under its own directory.
+
+    Args:
+        config_squashfs: SquashFsConfig object with tool paths
+        sources: (squashfs_path, subdir_to_take_or_None, destination_directory_name) tuples
+        output: Binary stream to write the combined tar archive to
+
+    Returns:
+        Total bytes of regular file data written
+
+    Raises:
+        SquashfsError: If any image cannot be streamed
+    """
+    total_bytes = 0
+    with tarfile.open(fileobj=output, mode="w|", format=tarfile.PAX_FORMAT) as tar_out:
+        for squashfs_path, subdir, dest_name in sources:
+            dest_dir = tarfile.TarInfo(dest_name)
+            dest_dir.type = tarfile.DIRTYPE
+            dest_dir.mode = 0o755
+            dest_dir.uname = dest_dir.gname = "root"
+            tar_out.addfile(dest_dir)
+            with tempfile.TemporaryFile() as log:
+                process = open_squashfs_as_tar(config_squashfs, squashfs_path, subdir, log)
+                assert process.stdout is not None
+                try:
+                    members, data_bytes = copy_tar_stream_relocated(process.stdout, dest_name, tar_out)
+                except tarfile.TarError as e:
+                    process.kill()
+                    process.wait()
+                    raise SquashfsError(f"Failed to read tar stream of {squashfs_path}: {e}") from e
+                finally:
+                    process.stdout.close()
+                if process.wait() != 0:
+                    raise SquashfsError(f"sqfs2tar of {squashfs_path} failed: {_read_log(log)}")
+            _LOGGER.info("Streamed %s into %s/ (%d entries, %d bytes)", squashfs_path, dest_name, members, data_bytes)
+            total_bytes += data_bytes
+    return total_bytes
+
+
 def create_squashfs_image(
     config_squashfs: SquashfsConfig,
     source_path: Path,
@@ -204,6 +535,7 @@ def create_squashfs_image(
     compression: str | None = None,
     compression_level: int | None = None,
     additional_args: list[str] | None = None,
+    profile: CompressionProfile | None = None,
 ) -> None:
     """Create a squashfs image using configured mksquashfs tool.
 
@@ -214,6 +546,7 @@ def create_squashfs_image(
         compression: Compression type (defaults to config.compression)
         compression_level: Compression level (defaults to config.compression_level)
         additional_args: Additional arguments to pass to mksquashfs
+        profile: Compression profile, overriding compression and compression_level
 
     Raises:
         SquashfsError: If mksquashfs command fails
@@ -224,10 +557,7 @@ def create_squashfs_image(
         str(output_path),
         "-all-root",
         "-progress",
-        "-comp",
-        compression or config_squashfs.compression,
-        "-Xcompression-level",
-        str(compression_level or config_squashfs.compression_level),
+        *compression_args(_resolve_profile(config_squashfs, compression, compression_level, profile)),
         "-noappend",  # Don't append, create new
     ]
 
@@ -254,6 +584,31 @@ def extract_squashfs_image(
         output_dir: Directory to extract to
         extract_path: Specific path within the archive to extract, or None for full extraction
 
+    Raises:
+        SquashfsError: If unsquashfs command fails
+    """
+    extract_squashfs_paths(
+        config_squashfs, squashfs_path, output_dir, [extract_path] if extract_path and extract_path != Path(".") else []
+    )
+
+
+def extract_squashfs_paths(
+    config_squashfs: SquashfsConfig,
+    squashfs_path: Path,
+    output_dir: Path,
+    extract_paths: list[Path],
+) -> None:
+    """Extract several paths from a squashfs image in one unsquashfs run.
+
+    Each path is extracted beneath output_dir at its path within the image, so several
+    subdirectories of a consolidated image can share a single pass over its metadata.
+
+    Args:
+        config_squashfs: SquashFsConfig object with tool paths
+        squashfs_path: Path to squashfs file to extract
+        output_dir: Directory to extract to
+        extract_paths: Paths within the archive to extract; empty for full extraction
+
     Raises:
         SquashfsError: If unsquashfs command fails
     """
@@ -263,11 +618,9 @@ def extract_squashfs_image(
         "-d",
         str(output_dir),  # Destination directory
         str(squashfs_path),
+        *(str(path) for path in extract_paths),
     ]
 
-    if extract_path and extract_path != Path("."):
-        cmd.append(str(extract_path))
-
     result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, check=False)
     if result.returncode != 0:
         raise SquashfsError(f"unsquashfs of {squashfs_path} failed: {result.stdout.strip()}")
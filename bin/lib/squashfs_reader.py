@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""Pure-Python reader for squashfs 4.0 image metadata (superblock, inodes and directories).
+
+Lists every entry of an image with its type, size, mode, ownership and symlink target, without
+running unsquashfs or mounting. Only metadata blocks are read (never file data), and entries are
+produced lazily, one directory at a time, so even huge images can be walked in constant memory.
+"""
+
+from __future__ import annotations
+
+import logging
+import lzma
+import stat
+import struct
+import zlib
+from collections import OrderedDict
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO
+
+import zstandard
+
+_LOGGER = logging.getLogger(__name__)
+
+SQUASHFS_MAGIC = 0x73717368
+
+_SUPERBLOCK = struct.Struct("<IIIIIHHHHHHQQQQQQQQ")
+_INODE_HEADER = struct.Struct("<HHHHII")
+_DIR_HEADER = struct.Struct("<III")
+_DIR_ENTRY = struct.Struct("<HhHH")
+
+_METADATA_BLOCK_SIZE = 8192
+_METADATA_UNCOMPRESSED = 0x8000
+_METADATA_CACHE_BLOCKS = 256
+
+_COMPRESSION_NAMES = {1: "gzip", 2: "lzma", 3: "lzo", 4: "xz", 5: "lz4", 6: "zstd"}
+
+# Inode types; the extended variants are the basic ones + 7
+_DIR, _FILE, _SYMLINK, _BLOCK_DEV, _CHAR_DEV, _FIFO, _SOCKET = range(1, 8)
+_EXTENDED = 7
+
+_FILE_TYPE_CHARS = {
+    _DIR: "d",
+    _FILE: "-",
+    _SYMLINK: "l",
+    _BLOCK_DEV: "b",
+    _CHAR_DEV: "c",
+    _FIFO: "p",
+    _SOCKET: "s",
+}
+_FILE_TYPE_MODES = {
+    _DIR: stat.S_IFDIR,
+    _FILE: stat.S_IFREG,
+    _SYMLINK: stat.S_IFLNK,
+    _BLOCK_DEV: stat.S_IFBLK,
+    _CHAR_DEV: stat.S_IFCHR,
+    _FIFO: stat.S_IFIFO,
+    _SOCKET: stat.S_IFSOCK,
+}
+
+
+class SquashfsFormatError(ValueError):
+    """The image is not a squashfs 4.0 image we can read, or is corrupt."""
+
+
+class UnsupportedCompressionError(SquashfsFormatError):
+    """The image's metadata uses a compressor we can't decompress (lzo, lz4)."""
+
+
+@dataclass(frozen=True)
+class Superblock:
+    """The parts of a squashfs superblock needed to read its metadata."""
+
+    inode_count: int
+    modification_time: int
+    block_size: int
+    compression: str
+    flags: int
+    id_count: int
+    version: tuple[int, int]
+    root_inode_ref: int
+    bytes_used: int
+    id_table_start: int
+    inode_table_start: int
+    directory_table_start: int
+
+    @classmethod
+    def parse(cls, data: bytes) -> Superblock:
+        if len(data) < _SUPERBLOCK.size:
+            raise SquashfsFormatError("File too small to be a squashfs image")
+        (
+            magic,
+            inode_count,
+            modification_time,
+            block_size,
+            _fragment_count,
+            compression_id,
+            _block_log,
+            flags,
+            id_count,
+            version_major,
+            version_minor,
+            root_inode_ref,
+            bytes_used,
+            id_table_start,
+            _xattr_table_start,
+            inode_table_start,
+            directory_table_start,
+            _fragment_table_start,
+            _export_table_start,
+        ) = _SUPERBLOCK.unpack_from(data)
+        if magic != SQUASHFS_MAGIC:
+            raise SquashfsFormatError(f"Bad squashfs magic {magic:#x}")
+        if (version_major, version_minor) != (4, 0):
+            raise SquashfsFormatError(f"Unsupported squashfs version {version_major}.{version_minor}")
+        return cls(
+            inode_count=inode_count,
+            modification_time=modification_time,
+            block_size=block_size,
+            compression=_COMPRESSION_NAMES.get(compression_id, f"unknown({compression_id})"),
+            flags=flags,
+            id_count=id_count,
+            version=(version_major, version_minor),
+            root_inode_ref=root_inode_ref,
+            bytes_used=bytes_used,
+            id_table_start=id_table_start,
+            inode_table_start=inode_table_start,
+            directory_table_start=directory_table_start,
+        )
+
+
+@dataclass(frozen=True)
+class SquashfsInode:
+    """A single entry of a squashfs image."""
+
+    path: str  # Relative path without leading slash ("" for the root directory)
+    file_type: str  # 'd', 'l', '-', 'c', 'b', 'p' or 's', as in `ls -l`
+    mode: int  # Full st_mode, including the file type bits
+    uid: int
+    gid: int
+    mtime: int
+    size: int  # Bytes of data for regular files, 0 otherwise
+    inode_number: int
+    target: str | None = None  # Target for symlinks
+
+
+@dataclass(frozen=True)
+class _RawInode:
+    inode_type: int
+    permissions: int
+    uid: int
+    gid: int
+    mtime: int
+    inode_number: int
+    size: int = 0
+    target: str | None = None
+    dir_block: int = 0
+    dir_offset: int = 0
+    dir_size: int = 0
+
+
+def _decompressor_for(compression: str):
+    if compression == "gzip":
+        return zlib.decompress
+    if compression == "xz":
+        return lambda data: lzma.decompress(data, format=lzma.FORMAT_XZ)
+    if compression == "lzma":
+        return lambda data: lzma.decompress(data, format=lzma.FORMAT_ALONE)
+    if compression == "zstd":
+        decompressor = zstandard.ZstdDecompressor()
+        return lambda data: decompressor.decompress(data, max_output_size=_METADATA_BLOCK_SIZE)
+    return None
+
+
+class SquashfsReader:
+    """Reads the metadata of a squashfs image.
+
+    Usage:
+        with SquashfsReader(path) as reader:
+            for inode in reader.iter_entries():
+                ...
+    """
+
+    def __init__(self, image_path: Path):
+        self.image_path = image_path
+        self._file: BinaryIO = image_path.open("rb")
+        try:
+            self.superblock = Superblock.parse(self._file.read(_SUPERBLOCK.size))
+            self._decompress = _decompressor_for(self.superblock.compression)
+            self._block_cache: OrderedDict[int, tuple[bytes, int]] = OrderedDict()
+            self._ids = self._read_id_table()
+        except BaseException:
+            self._file.close()
+            raise
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> SquashfsReader:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _read_at(self, position: int, length: int) -> bytes:
+        self._file.seek(position)
+        data = self._file.read(length)
+        if len(data) != length:
+            raise SquashfsFormatError(f"Unexpected end of image {self.image_path} at {position}")
+        return data
+
+    def _metadata_block(self, position: int) -> tuple[bytes, int]:
+        """Read (and cache) the metadata block at position. Returns (data, position of next block)."""
+        cached = self._block_cache.get(position)
+        if cached is not None:
+            self._block_cache.move_to_end(position)
+            return cached
+        (header,) = struct.unpack("<H", self._read_at(position, 2))
+        length = header & ~_METADATA_UNCOMPRESSED
+        data = self._read_at(position + 2, length)
+        if not header & _METADATA_UNCOMPRESSED:
+            if self._decompress is None:
+                raise UnsupportedCompressionError(f"Unsupported squashfs compression: {self.superblock.compression}")
+            try:
+                data = self._decompress(data)
+            except (zlib.error, lzma.LZMAError, zstandard.ZstdError) as e:
+                raise SquashfsFormatError(f"Corrupt metadata block at {position} in {self.image_path}: {e}") from e
+        result = (data, position + 2 + length)
+        self._block_cache[position] = result
+        if len(self._block_cache) > _METADATA_CACHE_BLOCKS:
+            self._block_cache.popitem(last=False)
+        return result
+
+    def _read_metadata(self, block_position: int, offset: int, length: int) -> tuple[bytes, int, int]:
+        """Read length bytes of a metadata stream, which may span several blocks.
+
+        Returns (data, block position, offset) where the returned position/offset point just past the data.
+        """
+        chunks = []
+        while length > 0:
+            block, next_position = self._metadata_block(block_position)
+            chunk = block[offset : offset + length]
+            chunks.append(chunk)
+            length -= len(chunk)
+            offset += len(chunk)
+            if offset >= len(block):
+                if length > 0 and next_position >= self.superblock.bytes_used:
+                    raise SquashfsFormatError(f"Metadata runs past the end of {self.image_path}")
+                block_position, offset = next_position, 0
+        return b"".join(chunks), block_position, offset
+
+    def _read_id_table(self) -> list[int]:
+        count = self.superblock.id_count
+        if count == 0:
+            return []
+        num_blocks = (count * 4 + _METADATA_BLOCK_SIZE - 1) // _METADATA_BLOCK_SIZE
+        pointers = struct.unpack(f"<{num_blocks}Q", self._read_at(self.superblock.id_table_start, num_blocks * 8))
+        data, _, _ = self._read_metadata(pointers[0], 0, count * 4)
+        return list(struct.unpack(f"<{count}I", data))
+
+    def _id(self, index: int) -> int:
+        try:
+            return self._ids[index]
+        except IndexError:
+            raise SquashfsFormatError(f"Bad uid/gid index {index} in {self.image_path}") from None
+
+    def _read_inode(self, inode_ref: int) -> _RawInode:
+        position = self.superblock.inode_table_start + (inode_ref >> 16)
+        offset = inode_ref & 0xFFFF
+        header, position, offset = self._read_metadata(position, offset, _INODE_HEADER.size)
+        inode_type, permissions, uid_index, gid_index, mtime, inode_number = _INODE_HEADER.unpack(header)
+        common = {
+            "inode_type": inode_type if inode_type <= _EXTENDED else inode_type - _EXTENDED,
+            "permissions": permissions,
+            "uid": self._id(uid_index),
+            "gid": self._id(gid_index),
+            "mtime": mtime,
+            "inode_number": inode_number,
+        }
+
+        def read(fmt: str) -> tuple:
+            nonlocal position, offset
+            data, position, offset = self._read_metadata(position, offset, struct.calcsize(fmt))
+            return struct.unpack(fmt, data)
+
+        if inode_type == _DIR:
+            dir_block, _links, dir_size, dir_offset, _parent = read("<IIHHI")
+            return _RawInode(**common, dir_block=dir_block, dir_offset=dir_offset, dir_size=dir_size)
+        if inode_type == _DIR + _EXTENDED:
+            _links, dir_size, dir_block, _parent, _index_count, dir_offset, _xattr = read("<IIIIHHI")
+            return _RawInode(**common, dir_block=dir_block, dir_offset=dir_offset, dir_size=dir_size)
+        if inode_type == _FILE:
+            _blocks_start, _fragment, _fragment_offset, size = read("<IIII")
+            return _RawInode(**common, size=size)
+        if inode_type == _FILE + _EXTENDED:
+            _blocks_start, size, _sparse, _links, _fragment, _fragment_offset, _xattr = read("<QQQIIII")
+            return _RawInode(**common, size=size)
+        if inode_type in (_SYMLINK, _SYMLINK + _EXTENDED):
+            _links, target_size = read("<II")
+            target, position, offset = self._read_metadata(position, offset, target_size)
+            return _RawInode(**common, target=target.decode("utf-8", errors="surrogateescape"))
+        if _BLOCK_DEV <= common["inode_type"] <= _SOCKET:
+            return _RawInode(**common)
+        raise SquashfsFormatError(f"Unknown inode type {inode_type} in {self.image_path}")
+
+    def _read_directory(self, inode: _RawInode) -> Iterator[tuple[str, int]]:
+        """Yield (name, inode reference) for each entry of a directory, in on-disk (sorted) order."""
+        remaining = inode.dir_size - 3  # The stored size counts the "." and ".." entries squashfs doesn't store
+        position = self.superblock.directory_table_start + inode.dir_block
+        offset = inode.dir_offset
+        while remaining > 0:
+            header, position, offset = self._read_metadata(position, offset, _DIR_HEADER.size)
+            remaining -= _DIR_HEADER.size
+            count, inode_block, _base_inode = _DIR_HEADER.unpack(header)
+            for _ in range(count + 1):
+                entry, position, offset = self._read_metadata(position, offset, _DIR_ENTRY.size)
+                inode_offset, _inode_delta, _entry_type, name_size = _DIR_ENTRY.unpack(entry)
+                name, position, offset = self._read_metadata(position, offset, name_size + 1)
+                remaining -= _DIR_ENTRY.size + name_size + 1
+                yield name.decode("utf-8", errors="surrogateescape"), (inode_block << 16) | inode_offset
+
+    def _to_inode(self, path: str, raw: _RawInode) -> SquashfsInode:
+        return SquashfsInode(
+            path=path,
+            file_type=_FILE_TYPE_CHARS[raw.inode_type],
+            mode=_FILE_TYPE_MODES[raw.inode_type] | raw.permissions,
+            uid=raw.uid,
+            gid=raw.gid,
+            mtime=raw.mtime,
+            size=raw.size,
+            inode_number=raw.inode_number,
+            target=raw.target,
+        )
+
+    def _walk(self, directory: _RawInode, prefix: str) -> Iterator[SquashfsInode]:
+        for name, inode_ref in self._read_directory(directory):
+            raw = self._read_inode(inode_ref)
+            path = f"{prefix}{name}"
+            yield self._to_inode(path, raw)
+            if raw.inode_type == _DIR:
+                yield from self._walk(raw, f"{path}/")
+
+    def root(self) -> SquashfsInode:
+        """The root directory of the image."""
+        return self._to_inode("", self._read_inode(self.superblock.root_inode_ref))
+
+    def iter_entries(self, subdir: str | None = None) -> Iterator[SquashfsInode]:
+        """Lazily yield every entry of the image (or below subdir), parents before children.
+
+        The root (or subdir itself) is not included, matching unsquashfs -ll once its root line is skipped.
+
+        Raises:
+            SquashfsFormatError: If the image is corrupt, or subdir isn't a directory in it
+        """
+        directory = self._read_inode(self.superblock.root_inode_ref)
+        prefix = ""
+        for part in Path(subdir).parts if subdir else ():
+            if part in ("/", "."):
+                continue
+            ref = next((ref for name, ref in self._read_directory(directory) if name == part), None)
+            if ref is None:
+                raise SquashfsFormatError(f"{subdir} not found in {self.image_path}")
+            directory = self._read_inode(ref)
+            if directory.inode_type != _DIR:
+                raise SquashfsFormatError(f"{subdir} is not a directory in {self.image_path}")
+            prefix = f"{prefix}{part}/"
+        yield from self._walk(directory, prefix)
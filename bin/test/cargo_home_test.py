@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+from lib.cargo_home import CargoHome
+
+
+def _write(path: Path, size: int, mtime: int) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"x" * size)
+    os.utime(path, (mtime, mtime))
+
+
+def _populate(home: Path) -> None:
+    _write(home / "registry/index/index.crates.io-1/config.json", 100, 1)
+    _write(home / "registry/cache/index.crates.io-1/serde-1.0.0.crate", 300, 1)
+    _write(home / "registry/cache/index.crates.io-1/libc-0.2.0.crate", 300, 2)
+    _write(home / "registry/src/index.crates.io-1/serde-1.0.0/lib.rs", 400, 3)
+    _write(home / "git/checkouts/tokio-1/abc/lib.rs", 200, 4)
+    os.utime(home / "registry/src/index.crates.io-1/serde-1.0.0", (3, 3))
+
+
+def test_cached_crate(tmp_path):
+    _populate(tmp_path)
+    home = CargoHome(tmp_path)
+
+    assert home.cached_crate("serde", "1.0.0") == tmp_path / "registry/cache/index.crates.io-1/serde-1.0.0.crate"
+    assert home.cached_crate("serde", "2.0.0") is None
+
+
+def test_prune_removes_cheapest_to_recreate_first(tmp_path):
+    _populate(tmp_path)
+    home = CargoHome(tmp_path, max_size=800)
+
+    freed = home.prune()
+
+    assert freed == 600
+    assert not (tmp_path / "registry/src/index.crates.io-1/serde-1.0.0").exists()
+    assert not (tmp_path / "git/checkouts/tokio-1/abc").exists()
+    assert (tmp_path / "registry/cache/index.crates.io-1/serde-1.0.0.crate").exists()
+    assert home.size() == 700
+
+
+def test_prune_removes_oldest_crates_first(tmp_path):
+    _populate(tmp_path)
+    home = CargoHome(tmp_path, max_size=450)
+
+    home.prune()
+
+    assert not (tmp_path / "registry/cache/index.crates.io-1/serde-1.0.0.crate").exists()
+    assert (tmp_path / "registry/cache/index.crates.io-1/libc-0.2.0.crate").exists()
+    assert (tmp_path / "registry/index/index.crates.io-1/config.json").exists()
+
+
+def test_prune_within_limit_or_missing_does_nothing(tmp_path):
+    _populate(tmp_path)
+
+    assert CargoHome(tmp_path, max_size=10_000).prune() == 0
+    assert CargoHome(tmp_path / "missing").prune() == 0
@@ -742,6 +742,21 @@ def test_validate_space_requirements(tmp_path):
     assert largest == 0
 
 
+def test_validate_space_requirements_with_uncompressed_sizes(tmp_path):
+    mb = 1024 * 1024
+    groups = [
+        [ConsolidationCandidate(name="a", nfs_path=Path("/opt/a"), squashfs_path=Path("/efs/a.sqfs"), size=300 * mb)],
+        [ConsolidationCandidate(name="b", nfs_path=Path("/opt/b"), squashfs_path=Path("/efs/b.sqfs"), size=100 * mb)],
+    ]
+
+    with patch("lib.cefs.consolidation.check_temp_space_available", return_value=True):
+        required, largest = validate_space_requirements(groups, tmp_path, uncompressed_group_sizes=[600 * mb, 900 * mb])
+
+    # The smaller image holds more data: its extracted tree plus its new image dominates
+    assert largest == 300 * mb
+    assert required == 900 * mb + 100 * mb
+
+
 def test_gather_reconsolidation_candidates(tmp_path):
     """Test gather_reconsolidation_candidates method in CEFSState."""
     # Create test directory structure
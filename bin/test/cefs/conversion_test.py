@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""Tests for CEFS bulk conversion."""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+from lib.cefs.conversion import (
+    ConversionItem,
+    ConversionJournal,
+    IoBudget,
+    bulk_convert,
+)
+from lib.cefs.paths import calculate_squashfs_hash
+from lib.config import CefsConfig, SquashfsConfig
+
+
+@pytest.fixture(name="layout")
+def layout_fixture(tmp_path):
+    squashfs_config = SquashfsConfig(image_dir=tmp_path / "squash")
+    cefs_config = CefsConfig(enabled=True, image_dir=tmp_path / "cefs-images", mount_point=tmp_path / "cefs")
+    return tmp_path / "opt", squashfs_config, cefs_config
+
+
+def _make_item(layout, name: str, installed: bool = True) -> ConversionItem:
+    nfs_dir, squashfs_config, _ = layout
+    (nfs_dir / name).mkdir(parents=True)
+    (nfs_dir / name / "file").write_text(name)
+    image = squashfs_config.image_dir / f"{name}.img"
+    image.parent.mkdir(parents=True, exist_ok=True)
+    image.write_bytes(f"image of {name}".encode() * 1000)
+    installable = MagicMock()
+    installable.name = f"compilers/{name}"
+    installable.is_installed.return_value = installed
+    return ConversionItem(installable=installable, nfs_path=nfs_dir / name, squashfs_image_path=image)
+
+
+def _convert(layout, items, **kwargs):
+    _, squashfs_config, cefs_config = layout
+    return bulk_convert(items, squashfs_config, cefs_config, False, False, False, **kwargs)
+
+
+def test_bulk_convert_deploys_and_swaps(layout):
+    items = [_make_item(layout, f"gcc-{v}") for v in ("12", "13", "14")]
+
+    result = _convert(layout, items, max_workers=3)
+
+    assert result.converted == ["compilers/gcc-12", "compilers/gcc-13", "compilers/gcc-14"]
+    assert not result.failed
+    cefs_config = layout[2]
+    for item in items:
+        image_hash = calculate_squashfs_hash(item.squashfs_image_path)
+        images = list(cefs_config.image_dir.glob(f"{image_hash[:2]}/{image_hash}_converted_*.sqfs"))
+        assert len(images) == 1
+        assert images[0].read_bytes() == item.squashfs_image_path.read_bytes()
+        assert images[0].with_suffix(".yaml").exists()
+        assert item.nfs_path.is_symlink()
+        assert item.nfs_path.readlink() == cefs_config.mount_point / image_hash[:2] / images[0].stem
+        assert (item.nfs_path.with_name(item.nfs_path.name + ".bak") / "file").exists()
+    assert not list(cefs_config.image_dir.glob("*.tmp"))
+
+
+def test_bulk_convert_records_failures_and_resumes(layout, tmp_path):
+    good = _make_item(layout, "gcc-13")
+    broken = _make_item(layout, "gcc-14", installed=False)
+    missing = _make_item(layout, "gcc-15")
+    missing.squashfs_image_path.unlink()
+    journal_path = tmp_path / "journal.jsonl"
+
+    result = _convert(layout, [good, broken, missing], journal=ConversionJournal(journal_path))
+
+    assert result.converted == ["compilers/gcc-13"]
+    assert set(result.failed) == {"compilers/gcc-14", "compilers/gcc-15"}
+    assert "reports not installed" in result.failed["compilers/gcc-14"]
+    assert "No squashfs image" in result.failed["compilers/gcc-15"]
+    entries = [json.loads(line) for line in journal_path.read_text().splitlines()]
+    assert {(entry["name"], entry["status"]) for entry in entries} == {
+        ("compilers/gcc-13", "converted"),
+        ("compilers/gcc-14", "failed"),
+        ("compilers/gcc-15", "failed"),
+    }
+
+    missing.squashfs_image_path.write_bytes(b"now it exists")
+    result = _convert(layout, [good, missing], journal=ConversionJournal(journal_path))
+
+    assert result.resumed == ["compilers/gcc-13"]
+    assert result.converted == ["compilers/gcc-15"]
+    good.installable.is_installed.assert_called_once()
+
+
+def test_bulk_convert_already_converted(layout):
+    item = _make_item(layout, "gcc-13")
+    _convert(layout, [item])
+
+    result = _convert(layout, [item])
+
+    assert result.already_converted == ["compilers/gcc-13"]
+    assert not result.converted
+
+
+def test_bulk_convert_finalises_manifest_left_by_interrupted_run(layout):
+    item = _make_item(layout, "gcc-13")
+    _convert(layout, [item])
+    cefs_config = layout[2]
+    [image] = list(cefs_config.image_dir.glob("*/*.sqfs"))
+    manifest = image.with_suffix(".yaml")
+    # Simulate a run that deployed the image but stopped before the symlink swap
+    manifest.rename(Path(f"{manifest}.inprogress"))
+    item.nfs_path.unlink()
+    item.nfs_path.with_name(item.nfs_path.name + ".bak").rename(item.nfs_path)
+
+    result = _convert(layout, [item])
+
+    assert result.converted == ["compilers/gcc-13"]
+    assert manifest.exists()
+    assert not Path(f"{manifest}.inprogress").exists()
+
+
+def test_bulk_convert_dry_run_changes_nothing(layout, tmp_path):
+    item = _make_item(layout, "gcc-13")
+    _, squashfs_config, cefs_config = layout
+    journal_path = tmp_path / "journal.jsonl"
+
+    result = bulk_convert(
+        [item], squashfs_config, cefs_config, False, False, True, journal=ConversionJournal(journal_path)
+    )
+
+    assert result.converted == ["compilers/gcc-13"]
+    assert not item.nfs_path.is_symlink()
+    assert not cefs_config.image_dir.exists()
+    assert not journal_path.exists()
+
+
+def test_conversion_journal_ignores_malformed_lines(tmp_path):
+    journal_path = tmp_path / "journal.jsonl"
+    journal_path.write_text('{"name": "a", "status": "converted"}\nnot json\n{"name": "b", "status": "failed"}\n')
+
+    journal = ConversionJournal(journal_path)
+
+    assert journal.is_converted("a")
+    assert not journal.is_converted("b")
+    assert not journal.is_converted("c")
+
+
+def test_io_budget_limits_bytes_in_flight():
+    budget = IoBudget(100)
+    in_flight = []
+    peak = []
+    lock = threading.Lock()
+
+    def work(size: int) -> None:
+        with budget.reserve(size):
+            with lock:
+                in_flight.append(size)
+                peak.append(sum(in_flight))
+            time.sleep(0.01)
+            with lock:
+                in_flight.remove(size)
+
+    threads = [threading.Thread(target=work, args=(size,)) for size in (60, 60, 30, 150)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # 150 is larger than the budget, so it may only ever run alone
+    assert max(peak) <= 150
+    assert all(total <= 100 or total == 150 for total in peak)
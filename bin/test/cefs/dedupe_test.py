@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""Tests for CEFS cross-image dedupe analysis."""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+from lib.cefs.dedupe import (
+    DedupeImage,
+    build_dedupe_report,
+    collect_dedupe_images,
+    read_suggested_groups,
+    suggest_dedupe_groups,
+    write_suggested_groups,
+)
+from lib.cefs.state import CEFSState
+from lib.cefs_manifest import write_manifest_alongside_image
+from lib.squashfs import FileDigest
+
+from test.cefs.test_helpers import make_test_manifest
+
+MB = 1024 * 1024
+
+
+def _image(name: str, *installables: str, size: int = 100 * MB) -> DedupeImage:
+    return DedupeImage(path=Path(f"/efs/cefs-images/ab/{name}.sqfs"), size=size, names=installables)
+
+
+def _file(path: str, content: str, size: int) -> FileDigest:
+    return FileDigest(path=path, size=size, digest=content.encode().ljust(16, b"\0"))
+
+
+@pytest.fixture
+def gcc_images():
+    gcc13 = _image("gcc13", "compilers/c++/x86/gcc 13.1.0")
+    gcc14 = _image("gcc14", "compilers/c++/x86/gcc 14.2.0")
+    clang = _image("clang18", "compilers/c++/x86/clang 18.1.0")
+    digests = {
+        gcc13.path: [
+            _file("include/vector", "vector", 10 * MB),
+            _file("lib/libstdc++.so", "libstdc++13", 50 * MB),
+            _file("lib/copy-of-vector", "vector", 10 * MB),
+        ],
+        gcc14.path: [_file("include/vector", "vector", 10 * MB), _file("lib/libstdc++.so", "libstdc++14", 60 * MB)],
+        clang.path: [_file("share/vector", "vector", 10 * MB), _file("bin/clang", "clang", 80 * MB)],
+    }
+    return [gcc13, gcc14, clang], digests
+
+
+def test_build_dedupe_report(gcc_images):
+    images, digests = gcc_images
+
+    report = build_dedupe_report(images, digests)
+
+    assert report.images == 3
+    assert report.files == 7
+    # "vector" is in all three images (counted once per image); everything else is unique
+    assert report.total_bytes == 3 * 10 * MB + 50 * MB + 60 * MB + 80 * MB
+    assert report.duplicate_bytes == 2 * 10 * MB
+    assert len(report.pair_bytes) == 3
+    assert all(shared == 10 * MB for shared in report.pair_bytes.values())
+    assert report.family_bytes == {"compilers/c++/x86/gcc": 10 * MB}
+
+
+def test_build_dedupe_report_limits_pair_fanout(gcc_images):
+    images, digests = gcc_images
+
+    report = build_dedupe_report(images, digests, max_pair_fanout=2)
+
+    assert report.duplicate_bytes == 2 * 10 * MB
+    assert report.pair_bytes == {}
+
+
+def test_suggest_dedupe_groups_clusters_by_shared_content():
+    images = [_image(name, f"compilers/c++/x86/gcc {name}") for name in ("a", "b", "c", "d")]
+    report = build_dedupe_report(
+        images,
+        {
+            images[0].path: [_file("x", "big", 200 * MB)],
+            images[1].path: [_file("x", "big", 200 * MB)],
+            images[2].path: [_file("y", "medium", 100 * MB)],
+            images[3].path: [_file("y", "medium", 100 * MB), _file("z", "small", 1 * MB)],
+        },
+    )
+
+    assert suggest_dedupe_groups(images, report, min_shared_bytes=64 * MB, max_group_bytes=1024 * MB) == [
+        ["compilers/c++/x86/gcc a", "compilers/c++/x86/gcc b"],
+        ["compilers/c++/x86/gcc c", "compilers/c++/x86/gcc d"],
+    ]
+    assert suggest_dedupe_groups(images, report, min_shared_bytes=150 * MB, max_group_bytes=1024 * MB) == [
+        ["compilers/c++/x86/gcc a", "compilers/c++/x86/gcc b"],
+    ]
+    assert suggest_dedupe_groups(images, report, min_shared_bytes=64 * MB, max_group_bytes=150 * MB) == []
+
+
+def test_suggested_groups_round_trip(tmp_path):
+    path = tmp_path / "groups.yaml"
+    groups = [["compilers/c++/x86/gcc 13.1.0", "compilers/c++/x86/gcc 14.2.0"]]
+
+    write_suggested_groups(path, groups)
+
+    assert read_suggested_groups(path) == groups
+
+
+def test_read_suggested_groups_rejects_bad_format(tmp_path):
+    path = tmp_path / "groups.yaml"
+    path.write_text("groups: [1, 2]\n")
+    with pytest.raises(ValueError):
+        read_suggested_groups(path)
+
+
+def test_collect_dedupe_images_filters_by_content(tmp_path):
+    image_dir = tmp_path / "cefs-images"
+    (image_dir / "ab").mkdir(parents=True)
+    for stem, name in (("ab1_gcc", "compilers/c++/x86/gcc 14.2.0"), ("ab2_clang", "compilers/c++/x86/clang 18.1.0")):
+        image_path = image_dir / "ab" / f"{stem}.sqfs"
+        image_path.write_bytes(b"x" * 10)
+        write_manifest_alongside_image(
+            make_test_manifest(contents=[{"name": name, "destination": f"/opt/compiler-explorer/{stem}"}]),
+            image_path,
+        )
+    state = CEFSState(nfs_dir=tmp_path / "nfs", cefs_image_dir=image_dir, mount_point=Path("/cefs"))
+    state.scan_cefs_images_with_manifests()
+
+    images = collect_dedupe_images(state, ["gcc"])
+
+    assert [(image.path.name, image.size, image.names) for image in images] == [
+        ("ab1_gcc.sqfs", 10, ("compilers/c++/x86/gcc 14.2.0",))
+    ]
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""Tests for CEFS filesystem checking."""
+
+from __future__ import annotations
+
+import os
+import time
+
+import pytest
+import yaml
+from lib.cefs.fsck import (
+    UNCHANGED,
+    FSCKResults,
+    check_shard,
+    fsck_report_records,
+    is_clean_baseline,
+    read_last_success,
+    record_success,
+    run_fsck_validation,
+)
+from lib.cefs.state import CEFSState
+
+from test.cefs.test_helpers import make_test_manifest
+
+GOOD_CONTENTS = [{"name": "compilers/c++/x86/gcc 14.1.0", "destination": "/opt/compiler-explorer/gcc-14.1.0"}]
+
+
+def _add_image(image_dir, stem: str, manifest: dict | str | None):
+    image_path = image_dir / stem[:2] / f"{stem}.sqfs"
+    image_path.parent.mkdir(parents=True, exist_ok=True)
+    image_path.write_bytes(b"image")
+    if isinstance(manifest, dict):
+        image_path.with_suffix(".yaml").write_text(yaml.dump(manifest))
+    elif isinstance(manifest, str):
+        image_path.with_suffix(".yaml").write_text(manifest)
+    return image_path
+
+
+@pytest.fixture(name="image_dir")
+def image_dir_fixture(tmp_path):
+    image_dir = tmp_path / "cefs-images"
+    _add_image(image_dir, "aa1_gcc", make_test_manifest(contents=GOOD_CONTENTS))
+    _add_image(image_dir, "aa2_gcc", None)
+    _add_image(image_dir, "bb1_gcc", make_test_manifest(contents=[{"name": "gcc", "destination": "/opt/gcc"}]))
+    _add_image(image_dir, "bb2_gcc", make_test_manifest(contents=[{"name": "x", "target": "/opt/gcc"}]))
+    _add_image(image_dir, "cc1_gcc", "contents: [")
+    inprogress = _add_image(image_dir, "cc2_gcc", None)
+    inprogress.with_suffix(".yaml.inprogress").write_text("in progress")
+    return image_dir
+
+
+def test_check_shard(image_dir):
+    statuses = {
+        check.image_path.stem: check.status for shard in ("aa", "bb", "cc") for check in check_shard(image_dir / shard)
+    }
+
+    assert statuses == {
+        "aa1_gcc": "valid",
+        "aa2_gcc": "missing",
+        "bb1_gcc": "invalid_name",
+        "bb2_gcc": "old_format",
+        "cc1_gcc": "unreadable",
+    }
+
+
+def test_check_shard_skips_unchanged_manifests(image_dir):
+    old_manifest = image_dir / "aa" / "aa1_gcc.yaml"
+    os.utime(old_manifest, (0, 0))
+
+    checks = check_shard(image_dir / "aa", since=time.time() - 60)
+
+    assert [(check.image_path.stem, check.status) for check in checks] == [
+        ("aa1_gcc", UNCHANGED),
+        ("aa2_gcc", "missing"),
+    ]
+
+
+@pytest.mark.parametrize("max_workers", [1, 3])
+def test_run_fsck_validation_streams_every_check(tmp_path, image_dir, max_workers):
+    state = CEFSState(tmp_path / "opt", image_dir, tmp_path / "cefs")
+    (tmp_path / "opt").mkdir()
+    checks = []
+    progress = []
+
+    results = run_fsck_validation(
+        state,
+        tmp_path / "cefs",
+        max_workers=max_workers,
+        on_check=checks.append,
+        on_shard=lambda *p: progress.append(p),
+    )
+
+    assert len(checks) == results.total_images == 5
+    assert sum(check.is_problem for check in checks) == results.total_invalid == 4
+    assert results.valid_manifests == 1
+    assert results.invalid_name_manifests[0][0] == image_dir / "bb" / "bb1_gcc.yaml"
+    assert "invalid name" in results.invalid_name_manifests[0][1]
+    assert [file.path.name for file in results.inprogress_files] == ["cc2_gcc.yaml.inprogress"]
+    assert progress == [(1, 3), (2, 3), (3, 3)]
+
+
+def test_report_records(tmp_path, image_dir):
+    state = CEFSState(tmp_path / "opt", image_dir, tmp_path / "cefs")
+    (tmp_path / "opt").mkdir()
+    results = run_fsck_validation(state, tmp_path / "cefs", max_workers=1)
+
+    records = fsck_report_records(results)
+
+    assert records[0]["type"] == "inprogress"
+    assert records[-1] == {
+        "type": "summary",
+        "total_images": 5,
+        "valid_manifests": 1,
+        "unchanged_manifests": 0,
+        "invalid_manifests": 4,
+        "inprogress_files": 1,
+        "pending_cleanup": 0,
+    }
+
+
+def test_last_success_round_trip(tmp_path):
+    path = tmp_path / "temp" / "fsck-last-success"
+    assert read_last_success(path) is None
+
+    record_success(path, 1234.5)
+
+    assert read_last_success(path) == 1234.5
+
+
+@pytest.mark.parametrize("since, expected", [(None, True), ("last", True), ("1d", False)])
+def test_clean_run_is_baseline_unless_manifests_were_skipped_by_age(since, expected):
+    assert is_clean_baseline(FSCKResults(valid_manifests=1, unchanged_manifests=3), since) is expected
+
+
+def test_run_with_invalid_manifests_is_not_baseline(tmp_path):
+    assert not is_clean_baseline(FSCKResults(missing_manifests=[tmp_path / "aa1_gcc.yaml"]), None)
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""Tests for the node-local CEFS image cache."""
+
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import os
+import time
+from unittest import mock
+
+import pytest
+from lib.cefs.local_cache import LocalImageCache, format_prometheus, map_entry
+
+
+def _make_image(image_dir, contents: bytes, suffix: str = "_gcc") -> str:
+    key = hashlib.sha256(contents).hexdigest()[:24] + suffix
+    path = image_dir / key[:2] / f"{key}.sqfs"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(contents)
+    return key
+
+
+@pytest.fixture(name="cache")
+def cache_fixture(tmp_path):
+    return LocalImageCache(tmp_path / "cache", tmp_path / "images", max_bytes=1000)
+
+
+def test_miss_then_fill_then_hit(cache):
+    key = _make_image(cache.image_dir, b"a" * 100)
+
+    assert cache.resolve(key) == (cache.source_path(key), False)
+    assert cache.fill(key)
+    assert cache.cached_path(key).read_bytes() == b"a" * 100
+    assert cache.resolve(key) == (cache.cached_path(key), True)
+
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.fills, stats.images, stats.cached_bytes) == (1, 1, 1, 1, 100)
+    assert stats.hit_rate == 0.5
+
+
+def test_fill_rejects_image_not_matching_its_hash(cache):
+    key = _make_image(cache.image_dir, b"original")
+    cache.source_path(key).write_bytes(b"corrupted")
+
+    assert not cache.fill(key)
+    assert not cache.cached_path(key).exists()
+    assert list(cache.cached_path(key).parent.iterdir()) == []
+    assert cache.stats().verify_failures == 1
+
+
+def test_fill_skips_images_larger_than_the_cache(cache):
+    key = _make_image(cache.image_dir, b"x" * 2000)
+
+    assert not cache.fill(key)
+    assert not cache.cached_path(key).exists()
+
+
+def test_fill_skips_image_already_being_filled(cache):
+    key = _make_image(cache.image_dir, b"a" * 100)
+    cache.cached_path(key).parent.mkdir(parents=True)
+    cache.cached_path(key).with_name(f"{key}.sqfs.partial").touch()
+
+    assert not cache.fill(key)
+
+
+def test_evicts_least_recently_mounted(cache):
+    first, second, third = (_make_image(cache.image_dir, bytes([i]) * 400) for i in range(3))
+    for age, key in ((30, first), (20, second)):
+        cache.fill(key)
+        os.utime(cache.cached_path(key), (time.time() - age, time.time() - age))
+    cache.resolve(first)  # Mounting the oldest makes it the most recent
+
+    assert cache.fill(third)
+
+    assert cache.cached_path(first).exists()
+    assert not cache.cached_path(second).exists()
+    assert cache.cached_path(third).exists()
+    assert cache.stats().evictions == 1
+
+
+def test_evict_removes_stale_partial_copies(cache):
+    key = _make_image(cache.image_dir, b"a")
+    partial = cache.cached_path(key).with_name(f"{key}.sqfs.partial")
+    partial.parent.mkdir(parents=True)
+    partial.touch()
+    os.utime(partial, (0, 0))
+
+    cache.evict()
+
+    assert not partial.exists()
+
+
+def test_evict_counts_fills_in_flight(cache):
+    old, new = (_make_image(cache.image_dir, bytes([i]) * 400) for i in range(2))
+    for age, key in ((20, old), (10, new)):
+        cache.fill(key)
+        os.utime(cache.cached_path(key), (time.time() - age, time.time() - age))
+    in_flight = cache.cached_path("ff" * 12).with_name(f"{'ff' * 12}_gcc.sqfs.partial")
+    in_flight.parent.mkdir(parents=True)
+    in_flight.write_bytes(b"x" * 300)
+
+    cache.evict()
+
+    assert not cache.cached_path(old).exists()
+    assert cache.cached_path(new).exists()
+
+
+def test_fill_reserves_the_whole_image_while_copying(cache):
+    key = _make_image(cache.image_dir, b"a" * 100)
+    sizes = []
+
+    with mock.patch.object(LocalImageCache, "evict", autospec=True) as evict:
+        evict.side_effect = lambda self: sizes.extend(
+            path.stat().st_size for path in self.cache_dir.glob("*/*.partial")
+        )
+        assert cache.fill(key)
+
+    assert sizes == [100]
+
+
+def test_fill_waits_for_a_free_slot(tmp_path):
+    cache = LocalImageCache(tmp_path / "cache", tmp_path / "images", max_bytes=1000, max_fills=1)
+    key = _make_image(cache.image_dir, b"a" * 100)
+    (tmp_path / "cache" / ".fills").mkdir(parents=True)
+    with open(tmp_path / "cache" / ".fills" / "0", "w", encoding="utf-8") as held:
+        fcntl.flock(held, fcntl.LOCK_EX)
+        assert not cache.fill(key)
+
+    assert cache.fill(key)
+
+
+def test_fill_shares_the_bandwidth_between_slots(tmp_path):
+    cache = LocalImageCache(tmp_path / "cache", tmp_path / "images", max_bytes=1000, max_fills=2, fill_bandwidth=1000)
+    key = _make_image(cache.image_dir, b"a" * 100)
+
+    with mock.patch("lib.cefs.local_cache.RateLimiter") as limiter:
+        assert cache.fill(key)
+
+    limiter.assert_called_once_with(500)
+    limiter.return_value.wait.assert_called_once_with(100)
+
+
+def test_only_images_that_keep_missing_are_filled(cache):
+    key = _make_image(cache.image_dir, b"a" * 100)
+
+    assert not cache.should_fill(key)
+    assert cache.should_fill(key)
+    cache.fill(key)
+    assert not cache.should_fill(key)  # Misses are counted afresh once filled
+
+
+def test_hot_images_are_filled_on_first_miss(tmp_path):
+    hot_list = tmp_path / "warm-list"
+    cache = LocalImageCache(tmp_path / "cache", tmp_path / "images", max_bytes=1000, hot_list=hot_list)
+    hot, cold = (_make_image(cache.image_dir, bytes([i]) * 100) for i in range(2))
+    hot_list.write_text(f"/cefs/{hot[:2]}/{hot}/bin/gcc\n/cefs/{hot[:2]}/{hot}/include/stdio.h\n")
+
+    assert cache.hot_keys() == {hot}
+    assert cache.should_fill(hot)
+    assert not cache.should_fill(cold)
+
+
+def test_map_entry_fills_on_the_second_miss(cache):
+    key = _make_image(cache.image_dir, b"a" * 100)
+
+    with mock.patch("subprocess.Popen") as popen:
+        map_entry(cache, key, ["fill"])
+        popen.assert_not_called()
+        map_entry(cache, key, ["fill"])
+
+    assert popen.call_args.args[0] == ["fill", key]
+
+
+def test_map_entry(cache):
+    key = _make_image(cache.image_dir, b"a" * 100)
+
+    assert map_entry(cache, key, ["true"]) == f"-fstype=squashfs,loop,nosuid,nodev,ro :{cache.source_path(key)}"
+    cache.fill(key)
+    assert map_entry(cache, key, None) == f"-fstype=squashfs,loop,nosuid,nodev,ro :{cache.cached_path(key)}"
+
+
+def test_map_entry_passes_unexpected_keys_through(cache):
+    assert map_entry(cache, "not-a-hash", ["false"]).endswith(f":{cache.image_dir}/no/not-a-hash.sqfs")
+    assert cache.stats().misses == 0
+
+
+def test_format_prometheus(cache):
+    key = _make_image(cache.image_dir, b"a" * 100)
+    cache.resolve(key)
+
+    text = format_prometheus(cache.stats())
+
+    assert "cefs_local_cache_misses_total 1\n" in text
+    assert "cefs_local_cache_hits_total 0\n" in text
+    assert "cefs_local_cache_max_bytes 1000\n" in text
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""Tests for CEFS mount latency and read statistics."""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+from lib.cefs.mount_metrics import (
+    CefsMount,
+    ProbeResult,
+    collect_image_stats,
+    efs_read_bytes,
+    format_prometheus,
+    image_stem_from_mount_path,
+    parse_mountinfo,
+    parse_nfs_read_bytes,
+    probe_image,
+    probe_images,
+    to_json,
+)
+
+MOUNTINFO = """\
+22 1 259:1 / / rw,relatime shared:1 - ext4 /dev/root rw
+40 22 0:40 / /efs rw,relatime shared:20 - nfs4 fs-1.efs.us-east-1.amazonaws.com:/ rw,vers=4.1
+41 22 0:41 / /cefs rw,relatime shared:21 - autofs /etc/auto.cefs rw,fd=7
+50 41 7:3 / /cefs/ab/abc123_gcc ro,nosuid,nodev,relatime shared:30 - squashfs /dev/loop3 ro,errors=continue
+51 41 7:4 / /cefs/de/def456_consolidated ro,nosuid shared:31 master:2 - squashfs /dev/loop4 ro
+52 22 7:5 / /opt/compiler-explorer/old\\040image ro shared:32 - squashfs /dev/loop5 ro
+53 41 7:6 / /cefs/xy/abc_gcc ro shared:33 - squashfs /dev/loop6 ro
+"""
+
+MOUNTSTATS = """\
+device /dev/root mounted on / with fstype ext4
+device fs-1.efs.us-east-1.amazonaws.com:/ mounted on /efs with fstype nfs4 statvers=1.1
+\topts:\trw,vers=4.1
+\tbytes:\t100\t0\t0\t0\t4096\t0\t1\t0
+device other:/ mounted on /other with fstype nfs statvers=1.1
+\tbytes:\t1\t0\t0\t0\t2\t0\t0\t0
+"""
+
+
+def test_parse_mountinfo():
+    assert parse_mountinfo(MOUNTINFO, Path("/cefs")) == [
+        CefsMount("abc123_gcc", "/cefs/ab/abc123_gcc", "7:3"),
+        CefsMount("def456_consolidated", "/cefs/de/def456_consolidated", "7:4"),
+    ]
+
+
+@pytest.mark.parametrize(
+    "mount_path, expected",
+    [
+        ("/cefs/ab/abc123_gcc", "abc123_gcc"),
+        ("/cefs/ab/abc123_gcc/sub", None),
+        ("/cefs/ab", None),
+        ("/other/ab/abc123_gcc", None),
+    ],
+)
+def test_image_stem_from_mount_path(mount_path, expected):
+    assert image_stem_from_mount_path(mount_path, Path("/cefs")) == expected
+
+
+def test_efs_read_bytes():
+    read_bytes = parse_nfs_read_bytes(MOUNTSTATS)
+
+    assert read_bytes == {"/efs": 4096, "/other": 2}
+    assert efs_read_bytes(read_bytes, Path("/efs/cefs-images")) == 4096
+    assert efs_read_bytes(read_bytes, Path("/local/images")) is None
+
+
+def _add_loop_device(sys_root: Path, device: str, backing_file: Path, stat: str) -> None:
+    device_dir = sys_root / "dev" / "block" / device
+    (device_dir / "loop").mkdir(parents=True)
+    (device_dir / "loop" / "backing_file").write_text(f"{backing_file}\n")
+    (device_dir / "stat").write_text(stat)
+
+
+def test_collect_image_stats(tmp_path):
+    proc_root = tmp_path / "proc"
+    sys_root = tmp_path / "sys"
+    image_dir = tmp_path / "images"
+    (proc_root / "self").mkdir(parents=True)
+    (proc_root / "self" / "mountinfo").write_text(MOUNTINFO)
+    efs_image = image_dir / "ab" / "abc123_gcc.sqfs"
+    efs_image.parent.mkdir(parents=True)
+    efs_image.write_bytes(b"x" * 2048)
+    _add_loop_device(sys_root, "7:3", efs_image, "10 0 8 25 0 0 0 0 0 30 25 0 0 0 0")
+    _add_loop_device(sys_root, "7:4", tmp_path / "cache" / "de" / "def456.sqfs", "1 0 100 5 0 0 0 0 0 5 5")
+
+    stats = collect_image_stats(Path("/cefs"), image_dir, proc_root, sys_root)
+
+    assert [(s.stem, s.cached, s.read_ios, s.read_bytes, s.read_seconds) for s in stats] == [
+        ("def456_consolidated", True, 1, 51200, 0.005),
+        ("abc123_gcc", False, 10, 4096, 0.025),
+    ]
+    assert stats[0].read_amplification is None
+    assert stats[1].read_amplification == 2.0
+    assert to_json(image_stats=stats)["images"][1]["read_amplification"] == 2.0
+
+
+def test_probe_image(tmp_path):
+    mount_path = tmp_path / "ab" / "abc123_gcc"
+    (mount_path / "bin").mkdir(parents=True)
+
+    result = probe_image(mount_path, {str(mount_path)})
+
+    assert result.stem == "abc123_gcc"
+    assert result.was_mounted
+    assert result.error is None
+    assert result.mount_seconds >= 0 and result.first_access_seconds >= 0
+    assert "No such file" in probe_image(tmp_path / "ab" / "missing", set()).error
+
+
+def test_probe_images_cold_only(tmp_path):
+    (tmp_path / "self").mkdir()
+    (tmp_path / "self" / "mountinfo").write_text(MOUNTINFO)
+
+    results = probe_images(["abc123_gcc", "/cefs/gh/ghi789_gcc"], Path("/cefs"), cold_only=True, proc_root=tmp_path)
+
+    assert [(result.stem, result.was_mounted) for result in results] == [("ghi789_gcc", False)]
+
+
+def test_format_prometheus():
+    probes = [ProbeResult("abc", False, 0.5, 0.01), ProbeResult('we"ird', True, None, None, "failed")]
+
+    text = format_prometheus(probes, [], efs_bytes=4096)
+
+    assert 'cefs_probe_mount_seconds{image="abc",was_mounted="false"} 0.5\n' in text
+    assert 'cefs_probe_success{image="we\\"ird"} 0\n' in text
+    assert "# TYPE cefs_efs_read_bytes_total counter\ncefs_efs_read_bytes_total 4096\n" in text
+    assert "cefs_mounted_images 0\n" in text
+    assert "cefs_image_read_bytes_total" not in text
+
+
+def test_probe_image_resolves_through_the_mount_path(tmp_path):
+    # The trailing slash makes stat resolve the path as a directory, which is what triggers an
+    # autofs mount; a plain stat of the key would only see the trigger
+    mount_path = tmp_path / "ab" / "abc123_gcc"
+    mount_path.parent.mkdir()
+    mount_path.write_bytes(b"")
+
+    assert "Not a directory" in probe_image(mount_path, set()).error
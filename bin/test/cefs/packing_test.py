@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""Tests for CEFS usage-aware packing."""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+from lib.cefs.consolidation import pack_items_into_groups
+from lib.cefs.models import ConsolidationCandidate
+from lib.cefs.packing import (
+    compute_item_heat,
+    item_family,
+    load_compiler_usage,
+    pack_items_by_affinity,
+    pack_items_with_suggestions,
+    score_packing,
+)
+
+MB = 1024 * 1024
+
+
+def _candidate(name: str, install_path: str, size_mb: int = 100) -> ConsolidationCandidate:
+    return ConsolidationCandidate(
+        name=name,
+        nfs_path=Path("/opt/compiler-explorer") / install_path,
+        squashfs_path=Path(f"/efs/cefs-images/{install_path}.sqfs"),
+        size=size_mb * MB,
+    )
+
+
+@pytest.mark.parametrize(
+    "name,family",
+    [
+        ("compilers/c++/x86/gcc 14.2.0", "compilers/c++/x86/gcc"),
+        ("compilers/c++/x86/gcc trunk", "compilers/c++/x86/gcc"),
+        ("gcc-15.0.0", "gcc"),
+        ("nightly", "nightly"),
+    ],
+)
+def test_item_family(name, family):
+    assert item_family(name) == family
+
+
+def test_load_compiler_usage_from_file(tmp_path):
+    csv_path = tmp_path / "usage.csv"
+    csv_path.write_text("compiler,times_used\ng142,1000\nclang18,50\nbroken,notanumber\n")
+    assert load_compiler_usage(str(csv_path)) == {"g142": 1000, "clang18": 50}
+
+
+def test_load_compiler_usage_from_url(requests_mock):
+    requests_mock.get("https://example.com/usage.csv", text="compiler,times_used\ng142,7\n")
+    assert load_compiler_usage("https://example.com/usage.csv") == {"g142": 7}
+
+
+def test_load_compiler_usage_http_error(requests_mock):
+    requests_mock.get("https://example.com/usage.csv", status_code=404)
+    with pytest.raises(RuntimeError, match="HTTP 404"):
+        load_compiler_usage("https://example.com/usage.csv")
+
+
+def test_compute_item_heat_attributes_exes_to_install_dirs():
+    items = [
+        _candidate("compilers/c++/x86/gcc 14.2.0", "gcc-14.2.0"),
+        _candidate("compilers/c++/x86/gcc 13.1.0", "gcc-13.1.0"),
+    ]
+    exe_map = {
+        "/opt/compiler-explorer/gcc-14.2.0/bin/g++": {"g142"},
+        "/opt/compiler-explorer/gcc-14.2.0/bin/gcc": {"cg142"},
+        "/opt/compiler-explorer/clang-18.1.0/bin/clang++": {"clang18"},
+    }
+    usage = {"g142": 100, "cg142": 20, "clang18": 999}
+
+    assert compute_item_heat(items, usage, exe_map) == {
+        "compilers/c++/x86/gcc 14.2.0": 120,
+        "compilers/c++/x86/gcc 13.1.0": 0,
+    }
+
+
+def test_pack_items_by_affinity_co_locates_hot_items():
+    items = [
+        _candidate("compilers/c++/x86/clang 17.0.1", "clang-17.0.1"),
+        _candidate("compilers/c++/x86/clang 18.1.0", "clang-18.1.0"),
+        _candidate("compilers/c++/x86/gcc 13.1.0", "gcc-13.1.0"),
+        _candidate("compilers/c++/x86/gcc 14.2.0", "gcc-14.2.0"),
+    ]
+    heat = {
+        "compilers/c++/x86/clang 18.1.0": 500,
+        "compilers/c++/x86/gcc 14.2.0": 1000,
+    }
+
+    groups = pack_items_by_affinity(items, 200 * MB, 2, heat)
+
+    assert [[item.name for item in group] for group in groups] == [
+        ["compilers/c++/x86/gcc 14.2.0", "compilers/c++/x86/clang 18.1.0"],
+        ["compilers/c++/x86/clang 17.0.1", "compilers/c++/x86/gcc 13.1.0"],
+    ]
+
+
+def test_pack_items_by_affinity_keeps_families_adjacent():
+    items = [
+        _candidate("compilers/c++/x86/clang 17.0.1", "clang-17.0.1"),
+        _candidate("compilers/c++/x86/gcc 13.1.0", "gcc-13.1.0"),
+        _candidate("compilers/c++/x86/clang 16.0.0", "clang-16.0.0"),
+        _candidate("compilers/c++/x86/gcc 12.1.0", "gcc-12.1.0"),
+    ]
+
+    groups = pack_items_by_affinity(items, 200 * MB, 2, {})
+
+    assert [{item_family(item.name) for item in group} for group in groups] == [
+        {"compilers/c++/x86/clang"},
+        {"compilers/c++/x86/gcc"},
+    ]
+
+
+def test_score_packing_prefers_hot_items_together():
+    hot_a = _candidate("compilers/c++/x86/gcc 14.2.0", "gcc-14.2.0")
+    hot_b = _candidate("compilers/c++/x86/clang 18.1.0", "clang-18.1.0")
+    cold_a = _candidate("compilers/c++/x86/gcc 4.1.2", "gcc-4.1.2")
+    cold_b = _candidate("compilers/c++/x86/clang 3.0.0", "clang-3.0.0")
+    heat = {hot_a.name: 10000, hot_b.name: 10000, cold_a.name: 1, cold_b.name: 1}
+
+    together = score_packing([[hot_a, hot_b], [cold_a, cold_b]], heat, requests_per_node=100)
+    mixed = score_packing([[hot_a, cold_a], [hot_b, cold_b]], heat, requests_per_node=100)
+
+    assert together.total_bytes == mixed.total_bytes == 400 * MB
+    assert together.expected_mounted_images < mixed.expected_mounted_images
+    assert together.expected_mounted_bytes < mixed.expected_mounted_bytes
+
+
+def test_score_packing_estimates_family_dedupe():
+    items = [
+        _candidate("compilers/c++/x86/gcc 13.1.0", "gcc-13.1.0"),
+        _candidate("compilers/c++/x86/gcc 14.2.0", "gcc-14.2.0"),
+        _candidate("compilers/c++/x86/clang 18.1.0", "clang-18.1.0"),
+    ]
+
+    by_family = score_packing([items[:2], items[2:]], {})
+    split = score_packing([[items[0], items[2]], [items[1]]], {})
+
+    assert by_family.estimated_compressed_bytes < split.estimated_compressed_bytes
+    assert split.estimated_compressed_bytes == split.total_bytes
+    assert by_family.expected_mounted_images == 0.0
+
+
+def test_pack_items_by_affinity_matches_name_packing_group_count():
+    items = [_candidate(f"compilers/c++/x86/gcc {v}.1.0", f"gcc-{v}.1.0") for v in range(5, 15)]
+    heat = {item.name: i for i, item in enumerate(items)}
+
+    assert len(pack_items_by_affinity(items, 300 * MB, 2, heat)) == len(pack_items_into_groups(items, 300 * MB, 2))
+
+
+def test_pack_items_with_suggestions():
+    items = [
+        _candidate("compilers/c++/x86/gcc 13.1.0", "gcc-13.1.0"),
+        _candidate("compilers/c++/x86/gcc 14.2.0", "gcc-14.2.0"),
+        _candidate("compilers/c++/x86/clang 18.1.0", "clang-18.1.0"),
+        _candidate("compilers/c++/x86/clang 17.0.1", "clang-17.0.1"),
+    ]
+    suggestions = [
+        ["compilers/c++/x86/gcc 13.1.0", "compilers/c++/x86/clang 18.1.0", "not/a/candidate 1.0"],
+        ["compilers/c++/x86/gcc 14.2.0"],
+    ]
+
+    groups, remaining = pack_items_with_suggestions(items, suggestions, 1024 * MB, 2)
+
+    assert [[item.name for item in group] for group in groups] == [
+        ["compilers/c++/x86/gcc 13.1.0", "compilers/c++/x86/clang 18.1.0"]
+    ]
+    assert [item.name for item in remaining] == ["compilers/c++/x86/gcc 14.2.0", "compilers/c++/x86/clang 17.0.1"]
@@ -14,6 +14,7 @@ from lib.cefs.paths import (
     get_cefs_mount_path,
     get_cefs_paths,
     get_current_symlink_targets,
+    get_directory_size,
     get_extraction_path_from_symlink,
     glob_with_depth,
     parse_cefs_target,
@@ -441,3 +442,18 @@ def test_glob_with_depth_does_not_follow_symlink_dirs(tmp_path):
     assert len(results2) == 2
     assert root_bak in results2
     assert symlink_bak_dir in results2
+
+
+def test_get_directory_size_counts_regular_files_only(tmp_path):
+    (tmp_path / "bin").mkdir()
+    (tmp_path / "bin" / "gcc").write_bytes(b"x" * 100)
+    (tmp_path / "lib" / "deep").mkdir(parents=True)
+    (tmp_path / "lib" / "deep" / "libfoo.so").write_bytes(b"y" * 50)
+    (tmp_path / "lib" / "libfoo-link.so").symlink_to("deep/libfoo.so")
+    (tmp_path / "bin-link").symlink_to("bin")
+
+    assert get_directory_size(tmp_path) == 150
+
+
+def test_get_directory_size_missing_directory(tmp_path):
+    assert get_directory_size(tmp_path / "missing") == 0
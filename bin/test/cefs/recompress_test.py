@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""Tests for usage-tiered CEFS recompression."""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+from lib.cefs.recompress import (
+    ProfileBenchmark,
+    assign_profiles,
+    compute_image_usage,
+    plan_recompression,
+    select_sample_files,
+)
+from lib.cefs.state import CEFSState
+from lib.cefs_manifest import validate_manifest, write_manifest_alongside_image
+
+from test.cefs.test_helpers import make_test_manifest
+
+
+def test_assign_profiles():
+    usage = {"aaa": 700, "bbb": 200, "ccc": 60, "ddd": 40, "eee": 0}
+
+    assert assign_profiles(usage, hot_share=0.8) == {
+        "aaa": "hot",
+        "bbb": "hot",
+        "ccc": "default",
+        "ddd": "default",
+        "eee": "cold",
+    }
+
+
+def test_compute_image_usage_includes_unused_compiler_images(tmp_path):
+    nfs_dir = tmp_path / "opt"
+    mount_point = tmp_path / "cefs"
+    nfs_dir.mkdir()
+    for name, stem in (("gcc-14", "abc_gcc"), ("gcc-4", "def_gcc")):
+        (mount_point / stem[:2] / stem / "bin").mkdir(parents=True)
+        (nfs_dir / name).symlink_to(mount_point / stem[:2] / stem)
+    mappings = {
+        str(nfs_dir / "gcc-14/bin/g++"): {"g14"},
+        str(nfs_dir / "gcc-4/bin/g++"): {"g4"},
+    }
+
+    assert compute_image_usage({"g14": 10}, mappings, nfs_dir, mount_point) == {"abc_gcc": 10, "def_gcc": 0}
+
+
+@pytest.fixture(name="state")
+def state_fixture(tmp_path):
+    """Three single-item images: one already cold, one default, and one nothing uses any more."""
+    nfs_dir = tmp_path / "opt"
+    image_dir = tmp_path / "images"
+    mount_point = tmp_path / "cefs"
+    nfs_dir.mkdir()
+    state = CEFSState(nfs_dir, image_dir, mount_point)
+    for stem, name, profile, linked in (
+        ("aaa_gcc", "gcc-4", "cold", True),
+        ("bbb_gcc", "gcc-5", None, True),
+        ("ccc_gcc", "gcc-6", None, False),
+    ):
+        image_path = image_dir / stem[:2] / f"{stem}.sqfs"
+        image_path.parent.mkdir(parents=True, exist_ok=True)
+        image_path.write_bytes(b"x" * 100)
+        manifest = make_test_manifest(
+            contents=[{"name": f"compilers/c++/x86/gcc {name}", "destination": str(nfs_dir / name)}]
+        )
+        if profile:
+            manifest["compression_profile"] = profile
+        write_manifest_alongside_image(manifest, image_path)
+        if linked:
+            (nfs_dir / name).symlink_to(mount_point / stem[:2] / stem)
+    state.scan_cefs_images_with_manifests()
+    return state
+
+
+def test_plan_recompression_skips_images_already_at_target(state):
+    targets = {"aaa_gcc": "cold", "bbb_gcc": "cold", "ccc_gcc": "cold"}
+
+    [plan] = plan_recompression(state, targets, {}, [])
+
+    assert plan.image_path.name == "bbb_gcc.sqfs"
+    assert (plan.current_profile, plan.target_profile) == ("default", "cold")
+    assert [item.name for item in plan.items] == ["compilers/c++/x86/gcc gcc-5"]
+    assert plan.items[0].extraction_path is None
+
+
+def test_plan_recompression_orders_by_usage_and_filters(state):
+    targets = {"aaa_gcc": "hot", "bbb_gcc": "hot"}
+
+    plans = plan_recompression(state, targets, {"aaa_gcc": 1, "bbb_gcc": 5}, [])
+    assert [plan.image_path.name for plan in plans] == ["bbb_gcc.sqfs", "aaa_gcc.sqfs"]
+
+    assert [plan.image_path.name for plan in plan_recompression(state, targets, {}, ["gcc-4"])] == ["aaa_gcc.sqfs"]
+
+
+def test_recompressed_manifest_validates():
+    manifest = make_test_manifest(
+        operation="recompress",
+        compression_profile="hot",
+        contents=[{"name": "compilers/c++/x86/gcc 14.1.0", "destination": "/opt/compiler-explorer/gcc-14.1.0"}],
+    )
+
+    assert validate_manifest(manifest).compression_profile == "hot"
+
+
+def test_select_sample_files_prefers_hot_files(tmp_path):
+    (tmp_path / "bin").mkdir()
+    (tmp_path / "bin/g++").write_bytes(b"x" * 10)
+    (tmp_path / "bin/gcc").symlink_to("g++")
+    (tmp_path / "libexec/gcc/x86_64-linux-gnu/14").mkdir(parents=True)
+    (tmp_path / "libexec/gcc/x86_64-linux-gnu/14/cc1plus").write_bytes(b"x" * 100)
+    (tmp_path / "share").mkdir()
+    (tmp_path / "share/huge").write_bytes(b"x" * 1000)
+
+    assert select_sample_files(tmp_path, 5) == [Path("libexec/gcc/x86_64-linux-gnu/14/cc1plus"), Path("bin/g++")]
+    assert select_sample_files(tmp_path / "share", 5) == [Path("huge")]
+
+
+def test_benchmark_percentiles():
+    result = ProfileBenchmark("hot", 100, 1.0, 2.0, tuple(i / 100 for i in range(1, 101)))
+
+    assert result.read_p50 == pytest.approx(0.505)
+    assert result.read_p95 == pytest.approx(0.9505)
+    assert ProfileBenchmark("cold", 100, 1.0, 2.0, ()).read_p95 == 0.0
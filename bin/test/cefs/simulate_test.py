@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""Tests for the offline CEFS gc and consolidation simulator."""
+
+from __future__ import annotations
+
+import os
+
+import pytest
+from lib.cefs.simulate import (
+    CEFSSnapshot,
+    SimulationParams,
+    SnapshotImage,
+    SnapshotItem,
+    project,
+    read_snapshot,
+    run_simulation,
+    take_snapshot,
+    write_snapshot,
+)
+from lib.cefs.state import CEFSState
+from lib.cefs_manifest import write_manifest_alongside_image
+
+from test.cefs.test_helpers import make_test_manifest
+
+NOW = 1_000_000.0
+DAY = 24 * 60 * 60
+
+
+def _image(stem: str, size: int, age_days: float, *items: SnapshotItem) -> SnapshotImage:
+    return SnapshotImage(stem, size, NOW - age_days * DAY, items)
+
+
+def _linked(name: str) -> SnapshotItem:
+    return SnapshotItem(name, f"/opt/{name}", linked=True)
+
+
+def _unlinked(name: str) -> SnapshotItem:
+    return SnapshotItem(name, f"/opt/{name}", linked=False)
+
+
+@pytest.fixture(name="snapshot")
+def snapshot_fixture():
+    return CEFSSnapshot(
+        NOW,
+        (
+            _image("aaa_gcc", 100, 10, _linked("gcc-1")),
+            _image("bbb_gcc", 100, 10, _linked("gcc-2")),
+            _image("ccc_gcc", 100, 10, _linked("gcc-3")),
+            _image("ddd_gcc", 50, 10, _unlinked("gcc-0")),
+            _image("eee_gcc", 50, 1, _unlinked("gcc-00")),
+            _image("fff_gcc", 50, 10, SnapshotItem("gcc-000", "/opt/gcc-000", linked=False, backed_up=True)),
+            _image("ggg_consolidated", 400, 10, _linked("clang-1"), *(_unlinked(f"clang-{i}") for i in range(2, 5))),
+            SnapshotImage("hhh_broken", 10, 0, (), broken=True),
+        ),
+    )
+
+
+def test_project(snapshot):
+    assert project(snapshot.images) == project(list(snapshot.images))
+    now = project(snapshot.images)
+
+    assert (now.images, now.bytes, now.mounts, now.linked_items) == (8, 860, 4, 4)
+
+
+@pytest.mark.parametrize(
+    "min_age_days, expected_gc",
+    [(0, ["ddd_gcc", "eee_gcc"]), (2, ["ddd_gcc"]), (30, [])],
+)
+def test_gc_only(snapshot, min_age_days, expected_gc):
+    after = run_simulation(snapshot, SimulationParams(min_age_days * DAY))
+
+    expected_bytes = sum(image.size for image in snapshot.images if image.stem in expected_gc)
+    assert (after.gc_images, after.gc_bytes) == (len(expected_gc), expected_bytes)
+    assert after.images == 8 - len(expected_gc)
+    assert after.mounts == 4
+    assert after.consolidated_images == 0
+
+
+def test_consolidation_frees_the_images_it_empties(snapshot):
+    after = run_simulation(snapshot, SimulationParams(2 * DAY, max_size_bytes=1000, min_items=3))
+
+    assert (after.consolidated_images, after.consolidated_bytes, after.moved_items) == (1, 300, 3)
+    # aaa, bbb, ccc (emptied by consolidation) and ddd (already unused); eee is too recent
+    assert after.gc_images == 4
+    assert after.mounts == 2  # The new image and ggg, which still serves clang-1
+    assert after.linked_items == 4
+    assert after.bytes == 860 - 350 + 300
+
+
+def test_consolidation_respects_min_items(snapshot):
+    after = run_simulation(snapshot, SimulationParams(2 * DAY, max_size_bytes=1000, min_items=4))
+
+    assert after.consolidated_images == 0
+    assert after.mounts == 4
+
+
+def test_reconsolidation_repacks_inefficient_images(snapshot):
+    keep = run_simulation(snapshot, SimulationParams(2 * DAY, 1000, 3, efficiency_threshold=0.2))
+    repack = run_simulation(snapshot, SimulationParams(2 * DAY, 1000, 3, efficiency_threshold=0.5))
+
+    assert keep.moved_items == 3
+    # ggg is 25% used: repacking its one live item (estimated at a quarter of it) lets gc delete it
+    assert repack.moved_items == 4
+    assert repack.consolidated_bytes == 400
+    assert repack.mounts == 1
+    assert repack.bytes == keep.bytes - 400 + 100
+
+
+def test_snapshot_from_state_round_trips(tmp_path):
+    nfs_dir = tmp_path / "opt"
+    image_dir = tmp_path / "images"
+    mount_point = tmp_path / "cefs"
+    nfs_dir.mkdir()
+    for stem, name, link in (("aaa_gcc", "gcc-1", ""), ("bbb_gcc", "gcc-2", ".bak"), ("ccc_gcc", "gcc-3", None)):
+        image_path = image_dir / stem[:2] / f"{stem}.sqfs"
+        image_path.parent.mkdir(parents=True, exist_ok=True)
+        image_path.write_bytes(b"x" * 10)
+        os.utime(image_path, (NOW - DAY, NOW - DAY))
+        write_manifest_alongside_image(
+            make_test_manifest(
+                contents=[{"name": f"compilers/c++/x86/gcc {name}", "destination": str(nfs_dir / name)}]
+            ),
+            image_path,
+        )
+        if link is not None:
+            (nfs_dir / f"{name}{link}").symlink_to(mount_point / stem[:2] / stem)
+    broken = image_dir / "dd" / "ddd_gcc.sqfs"
+    broken.parent.mkdir()
+    broken.write_bytes(b"x")
+    invalid = image_dir / "ee" / "eee_gcc.sqfs"
+    invalid.parent.mkdir()
+    invalid.write_bytes(b"x")
+    invalid.with_suffix(".yaml").write_text("contents: [", encoding="utf-8")
+    state = CEFSState(nfs_dir, image_dir, mount_point)
+    state.scan_cefs_images_with_manifests()
+    state.check_symlink_references()
+
+    snapshot = take_snapshot(state, NOW)
+
+    assert [(image.stem, image.size, image.mtime, image.broken) for image in snapshot.images] == [
+        ("aaa_gcc", 10, NOW - DAY, False),
+        ("bbb_gcc", 10, NOW - DAY, False),
+        ("ccc_gcc", 10, NOW - DAY, False),
+        ("ddd_gcc", 1, broken.stat().st_mtime, True),
+        ("eee_gcc", 1, invalid.stat().st_mtime, True),
+    ]
+    assert [(item.linked, item.backed_up) for image in snapshot.images[:3] for item in image.items] == [
+        (True, False),
+        (False, True),
+        (False, False),
+    ]
+    assert run_simulation(snapshot, SimulationParams(0)).gc_images == 1
+
+    write_snapshot(snapshot, tmp_path / "snapshot.json")
+    assert read_snapshot(tmp_path / "snapshot.json") == snapshot
+
+
+def test_read_snapshot_rejects_other_versions(tmp_path):
+    (tmp_path / "snapshot.json").write_text('{"version": 99, "taken_at": 0, "images": []}')
+
+    with pytest.raises(ValueError, match="Unsupported snapshot version"):
+        read_snapshot(tmp_path / "snapshot.json")
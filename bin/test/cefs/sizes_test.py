@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""Tests for CEFS image size accounting."""
+
+from __future__ import annotations
+
+from pathlib import Path
+from unittest.mock import patch
+
+from lib.cefs.models import ConsolidationCandidate
+from lib.cefs.sizes import ImageSizeCache, ImageSizes, image_sizes_from_entries
+from lib.config import SquashfsConfig
+from lib.squashfs import SquashfsEntry
+
+ENTRIES = [
+    SquashfsEntry(file_type="d", size=0, path="gcc"),
+    SquashfsEntry(file_type="d", size=0, path="gcc/bin"),
+    SquashfsEntry(file_type="-", size=100, path="gcc/bin/g++"),
+    SquashfsEntry(file_type="l", size=0, path="gcc/bin/c++", target="g++"),
+    SquashfsEntry(file_type="d", size=0, path="gcc/lib"),
+    SquashfsEntry(file_type="d", size=0, path="gcc/lib/deep"),
+    SquashfsEntry(file_type="-", size=40, path="gcc/lib/deep/libstdc++.so"),
+    SquashfsEntry(file_type="d", size=0, path="clang"),
+    SquashfsEntry(file_type="d", size=0, path="empty"),
+    SquashfsEntry(file_type="-", size=7, path="README"),
+]
+
+
+def test_image_sizes_from_entries():
+    sizes = image_sizes_from_entries(ENTRIES)
+
+    assert sizes.total_bytes == 147
+    assert sizes.file_count == 3
+    assert sizes.directory_bytes == {
+        "gcc": 140,
+        "gcc/bin": 100,
+        "gcc/lib": 40,
+        "clang": 0,
+        "empty": 0,
+    }
+
+
+def test_bytes_under():
+    sizes = image_sizes_from_entries(ENTRIES)
+
+    assert sizes.bytes_under(None) == 147
+    assert sizes.bytes_under(Path("gcc")) == 140
+    assert sizes.bytes_under(Path("gcc/lib")) == 40
+    # Deeper than recorded: falls back to the nearest recorded ancestor
+    assert sizes.bytes_under(Path("gcc/lib/deep")) == 40
+    assert sizes.bytes_under(Path("missing")) == 0
+
+
+def _image(tmp_path: Path, name: str, size: int = 10) -> Path:
+    image = tmp_path / f"{name}.sqfs"
+    image.write_bytes(b"x" * size)
+    return image
+
+
+def test_image_size_cache_reads_metadata_once(tmp_path):
+    image = _image(tmp_path, "abcdef_gcc")
+    cache_path = tmp_path / "cache" / "sizes.json"
+    config = SquashfsConfig()
+
+    with patch("lib.cefs.sizes.list_squashfs_entries", return_value=ENTRIES) as mock_list:
+        cache = ImageSizeCache(config, cache_path)
+        assert cache.get(image).total_bytes == 147
+        assert cache.get(image).total_bytes == 147
+        cache.save()
+        assert mock_list.call_count == 1
+        assert (cache.hits, cache.misses) == (1, 1)
+
+        reloaded = ImageSizeCache(config, cache_path)
+        assert reloaded.get(image) == ImageSizes(
+            total_bytes=147, file_count=3, directory_bytes=image_sizes_from_entries(ENTRIES).directory_bytes
+        )
+        assert mock_list.call_count == 1
+
+
+def test_image_size_cache_rereads_when_image_size_changes(tmp_path):
+    image = _image(tmp_path, "abcdef_gcc")
+    cache_path = tmp_path / "sizes.json"
+
+    with patch("lib.cefs.sizes.list_squashfs_entries", return_value=ENTRIES) as mock_list:
+        cache = ImageSizeCache(SquashfsConfig(), cache_path)
+        cache.get(image)
+        cache.save()
+        image.write_bytes(b"x" * 20)
+        ImageSizeCache(SquashfsConfig(), cache_path).get(image)
+        assert mock_list.call_count == 2
+
+
+def test_image_size_cache_ignores_corrupt_cache(tmp_path):
+    cache_path = tmp_path / "sizes.json"
+    cache_path.write_text("not json")
+    image = _image(tmp_path, "abcdef_gcc")
+
+    with patch("lib.cefs.sizes.list_squashfs_entries", return_value=ENTRIES):
+        assert ImageSizeCache(SquashfsConfig(), cache_path).get(image).total_bytes == 147
+
+
+def test_candidate_bytes_uses_extraction_path(tmp_path):
+    image = _image(tmp_path, "abcdef_consolidated")
+    candidate = ConsolidationCandidate(
+        name="gcc", nfs_path=Path("/opt/gcc"), squashfs_path=image, size=10, extraction_path=Path("gcc")
+    )
+
+    with patch("lib.cefs.sizes.list_squashfs_entries", return_value=ENTRIES):
+        assert ImageSizeCache(SquashfsConfig(), None).candidate_bytes(candidate) == 140
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Tests for the CEFS trash queue."""
+
+from __future__ import annotations
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from lib.cefs.deployment import backup_and_symlink
+from lib.cefs.trash import (
+    BackgroundTrashEmptier,
+    RateLimiter,
+    TrashQueue,
+    delete_tree,
+    empty_trash,
+    empty_trash_once,
+)
+
+
+def _make_tree(path, files: int = 3):
+    (path / "bin").mkdir(parents=True)
+    for i in range(files):
+        (path / "bin" / f"tool{i}").write_text("x")
+    (path / "link").symlink_to("bin")
+    return path
+
+
+def test_put_and_empty(tmp_path):
+    queue = TrashQueue(tmp_path / ".cefs-trash")
+    old = _make_tree(tmp_path / "gcc-14.1.0.bak")
+
+    queued = queue.put(old)
+
+    assert not old.exists()
+    assert queued.exists()
+    assert queued.name.endswith("_gcc-14.1.0.bak")
+    assert queue.pending() == [queued]
+
+    result = empty_trash(queue)
+
+    assert (result.deleted_items, result.deleted_entries, result.errors) == (1, 6, [])
+    assert queue.pending() == []
+    assert list((tmp_path / ".cefs-trash" / "deleting").iterdir()) == []
+
+
+def test_claim_is_exclusive(tmp_path):
+    queue = TrashQueue(tmp_path / ".cefs-trash")
+    queued = queue.put(_make_tree(tmp_path / "item"))
+
+    first = queue.claim(queued)
+
+    assert first is not None
+    assert queue.claim(queued) is None
+    assert queue.pending() == []  # A fresh claim is not stale
+
+
+def test_stale_claims_are_taken_over(tmp_path):
+    queue = TrashQueue(tmp_path / ".cefs-trash", stale_after=60)
+    claimed = queue.claim(queue.put(_make_tree(tmp_path / "item")))
+    assert claimed is not None
+    # Simulate a worker that claimed the item long ago, deleted part of it and died
+    crashed = claimed.with_name(f"{int(time.time()) - 3600}_{claimed.name.split('_', 1)[1]}")
+    claimed.rename(crashed)
+    (crashed / "bin" / "tool0").unlink()
+
+    assert queue.pending() == [crashed]
+    result = empty_trash(queue)
+
+    assert result.deleted_items == 1
+    assert not any((tmp_path / ".cefs-trash" / "deleting").iterdir())
+
+
+def test_delete_tree_handles_files_and_symlinks(tmp_path):
+    limiter = RateLimiter(None)
+    (tmp_path / "file").write_text("x")
+    (tmp_path / "dangling").symlink_to("nowhere")
+    tree = _make_tree(tmp_path / "tree", files=0)
+
+    assert delete_tree(tmp_path / "file", limiter) == 1
+    assert delete_tree(tmp_path / "dangling", limiter) == 1
+    assert delete_tree(tree, limiter) == 3
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_rate_limiter_spaces_operations():
+    limiter = RateLimiter(100)
+    start = time.monotonic()
+    for _ in range(6):
+        limiter.wait()
+    assert time.monotonic() - start >= 0.05
+
+
+def test_empty_trash_once_leaves_later_items(tmp_path):
+    queue = TrashQueue(tmp_path / ".cefs-trash")
+    queue.put(_make_tree(tmp_path / "a"))
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        result = empty_trash_once(queue, executor, RateLimiter(None))
+        later = queue.put(_make_tree(tmp_path / "b"))
+
+    assert result.deleted_items == 1
+    assert queue.pending() == [later]
+
+
+def test_background_emptier_drains_on_exit(tmp_path):
+    queue = TrashQueue(tmp_path / ".cefs-trash")
+    with BackgroundTrashEmptier(queue, max_workers=2, max_deletes_per_second=None, poll_seconds=60) as emptier:
+        for name in ("a", "b", "c"):
+            queue.put(_make_tree(tmp_path / name))
+
+    assert emptier.result.deleted_items == 3
+    assert queue.pending() == []
+
+
+def test_backup_and_symlink_moves_old_backup_to_trash(tmp_path):
+    queue = TrashQueue(tmp_path / ".cefs-trash")
+    nfs_path = _make_tree(tmp_path / "gcc-14.1.0")
+    old_backup = _make_tree(tmp_path / "gcc-14.1.0.bak")
+    (old_backup / "marker").write_text("old")
+
+    backup_and_symlink(nfs_path, tmp_path / "cefs" / "ab" / "abc", dry_run=False, defer_cleanup=False, trash=queue)
+
+    assert nfs_path.is_symlink()
+    assert (tmp_path / "gcc-14.1.0.bak" / "bin").is_dir()
+    assert not (tmp_path / "gcc-14.1.0.bak" / "marker").exists()
+    [queued] = queue.pending()
+    assert (queued / "marker").read_text() == "old"
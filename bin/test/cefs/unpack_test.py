@@ -7,7 +7,15 @@ from pathlib import Path
 from unittest.mock import Mock, patch
 
 import pytest
-from lib.cefs.unpack import repack_cefs_item, unpack_cefs_item
+from lib.cefs.unpack import (
+    UnpackItem,
+    group_unpack_items,
+    repack_cefs_item,
+    repack_cefs_items,
+    required_repack_bytes,
+    unpack_cefs_item,
+    unpack_cefs_items,
+)
 from lib.config import SquashfsConfig
 
 
@@ -424,3 +432,90 @@ def test_unpack_repack_roundtrip(
     mock_create.assert_called_once()
     create_args = mock_create.call_args[0]
     assert create_args[1] == nfs_path  # Should include modified_file.txt
+
+
+def _consolidated_items(tmp_path, names: list[str]) -> list[UnpackItem]:
+    image_path = tmp_path / "cefs-images" / "ab" / "abc123_consolidated.sqfs"
+    items = []
+    for name in names:
+        nfs_path = tmp_path / name
+        target = Path("/cefs/ab/abc123_consolidated") / name
+        nfs_path.symlink_to(target)
+        items.append(UnpackItem(name, nfs_path, target, image_path, Path(name)))
+    return items
+
+
+def test_group_unpack_items(tmp_path):
+    shared = _consolidated_items(tmp_path, ["gcc-1", "gcc-2"])
+    (tmp_path / "arm").mkdir()
+    other_dir = UnpackItem("arm", tmp_path / "arm" / "gcc-3", Path("/x"), shared[0].image_path, Path("gcc-3"))
+    whole = UnpackItem("whole", tmp_path / "gcc-4", Path("/y"), tmp_path / "de" / "def_gcc.sqfs", None)
+
+    assert group_unpack_items([*shared, other_dir, whole]) == [shared, [other_dir], [whole]]
+
+
+@patch("lib.cefs.unpack.extract_squashfs_paths")
+def test_unpack_items_extracts_shared_image_once(mock_extract, tmp_path, squashfs_config):
+    items = _consolidated_items(tmp_path, ["gcc-1", "gcc-2"])
+
+    def mock_extract_impl(config, image_path, output_dir, extract_paths):
+        for path in extract_paths:
+            (output_dir / path / "bin").mkdir(parents=True)
+
+    mock_extract.side_effect = mock_extract_impl
+
+    result = unpack_cefs_items(items, squashfs_config, defer_cleanup=False, dry_run=False, max_workers=2)
+
+    assert sorted(result.successful) == ["gcc-1", "gcc-2"]
+    mock_extract.assert_called_once()
+    assert mock_extract.call_args[0][3] == [Path("gcc-1"), Path("gcc-2")]
+    for item in items:
+        assert (item.nfs_path / "bin").is_dir()
+        assert item.nfs_path.with_name(item.nfs_path.name + ".bak").readlink() == item.symlink_target
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["gcc-1", "gcc-1.bak", "gcc-2", "gcc-2.bak"]
+
+
+@patch("lib.cefs.unpack.extract_squashfs_paths")
+def test_unpack_items_leaves_symlinks_changed_meanwhile(mock_extract, tmp_path, squashfs_config):
+    items = _consolidated_items(tmp_path, ["gcc-1", "gcc-2"])
+
+    def mock_extract_impl(config, image_path, output_dir, extract_paths):
+        for path in extract_paths:
+            (output_dir / path).mkdir(parents=True)
+        items[0].nfs_path.unlink()
+        items[0].nfs_path.symlink_to("/cefs/cd/reinstalled")
+
+    mock_extract.side_effect = mock_extract_impl
+
+    result = unpack_cefs_items(items, squashfs_config, defer_cleanup=False, dry_run=False)
+
+    assert result.successful == ["gcc-2"]
+    assert "changed during unpack" in result.failed["gcc-1"]
+    assert items[0].nfs_path.readlink() == Path("/cefs/cd/reinstalled")
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["gcc-1", "gcc-2", "gcc-2.bak"]
+
+
+def test_required_repack_bytes(tmp_path):
+    for name, size in (("a", 10), ("b", 30), ("c", 20)):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "file").write_bytes(b"x" * size)
+
+    assert required_repack_bytes([tmp_path / name for name in "abc"], max_workers=2) == 50
+
+
+def test_repack_items_collects_failures(tmp_path, squashfs_config, mock_paths):
+    (tmp_path / "dir").mkdir()
+    (tmp_path / "file").touch()
+
+    result = repack_cefs_items(
+        [("dir", tmp_path / "dir"), ("file", tmp_path / "file")],
+        mock_paths["cefs_image_dir"],
+        mock_paths["mount_point"],
+        squashfs_config,
+        mock_paths["local_temp_dir"],
+        defer_cleanup=False,
+        dry_run=True,
+    )
+
+    assert result.successful == ["dir"]
+    assert "not a directory" in result.failed["file"]
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""Tests for CEFS image warming."""
+
+from __future__ import annotations
+
+import time
+
+import pytest
+from lib.cefs.trash import RateLimiter
+from lib.cefs.warm import WarmTarget, find_warm_targets, list_hot_files, read_file, warm_images, write_warm_list
+
+
+@pytest.fixture(name="layout")
+def layout_fixture(tmp_path):
+    """An NFS directory with gcc in its own image and two clangs in a consolidated one."""
+    nfs_dir = tmp_path / "opt"
+    mount_point = tmp_path / "cefs"
+    gcc_image = mount_point / "ab" / "abc"
+    consolidated = mount_point / "cd" / "cde"
+    for install_dir, exe in (
+        (gcc_image, "bin/g++"),
+        (consolidated / "clang-18", "bin/clang++"),
+        (consolidated / "clang-19", "bin/clang++"),
+    ):
+        (install_dir / exe).parent.mkdir(parents=True)
+        (install_dir / exe).write_bytes(b"x" * 100)
+    (gcc_image / "libexec/gcc/x86_64-linux-gnu/14.1.0").mkdir(parents=True)
+    (gcc_image / "libexec/gcc/x86_64-linux-gnu/14.1.0/cc1plus").write_bytes(b"c" * 1000)
+    (gcc_image / "include/c++/14.1.0/bits").mkdir(parents=True)
+    (gcc_image / "include/c++/14.1.0/vector").write_text("#include <bits/vector.h>")
+    (gcc_image / "include/c++/14.1.0/bits/vector.h").write_text("// vector")
+    (gcc_image / "include/c++/14.1.0/alias").symlink_to("vector")
+    (gcc_image / "share").mkdir()
+    (gcc_image / "share/unused.txt").write_text("cold")
+
+    nfs_dir.mkdir()
+    (nfs_dir / "gcc-14.1.0").symlink_to(gcc_image)
+    (nfs_dir / "clang-18").symlink_to(consolidated / "clang-18")
+    (nfs_dir / "clang-19").symlink_to(consolidated / "clang-19")
+    (nfs_dir / "clang-20" / "bin").mkdir(parents=True)  # Not in CEFS
+    mappings = {
+        str(nfs_dir / "gcc-14.1.0/bin/g++"): {"g141"},
+        str(nfs_dir / "clang-18/bin/clang++"): {"clang18", "clang18-asan"},
+        str(nfs_dir / "clang-19/bin/clang++"): {"clang19"},
+        str(nfs_dir / "clang-20/bin/clang++"): {"clang20"},
+        "/elsewhere/bin/cc": {"other"},
+    }
+    return nfs_dir, mount_point, mappings
+
+
+def test_find_warm_targets_ranks_images_by_usage(layout):
+    nfs_dir, mount_point, mappings = layout
+    usage = {"g141": 50, "clang18": 30, "clang18-asan": 10, "clang19": 20, "clang20": 1000, "other": 1000}
+
+    targets = find_warm_targets(usage, mappings, nfs_dir, mount_point)
+
+    assert [(target.mount_path, target.usage) for target in targets] == [
+        (mount_point / "cd" / "cde", 60),
+        (mount_point / "ab" / "abc", 50),
+    ]
+    assert targets[0].install_dirs == (mount_point / "cd/cde/clang-18", mount_point / "cd/cde/clang-19")
+    assert targets[0].exes == (mount_point / "cd/cde/clang-18/bin/clang++", mount_point / "cd/cde/clang-19/bin/clang++")
+
+
+def test_find_warm_targets_skips_unused_images(layout):
+    nfs_dir, mount_point, mappings = layout
+
+    targets = find_warm_targets({"g141": 1}, mappings, nfs_dir, mount_point)
+
+    assert [target.mount_path for target in targets] == [mount_point / "ab" / "abc"]
+
+
+def test_list_hot_files(layout):
+    nfs_dir, mount_point, mappings = layout
+    [target] = find_warm_targets({"g141": 1}, mappings, nfs_dir, mount_point)
+    gcc_image = mount_point / "ab" / "abc"
+
+    files = list_hot_files(target, None)
+
+    assert files[0] == (gcc_image / "bin/g++", 100)
+    assert {path.relative_to(gcc_image).as_posix() for path, _ in files} == {
+        "bin/g++",
+        "libexec/gcc/x86_64-linux-gnu/14.1.0/cc1plus",
+        "include/c++/14.1.0/vector",
+        "include/c++/14.1.0/bits/vector.h",
+    }
+
+
+def test_list_hot_files_respects_byte_limit(layout):
+    nfs_dir, mount_point, mappings = layout
+    [target] = find_warm_targets({"g141": 1}, mappings, nfs_dir, mount_point)
+
+    files = list_hot_files(target, 500)
+
+    assert [path.name for path, _ in files] == ["g++"]
+
+
+def test_warm_images_reads_hot_files(layout):
+    nfs_dir, mount_point, mappings = layout
+    targets = find_warm_targets({"g141": 1, "clang19": 1}, mappings, nfs_dir, mount_point)
+    targets.append(WarmTarget(mount_point / "ef" / "missing", (), (), 1))
+
+    result = warm_images(targets, max_workers=2, max_bytes_per_second=None)
+
+    assert result.images == 2
+    assert result.files == 5
+    assert result.bytes_read == 100 + 1000 + 24 + 9 + 100
+    assert len(result.errors) == 1
+    assert "missing" in result.errors[0]
+
+
+def test_read_file_is_rate_limited(tmp_path):
+    path = tmp_path / "big"
+    path.write_bytes(b"x" * 3 * 1024 * 1024)
+    start = time.monotonic()
+
+    assert read_file(path, RateLimiter(20 * 1024 * 1024)) == 3 * 1024 * 1024
+    assert time.monotonic() - start >= 0.09
+
+
+def test_write_warm_list(layout, tmp_path):
+    nfs_dir, mount_point, mappings = layout
+    targets = find_warm_targets({"g141": 1}, mappings, nfs_dir, mount_point)
+    list_path = tmp_path / "warm-list"
+
+    assert write_warm_list(list_path, targets, None) == 4
+    assert list_path.read_text().splitlines()[0] == str(mount_point / "ab" / "abc" / "bin" / "g++")
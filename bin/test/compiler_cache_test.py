@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import json
+from unittest import mock
+
+import pytest
+from lib.compiler_cache import CacheStats, CompilerCache, parse_ccache_stats_log
+
+
+def _sccache_stats(hits, misses):
+    return json.dumps({
+        "stats": {
+            "cache_hits": {"counts": {"C/C++": hits[0], "Rust": hits[1]}},
+            "cache_misses": {"counts": {"Rust": misses}},
+        }
+    })
+
+
+def test_parse_ccache_stats_log(tmp_path):
+    log = tmp_path / "stats.log"
+    log.write_text(
+        "# /src/a.cpp\ndirect_cache_hit\n# /src/b.cpp\npreprocessed_cache_hit\n"
+        "# /src/c.cpp\ncache_miss\n# /src/d.cpp\ncompile_failed\n"
+    )
+
+    assert parse_ccache_stats_log(log) == CacheStats(2, 1)
+    assert parse_ccache_stats_log(tmp_path / "missing.log") is None
+
+
+def test_describe():
+    assert CacheStats(3, 1).describe() == "3 hits, 1 misses (75% hit rate)"
+    assert CacheStats().describe() == "no cacheable compilations"
+
+
+def test_ccache_env_is_bounded_and_keyed_by_compiler_content(tmp_path):
+    cache = CompilerCache(tmp_path / "cache", 5 * 1000**3, launcher_exe="/usr/bin/ccache")
+
+    env = cache.build_env(str(tmp_path / "staging" / "build"), str(tmp_path / "source"))
+
+    assert env["CCACHE_DIR"] == str(tmp_path / "cache" / "ccache")
+    assert env["CCACHE_MAXSIZE"] == "5000M"
+    assert env["CCACHE_COMPILERCHECK"] == "content"
+    assert env["CCACHE_BASEDIR"] == str(tmp_path / "staging")
+    assert env["CCACHE_STATSLOG"] == str(tmp_path / "staging" / "build" / "ceccachestats.log")
+
+
+def test_base_dir_is_the_staging_directory_when_only_root_is_shared(tmp_path):
+    cache = CompilerCache(tmp_path / "cache", launcher_exe="/usr/bin/ccache")
+
+    assert cache.build_env("/tmp/staging/build", "/opt/source")["CCACHE_BASEDIR"] == "/tmp/staging"
+
+
+def test_rust_needs_sccache(tmp_path):
+    with mock.patch("shutil.which", return_value=None):
+        without = CompilerCache(tmp_path, launcher_exe="/usr/bin/ccache")
+    with_sccache = CompilerCache(tmp_path, launcher_exe="/usr/bin/ccache", sccache_exe="/usr/bin/sccache")
+
+    assert without.rust_env() == {}
+    assert with_sccache.rust_env()["RUSTC_WRAPPER"] == "/usr/bin/sccache"
+    assert with_sccache.rust_env()["SCCACHE_DIR"] == str(tmp_path / "sccache")
+
+
+def test_missing_launcher_is_an_error(tmp_path):
+    with mock.patch("shutil.which", return_value=None), pytest.raises(RuntimeError, match="not found"):
+        CompilerCache(tmp_path, launcher="sccache")
+
+
+def test_sccache_stats_are_the_difference_over_the_build(tmp_path):
+    cache = CompilerCache(tmp_path, launcher="sccache", launcher_exe="/usr/bin/sccache")
+
+    with mock.patch("subprocess.check_output", side_effect=[_sccache_stats((1, 2), 3), _sccache_stats((4, 2), 5)]):
+        result, stats = cache.run_build(str(tmp_path), lambda: "built", uses_sccache=True)
+
+    assert (result, stats) == ("built", CacheStats(3, 2))
+    assert cache.totals == CacheStats(3, 2)
+
+
+def test_unreadable_sccache_stats_are_not_counted(tmp_path):
+    cache = CompilerCache(tmp_path, launcher="sccache", launcher_exe="/usr/bin/sccache")
+
+    with mock.patch("subprocess.check_output", side_effect=OSError("no server")):
+        _, stats = cache.run_build(str(tmp_path), lambda: None, uses_sccache=True)
+
+    assert stats is None
+    assert cache.totals == CacheStats()
+
+
+def test_no_sccache_stats_without_sccache(tmp_path):
+    with mock.patch("shutil.which", return_value=None):
+        cache = CompilerCache(tmp_path, launcher_exe="/usr/bin/ccache")
+
+    with mock.patch("subprocess.check_output") as check_output:
+        _, stats = cache.run_build(str(tmp_path), lambda: None, uses_sccache=True)
+
+    check_output.assert_not_called()
+    assert stats is None
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import json
+import os
+
+import pytest
+from lib.compiler_probe_cache import CompilerProbeCache
+
+
+@pytest.fixture(name="exe")
+def exe_fixture(tmp_path):
+    exe = tmp_path / "bin" / "g++"
+    exe.parent.mkdir()
+    exe.write_text("#!/bin/sh\n")
+    return exe
+
+
+def _counting_probe(result):
+    calls = []
+
+    def run_probe():
+        calls.append(1)
+        return result
+
+    return run_probe, calls
+
+
+def test_results_persist_between_processes(tmp_path, exe):
+    run_probe, calls = _counting_probe("x86_64-linux-gnu")
+    cache = CompilerProbeCache(tmp_path / "probes.json")
+
+    assert cache.probe("dumpmachine", exe, run_probe) == "x86_64-linux-gnu"
+    assert cache.probe("dumpmachine", exe, run_probe) == "x86_64-linux-gnu"
+    cache.save()
+    later = CompilerProbeCache(tmp_path / "probes.json")
+
+    assert later.probe("dumpmachine", exe, run_probe) == "x86_64-linux-gnu"
+    assert len(calls) == 1
+    assert (cache.hits, cache.misses, later.hits, later.misses) == (1, 1, 1, 0)
+
+
+def test_reinstalled_compiler_is_probed_again(tmp_path, exe):
+    run_probe, calls = _counting_probe(True)
+    cache = CompilerProbeCache(tmp_path / "probes.json")
+    cache.probe("cpp-arch", exe, run_probe, detail="x86")
+
+    os.utime(exe, ns=(0, 0))
+    cache.probe("cpp-arch", exe, run_probe, detail="x86")
+
+    assert len(calls) == 2
+
+
+def test_options_ld_path_and_detail_are_part_of_the_key(tmp_path, exe):
+    run_probe, calls = _counting_probe(True)
+    cache = CompilerProbeCache(None)
+
+    for options, ld_path, detail in [("", "", "x86"), ("-m32", "", "x86"), ("", "/lib64", "x86"), ("", "", "x86_64")]:
+        cache.probe("cpp-arch", exe, run_probe, options=options, ld_path=ld_path, detail=detail)
+    cache.probe("cpp-arch", exe, run_probe, detail="x86")
+
+    assert len(calls) == 4
+
+
+def test_missing_exe_is_not_cached(tmp_path):
+    run_probe, calls = _counting_probe(None)
+    cache = CompilerProbeCache(tmp_path / "probes.json")
+
+    cache.probe("go-version", tmp_path / "missing", run_probe)
+    cache.probe("go-version", tmp_path / "missing", run_probe)
+    cache.save()
+
+    assert len(calls) == 2
+    assert not (tmp_path / "probes.json").exists()
+
+
+def test_save_merges_with_other_writers(tmp_path, exe):
+    path = tmp_path / "probes.json"
+    first = CompilerProbeCache(path)
+    second = CompilerProbeCache(path)
+    first.probe("dumpmachine", exe, lambda: "a")
+    second.probe("go-version", exe, lambda: [1, 21])
+
+    first.save()
+    second.save()
+
+    assert len(json.loads(path.read_text())["probes"]) == 2
+
+
+@pytest.mark.parametrize("contents", ["not json", '{"version": 99, "probes": {"k": {}}}'])
+def test_unusable_cache_file_is_ignored(tmp_path, exe, contents):
+    (tmp_path / "probes.json").write_text(contents)
+    cache = CompilerProbeCache(tmp_path / "probes.json")
+
+    assert cache.probe("dumpmachine", exe, lambda: "a") == "a"
+    cache.save()
+    assert CompilerProbeCache(tmp_path / "probes.json").probe("dumpmachine", exe, lambda: "b") == "a"
+
+
+def test_warm_runs_every_probe_and_saves(tmp_path, exe):
+    cache = CompilerProbeCache(tmp_path / "probes.json", max_workers=4)
+    probed = []
+
+    def failing_probe():
+        raise RuntimeError("compiler crashed")
+
+    cache.warm(
+        [failing_probe]
+        + [lambda arch=arch: probed.append(cache.probe("cpp-arch", exe, lambda: True, detail=arch)) for arch in "abc"]
+    )
+
+    assert probed == [True, True, True]
+    assert len(json.loads((tmp_path / "probes.json").read_text())["probes"]) == 3
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import logging
+import threading
+from unittest import mock
+
+from lib.conan_upload_pipeline import ConanUploadPipeline, PendingUpload, free_bytes
+
+
+def _pending(n):
+    return PendingUpload(f"/tmp/build{n}", {"compiler.version": f"g{n}"}, {"commithash": "abc"})
+
+
+def _pipeline(tmp_path, upload=None, annotate=None, batch_size=2, min_free_bytes=0):
+    calls = []
+    pipeline = ConanUploadPipeline(
+        upload or (lambda: calls.append("upload")),
+        annotate or (lambda pending: calls.append(pending.description)),
+        lambda: calls.append("clear"),
+        logging.getLogger(__name__),
+        batch_size=batch_size,
+        min_free_bytes=min_free_bytes,
+        cache_path=tmp_path,
+    )
+    return pipeline, calls
+
+
+def test_uploads_in_batches_and_clears_once(tmp_path):
+    pipeline, calls = _pipeline(tmp_path)
+
+    for n in range(5):
+        pipeline.add(_pending(n))
+    failed = pipeline.finish()
+
+    assert failed == []
+    assert calls == [
+        "upload",
+        "/tmp/build0",
+        "/tmp/build1",
+        "upload",
+        "/tmp/build2",
+        "/tmp/build3",
+        "upload",
+        "/tmp/build4",
+        "clear",
+    ]
+    assert pipeline.batches_uploaded == 3
+
+
+def test_builds_carry_on_while_a_batch_uploads(tmp_path):
+    uploading = threading.Event()
+    release = threading.Event()
+
+    def slow_upload():
+        uploading.set()
+        assert release.wait(5)
+
+    pipeline, _ = _pipeline(tmp_path, upload=slow_upload, batch_size=1)
+
+    pipeline.add(_pending(0))
+    assert uploading.wait(5)
+    release.set()
+
+    assert pipeline.finish() == []
+
+
+def test_failed_upload_fails_the_whole_batch(tmp_path):
+    def upload():
+        raise RuntimeError("conan server unreachable")
+
+    pipeline, calls = _pipeline(tmp_path, upload=upload)
+    for n in range(3):
+        pipeline.add(_pending(n))
+
+    assert [pending.description for pending in pipeline.finish()] == ["/tmp/build0", "/tmp/build1", "/tmp/build2"]
+    assert calls == ["clear"]
+
+
+def test_failed_annotation_fails_just_that_build(tmp_path):
+    def annotate(pending):
+        if pending.description == "/tmp/build1":
+            raise RuntimeError("no package id")
+
+    pipeline, _ = _pipeline(tmp_path, annotate=annotate)
+    pipeline.add(_pending(0))
+    pipeline.add(_pending(1))
+
+    assert [pending.description for pending in pipeline.finish()] == ["/tmp/build1"]
+
+
+def test_low_disk_uploads_and_clears_early(tmp_path):
+    pipeline, calls = _pipeline(tmp_path, batch_size=10, min_free_bytes=1 << 60)
+
+    pipeline.add(_pending(0))
+    assert calls == ["upload", "/tmp/build0", "clear"]
+    pipeline.add(_pending(1))
+    pipeline.finish()
+
+    assert calls[3:] == ["upload", "/tmp/build1", "clear"]
+
+
+def test_nothing_exported_nothing_uploaded_or_cleared(tmp_path):
+    pipeline, calls = _pipeline(tmp_path)
+
+    assert pipeline.finish() == []
+    assert calls == []
+
+
+def test_free_bytes_of_a_cache_not_created_yet(tmp_path):
+    assert free_bytes(tmp_path / "not" / "yet") == free_bytes(tmp_path)
+    with mock.patch("shutil.disk_usage", side_effect=PermissionError):
+        assert free_bytes(tmp_path) is None
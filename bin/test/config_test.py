@@ -6,7 +6,7 @@ import unittest
 from pathlib import Path
 
 import yaml
-from lib.config import CefsConfig, Config, SquashfsConfig
+from lib.config import CefsConfig, CompressionProfile, Config, SquashfsConfig
 from pydantic import ValidationError
 
 
@@ -193,6 +193,17 @@ class TestSquashfsConfig(unittest.TestCase):
         with self.assertRaises(ValidationError):
             SquashfsConfig(unknown_field="value")
 
+    def test_compression_profiles(self):
+        """Test named compression profiles, and the default one built from the top-level settings."""
+        config = SquashfsConfig(compression_level=9, profiles={"archive": {"compression": "xz", "block_size": "1M"}})
+
+        self.assertEqual(config.profile(), CompressionProfile(compression="zstd", compression_level=9))
+        self.assertEqual(config.profile("default"), config.profile())
+        self.assertEqual(config.profile("archive").compression, "xz")
+        with self.assertRaises(ValueError):
+            config.profile("hot")
+        self.assertEqual(SquashfsConfig().profile("hot").block_size, "64K")
+
 
 class TestCefsConfig(unittest.TestCase):
     def test_direct_construction(self):
@@ -204,6 +215,13 @@ class TestCefsConfig(unittest.TestCase):
         # Default should be preserved
         self.assertEqual(config.image_dir, Path("/efs/cefs-images"))
 
+    def test_local_cache_is_off_by_default(self):
+        """Test that the local image cache must be configured explicitly."""
+        self.assertIsNone(CefsConfig().local_cache_dir)
+        config = CefsConfig(local_cache_dir="/cefs-cache", local_cache_max_size="200G")
+        self.assertEqual(config.local_cache_dir, Path("/cefs-cache"))
+        self.assertEqual(config.local_cache_max_size, "200G")
+
 
 if __name__ == "__main__":
     unittest.main()
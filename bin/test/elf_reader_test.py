@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import logging
+import shutil
+import struct
+import subprocess
+from pathlib import Path
+
+import pytest
+from lib.binary_info import BinaryInfo
+from lib.elf_reader import ElfFormatError, read_elf
+from lib.library_platform import LibraryPlatform
+
+needs_toolchain = pytest.mark.skipif(
+    not all(shutil.which(tool) for tool in ("g++", "ar")), reason="needs g++ and ar to build test binaries"
+)
+
+SOURCE = """
+#include <string>
+#include <stdexcept>
+std::string greet(const std::string &name) {
+    if (name.empty()) throw std::runtime_error("no name");
+    return "hello " + name;
+}
+"""
+
+
+@pytest.fixture(name="built", scope="module")
+def built_fixture(tmp_path_factory):
+    folder = tmp_path_factory.mktemp("elf")
+    (folder / "greet.cpp").write_text(SOURCE)
+    (folder / "other.c").write_text(
+        "int other_value = 42;\nextern int missing(void);\nint call(void) { return missing(); }\n"
+    )
+    subprocess.check_call(["g++", "-fPIC", "-c", "greet.cpp", "-o", "greet.o"], cwd=folder)
+    subprocess.check_call(["g++", "-x", "c", "-fPIC", "-c", "other.c", "-o", "other.o"], cwd=folder)
+    subprocess.check_call(["ar", "rcs", "libgreet.a", "greet.o", "other.o"], cwd=folder)
+    subprocess.check_call(["g++", "-shared", "greet.o", "-o", "libgreet.so"], cwd=folder)
+    return folder
+
+
+@needs_toolchain
+def test_archive_symbols_and_headers(built):
+    elf = read_elf(built / "libgreet.a")
+
+    assert [header.elf_class for header in elf.headers] == ["ELF64", "ELF64"]
+    assert elf.headers[0].osabi == "UNIX - System V"
+    assert {"other_value", "call"} <= elf.defined_symbols
+    assert {"missing", "__gxx_personality_v0", "_Unwind_Resume"} <= elf.undefined_symbols
+    assert any("cxx11" in symbol for symbol in elf.defined_symbols)
+    assert elf.needed == ()
+
+
+@needs_toolchain
+def test_shared_library_needed_and_dynamic_symbols(built):
+    elf = read_elf(built / "libgreet.so")
+
+    assert any(needed.startswith("libstdc++.so") for needed in elf.needed)
+    assert "__gxx_personality_v0" in elf.undefined_symbols
+
+
+@needs_toolchain
+@pytest.mark.skipif(not shutil.which("readelf"), reason="needs readelf to compare against")
+@pytest.mark.parametrize("name", ["libgreet.a", "libgreet.so", "greet.o"])
+def test_headers_match_readelf(built, name):
+    readelf = subprocess.check_output(["readelf", "-h", str(built / name)], text=True)
+    expected = [
+        line.strip() for line in readelf.splitlines() if line.strip().startswith(("Class:", "OS/ABI:", "Machine:"))
+    ]
+
+    described = "".join(header.describe() for header in read_elf(built / name).headers)
+
+    assert [line.strip() for line in described.splitlines()] == expected
+
+
+@needs_toolchain
+def test_results_are_cached_by_content(built, tmp_path):
+    copy = tmp_path / "copy.a"
+    shutil.copy(built / "libgreet.a", copy)
+
+    assert read_elf(copy) is read_elf(built / "libgreet.a")
+
+
+@pytest.mark.parametrize("contents", [b"", b"not an elf file", b"\x7fELF\x03\x01"])
+def test_not_elf(tmp_path, contents):
+    (tmp_path / "libx.so").write_bytes(contents)
+
+    with pytest.raises(ElfFormatError):
+        read_elf(tmp_path / "libx.so")
+
+
+def _elf_with_symbol_tables(*string_table_links):
+    """An x86-64 ELF file whose only sections are a string table and symbol tables linked as given."""
+    strings = b"\0sym\0"
+    symbol = struct.pack("<IBBHQQ", 1, 0, 0, 1, 0, 0)
+    data_offset = 64 + 64 * (2 + len(string_table_links))
+    sections = [bytes(64), struct.pack("<IIQQQQIIQQ", 0, 3, 0, 0, data_offset, len(strings), 0, 0, 1, 0)]
+    sections += [
+        struct.pack("<IIQQQQIIQQ", 0, 2, 0, 0, data_offset + len(strings), len(symbol), link, 0, 8, len(symbol))
+        for link in string_table_links
+    ]
+    header = struct.pack("<HHIQQQIHHHHHH", 1, 62, 1, 0, 0, 64, 0, 64, 0, 0, 64, len(sections), 0)
+    return b"\x7fELF\x02\x01\x01" + bytes(9) + header + b"".join(sections) + strings + symbol
+
+
+def _archive(*members, name="{index}.o/"):
+    contents = b"!<arch>\n"
+    for index, member in enumerate(members):
+        contents += name.format(index=index).ljust(48).encode() + str(len(member)).ljust(10).encode() + b"`\n"
+        contents += member + b"\n" * (len(member) & 1)
+    return contents
+
+
+def test_hand_built_elf(tmp_path):
+    (tmp_path / "libx.a").write_bytes(_archive(_elf_with_symbol_tables(1)))
+
+    assert read_elf(tmp_path / "libx.a").defined_symbols == {"sym"}
+
+
+@pytest.mark.parametrize(
+    "member", [b"\x7fELF\x02\x01\x01" + bytes(20), _elf_with_symbol_tables(1, 9)], ids=["truncated", "bad_link"]
+)
+def test_corrupt_archive_member(tmp_path, member):
+    (tmp_path / "libx.a").write_bytes(_archive(_elf_with_symbol_tables(1), member))
+
+    with pytest.raises(ElfFormatError):
+        read_elf(tmp_path / "libx.a")
+
+
+def test_bad_bsd_member_name(tmp_path):
+    (tmp_path / "libx.a").write_bytes(_archive(_elf_with_symbol_tables(1), name="#1/x"))
+
+    with pytest.raises(ElfFormatError, match="member name at 8"):
+        read_elf(tmp_path / "libx.a")
+
+
+@needs_toolchain
+def test_binary_info_follows_linker_scripts_without_readelf(built, tmp_path, monkeypatch):
+    monkeypatch.setattr("subprocess.check_output", None)
+    shutil.copy(built / "libgreet.so", tmp_path / "libgreet.so.1")
+    (tmp_path / "libgreet.so").write_text("INPUT (libgreet.so.1)\n")
+
+    info = BinaryInfo(logging.getLogger(__name__), str(tmp_path), str(tmp_path / "libgreet.so"), LibraryPlatform.Linux)
+
+    assert Path(info.filepath).name == "libgreet.so.1"
+    assert "libstdc++.so" in info.ldd_details
+    assert "ELF64" in info.readelf_header_details
+    assert info.cxx_info_from_binary()["has_maybecxx11abi"]
+    assert info.arch_info_from_binary()["elf_class"] == "ELF64"
+
+
+@needs_toolchain
+def test_32_bit_objects(tmp_path):
+    (tmp_path / "x.c").write_text("int defined_here(void) { return 0; }\n")
+    if subprocess.call(["g++", "-x", "c", "-m32", "-c", "x.c", "-o", "x.o"], cwd=tmp_path) != 0:
+        pytest.skip("no 32-bit multilib")
+
+    elf = read_elf(tmp_path / "x.o")
+
+    assert elf.headers[0].elf_class == "ELF32"
+    assert "defined_here" in elf.defined_symbols
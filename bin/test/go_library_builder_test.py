@@ -8,6 +8,7 @@ from unittest.mock import MagicMock, patch
 import pytest
 from lib.go_library_builder import (
     BuildStatus,
+    GoBuildJob,
     GoLibraryBuilder,
     clear_properties_cache,
     get_build_method,
@@ -413,6 +414,128 @@ class TestGoLibraryBuilderConanHelpers:
         assert matcher.call_count == 1
 
 
+def create_go_builder(compilerprops, staging_path=None):
+    """Create a GoLibraryBuilder for compilerprops, whose staging dirs are at staging_path."""
+    install_context = MagicMock()
+    install_context.dry_run = False
+    install_context.new_staging_dir.return_value.__enter__.return_value.path = staging_path
+    with patch("lib.go_library_builder.get_properties_compilers_and_libraries", return_value=(compilerprops, {})):
+        return GoLibraryBuilder(
+            logger=MagicMock(),
+            language="go",
+            libname="uuid",
+            target_name="v1.6.0",
+            install_context=install_context,
+            buildconfig=create_go_test_build_config(),
+        )
+
+
+class TestGoLibraryBuilderSharedModules:
+    """Tests for the module cache builds share, and building compilers in parallel."""
+
+    COMPILERS = {
+        "gl1200": {"exe": "/opt/go1200/go/bin/go"},
+        "gl1210": {"exe": "/opt/go1210/go/bin/go"},
+        "gl1220": {"exe": "/opt/go1220/go/bin/go"},
+    }
+
+    @staticmethod
+    def _prepare(compiler, buildos, buildtype, arch, staging):
+        return GoBuildJob(compiler, buildos, buildtype, arch, staging.path / compiler, "gomod")
+
+    @patch("lib.go_library_builder.go_module_flags", return_value="-mod=mod -modcacherw")
+    def test_module_env_shares_module_cache(self, _mock_flags, tmp_path):
+        builder = create_go_builder(self.COMPILERS)
+
+        env = builder._module_env(Path("/opt/go/bin/go"), Path("/opt/go"), tmp_path / "gopath")
+
+        assert env["GOPATH"] == str(tmp_path / "gopath")
+        assert env["GOMODCACHE"] == str(tmp_path / "gopath" / "pkg" / "mod")
+        assert env["GOFLAGS"] == "-mod=mod -modcacherw"
+
+    @patch("lib.go_library_builder.go_module_flags", return_value="")
+    @patch("lib.go_library_builder.get_go_version")
+    @patch("lib.go_library_builder.subprocess.run")
+    def test_prefetch_uses_newest_go(self, mock_run, mock_version, _mock_flags, tmp_path):
+        mock_version.side_effect = lambda go_binary: {"go1200": (1, 20), "go1210": (1, 22), "go1220": (1, 21)}[
+            go_binary.parent.parent.parent.name
+        ]
+        mock_run.return_value = MagicMock(returncode=0)
+        builder = create_go_builder(self.COMPILERS)
+        jobs = [
+            self._prepare(compiler, "Linux", "Debug", "x86_64", MagicMock(path=tmp_path)) for compiler in self.COMPILERS
+        ]
+
+        assert builder.prefetch_modules(jobs, tmp_path / "gopath", tmp_path / "prefetch") is True
+
+        commands = [call.args[0] for call in mock_run.call_args_list]
+        assert commands == [
+            ["/opt/go1210/go/bin/go", "mod", "download", "github.com/google/uuid@v1.6.0"],
+            ["/opt/go1210/go/bin/go", "mod", "tidy"],
+        ]
+        assert "require github.com/google/uuid v1.6.0" in (tmp_path / "prefetch" / "go.mod").read_text()
+
+    def test_makebuild_prefetches_once_and_builds_in_parallel(self, tmp_path):
+        builder = create_go_builder(self.COMPILERS, tmp_path)
+        builder.upload_builds = MagicMock()
+        builder.prefetch_modules = MagicMock(return_value=True)
+        builder.export_build = MagicMock(side_effect=lambda job, status: status)
+        compiled = []
+
+        def compile_build(job, gopath):
+            compiled.append((job.compiler, gopath))
+            return BuildStatus.Failed if job.compiler == "gl1200" else BuildStatus.Ok
+
+        builder.compile_build = compile_build
+        with patch.object(builder, "prepare_build", side_effect=self._prepare):
+            result = builder.makebuild("forceall", max_workers=3)
+
+        assert result == [2, 0, 1]
+        builder.prefetch_modules.assert_called_once()
+        assert [job.compiler for job in builder.prefetch_modules.call_args.args[0]] == list(self.COMPILERS)
+        assert sorted(compiled) == [(compiler, tmp_path / "gopath") for compiler in self.COMPILERS]
+        assert builder.export_build.call_count == 3
+        builder.upload_builds.assert_called_once()
+
+    def test_module_sources_are_packaged_after_every_build(self, tmp_path):
+        builder = create_go_builder(self.COMPILERS, tmp_path)
+        builder.prefetch_modules = MagicMock(return_value=True)
+        builder.export_build = MagicMock(side_effect=lambda job, status: status)
+        module = tmp_path / "gopath" / "pkg" / "mod" / "example.com"
+
+        def compile_build(job, gopath):
+            # A later build downloading into the shared cache
+            (module / f"{job.compiler}.go").parent.mkdir(parents=True, exist_ok=True)
+            (module / f"{job.compiler}.go").write_text("package m\n")
+            return BuildStatus.Failed if job.compiler == "gl1200" else BuildStatus.Ok
+
+        builder.compile_build = compile_build
+        jobs = [
+            self._prepare(compiler, "Linux", "Debug", "x86_64", MagicMock(path=tmp_path)) for compiler in self.COMPILERS
+        ]
+
+        statuses = builder.build_all(jobs, MagicMock(path=tmp_path), max_workers=1)
+
+        assert statuses == [BuildStatus.Failed, BuildStatus.Ok, BuildStatus.Ok]
+        assert not (tmp_path / "gl1200" / "module_sources").exists()
+        for compiler in ("gl1210", "gl1220"):
+            packaged = tmp_path / compiler / "module_sources" / "example.com"
+            assert sorted(path.name for path in packaged.iterdir()) == ["gl1200.go", "gl1210.go", "gl1220.go"]
+
+    def test_makebuild_fails_every_build_when_prefetch_fails(self, tmp_path):
+        builder = create_go_builder(self.COMPILERS, tmp_path)
+        builder.prefetch_modules = MagicMock(return_value=False)
+        builder.compile_build = MagicMock()
+        builder.export_build = MagicMock(side_effect=lambda job, status: status)
+
+        with patch.object(builder, "prepare_build", side_effect=self._prepare):
+            result = builder.makebuild("forceall", max_workers=3)
+
+        assert result == [0, 0, 3]
+        builder.compile_build.assert_not_called()
+        assert {call.args[1] for call in builder.export_build.call_args_list} == {BuildStatus.Failed}
+
+
 class TestGoLibraryBuilderBuildStatus:
     """Tests for BuildStatus enum."""
 
@@ -4,15 +4,19 @@ from __future__ import annotations
 
 from pathlib import Path
 from subprocess import TimeoutExpired
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 from lib.golang_stdlib import (
     DEFAULT_ARCHITECTURES,
+    build_go_stdlib,
+    build_missing_go_stdlibs,
     get_arch_marker_file,
     get_go_version,
+    go_module_flags,
     go_supports_trimpath,
     is_go_installation,
     is_stdlib_already_built,
+    merge_cache_shard,
 )
 
 
@@ -92,6 +96,25 @@ class TestGoSupportsTrimpath:
         assert go_supports_trimpath(Path("/opt/go/bin/go")) is True
 
 
+class TestGoModuleFlags:
+    """Tests for go_module_flags function."""
+
+    @patch("lib.golang_stdlib.get_go_version")
+    def test_go_1_14_gets_module_flags(self, mock_version):
+        mock_version.return_value = (1, 14)
+        assert go_module_flags(Path("/opt/go/bin/go")) == "-mod=mod -modcacherw"
+
+    @patch("lib.golang_stdlib.get_go_version")
+    def test_go_1_13_gets_no_flags(self, mock_version):
+        mock_version.return_value = (1, 13)
+        assert not go_module_flags(Path("/opt/go/bin/go"))
+
+    @patch("lib.golang_stdlib.get_go_version")
+    def test_unknown_version_gets_module_flags(self, mock_version):
+        mock_version.return_value = None
+        assert go_module_flags(Path("/opt/go/bin/go")) == "-mod=mod -modcacherw"
+
+
 class TestArchMarkerFile:
     """Tests for get_arch_marker_file function."""
 
@@ -143,3 +166,118 @@ class TestIsStdlibAlreadyBuilt:
         # Only create marker for first arch
         get_arch_marker_file(cache, DEFAULT_ARCHITECTURES[0]).write_text("built")
         assert is_stdlib_already_built(tmp_path) is False
+
+
+def _make_go_installation(path: Path) -> Path:
+    go_binary = path / "go" / "bin" / "go"
+    go_binary.parent.mkdir(parents=True)
+    go_binary.touch()
+    return path
+
+
+def _fake_go_build(failing_arch: str | None = None):
+    """A subprocess.run for `go build std` that writes a per-arch entry and a shared one to GOCACHE."""
+
+    def run(cmd, env, **_kwargs):
+        arch = f"{env['GOOS']}/{env['GOARCH']}"
+        cache = Path(env["GOCACHE"])
+        (cache / "00").mkdir(parents=True, exist_ok=True)
+        (cache / "00" / f"{env['GOARCH']}-a").write_text(arch)
+        (cache / "README").write_text(arch)
+        return MagicMock(returncode=1 if arch == failing_arch else 0, stdout="", stderr="")
+
+    return run
+
+
+class TestMergeCacheShard:
+    """Tests for merge_cache_shard function."""
+
+    def test_moves_new_entries_and_keeps_existing(self, tmp_path):
+        shard = tmp_path / "shard"
+        (shard / "ab").mkdir(parents=True)
+        (shard / "ab" / "new-d").write_text("new")
+        (shard / "README").write_text("shard")
+        cache = tmp_path / "cache"
+        cache.mkdir()
+        (cache / "README").write_text("cache")
+
+        assert merge_cache_shard(shard, cache) == 1
+
+        assert (cache / "ab" / "new-d").read_text() == "new"
+        assert (cache / "README").read_text() == "cache"
+
+
+class TestBuildGoStdlib:
+    """Tests for build_go_stdlib function."""
+
+    @patch("lib.golang_stdlib.go_supports_trimpath", return_value=True)
+    @patch("lib.golang_stdlib.subprocess.run")
+    def test_serial_build_shares_one_cache(self, mock_run, _mock_trimpath, tmp_path):
+        mock_run.side_effect = _fake_go_build()
+        install = _make_go_installation(tmp_path / "go1.21")
+
+        assert build_go_stdlib(install) is True
+
+        assert {call.kwargs["env"]["GOCACHE"] for call in mock_run.call_args_list} == {str(install / "cache")}
+        assert all(not any(arg.startswith("-p=") for arg in call.args[0]) for call in mock_run.call_args_list)
+        assert is_stdlib_already_built(install)
+
+    @patch("lib.golang_stdlib.go_supports_trimpath", return_value=True)
+    @patch("lib.golang_stdlib.subprocess.run")
+    def test_parallel_build_merges_shards(self, mock_run, _mock_trimpath, tmp_path):
+        mock_run.side_effect = _fake_go_build()
+        install = _make_go_installation(tmp_path / "go1.21")
+
+        assert build_go_stdlib(install, max_workers=3, cpu_budget=6) is True
+
+        caches = {call.kwargs["env"]["GOCACHE"] for call in mock_run.call_args_list}
+        assert len(caches) == 3
+        assert str(install / "cache") not in caches
+        assert all("-p=2" in call.args[0] for call in mock_run.call_args_list)
+        assert sorted(p.name for p in (install / "cache" / "00").iterdir()) == ["amd64-a", "arm-a", "arm64-a"]
+        assert is_stdlib_already_built(install)
+        # The shards are gone
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["go1.21"]
+
+    @patch("lib.golang_stdlib.go_supports_trimpath", return_value=True)
+    @patch("lib.golang_stdlib.subprocess.run")
+    def test_parallel_build_only_marks_built_architectures(self, mock_run, _mock_trimpath, tmp_path):
+        mock_run.side_effect = _fake_go_build(failing_arch="linux/arm")
+        install = _make_go_installation(tmp_path / "go1.21")
+
+        assert build_go_stdlib(install, max_workers=3, cpu_budget=6) is True
+
+        cache = install / "cache"
+        assert not get_arch_marker_file(cache, "linux/arm").exists()
+        assert not (cache / "00" / "arm-a").exists()
+        assert is_stdlib_already_built(install, ["linux/amd64", "linux/arm64"])
+
+
+class TestBuildMissingGoStdlibs:
+    """Tests for build_missing_go_stdlibs function."""
+
+    @patch("lib.golang_stdlib.build_go_stdlib")
+    def test_skips_built_and_counts_results(self, mock_build, tmp_path):
+        built = _make_go_installation(tmp_path / "built")
+        (built / "cache").mkdir()
+        get_arch_marker_file(built / "cache", "linux/amd64").write_text("built")
+        missing = _make_go_installation(tmp_path / "missing")
+        broken = _make_go_installation(tmp_path / "broken")
+        mock_build.side_effect = lambda path, *_args, **_kwargs: path == missing
+
+        result = build_missing_go_stdlibs(
+            [(built, ["linux/amd64"]), (missing, ["linux/amd64"]), (broken, ["linux/amd64"])],
+            max_workers=2,
+            cpu_budget=4,
+        )
+
+        assert result == (1, 1, 1)
+        assert [call.args[0] for call in mock_build.call_args_list] == [missing, broken]
+        assert mock_build.call_args.kwargs == {"max_workers": 2, "cpu_budget": 4}
+
+    @patch("lib.golang_stdlib.build_go_stdlib")
+    def test_dry_run_builds_nothing(self, mock_build, tmp_path):
+        missing = _make_go_installation(tmp_path / "missing")
+
+        assert build_missing_go_stdlibs([(missing, ["linux/amd64"])], dry_run=True) == (0, 0, 0)
+        mock_build.assert_not_called()
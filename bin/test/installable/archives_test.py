@@ -1,7 +1,13 @@
 from unittest.mock import MagicMock, patch
 
 import pytest
-from lib.installable.archives import NightlyInstallable, RestQueryTarballInstallable
+from lib.installable.archives import (
+    NightlyInstallable,
+    NonFreeS3TarballInstallable,
+    RestQueryTarballInstallable,
+    S3TarballInstallable,
+    TarballInstallable,
+)
 from lib.installation_context import InstallationContext
 from lib.staging import StagingDir
 
@@ -108,3 +114,69 @@ def test_other_installables_have_no_dated_s3_prefix(fake_context):
     installable = make_installable(fake_context, "document[0]['cdn_url']")
 
     assert installable.dated_s3_prefix is None
+
+
+def make_s3_tarball(fake_context, config_extras: dict, cls=S3TarballInstallable) -> S3TarballInstallable:
+    config = dict(context=["compilers", "c++", "x86", "gcc"], name="15.1.0")
+    config.update(config_extras)
+    return cls(fake_context, config)
+
+
+def test_s3_tarball_streams_to_cefs_when_nothing_modifies_the_tree(fake_context):
+    fake_context.can_stream_archives_to_cefs = True
+    installable = make_s3_tarball(fake_context, dict(strip_components=1))
+
+    installable.install()
+
+    fake_context.install_archive_to_cefs.assert_called_once_with(
+        installable.name, installable.fetch_archive_to, "xz", "gcc-15.1.0", "gcc-15.1.0", strip_components=1
+    )
+    fake_context.new_staging_dir.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "config_extras",
+    [dict(strip=True), dict(after_stage_script=["rm -rf share"]), dict(extract_xattrs=True)],
+)
+def test_s3_tarball_needs_staging_to_modify_the_tree(fake_context, config_extras):
+    fake_context.can_stream_archives_to_cefs = True
+    assert not make_s3_tarball(fake_context, config_extras).can_stream_to_cefs
+
+
+def test_s3_tarball_does_not_stream_without_cefs(fake_context):
+    fake_context.can_stream_archives_to_cefs = False
+    assert not make_s3_tarball(fake_context, {}).can_stream_to_cefs
+
+
+def test_nonfree_tarballs_are_unpacked_inside_untar_dir(fake_context):
+    installable = make_s3_tarball(fake_context, {}, cls=NonFreeS3TarballInstallable)
+    assert not installable.archive_root
+
+
+def make_tarball(fake_context, config_extras: dict) -> TarballInstallable:
+    config = dict(
+        context=["tools"], name="1.0", url="https://example.com/tool.tar.gz", dir="tool-1.0", compression="gz"
+    )
+    config.update(config_extras)
+    return TarballInstallable(fake_context, config)
+
+
+def test_tarball_archive_root():
+    fake_context = MagicMock(spec=InstallationContext)
+    assert make_tarball(fake_context, {}).archive_root == "tool-1.0"
+    assert not make_tarball(fake_context, dict(create_untar_dir=True)).archive_root
+    assert make_tarball(fake_context, dict(untar_dir="tool")).archive_root == "tool"
+
+
+@pytest.mark.parametrize(
+    "config_extras,can_stream",
+    [
+        ({}, True),
+        (dict(configure_command=["./configure"]), False),
+        (dict(extract_only="tool-1.0/bin"), False),
+        (dict(strip=True), False),
+    ],
+)
+def test_tarball_can_stream_to_cefs(fake_context, config_extras, can_stream):
+    fake_context.can_stream_archives_to_cefs = True
+    assert make_tarball(fake_context, config_extras).can_stream_to_cefs == can_stream
@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import contextlib
 from pathlib import Path
 from unittest.mock import MagicMock, patch
 
@@ -9,6 +10,7 @@ import pytest
 from lib.golang_stdlib import DEFAULT_ARCHITECTURES, STDLIB_CACHE_DIR
 from lib.installable.go import GoInstallable
 from lib.installation_context import InstallationContext
+from lib.staging import StagingDir
 
 
 class TestGoInstallable:
@@ -272,6 +274,34 @@ class TestGoInstallable:
         call_kwargs = mock_build_stdlib.call_args[1]
         assert call_kwargs["architectures"] == ["linux/amd64", "linux/386"]
 
+    @patch("lib.installable.go.build_go_stdlib")
+    def test_install_builds_stdlib_with_cefs(
+        self, mock_build_stdlib: MagicMock, mock_context: MagicMock, basic_config: dict, tmp_path: Path
+    ):
+        """Test that install() stages, and so builds the stdlib, even when archives could stream to CEFS."""
+        del basic_config["strip"]
+        mock_context.can_stream_archives_to_cefs = True
+        staging = StagingDir(tmp_path / "staging", False)
+        mock_context.new_staging_dir.return_value = contextlib.nullcontext(staging)
+        mock_context.fetch_url_and_pipe_to.side_effect = lambda staging, *_args: (staging.path / "golang-1.24.2").mkdir(
+            parents=True
+        )
+
+        GoInstallable(mock_context, basic_config).install()
+
+        mock_context.install_archive_to_cefs.assert_not_called()
+        assert mock_build_stdlib.call_args[1]["go_installation_path"] == staging.path / "golang-1.24.2"
+        mock_context.move_from_staging.assert_called_once()
+
+    def test_can_stream_to_cefs_without_stdlib(self, mock_context: MagicMock, basic_config: dict):
+        """Test that only installs that don't build the stdlib can skip staging."""
+        del basic_config["strip"]
+        mock_context.can_stream_archives_to_cefs = True
+
+        assert not GoInstallable(mock_context, basic_config).can_stream_to_cefs
+        basic_config["build_stdlib"] = False
+        assert GoInstallable(mock_context, basic_config).can_stream_to_cefs
+
     def test_repr(self, mock_context: MagicMock, basic_config: dict):
         """Test string representation of GoInstallable."""
         installable = GoInstallable(mock_context, basic_config)
@@ -1,10 +1,15 @@
 from __future__ import annotations
 
+import io
 import stat
+import tarfile
 import tempfile
 from pathlib import Path
+from unittest.mock import patch
 
-from lib.config import Config
+import pytest
+import zstandard
+from lib.config import CefsConfig, Config
 from lib.installation_context import InstallationContext, fix_permissions
 from lib.library_platform import LibraryPlatform
 
@@ -129,3 +134,111 @@ def make_context(s3_bucket: str, s3_dir: str) -> InstallationContext:
 def test_s3_url_follows_the_bucket_and_directory():
     assert make_context("compiler-explorer", "opt").s3_url == "https://s3.amazonaws.com/compiler-explorer/opt"
     assert make_context("other-bucket", "opt-nonfree").s3_url == "https://s3.amazonaws.com/other-bucket/opt-nonfree"
+
+
+def test_staging_cleanup_leaves_hardlinked_sources_alone(tmp_path):
+    installed = tmp_path / "opt" / "lib.c"
+    installed.parent.mkdir()
+    installed.write_text("int x;\n")
+    installed.chmod(0o444)
+    context = make_cefs_context(tmp_path)
+
+    with context.new_staging_dir() as staging:
+        build = staging.path / "build"
+        build.mkdir(parents=True)
+        (build / "lib.c").hardlink_to(installed)
+        build.chmod(0o555)
+
+    assert not staging.path.exists()
+    assert stat.S_IMODE(installed.stat().st_mode) == 0o444
+
+
+def make_cefs_context(tmp_path: Path) -> InstallationContext:
+    return InstallationContext(
+        destination=tmp_path / "opt",
+        staging_root=tmp_path / "staging",
+        s3_bucket="compiler-explorer",
+        s3_dir="opt",
+        dry_run=False,
+        is_nightly_enabled=False,
+        only_nightly=False,
+        cache=None,
+        yaml_dir=tmp_path,
+        allow_unsafe_ssl=False,
+        resource_dir=tmp_path,
+        keep_staging=False,
+        check_user="",
+        platform=LibraryPlatform.Linux,
+        config=Config(cefs=CefsConfig(enabled=True, local_temp_dir=tmp_path / "cefs-temp")),
+    )
+
+
+def _tarball() -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        for name, data, mode in [("gcc-15.1.0", None, 0o700), ("gcc-15.1.0/bin/gcc", b"binary", 0o700)]:
+            info = tarfile.TarInfo(name)
+            info.mode = mode
+            info.uid = 1000
+            if data is None:
+                info.type = tarfile.DIRTYPE
+                tar.addfile(info)
+            else:
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+def _capture_squashfs_from_tar(captured: dict):
+    def fake_create(_config, output_path, write_tar, profile=None):
+        stream = io.BytesIO()
+        write_tar(stream)
+        captured["tar"] = stream.getvalue()
+        captured["profile"] = profile
+        output_path.write_bytes(b"image")
+
+    return fake_create
+
+
+@pytest.mark.parametrize("compression", ["tar", "zstd"])
+def test_install_archive_to_cefs_streams_without_staging(tmp_path, compression):
+    context = make_cefs_context(tmp_path)
+    archive = _tarball()
+    if compression == "zstd":
+        archive = zstandard.ZstdCompressor().compress(archive)
+    captured: dict = {}
+
+    with (
+        patch("lib.installation_context.create_squashfs_image_from_tar", _capture_squashfs_from_tar(captured)),
+        patch.object(InstallationContext, "_deploy_image_to_cefs") as mock_deploy,
+    ):
+        context.install_archive_to_cefs(
+            "compilers/c++/x86/gcc 15.1.0", lambda fd: fd.write(archive), compression, "gcc-15.1.0", "gcc-15.1.0"
+        )
+
+    with tarfile.open(fileobj=io.BytesIO(captured["tar"])) as result:
+        members = result.getmembers()
+    assert [(m.name, m.mode, m.uid) for m in members] == [("bin/gcc", 0o755, 0)]
+    image, name, dest = mock_deploy.call_args.args
+    assert (name, dest) == ("compilers/c++/x86/gcc 15.1.0", "gcc-15.1.0")
+    assert not image.exists()
+    assert not (tmp_path / "staging").exists()
+    assert list((tmp_path / "cefs-temp").iterdir()) == []
+
+
+def test_install_archive_to_cefs_missing_root(tmp_path):
+    context = make_cefs_context(tmp_path)
+    archive = _tarball()
+
+    with (
+        patch("lib.installation_context.create_squashfs_image_from_tar", _capture_squashfs_from_tar({})),
+        patch.object(InstallationContext, "_deploy_image_to_cefs") as mock_deploy,
+        pytest.raises(RuntimeError, match="Missing source 'clang-18'"),
+    ):
+        context.install_archive_to_cefs("clang 18", lambda fd: fd.write(archive), "tar", "clang-18", "clang-18")
+    mock_deploy.assert_not_called()
+
+
+def test_can_stream_archives_to_cefs(tmp_path):
+    assert make_cefs_context(tmp_path).can_stream_archives_to_cefs
+    assert not make_context("compiler-explorer", "opt").can_stream_archives_to_cefs
@@ -69,3 +69,13 @@ class TestCsharedValidation:
     def test_cshared_requires_use_compiler(self):
         with pytest.raises(RuntimeError, match="required to supply a .cross.compiler"):
             LibraryBuildConfig(_config(lib_type="cshared"))
+
+
+class TestSourceTree:
+    def test_default_source_tree_is_auto(self):
+        cfg = LibraryBuildConfig(_config())
+        assert (cfg.source_tree, cfg.source_tree_writable) == ("auto", [])
+
+    def test_invalid_source_tree_rejected(self):
+        with pytest.raises(RuntimeError, match="not a valid source_tree"):
+            LibraryBuildConfig(_config(source_tree="overlay"))
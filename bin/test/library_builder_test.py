@@ -1,9 +1,11 @@
 from __future__ import annotations
 
 import ast
+import contextlib
 import io
 import os
 import re
+import threading
 from logging import Logger
 from pathlib import Path
 from subprocess import TimeoutExpired
@@ -12,12 +14,18 @@ from unittest.mock import patch
 
 import pytest
 import requests
-from lib.installation_context import FetchFailure, InstallationContext
+from lib.compiler_cache import CacheStats, CompilerCache, compiler_cache
+from lib.compiler_probe_cache import CompilerProbeCache
+from lib.conan_upload_pipeline import PendingUpload
+from lib.installation_context import FetchFailure, InstallationContext, PostFailure
 from lib.library_build_config import LibraryBuildConfig
 from lib.library_builder import (
     BuildStatus,
     LibraryBuilder,
+    PlannedBuild,
+    build_target_settings,
     build_timeout,
+    build_worker_count,
     fetch_all_annotations,
     fetch_failed_builds,
     is_clang_variant,
@@ -144,6 +152,9 @@ def create_test_build_config():
     config.use_compiler = ""
     config.cxx_compiler_wrapper = ""
     config.source_folder = ""
+    config.source_tree = "reflink"
+    config.source_tree_writable = []
+    config.compiler_cache = True
     return config
 
 
@@ -952,7 +963,7 @@ def test_upload_builds_invalidates_search_cache(mock_subprocess, requests_mock):
 
 @patch("subprocess.check_call")
 def test_set_as_uploaded_first_time_does_not_raise(mock_subprocess, requests_mock):
-    """Regression test: set_as_uploaded must not raise on a never-before-uploaded build.
+    """Regression test: annotating a never-before-uploaded build must not fail.
 
     Reproduces the bug where get_conan_hash was called BEFORE upload_builds, so the
     search response (which only includes already-uploaded packages) returned None.
@@ -978,12 +989,45 @@ def test_set_as_uploaded_first_time_does_not_raise(mock_subprocess, requests_moc
         json={"ok": True},
     )
 
-    builder.needs_uploading = 1
     builder.current_commit_hash = "abc123"
 
     builder.set_as_uploaded("/tmp/buildfolder")
 
-    mock_subprocess.assert_called()
+    assert builder.upload_pipeline.finish() == []
+    assert [call.args[0][:2] for call in mock_subprocess.call_args_list] == [["conan", "upload"], ["conan", "remove"]]
+
+
+@patch("subprocess.check_call")
+def test_set_as_uploaded_logs_in_before_queueing(mock_subprocess, requests_mock):
+    """The upload thread annotates with the proxy token, so it must exist before the package is queued."""
+    builder = _make_builder_with_params(requests_mock)
+    requests_mock.get(SEARCH_URL, json={})
+    login_threads = []
+
+    def login():
+        login_threads.append(threading.current_thread())
+        builder.conanserverproxy_token = "test-token"
+
+    builder.current_commit_hash = "abc123"
+    with patch.object(builder, "conanproxy_login", side_effect=login):
+        builder.set_as_uploaded("/tmp/buildfolder")
+        builder.upload_pipeline.finish()
+
+    assert login_threads == [threading.current_thread()]
+
+
+def test_annotate_upload_raises_when_post_gives_up(requests_mock):
+    builder = _make_builder_with_params(requests_mock)
+    builder.conanserverproxy_token = "test-token"
+    settings = build_target_settings(builder.current_buildparameters_obj)
+    requests_mock.get(SEARCH_URL, json={"somehash": {"settings": settings}})
+    pending = PendingUpload("/tmp/buildfolder", settings, {"commithash": "abc123"})
+
+    with (
+        patch("lib.library_builder.resil_post", return_value={"ok": False, "text": "gave up"}),
+        pytest.raises(PostFailure),
+    ):
+        builder.annotate_upload(pending)
 
 
 @patch("subprocess.call")
@@ -1375,3 +1419,245 @@ def test_is_already_uploaded_returns_false_when_hash_missing_from_bulk(requests_
     requests_mock.get(SEARCH_URL, json={"hash1": {"settings": _matched_settings_dict()}})
     requests_mock.get(_ANNOTATIONS_BULK_URL, json=[])
     assert builder.is_already_uploaded("/tmp/buildfolder") is False
+
+
+@pytest.mark.parametrize(
+    "max_workers, cpu_count, memory_bytes, expected",
+    [
+        (4, 16, 64 << 30, 4),
+        (4, 2, 64 << 30, 2),
+        (4, 16, 5 << 30, 2),
+        (4, 16, 1 << 30, 1),
+        (4, None, None, 4),
+    ],
+)
+def test_build_worker_count(max_workers, cpu_count, memory_bytes, expected):
+    assert build_worker_count(max_workers, 2 << 30, cpu_count, memory_bytes) == expected
+
+
+def _make_matrix_builder(requests_mock):
+    builder = _make_builder_with_params(requests_mock)
+    builder.install_context.new_staging_dir = lambda: contextlib.nullcontext(mock.Mock())
+    builder.compilerprops = {
+        compiler: {"exe": f"/opt/{compiler}/bin/g++", "options": "", "ldPath": "", "compilerType": ""}
+        for compiler in ("g131", "g141")
+    }
+    return builder
+
+
+def _matrix_status(_builder, compiler, options, exe, compiler_type, toolchain, buildos, buildtype, arch, *_, **__):
+    if compiler == "g131" and arch == "x86":
+        raise RuntimeError("conan rejected a setting")
+    return {"g131": BuildStatus.Ok, "g141": BuildStatus.Skipped}[compiler]
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_makebuild_counts_are_the_same_at_any_concurrency(requests_mock, max_workers):
+    builder = _make_matrix_builder(requests_mock)
+
+    with (
+        patch.object(LibraryBuilder, "does_compiler_support", return_value=True),
+        patch.object(LibraryBuilder, "has_failed_before", return_value=False),
+        patch.object(LibraryBuilder, "lookup_build_annotations", return_value={}),
+        patch.object(LibraryBuilder, "makebuildfor", side_effect=_matrix_status, autospec=True) as makebuildfor,
+        patch.object(builder.upload_pipeline, "finish", return_value=[]) as finish_uploads,
+    ):
+        result = builder.makebuild("", max_workers=max_workers)
+
+    # x86_64 and x86 for each compiler: g131 builds one and throws on the other, g141 skips both
+    assert result == [1, 2, 1]
+    assert makebuildfor.call_count == 4
+    finish_uploads.assert_called_once_with()
+    assert builder.make_jobs is None
+
+
+def test_current_buildparameters_are_per_thread(requests_mock):
+    builder = _make_builder_with_params(requests_mock)
+    seen = {}
+
+    def build_in_thread():
+        builder.setCurrentConanBuildParameters("Linux", "Debug", "clang", "clang1810", "libc++", "x86", "", "")
+        seen.update(builder.current_buildparameters_obj)
+
+    thread = threading.Thread(target=build_in_thread)
+    thread.start()
+    thread.join()
+
+    assert seen["compiler_version"] == "clang1810"
+    assert builder.current_buildparameters_obj["compiler_version"] == "g141"
+
+
+def test_writebuildscript_shares_cpus_between_concurrent_builds(tmp_path, requests_mock):
+    builder = _make_builder_with_params(requests_mock)
+    builder.make_jobs = 3
+    builder.writebuildscript(
+        str(tmp_path),
+        str(tmp_path / "install"),
+        "/src/testlib",
+        "g141",
+        "",
+        "/opt/compiler-explorer/gcc-14.1.0/bin/g++",
+        "",
+        "/opt/compiler-explorer/gcc-14.1.0",
+        "Linux",
+        "Debug",
+        "x86_64",
+        "",
+        "",
+        [""],
+        "",
+        {},
+    )
+
+    assert 'export NUMCPUS="3"' in (tmp_path / "cebuild.sh").read_text(encoding="utf-8")
+
+
+def test_does_compiler_support_probes_each_compiler_once(tmp_path, requests_mock, monkeypatch):
+    exe = tmp_path / "g++"
+    exe.write_text("")
+    monkeypatch.setattr("lib.compiler_probe_cache._shared_cache", CompilerProbeCache(tmp_path / "probes.json"))
+    builder = _make_builder_with_params(requests_mock)
+
+    with patch.object(LibraryBuilder, "get_compiler_support_output", return_value="x86-64 i386") as support_output:
+        builder.warm_compiler_probes([])
+        assert builder.does_compiler_support_x86(str(exe), "", "", "")
+        assert builder.does_compiler_support_x86(str(exe), "", "", "")
+        assert not builder.does_compiler_support(str(exe), "", "aarch64", "", "")
+
+    assert support_output.call_count == 2
+
+
+def _plan_matrix(builder, forcebuild=False):
+    builder.forcebuild = forcebuild
+    builder.current_commit_hash = "abc123"
+    uploaded = {"g131": {"commithash": "abc123"}, "g141": {"commithash": "old"}}
+
+    with (
+        patch.object(LibraryBuilder, "does_compiler_support", return_value=True),
+        patch.object(
+            LibraryBuilder,
+            "has_failed_before",
+            autospec=True,
+            side_effect=lambda b: b.current_buildparameters_obj["arch"] == "x86",
+        ),
+        patch.object(
+            LibraryBuilder,
+            "lookup_build_annotations",
+            autospec=True,
+            side_effect=lambda b: uploaded[b.current_buildparameters_obj["compiler_version"]],
+        ),
+    ):
+        return builder.plan_builds(builder.build_jobs(""))
+
+
+def test_plan_builds_gives_skip_reasons(requests_mock):
+    plan = _plan_matrix(_make_matrix_builder(requests_mock))
+
+    assert [(p.job.compiler, p.job.combination[2], p.status, p.reason) for p in plan] == [
+        ("g131", "x86_64", BuildStatus.Skipped, "already uploaded at this commit"),
+        ("g131", "x86", BuildStatus.Skipped, "failed before at this commit"),
+        ("g141", "x86_64", None, "not built at this commit"),
+        ("g141", "x86", BuildStatus.Skipped, "failed before at this commit"),
+    ]
+
+
+def test_plan_builds_when_forced(requests_mock):
+    plan = _plan_matrix(_make_matrix_builder(requests_mock), forcebuild=True)
+
+    assert [(p.status, p.reason) for p in plan] == [
+        (None, "forced rebuild of an uploaded build"),
+        (None, "forced rebuild of an uploaded build"),
+        (None, "forced"),
+        (None, "forced"),
+    ]
+
+
+def test_makebuild_only_stages_planned_builds(requests_mock):
+    builder = _make_matrix_builder(requests_mock)
+    staged = []
+    builder.install_context.new_staging_dir = lambda: staged.append(1) or contextlib.nullcontext(mock.Mock())
+
+    with (
+        patch.object(LibraryBuilder, "plan_builds", autospec=True) as plan_builds,
+        patch.object(LibraryBuilder, "makebuildfor", return_value=BuildStatus.Ok) as makebuildfor,
+        patch.object(LibraryBuilder, "upload_builds"),
+    ):
+        plan_builds.side_effect = lambda b, jobs: [
+            PlannedBuild(job, None if index == 0 else BuildStatus.Skipped, "") for index, job in enumerate(jobs)
+        ]
+        with patch.object(LibraryBuilder, "does_compiler_support", return_value=True):
+            result = builder.makebuild("")
+
+    assert result == [1, 3, 0]
+    assert len(staged) == 1
+    assert makebuildfor.call_args.kwargs == {"planned": True}
+
+
+def _write_cached_build_script(tmp_path, requests_mock, monkeypatch, build_type, compiler_type=""):
+    cache = CompilerCache(tmp_path / "cache", launcher_exe="/usr/bin/ccache", sccache_exe=None)
+    monkeypatch.setattr("lib.compiler_cache._compiler_cache", cache)
+    builder = _make_builder_with_params(requests_mock)
+    builder.buildconfig.build_type = build_type
+    with patch.object(builder, "getDefaultTargetFromCompiler", return_value="x86_64-linux-gnu"):
+        builder.writebuildscript(
+            str(tmp_path / "build"),
+            str(tmp_path / "install"),
+            str(tmp_path / "source"),
+            "g141",
+            "",
+            "/opt/compiler-explorer/gcc-14.1.0/bin/g++",
+            compiler_type,
+            "/opt/compiler-explorer/gcc-14.1.0",
+            "Linux",
+            "Debug",
+            "x86_64",
+            "",
+            "",
+            [""],
+            "",
+            {},
+        )
+    return builder, (tmp_path / "build" / "cebuild.sh").read_text(encoding="utf-8")
+
+
+def test_writebuildscript_uses_compiler_cache_as_cmake_launcher(tmp_path, requests_mock, monkeypatch):
+    (tmp_path / "build").mkdir()
+    builder, script = _write_cached_build_script(tmp_path, requests_mock, monkeypatch, "cmake")
+
+    assert '"-DCMAKE_CXX_COMPILER_LAUNCHER=/usr/bin/ccache"' in script
+    assert f'export CCACHE_DIR="{tmp_path / "cache" / "ccache"}"' in script
+    assert f'export CCACHE_BASEDIR="{tmp_path}"' in script
+    assert 'export CCACHE_COMPILERCHECK="content"' in script
+    assert builder._build_state.compiler_cache is compiler_cache()
+
+
+def test_writebuildscript_prefixes_make_compilers_with_compiler_cache(tmp_path, requests_mock, monkeypatch):
+    (tmp_path / "build").mkdir()
+    _, script = _write_cached_build_script(tmp_path, requests_mock, monkeypatch, "make")
+
+    assert 'export CXX="/usr/bin/ccache /opt/compiler-explorer/gcc-14.1.0/bin/g++"' in script
+    assert 'export CC="/usr/bin/ccache /opt/compiler-explorer/gcc-14.1.0/bin/gcc"' in script
+
+
+def test_writebuildscript_leaves_uncacheable_compilers_alone(tmp_path, requests_mock, monkeypatch):
+    (tmp_path / "build").mkdir()
+    builder, script = _write_cached_build_script(tmp_path, requests_mock, monkeypatch, "cmake", "edg")
+
+    assert "ccache" not in script
+    assert builder._build_state.compiler_cache is None
+
+
+def test_executebuildscript_reports_compiler_cache_hits(tmp_path, requests_mock, monkeypatch):
+    (tmp_path / "build").mkdir()
+    builder, _ = _write_cached_build_script(tmp_path, requests_mock, monkeypatch, "cmake")
+    build_folder = tmp_path / "build"
+
+    def build(*_args, **_kwargs):
+        (build_folder / "ceccachestats.log").write_text("# a.cpp\ndirect_cache_hit\n# b.cpp\ncache_miss\n")
+        return 0
+
+    with patch("subprocess.call", side_effect=build):
+        assert builder.executebuildscript(str(build_folder)) == BuildStatus.Ok
+
+    builder.logger.info.assert_any_call("Compiler cache: 1 hits, 1 misses (50% hit rate)")
+    assert compiler_cache().totals == CacheStats(1, 1)
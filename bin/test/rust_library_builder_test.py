@@ -1,10 +1,13 @@
 from __future__ import annotations
 
+import json
 from logging import Logger
 from subprocess import TimeoutExpired
 from unittest import mock
 from unittest.mock import patch
 
+from lib.cargo_home import CargoHome
+from lib.compiler_cache import CacheStats, CompilerCache
 from lib.installation_context import InstallationContext
 from lib.library_build_config import LibraryBuildConfig
 from lib.rust_library_builder import BuildStatus, RustLibraryBuilder
@@ -36,6 +39,7 @@ def create_rust_test_build_config():
     config.use_compiler = ""
     config.domainurl = "https://github.com"
     config.repo = "test/rust-lib"
+    config.compiler_cache = True
     return config
 
 
@@ -421,3 +425,116 @@ def test_clone_branch(mock_subprocess, requests_mock):
         ["git", "-C", "/tmp/dest", "checkout", "-q", "1.0.0"],
         cwd="/tmp/staging",
     )
+
+
+def test_cargo_builds_use_sccache_as_rustc_wrapper(tmp_path, requests_mock, monkeypatch):
+    cache = CompilerCache(tmp_path / "cache", launcher_exe="/usr/bin/ccache", sccache_exe="/usr/bin/sccache")
+    monkeypatch.setattr("lib.compiler_cache._compiler_cache", cache)
+    builder = _make_rust_builder(requests_mock)
+    builder.writebuildscript(
+        str(tmp_path / "build"),
+        str(tmp_path),
+        "r1700",
+        "",
+        "/opt/compiler-explorer/rust-1.70.0/bin/rustc",
+        "",
+        "",
+        "Linux",
+        "Debug",
+        "x86_64",
+        "",
+        "",
+        [""],
+        "",
+        {"build_method": "", "linker": "/opt/compiler-explorer/gcc-12.4.0"},
+        str(tmp_path / "log"),
+    )
+    stats = [
+        {"stats": {"cache_hits": {"counts": {"Rust": n}}, "cache_misses": {"counts": {"Rust": 1}}}} for n in (2, 7)
+    ]
+
+    with (
+        patch("subprocess.call", return_value=0),
+        patch("subprocess.check_output", side_effect=[json.dumps(totals) for totals in stats]),
+    ):
+        assert builder.executebuildscript(str(tmp_path)) == BuildStatus.Ok
+
+    script = (tmp_path / "build.sh").read_text(encoding="utf-8")
+    assert 'export RUSTC_WRAPPER="/usr/bin/sccache"' in script
+    assert f'export SCCACHE_DIR="{tmp_path / "cache" / "sccache"}"' in script
+    assert cache.totals == CacheStats(5, 0)
+
+
+def _write_rust_script(builder, tmp_path):
+    builder.writebuildscript(
+        str(tmp_path / "build"),
+        str(tmp_path),
+        "r1700",
+        "",
+        "/opt/compiler-explorer/rust-1.70.0/bin/rustc",
+        "",
+        "",
+        "Linux",
+        "Debug",
+        "x86_64",
+        "",
+        "",
+        [""],
+        "",
+        {"build_method": "--all-features", "linker": "/opt/compiler-explorer/gcc-12.4.0"},
+        str(tmp_path / "log"),
+    )
+    return (tmp_path / "build.sh").read_text(encoding="utf-8")
+
+
+def test_cargo_builds_resolve_offline_first_in_shared_cargo_home(tmp_path, requests_mock, monkeypatch):
+    monkeypatch.setattr("lib.cargo_home._shared_cargo_home", CargoHome(tmp_path / "cargo"))
+    builder = _make_rust_builder(requests_mock)
+
+    script = _write_rust_script(builder, tmp_path)
+
+    assert f'export CARGO_HOME="{tmp_path / "cargo"}"' in script
+    assert "$CARGO fetch --offline" in script
+    assert "|| $CARGO fetch >>" in script
+    assert "$CARGO build --offline --all-features" in script
+
+
+def test_cargo_builds_only_go_offline_when_cargo_supports_it(tmp_path, requests_mock, monkeypatch):
+    monkeypatch.setattr("lib.cargo_home._shared_cargo_home", CargoHome(tmp_path / "cargo"))
+    builder = _make_rust_builder(requests_mock)
+
+    lines = _write_rust_script(builder, tmp_path).splitlines()
+
+    check = lines.index("if $CARGO build --help 2>/dev/null | grep -q -- --offline; then")
+    fallback = lines.index("else")
+    assert all("--offline" in line for line in lines[check + 1 : fallback])
+    assert lines[fallback + 1].strip().startswith("$CARGO build --all-features")
+    assert lines[fallback + 2] == "fi"
+
+
+def test_cargo_builds_without_shared_cargo_home(tmp_path, requests_mock, monkeypatch):
+    monkeypatch.setattr("lib.cargo_home._shared_cargo_home", None)
+    builder = _make_rust_builder(requests_mock)
+
+    script = _write_rust_script(builder, tmp_path)
+
+    assert "CARGO_HOME" not in script
+    assert "--offline" not in script
+
+
+@patch("subprocess.check_call")
+def test_download_library_uses_crate_from_shared_cargo_home(mock_subprocess, tmp_path, requests_mock, monkeypatch):
+    crate = tmp_path / "cargo" / "registry" / "cache" / "index.crates.io-1" / "rustlib-1.0.0.crate"
+    crate.parent.mkdir(parents=True)
+    crate.write_bytes(b"")
+    monkeypatch.setattr("lib.cargo_home._shared_cargo_home", CargoHome(tmp_path / "cargo"))
+    builder = _make_rust_builder(requests_mock)
+    builder.buildconfig.repo = ""
+    source_folder = tmp_path / "source"
+
+    builder.download_library(str(tmp_path / "build"), str(source_folder), mock.Mock())
+
+    mock_subprocess.assert_called_once_with(
+        ["tar", "zxf", str(crate), "--strip-components", "1"], cwd=str(source_folder)
+    )
+    builder.install_context.fetch_url_and_pipe_to.assert_not_called()
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import errno
+import os
+from unittest import mock
+
+import pytest
+from lib import source_tree
+from lib.source_tree import default_strategy, materialise_source_tree
+
+
+@pytest.fixture(name="source")
+def source_fixture(tmp_path):
+    source = tmp_path / "source"
+    (source / "src").mkdir(parents=True)
+    (source / "Makefile").write_text("all:\n")
+    (source / "config.h.in").write_text("#define X\n")
+    (source / "src" / "lib.c").write_text("int x;\n")
+    os.chmod(source / "Makefile", 0o750)
+    return source
+
+
+def _no_reflinks(*_args):
+    raise OSError(errno.EOPNOTSUPP, "Operation not supported")
+
+
+@pytest.mark.parametrize("strategy", ["reflink", "hardlink", "copy"])
+def test_every_strategy_reproduces_the_tree(tmp_path, source, strategy):
+    dest = tmp_path / "build"
+    dest.mkdir()
+
+    stats = materialise_source_tree(source, dest, strategy)
+
+    assert (dest / "src" / "lib.c").read_text() == "int x;\n"
+    assert os.stat(dest / "Makefile").st_mode & 0o777 == 0o750
+    assert stats.files == 3
+    assert stats.total_bytes == 5 + 10 + 7
+
+
+def test_default_strategy_reflinks_within_a_filesystem(tmp_path, source):
+    assert default_strategy(source, tmp_path / "build" / "not" / "made" / "yet") == "reflink"
+
+
+def test_default_strategy_copies_across_filesystems(tmp_path, source):
+    devices = {source: 1, tmp_path / "build": 2}
+    with (
+        mock.patch.object(source_tree, "_device", side_effect=lambda path: devices[path]),
+        mock.patch.object(source_tree.fcntl, "ioctl") as ioctl,
+    ):
+        assert default_strategy(source, tmp_path / "build") == "copy"
+        stats = materialise_source_tree(source, tmp_path / "build")
+
+    ioctl.assert_not_called()
+    assert (stats.strategy, stats.copied_bytes) == ("copy", 22)
+
+
+def test_reflink_falls_back_to_copying(tmp_path, source):
+    with mock.patch.object(source_tree.fcntl, "ioctl", side_effect=_no_reflinks) as ioctl:
+        stats = materialise_source_tree(source, tmp_path / "build", "reflink")
+
+    assert ioctl.call_count == 1
+    assert (stats.cloned_bytes, stats.copied_bytes, stats.saved_bytes) == (0, 22, 0)
+    assert (tmp_path / "build" / "config.h.in").read_text() == "#define X\n"
+
+
+def test_reflinked_files_are_counted_as_saved(tmp_path, source):
+    with mock.patch.object(source_tree.fcntl, "ioctl") as ioctl:
+        stats = materialise_source_tree(source, tmp_path / "build")
+
+    assert stats.strategy == "reflink"
+    assert ioctl.call_count == 3
+    assert (stats.cloned_bytes, stats.copied_bytes) == (22, 0)
+
+
+def test_hardlink_farm_copies_writable_files(tmp_path, source):
+    dest = tmp_path / "build"
+    with mock.patch.object(source_tree.fcntl, "ioctl", side_effect=_no_reflinks):
+        stats = materialise_source_tree(source, dest, "hardlink", writable=["*.in"])
+
+    assert os.path.samefile(source / "src" / "lib.c", dest / "src" / "lib.c")
+    assert not os.path.samefile(source / "config.h.in", dest / "config.h.in")
+    assert (stats.linked_bytes, stats.copied_bytes) == (12, 10)
+
+
+def test_hardlink_replaces_existing_files(tmp_path, source):
+    dest = tmp_path / "build"
+    dest.mkdir()
+    (dest / "Makefile").write_text("stale\n")
+
+    materialise_source_tree(source, dest, "hardlink")
+
+    assert os.path.samefile(source / "Makefile", dest / "Makefile")
+
+
+def test_hardlink_falls_back_across_filesystems(tmp_path, source):
+    with mock.patch("os.link", side_effect=OSError(errno.EXDEV, "Invalid cross-device link")) as link:
+        stats = materialise_source_tree(source, tmp_path / "build", "hardlink")
+
+    assert link.call_count == 1
+    assert stats.linked_bytes == 0
+    assert stats.total_bytes == 22
+
+
+def test_unknown_strategy(tmp_path, source):
+    with pytest.raises(ValueError, match="overlay"):
+        materialise_source_tree(source, tmp_path / "build", "overlay")
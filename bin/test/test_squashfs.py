@@ -1,8 +1,24 @@
 #!/usr/bin/env python3
 """Tests for squashfs utilities."""
 
+import gzip
+import io
+import sys
+import tarfile
+
 import pytest
-from lib.squashfs import SquashfsEntry, parse_unsquashfs_line
+from lib.config import CompressionProfile, SquashfsConfig
+from lib.squashfs import (
+    SquashfsEntry,
+    SquashfsError,
+    compression_args,
+    copy_tar_stream_relocated,
+    create_squashfs_image_from_tar,
+    hash_squashfs_files,
+    hash_tar_stream_files,
+    normalised_permissions,
+    parse_unsquashfs_line,
+)
 
 
 class TestUnsquashfsParser:
@@ -145,3 +161,216 @@ class TestUnsquashfsParser:
         result = parse_unsquashfs_line(line)
         # Since file type is '-' not 'l', this should be treated as a filename with arrow
         assert result == SquashfsEntry(file_type="-", size=100, path="weird/file -> not_a_link.txt")
+
+
+def _make_tar(members: list[tuple[str, bytes | None, int]]) -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        root = tarfile.TarInfo(".")
+        root.type = tarfile.DIRTYPE
+        root.mode = 0o755
+        tar.addfile(root)
+        for name, data, mode in members:
+            info = tarfile.TarInfo(name)
+            info.mode = mode
+            info.uid = info.gid = 1000
+            info.uname = info.gname = "builder"
+            if data is None:
+                info.type = tarfile.DIRTYPE
+                tar.addfile(info)
+            else:
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+class TestNormalisedPermissions:
+    @pytest.mark.parametrize(
+        "current,expected",
+        [
+            (0o700, 0o755),
+            (0o600, 0o644),
+            (0o400, 0o644),
+            (0o500, 0o755),
+            (0o777, 0o755),
+            (0o4755, 0o755),
+        ],
+    )
+    def test_mirrors_user_bits(self, current, expected):
+        assert normalised_permissions(current) == expected
+
+
+class TestCopyTarStreamRelocated:
+    def test_relocates_and_normalises(self):
+        source = io.BytesIO(
+            _make_tar([("./bin", None, 0o700), ("./bin/gcc", b"binary", 0o700), ("./README", b"hello", 0o600)])
+        )
+        output_buffer = io.BytesIO()
+        with tarfile.open(fileobj=output_buffer, mode="w") as output:
+            members, data_bytes = copy_tar_stream_relocated(source, "gcc-15.1.0", output)
+
+        assert members == 3
+        assert data_bytes == len(b"binary") + len(b"hello")
+
+        output_buffer.seek(0)
+        with tarfile.open(fileobj=output_buffer, mode="r") as result:
+            by_name = {member.name: member for member in result.getmembers()}
+            assert set(by_name) == {"gcc-15.1.0/bin", "gcc-15.1.0/bin/gcc", "gcc-15.1.0/README"}
+            assert by_name["gcc-15.1.0/bin"].mode == 0o755
+            assert by_name["gcc-15.1.0/bin/gcc"].mode == 0o755
+            assert by_name["gcc-15.1.0/README"].mode == 0o644
+            assert all(member.uid == 0 and member.uname == "root" for member in by_name.values())
+            extracted = result.extractfile(by_name["gcc-15.1.0/bin/gcc"])
+            assert extracted is not None
+            assert extracted.read() == b"binary"
+
+    def test_relocates_hardlink_targets(self):
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w") as tar:
+            info = tarfile.TarInfo("lib/a.so")
+            info.size = 3
+            tar.addfile(info, io.BytesIO(b"abc"))
+            link = tarfile.TarInfo("lib/b.so")
+            link.type = tarfile.LNKTYPE
+            link.linkname = "lib/a.so"
+            tar.addfile(link)
+        buffer.seek(0)
+
+        output_buffer = io.BytesIO()
+        with tarfile.open(fileobj=output_buffer, mode="w") as output:
+            copy_tar_stream_relocated(buffer, "item", output)
+
+        output_buffer.seek(0)
+        with tarfile.open(fileobj=output_buffer, mode="r") as result:
+            link_member = result.getmember("item/lib/b.so")
+            assert link_member.islnk()
+            assert link_member.linkname == "item/lib/a.so"
+
+    def test_selects_subdir_of_compressed_archive(self):
+        source = io.BytesIO(
+            gzip.compress(
+                _make_tar([
+                    ("gcc-15.1.0", None, 0o700),
+                    ("gcc-15.1.0/bin", None, 0o755),
+                    ("gcc-15.1.0/bin/gcc", b"binary", 0o700),
+                    ("other/file", b"x", 0o644),
+                ])
+            )
+        )
+        output_buffer = io.BytesIO()
+        with tarfile.open(fileobj=output_buffer, mode="w") as output:
+            members, _ = copy_tar_stream_relocated(source, "", output, subdir="./gcc-15.1.0/")
+
+        assert members == 2
+        output_buffer.seek(0)
+        with tarfile.open(fileobj=output_buffer, mode="r") as result:
+            assert result.getnames() == ["bin", "bin/gcc"]
+
+    def test_strip_components(self):
+        source = io.BytesIO(
+            _make_tar([("top", None, 0o755), ("top/gcc", None, 0o755), ("top/gcc/bin/gcc", b"binary", 0o755)])
+        )
+        output_buffer = io.BytesIO()
+        with tarfile.open(fileobj=output_buffer, mode="w") as output:
+            copy_tar_stream_relocated(source, "", output, subdir="gcc", strip_components=1)
+
+        output_buffer.seek(0)
+        with tarfile.open(fileobj=output_buffer, mode="r") as result:
+            assert result.getnames() == ["bin/gcc"]
+
+    def test_hardlink_outside_subdir_is_an_error(self):
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w") as tar:
+            info = tarfile.TarInfo("shared/a.so")
+            info.size = 3
+            tar.addfile(info, io.BytesIO(b"abc"))
+            link = tarfile.TarInfo("gcc/lib/a.so")
+            link.type = tarfile.LNKTYPE
+            link.linkname = "shared/a.so"
+            tar.addfile(link)
+        buffer.seek(0)
+
+        with tarfile.open(fileobj=io.BytesIO(), mode="w") as output:
+            with pytest.raises(SquashfsError, match="outside gcc"):
+                copy_tar_stream_relocated(buffer, "", output, subdir="gcc")
+
+
+class TestHashTarStreamFiles:
+    def test_hashes_regular_files(self):
+        source = io.BytesIO(
+            _make_tar([
+                ("./bin", None, 0o755),
+                ("./bin/a", b"same", 0o755),
+                ("./b", b"same", 0o644),
+                ("./c", b"x", 0o644),
+            ])
+        )
+
+        digests = hash_tar_stream_files(source, min_size=2)
+
+        assert [(d.path, d.size) for d in digests] == [("bin/a", 4), ("b", 4)]
+        assert digests[0].digest == digests[1].digest
+        assert len(digests[0].digest) == 16
+
+
+def _fake_sqfs2tar(tmp_path, tar_bytes: bytes, exit_code: int = 0) -> SquashfsConfig:
+    """A sqfs2tar that writes far more than a pipe's worth of stderr before its tar stream."""
+    tar_file = tmp_path / "image.tar"
+    tar_file.write_bytes(tar_bytes)
+    script = tmp_path / "sqfs2tar"
+    script.write_text(
+        f"#!{sys.executable}\n"
+        "import sys\n"
+        "sys.stderr.write('noise\\n' * 100000)\n"
+        "sys.stderr.flush()\n"
+        f"sys.stdout.buffer.write(open({str(tar_file)!r}, 'rb').read())\n"
+        f"sys.exit({exit_code})\n"
+    )
+    script.chmod(0o755)
+    return SquashfsConfig(sqfs2tar_path=str(script))
+
+
+class TestHashSquashfsFiles:
+    def test_noisy_sqfs2tar_does_not_deadlock(self, tmp_path):
+        config = _fake_sqfs2tar(tmp_path, _make_tar([("./a", b"data", 0o644)]))
+
+        digests = hash_squashfs_files(config, tmp_path / "image.sqfs")
+
+        assert [(d.path, d.size) for d in digests] == [("a", 4)]
+
+    def test_failure_reports_stderr(self, tmp_path):
+        config = _fake_sqfs2tar(tmp_path, _make_tar([]), exit_code=1)
+
+        with pytest.raises(SquashfsError, match="noise"):
+            hash_squashfs_files(config, tmp_path / "image.sqfs")
+
+
+class TestCreateSquashfsImageFromTar:
+    @staticmethod
+    def _mksquashfs_args(tmp_path, compression_level):
+        args_file = tmp_path / "args"
+        script = tmp_path / "mksquashfs"
+        script.write_text(f'#!/bin/sh\ncat > /dev/null\necho "$@" > {args_file}\n')
+        script.chmod(0o755)
+        config = SquashfsConfig(mksquashfs_path=str(script), compression="zstd", compression_level=7)
+        create_squashfs_image_from_tar(
+            config, tmp_path / "out.sqfs", lambda stdin: stdin.write(b""), compression_level=compression_level
+        )
+        return args_file.read_text().split()
+
+    def test_explicit_zero_level_is_kept(self, tmp_path):
+        args = self._mksquashfs_args(tmp_path, 0)
+        assert args[args.index("-Xcompression-level") + 1] == "0"
+
+    def test_unset_level_comes_from_config(self, tmp_path):
+        args = self._mksquashfs_args(tmp_path, None)
+        assert args[args.index("-Xcompression-level") + 1] == "7"
+
+
+class TestCompressionArgs:
+    def test_levelled_compressor_with_block_size(self):
+        profile = CompressionProfile(compression="zstd", compression_level=3, block_size="64K")
+        assert compression_args(profile) == ["-comp", "zstd", "-Xcompression-level", "3", "-b", "64K"]
+
+    def test_compressor_without_levels(self):
+        assert compression_args(CompressionProfile(compression="xz")) == ["-comp", "xz"]
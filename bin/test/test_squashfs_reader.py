@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""Tests for the native squashfs metadata reader."""
+
+from __future__ import annotations
+
+import lzma
+import math
+import stat
+import struct
+import zlib
+from dataclasses import dataclass, field
+from unittest.mock import patch
+
+import pytest
+import zstandard
+from lib.config import SquashfsConfig
+from lib.squashfs import SquashfsEntry, list_squashfs_entries, verify_squashfs_contents
+from lib.squashfs_reader import SquashfsFormatError, SquashfsReader, UnsupportedCompressionError
+
+BLOCK_SIZE = 131072
+METADATA_SIZE = 8192
+COMPRESSORS = {
+    "gzip": (1, zlib.compress),
+    "xz": (4, lambda data: lzma.compress(data, format=lzma.FORMAT_XZ)),
+    "zstd": (6, lambda data: zstandard.ZstdCompressor().compress(data)),
+    "lz4": (5, lambda data: data[::-1]),  # Not decompressible by the reader, which is all we need
+}
+
+
+@dataclass
+class Node:
+    kind: str  # "dir", "file", "symlink" or "chr"
+    mode: int = 0o755
+    size: int = 0
+    target: str = ""
+    children: dict[str, Node] = field(default_factory=dict)
+    uid_index: int = 0
+    number: int = 0
+    position: int = 0
+    listing: bytes = b""
+    listing_position: int = 0
+
+    @property
+    def inode_type(self) -> int:
+        return {"dir": 1, "file": 2, "symlink": 3, "chr": 5}[self.kind]
+
+    @property
+    def inode_size(self) -> int:
+        if self.kind == "dir":
+            return 32
+        if self.kind == "file":
+            return 32 + 4 * math.ceil(self.size / BLOCK_SIZE)
+        if self.kind == "symlink":
+            return 24 + len(self.target.encode())
+        return 24
+
+
+def _ref(position: int) -> tuple[int, int]:
+    """(on-disk block start, offset) of an uncompressed stream position, assuming uncompressed blocks."""
+    return (position // METADATA_SIZE) * (METADATA_SIZE + 2), position % METADATA_SIZE
+
+
+def _metadata_blocks(stream: bytes, compress) -> bytes:
+    out = b""
+    for start in range(0, max(len(stream), 1), METADATA_SIZE):
+        chunk = stream[start : start + METADATA_SIZE]
+        if compress:
+            packed = compress(chunk)
+            out += struct.pack("<H", len(packed)) + packed
+        else:
+            out += struct.pack("<H", len(chunk) | 0x8000) + chunk
+    return out
+
+
+def build_image(root: Node, compression: str | None = None) -> bytes:
+    """Build a minimal squashfs 4.0 image containing only metadata (no file data)."""
+    compression_id, compress = COMPRESSORS[compression] if compression else (1, None)
+
+    nodes: list[Node] = []
+
+    def collect(node: Node) -> None:
+        for name in sorted(node.children):
+            collect(node.children[name])
+        nodes.append(node)  # Children before parents, root last, like mksquashfs
+
+    collect(root)
+    position = 0
+    for number, node in enumerate(nodes, start=1):
+        node.number, node.position = number, position
+        position += node.inode_size
+
+    directory_stream = b""
+    for node in nodes:
+        if node.kind != "dir":
+            continue
+        listing = b""
+        run: list[tuple[str, Node]] = []
+
+        def flush(entries: list[tuple[str, Node]]) -> bytes:
+            if not entries:
+                return b""
+            block, _ = _ref(entries[0][1].position)
+            data = struct.pack("<III", len(entries) - 1, block, entries[0][1].number)
+            for name, child in entries:
+                _, offset = _ref(child.position)
+                data += struct.pack(
+                    "<HhHH", offset, child.number - entries[0][1].number, child.inode_type, len(name) - 1
+                )
+                data += name.encode()
+            return data
+
+        for name in sorted(node.children):
+            child = node.children[name]
+            if run and (len(run) == 256 or _ref(run[0][1].position)[0] != _ref(child.position)[0]):
+                listing += flush(run)
+                run = []
+            run.append((name, child))
+        listing += flush(run)
+        node.listing, node.listing_position = listing, len(directory_stream)
+        directory_stream += listing
+
+    inode_stream = b""
+    for node in nodes:
+        header = struct.pack("<HHHHII", node.inode_type, node.mode, node.uid_index, 0, 1234, node.number)
+        if node.kind == "dir":
+            block, offset = _ref(node.listing_position)
+            body = struct.pack("<IIHHI", block, 2, len(node.listing) + 3, offset, 0)
+        elif node.kind == "file":
+            blocks = math.ceil(node.size / BLOCK_SIZE)
+            body = struct.pack("<IIII", 0, 0xFFFFFFFF, 0, node.size) + b"\0" * 4 * blocks
+        elif node.kind == "symlink":
+            body = struct.pack("<II", 1, len(node.target.encode())) + node.target.encode()
+        else:
+            body = struct.pack("<II", 1, 0x0501)
+        inode_stream += header + body
+
+    if compress:
+        assert len(inode_stream) <= METADATA_SIZE and len(directory_stream) <= METADATA_SIZE
+
+    inode_table = _metadata_blocks(inode_stream, compress)
+    directory_table = _metadata_blocks(directory_stream, compress)
+    id_block = _metadata_blocks(struct.pack("<II", 0, 1000), compress)
+
+    inode_table_start = 96
+    directory_table_start = inode_table_start + len(inode_table)
+    id_block_start = directory_table_start + len(directory_table)
+    id_table_start = id_block_start + len(id_block)
+    bytes_used = id_table_start + 8
+    root_block, root_offset = _ref(root.position)
+    superblock = struct.pack(
+        "<IIIIIHHHHHHQQQQQQQQ",
+        0x73717368,
+        len(nodes),
+        0,
+        BLOCK_SIZE,
+        0,
+        compression_id,
+        17,
+        0,
+        2,
+        4,
+        0,
+        (root_block << 16) | root_offset,
+        bytes_used,
+        id_table_start,
+        0xFFFFFFFFFFFFFFFF,
+        inode_table_start,
+        directory_table_start,
+        0xFFFFFFFFFFFFFFFF,
+        0xFFFFFFFFFFFFFFFF,
+    )
+    return superblock + inode_table + directory_table + id_block + struct.pack("<Q", id_block_start)
+
+
+def sample_tree() -> Node:
+    return Node(
+        "dir",
+        children={
+            "bin": Node(
+                "dir",
+                children={
+                    "g++": Node("file", size=300000, uid_index=1),
+                    "c++": Node("symlink", mode=0o777, target="g++"),
+                },
+            ),
+            "README": Node("file", mode=0o644, size=5),
+            "dev": Node("dir", children={"null": Node("chr", mode=0o666)}),
+            "empty": Node("dir"),
+        },
+    )
+
+
+@pytest.fixture
+def sample_image(tmp_path):
+    image = tmp_path / "sample.sqfs"
+    image.write_bytes(build_image(sample_tree()))
+    return image
+
+
+def test_lists_entries_in_order(sample_image):
+    with SquashfsReader(sample_image) as reader:
+        entries = list(reader.iter_entries())
+
+    assert [(e.path, e.file_type, e.size, e.target) for e in entries] == [
+        ("README", "-", 5, None),
+        ("bin", "d", 0, None),
+        ("bin/c++", "l", 0, "g++"),
+        ("bin/g++", "-", 300000, None),
+        ("dev", "d", 0, None),
+        ("dev/null", "c", 0, None),
+        ("empty", "d", 0, None),
+    ]
+
+
+def test_modes_and_ownership(sample_image):
+    with SquashfsReader(sample_image) as reader:
+        by_path = {entry.path: entry for entry in reader.iter_entries()}
+        root = reader.root()
+
+    assert by_path["README"].mode == stat.S_IFREG | 0o644
+    assert by_path["bin/c++"].mode == stat.S_IFLNK | 0o777
+    assert by_path["dev/null"].mode == stat.S_IFCHR | 0o666
+    assert (by_path["bin/g++"].uid, by_path["bin/g++"].gid) == (1000, 0)
+    assert (by_path["README"].uid, by_path["README"].mtime) == (0, 1234)
+    assert root.file_type == "d"
+    assert not root.path
+
+
+def test_superblock(sample_image):
+    with SquashfsReader(sample_image) as reader:
+        assert reader.superblock.inode_count == 8
+        assert reader.superblock.block_size == BLOCK_SIZE
+        assert reader.superblock.version == (4, 0)
+
+
+@pytest.mark.parametrize("compression", ["gzip", "xz", "zstd"])
+def test_compressed_metadata(tmp_path, compression):
+    image = tmp_path / f"{compression}.sqfs"
+    image.write_bytes(build_image(sample_tree(), compression))
+
+    with SquashfsReader(image) as reader:
+        assert reader.superblock.compression == compression
+        assert len(list(reader.iter_entries())) == 7
+
+
+def test_metadata_spanning_blocks(tmp_path):
+    files = {f"header_{i:04}.h": Node("file", mode=0o644, size=i) for i in range(700)}
+    image = tmp_path / "big.sqfs"
+    image.write_bytes(build_image(Node("dir", children={"include": Node("dir", children=files)})))
+
+    with SquashfsReader(image) as reader:
+        entries = list(reader.iter_entries())
+
+    assert len(entries) == 701
+    assert [(e.path, e.size) for e in entries[1:]] == [(f"include/header_{i:04}.h", i) for i in range(700)]
+
+
+def test_iter_entries_subdir(sample_image):
+    with SquashfsReader(sample_image) as reader:
+        assert [e.path for e in reader.iter_entries("bin")] == ["bin/c++", "bin/g++"]
+        with pytest.raises(SquashfsFormatError, match="not found"):
+            list(reader.iter_entries("missing"))
+        with pytest.raises(SquashfsFormatError, match="not a directory"):
+            list(reader.iter_entries("README"))
+
+
+def test_rejects_non_squashfs(tmp_path):
+    image = tmp_path / "junk.sqfs"
+    image.write_bytes(b"\0" * 200)
+    with pytest.raises(SquashfsFormatError, match="magic"):
+        SquashfsReader(image)
+
+
+def test_unsupported_compression_falls_back_to_unsquashfs(tmp_path):
+    image = tmp_path / "lz4.sqfs"
+    image.write_bytes(build_image(sample_tree(), "lz4"))
+
+    with pytest.raises(UnsupportedCompressionError):
+        SquashfsReader(image)
+
+    fallback = [SquashfsEntry(file_type="-", size=1, path="x")]
+    with patch("lib.squashfs.list_squashfs_entries_with_unsquashfs", return_value=fallback) as mock_unsquashfs:
+        assert list_squashfs_entries(SquashfsConfig(), image) == fallback
+    mock_unsquashfs.assert_called_once()
+
+
+def test_list_squashfs_entries_matches_unsquashfs_format(sample_image):
+    entries = list_squashfs_entries(SquashfsConfig(), sample_image)
+
+    assert SquashfsEntry(file_type="l", size=0, path="bin/c++", target="g++") in entries
+    assert SquashfsEntry(file_type="-", size=300000, path="bin/g++") in entries
+
+
+def test_verify_squashfs_contents(tmp_path):
+    image = tmp_path / "image.sqfs"
+    image.write_bytes(
+        build_image(
+            Node(
+                "dir",
+                children={
+                    "bin": Node("dir", children={"tool": Node("file", size=4)}),
+                    "link": Node("symlink", target="bin/tool"),
+                },
+            )
+        )
+    )
+    nfs = tmp_path / "nfs"
+    (nfs / "bin").mkdir(parents=True)
+    (nfs / "bin" / "tool").write_bytes(b"abcd")
+    (nfs / "link").symlink_to("bin/tool")
+
+    assert verify_squashfs_contents(image, nfs) == 0
+
+    (nfs / "bin" / "tool").write_bytes(b"abcdef")
+    assert verify_squashfs_contents(image, nfs) == 1
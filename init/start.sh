@@ -25,6 +25,8 @@ fi
 setup_cgroups
 mount_opt
 mount_nosym
+setup_cefs_cache
+warm_cefs
 update_code
 
 if ! sudo -u "${CE_USER}" nsjail --config /infra/.deploy/etc/nsjail/compilers-and-tools.cfg -- /bin/bash -c "echo nsjail works"; then
@@ -39,6 +39,7 @@ apt-get install -y \
     patch \
     pkg-config \
     protobuf-compiler \
+    pv \
     python-is-python3 \
     python3-pip \
     python3-venv \
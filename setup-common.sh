@@ -235,10 +235,15 @@ EOF
     # the setup here.
     mkdir /cefs
     echo "* -fstype=autofs program:/etc/auto.cefs.sub" > /etc/auto.cefs
+    # If the node has a local image cache (see setup_cefs_cache in start-support.sh), mount from it when we can;
+    # any failure there falls back to mounting straight from EFS.
     cat > /etc/auto.cefs.sub << 'EOF'
 #!/bin/bash
 key="$1"
 subdir="${key:0:2}"
+if mountpoint -q /cefs-cache && /usr/bin/python3 /infra/bin/cefs_local_cache.py --cache-dir /cefs-cache --image-dir /efs/cefs-images --hot-list /opt/compiler-explorer/.cefs-warm-list map "${key}" 2>/dev/null; then
+    exit 0
+fi
 echo "-fstype=squashfs,loop,nosuid,nodev,ro :/efs/cefs-images/${subdir}/${key}.sqfs"
 EOF
     chmod +x /etc/auto.cefs.sub
@@ -79,6 +79,44 @@ update_code() {
     fi
 }
 
+setup_cefs_cache() {
+    # Use the instance store, if this instance type has one, as a local cache of CEFS images (see the
+    # autofs map in setup-common.sh). The instance store is empty after every stop, so format it each boot.
+    local DEVICE
+    DEVICE=$(find /dev/disk/by-id -name 'nvme-Amazon_EC2_NVMe_Instance_Storage_*' ! -name '*-part*' 2>/dev/null | head -1)
+    if [[ -z "${DEVICE}" ]] || mountpoint -q /cefs-cache; then
+        return
+    fi
+    echo "Setting up local CEFS image cache on ${DEVICE}"
+    # The cache is optional: if the device can't be used, images are mounted straight from EFS instead
+    mkfs.ext4 -q -F "${DEVICE}" || {
+        echo "cefs cache unavailable"
+        return 0
+    }
+    mkdir -p /cefs-cache
+    mount -o noatime "${DEVICE}" /cefs-cache || {
+        echo "cefs cache unavailable"
+        return 0
+    }
+}
+
+warm_cefs() {
+    # Prefetch the most used CEFS images in the background; the list is written by `ce cefs warm --write-list`.
+    # pv caps the reads at the bandwidth `ce cefs warm` defaults to (DEFAULT_MAX_BANDWIDTH, 100MiB/s), so a booting
+    # node doesn't saturate EFS
+    local WARM_LIST=/opt/compiler-explorer/.cefs-warm-list
+    local WARM_BANDWIDTH=100m
+    if [[ ! -f "${WARM_LIST}" ]]; then
+        return
+    fi
+    if ! command -v pv >/dev/null; then
+        echo "pv not installed, not warming CEFS images"
+        return
+    fi
+    echo "Warming CEFS images from ${WARM_LIST}"
+    (ionice -c3 nice xargs -a "${WARM_LIST}" -d '\n' -P 4 -n 64 cat 2>/dev/null | pv -q -L "${WARM_BANDWIDTH}" >/dev/null || true) &
+}
+
 install_asmparser() {
     rm -f /usr/local/bin/asm-parser
     cp /opt/compiler-explorer/asm-parser/asm-parser /usr/local/bin